@@ -29,7 +29,9 @@ import struct
 import argparse
 import functools
 import multiprocessing
+import multiprocessing.pool
 import logging
+import threading
 
 
 def which(prg):
@@ -67,6 +69,8 @@ if int(docker.__version__.split('.')[0]) < 2:
                      ' Please install it on the monitored system (pip install docker)."}\n')
     sys.exit(1)
 
+DOCKER_VERSION = tuple(int(n) for n in docker.__version__.split('.')[:2])
+
 DEBUG = "--debug" in sys.argv[1:]
 
 VERSION = "0.1"
@@ -77,6 +81,7 @@ DEFAULT_CFG_SECTION = {
     "base_url": "unix://var/run/docker.sock",
     "skip_sections": "",
     "container_id": "short",
+    "max_workers": "10",
 }
 
 LOGGER = logging.getLogger(__name__)
@@ -127,6 +132,7 @@ def get_config(cfg_file):
 
     skip_list = conf_dict.get("skip_sections", "").split(',')
     conf_dict["skip_sections"] = tuple(n.strip() for n in skip_list)
+    conf_dict["max_workers"] = max(1, int(conf_dict["max_workers"]))
 
     return conf_dict
 
@@ -170,12 +176,21 @@ def report_exception_to_server(exc, location):
 
 
 class MKDockerClient(docker.DockerClient):
-    '''a docker.DockerClient that caches containers and node info'''
+    '''a docker.DockerClient that caches containers and node info
+
+    The client is shared by the threads processing the containers, so the
+    connections to the docker API are reused.'''
     API_VERSION = "auto"
     _DEVICE_MAP_LOCK = multiprocessing.Lock()
 
     def __init__(self, config):
-        super(MKDockerClient, self).__init__(config['base_url'], version=MKDockerClient.API_VERSION)
+        kwargs = {}
+        if DOCKER_VERSION >= (4, 3):  # max_pool_size is available since docker 4.3.0
+            # One connection per worker thread
+            kwargs["max_pool_size"] = config['max_workers']
+        super(MKDockerClient, self).__init__(config['base_url'],
+                                             version=MKDockerClient.API_VERSION,
+                                             **kwargs)
         all_containers = self.containers.list(all=True)
         if config['container_id'] == "name":
             self.all_containers = dict([(c.attrs["Name"].lstrip('/'), c) for c in all_containers])
@@ -185,6 +200,7 @@ class MKDockerClient(docker.DockerClient):
             self.all_containers = dict([(c.attrs["Id"][:12], c) for c in all_containers])
         self._env = {"REMOTE": os.getenv("REMOTE", "")}
         self._container_stats = {}
+        self._container_stats_locks = dict((key, threading.Lock()) for key in self.all_containers)
         self._device_map = None
         self.node_info = self.info()
 
@@ -234,18 +250,22 @@ class MKDockerClient(docker.DockerClient):
         return self.get_stdout(result)
 
     def get_container_stats(self, container_key):
-        '''return cached container stats'''
-        try:
-            return self._container_stats[container_key]
-        except KeyError:
-            pass
+        '''return cached container stats
+
+        The stats of a container are fetched once per run and shared by all
+        sections (and threads) using them.'''
+        with self._container_stats_locks[container_key]:
+            try:
+                return self._container_stats[container_key]
+            except KeyError:
+                pass
 
-        container = self.all_containers[container_key]
-        if not container.status == "running":
-            return self._container_stats.setdefault(container_key, None)
+            container = self.all_containers[container_key]
+            if not container.status == "running":
+                return self._container_stats.setdefault(container_key, None)
 
-        stats = container.stats(stream=False)
-        return self._container_stats.setdefault(container_key, stats)
+            stats = container.stats(stream=False)
+            return self._container_stats.setdefault(container_key, stats)
 
 
 def time_it(func):
@@ -497,15 +517,19 @@ def call_node_sections(client, config):
 
 
 def call_container_sections(client, config):
-    jobs = []
-    for container_id in client.all_containers:
-        job = multiprocessing.Process(target=_call_single_containers_sections,
-                                      args=(client, config, container_id))
-        job.start()
-        jobs.append(job)
-
-    for job in jobs:
-        job.join()
+    '''process the containers with at most max_workers threads'''
+    container_ids = list(client.all_containers)
+    if not container_ids:
+        return
+
+    pool = multiprocessing.pool.ThreadPool(min(config["max_workers"], len(container_ids)))
+    try:
+        pool.map(functools.partial(_call_single_containers_sections, client, config),
+                 container_ids,
+                 chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def _call_single_containers_sections(client, config, container_id):
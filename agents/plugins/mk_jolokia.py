@@ -4,6 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import multiprocessing.pool
 import os
 import socket
 import sys
@@ -15,8 +16,10 @@ except:
     pass
 
 if sys.version_info[0] >= 3:
+    from io import StringIO
     from urllib.parse import quote  # pylint: disable=import-error,no-name-in-module
 else:
+    from StringIO import StringIO  # type: ignore[import,no-redef] # pylint: disable=import-error
     from urllib2 import quote  # type: ignore[attr-defined] # pylint: disable=import-error
 
 try:
@@ -153,7 +156,11 @@ DEFAULT_CONFIG_TUPLES = (
      " we try to detect the product from the jolokia info section." %
      ", ".join(AVAILABLE_PRODUCTS)),
     ("timeout", 1.0, "Connection/read timeout for requests."),
+    ("bulk_size", 0, "Number of read requests sent to the Jolokia server in one bulk request."
+     " If set to 0, a request is sent for each MBean."),
     ("custom_vars", []),
+    # Number of instances queried concurrently
+    ("max_workers", 1),
     # List of instances to monitor. Each instance is a dict where
     # the global configuration values can be overridden.
     ("instances", [{}]),
@@ -172,10 +179,12 @@ def get_default_config_dict():
     return dict([(elem[0], elem[1]) for elem in DEFAULT_CONFIG_TUPLES])
 
 
-def write_section(name, iterable):
-    sys.stdout.write('<<<%s:sep(0)>>>\n' % name)
+def write_section(name, iterable, output=None):
+    if output is None:
+        output = sys.stdout
+    output.write('<<<%s:sep(0)>>>\n' % name)
     for line in iterable:
-        sys.stdout.write(chr(0).join(map(str, line)) + '\n')
+        output.write(chr(0).join(map(str, line)) + '\n')
 
 
 def cached(function):
@@ -256,6 +265,10 @@ class JolokiaInstance(object):
         self.post_config = {"ignoreErrors": "true"}
         self._session = self._initialize_http_session()
 
+        self.bulk_size = int(self._config.get("bulk_size") or 0)
+        self.max_workers = int(self._config.get("max_workers") or 1)
+        self._prefetched = {}  # type: Dict[str, Dict[str, Any]]
+
     def _get_base_url(self):
         return "%s://%s:%d/%s/" % (
             self._config["protocol"].strip('/'),
@@ -323,15 +336,49 @@ class JolokiaInstance(object):
         return data
 
     def post(self, data):
+        try:
+            return validate_jolokia_response(self._prefetched[_request_key(data)])
+        except KeyError:
+            pass
+        return validate_response(self._post_raw(data))
+
+    def prefetch(self, data_list):
+        """Fetch the responses of the requests in bulk requests of bulk_size requests
+
+        The responses are used by post() instead of sending the requests one by one.
+        The requests of failed bulk requests are left to post().
+        """
+        self._prefetched = {}
+        if self.bulk_size < 1:
+            return
+
+        data_by_key = {}  # type: Dict[str, Dict[str, Any]]
+        keys = []  # type: List[str]
+        for data in data_list:
+            key = _request_key(data)
+            if key not in data_by_key:
+                data_by_key[key] = data
+                keys.append(key)
+
+        for start in range(0, len(keys), self.bulk_size):
+            chunk = keys[start:start + self.bulk_size]
+            try:
+                responses = validate_bulk_response(
+                    self._post_raw([data_by_key[key] for key in chunk]), len(chunk))
+            except SkipMBean:
+                continue
+            except SkipInstance:
+                break
+            self._prefetched.update(zip(chunk, responses))
+
+    def _post_raw(self, data):
         post_data = json.dumps(data)
         if VERBOSE:
             sys.stderr.write("\nDEBUG: POST data: %r\n" % post_data)
         try:
             # Watch out: we must provide the verify keyword to every individual request call!
             # Else it will be overwritten by the REQUESTS_CA_BUNDLE env variable
-            raw_response = self._session.post(self.base_url,
-                                              data=post_data,
-                                              verify=self._session.verify)
+            return self._session.post(self.base_url, data=post_data, verify=self._session.verify)
         except requests.exceptions.ConnectionError:
             if DEBUG:
                 raise
@@ -342,11 +389,27 @@ class JolokiaInstance(object):
             sys.stderr.write("ERROR: %s\n" % exc)
             raise SkipMBean(exc)
 
-        return validate_response(raw_response)
+
+def _request_key(data):
+    return json.dumps(data, sort_keys=True)
 
 
 def validate_response(raw):
     '''return loaded response or raise exception'''
+    return validate_jolokia_response(_validate_http_response(raw))
+
+
+def validate_bulk_response(raw, num_requests):
+    '''return loaded responses of a bulk request or raise exception'''
+    responses = _validate_http_response(raw)
+    # Old Jolokia agents answer bulk requests with a single error response
+    if not isinstance(responses, list) or len(responses) != num_requests:
+        sys.stderr.write("ERROR: unexpected response to bulk request: %r\n" % (responses,))
+        raise SkipMBean("ERROR", "unexpected response to bulk request")
+    return responses
+
+
+def _validate_http_response(raw):
     if VERBOSE > 1:
         sys.stderr.write("DEBUG: %r:\n"
                          "DEBUG:   headers: %r\n"
@@ -360,7 +423,11 @@ def validate_response(raw):
             raise SkipInstance("HTTP STATUS", raw.status_code)
         raise SkipMBean("HTTP STATUS", raw.status_code)
 
-    response = raw.json()
+    return raw.json()
+
+
+def validate_jolokia_response(response):
+    '''return the response of a single request or raise exception'''
     # check the status of the jolokia response
     if response.get("status") != 200:
         errmsg = response.get("error", "unkown error")
@@ -497,21 +564,46 @@ def _process_queries(inst, queries):
             continue
 
 
-def query_instance(inst):
-    write_section('jolokia_info', generate_jolokia_info(inst))
+def query_instance(inst, output=None):
+    write_section('jolokia_info', generate_jolokia_info(inst), output)
 
     # now (after jolokia_info) we're sure about the product
+    if inst.bulk_size:
+        prefetch_instance(inst)
+
     specs_specific = QUERY_SPECS_SPECIFIC_LEGACY.get(inst.product, [])
-    write_section('jolokia_metrics', generate_values(inst, specs_specific))
-    write_section('jolokia_metrics', generate_values(inst, QUERY_SPECS_LEGACY))
+    write_section('jolokia_metrics', generate_values(inst, specs_specific), output)
+    write_section('jolokia_metrics', generate_values(inst, QUERY_SPECS_LEGACY), output)
 
     sections_specific = MBEAN_SECTIONS_SPECIFIC.get(inst.product, {})
     for section_name, mbeans in sections_specific.items():
-        write_section('jolokia_%s' % section_name, generate_json(inst, mbeans))
+        write_section('jolokia_%s' % section_name, generate_json(inst, mbeans), output)
     for section_name, mbeans_tups in MBEAN_SECTIONS.items():
-        write_section('jolokia_%s' % section_name, generate_json(inst, mbeans_tups))
+        write_section('jolokia_%s' % section_name, generate_json(inst, mbeans_tups), output)
 
-    write_section('jolokia_generic', generate_values(inst, inst.custom_vars))
+    write_section('jolokia_generic', generate_values(inst, inst.custom_vars), output)
+
+
+def prefetch_instance(inst):
+    '''Fetch the MBeans queried by query_instance in bulk requests
+
+    The searches are sent first, their results determine the MBeans to read.
+    '''
+    var_list = (QUERY_SPECS_SPECIFIC_LEGACY.get(inst.product, []) + QUERY_SPECS_LEGACY +
+                list(inst.custom_vars))
+    inst.prefetch(
+        [inst.get_post_data(var[0], "search", use_target=False) for var in var_list if var[4]])
+
+    paths = []
+    for var in var_list:
+        mbean, path, title, itemspec, do_search = var[:5]
+        queries = _get_queries(do_search, inst, itemspec, title, path, mbean)
+        paths.extend(mbean_path for mbean_path, _title, _itemspec in queries)
+    for mbeans in MBEAN_SECTIONS_SPECIFIC.get(inst.product, {}).values():
+        paths.extend(mbeans)
+    for mbeans in MBEAN_SECTIONS.values():
+        paths.extend(mbeans)
+    inst.prefetch([inst.get_post_data(path, "read", use_target=True) for path in paths])
 
 
 def generate_jolokia_info(inst):
@@ -587,16 +679,38 @@ def load_config(custom_config):
     return custom_config
 
 
+def _query_instance_output(inst):
+    output = StringIO()
+    try:
+        query_instance(inst, output)
+    except SkipInstance:
+        pass
+    return output.getvalue()
+
+
 def main(configs_iterable=None):
     if configs_iterable is None:
         configs_iterable = yield_configured_instances()
 
-    for config in configs_iterable:
-        instance = JolokiaInstance(config)
-        try:
-            query_instance(instance)
-        except SkipInstance:
-            pass
+    instances = [JolokiaInstance(config) for config in configs_iterable]
+    # The global setting is part of the configuration of every instance
+    max_workers = max([inst.max_workers for inst in instances] or [1])
+    if max_workers < 2 or len(instances) < 2:
+        for instance in instances:
+            try:
+                query_instance(instance)
+            except SkipInstance:
+                pass
+        return
+
+    # The output of each instance is collected and written in the configured order
+    pool = multiprocessing.pool.ThreadPool(min(max_workers, len(instances)))
+    try:
+        for output in pool.map(_query_instance_output, instances, chunksize=1):
+            sys.stdout.write(output)
+    finally:
+        pool.close()
+        pool.join()
 
 
 if __name__ == "__main__":
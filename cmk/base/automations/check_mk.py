@@ -1382,6 +1382,7 @@ class AutomationDiagHost(Automation):
             is_usewalk_host=snmp_config.is_usewalk_host,
             is_inline_snmp_host=snmp_config.is_inline_snmp_host,
             record_stats=config.record_inline_snmp_stats,
+            bulk_backend_settings=snmp_config.bulk_backend_settings,
         )
 
         # TODO: It is unclear why mypy complains about this structure. Investigate!
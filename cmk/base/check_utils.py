@@ -4,7 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple, TypeVar, Union
 
 from cmk.utils.check_utils import section_name_of
 from cmk.utils.type_defs import CheckPluginNameStr, HostName, Item, RawAgentData, SectionName
@@ -27,7 +27,7 @@ SectionCacheInfo = Dict[SectionName, Tuple[int, int]]
 AgentSectionContent = List[List[str]]
 PersistedAgentSection = Tuple[int, int, AgentSectionContent]
 PersistedAgentSections = Dict[SectionName, PersistedAgentSection]
-AgentSections = Dict[SectionName, AgentSectionContent]
+AgentSections = MutableMapping[SectionName, AgentSectionContent]
 
 PiggybackRawData = Dict[HostName, List[bytes]]
 ParsedSectionContent = Any
@@ -20,6 +20,7 @@ from typing import (
     Dict,
     IO,
     Iterable,
+    Iterator,
     List,
     Optional,
     Set,
@@ -87,6 +88,8 @@ else:
 _nagios_command_pipe: Union[bool, IO[bytes], None] = None
 _checkresult_file_fd = None
 _checkresult_file_path = None
+# Check results collected for a buffered submission (see config.check_submission_buffered)
+_pending_check_results: List[Tuple[HostName, ServiceName, ServiceState, ServiceDetails, float]] = []
 
 _submit_to_core = True
 _show_perfdata = False
@@ -206,11 +209,25 @@ def do_check(
                 if phase in ["agent", "snmp", "ds"]:
                     t = times[4] - sum(times[:4])  # real time - CPU time
                     perfdata.append("cmk_time_%s=%.3f" % (phase, t))
+
+            for name, value in sorted(cpu_tracking.get_counters().items()):
+                perfdata.append("cmk_%s=%d" % (name, value))
         else:
             perfdata.append("execution_time=%.3f" % run_time)
 
+        _flush_check_results()
+
         return status, infotexts, long_infotexts, perfdata
     finally:
+        # Only left over when the checking failed: Submit the results of the services checked
+        # so far, but do not hide the original exception.
+        num_pending = len(_pending_check_results)
+        if num_pending:
+            try:
+                _flush_check_results()
+            except Exception as e:
+                console.warning("Cannot submit %d check results: %s\n" % (num_pending, e))
+
         if _checkresult_file_fd is not None:
             _close_checkresult_file()
 
@@ -292,6 +309,8 @@ def _do_all_checks_on_host(
             # TODO (mo): centralize maincheckify: CMK-4295
             plugins_missing_data.add(CheckPluginName(maincheckify(service.check_plugin_name)))
 
+    multi_host_sections.store_parsed_sections()
+
     import cmk.base.inventory as inventory  # pylint: disable=import-outside-toplevel
     inventory.do_inventory_actions_during_checking_for(
         sources,
@@ -850,27 +869,60 @@ def _do_submit_to_core(
         # Regular case for the CMC - check helpers are running in keepalive mode
         keepalive.add_check_result(host, service, state, output, cached_at, cache_interval)
 
-    elif config.check_submission == "pipe" or config.monitoring_core == "cmc":
+    elif config.check_submission not in ["pipe", "file"] and config.monitoring_core != "cmc":
+        raise MKGeneralException("Invalid setting %r for check_submission. "
+                                 "Must be 'pipe' or 'file'" % config.check_submission)
+
+    elif config.check_submission_buffered:
+        _pending_check_results.append((host, service, state, output, time.time()))
+        if len(_pending_check_results) >= config.check_submission_flush_results:
+            _flush_check_results()
+
+    elif _submit_via_pipe():
         # In case of CMC this is used when running "cmk" manually
         _submit_via_command_pipe(host, service, state, output)
 
-    elif config.check_submission == "file":
+    else:
         _submit_via_check_result_file(host, service, state, output)
 
+
+def _submit_via_pipe() -> bool:
+    return config.check_submission == "pipe" or config.monitoring_core == "cmc"
+
+
+def _flush_check_results() -> None:
+    """Submit all buffered check results to the core"""
+    global _pending_check_results
+    results, _pending_check_results = _pending_check_results, []
+    if not results:
+        return
+
+    if _submit_via_pipe():
+        _submit_many_via_command_pipe(results)
     else:
-        raise MKGeneralException("Invalid setting %r for check_submission. "
-                                 "Must be 'pipe' or 'file'" % config.check_submission)
+        _submit_many_via_check_result_file(results)
 
 
 def _submit_via_check_result_file(host: HostName, service: ServiceName, state: ServiceState,
                                   output: ServiceDetails) -> None:
-    output = output.replace("\n", "\\n")
     _open_checkresult_file()
     if _checkresult_file_fd:
-        now = time.time()
-        os.write(
-            _checkresult_file_fd,
-            ensure_binary("""host_name=%s
+        os.write(_checkresult_file_fd,
+                 _check_result_file_entry(host, service, state, output, time.time()))
+
+
+def _submit_many_via_check_result_file(
+        results: List[Tuple[HostName, ServiceName, ServiceState, ServiceDetails, float]]) -> None:
+    _open_checkresult_file()
+    if _checkresult_file_fd:
+        os.write(_checkresult_file_fd,
+                 b"".join(_check_result_file_entry(*result) for result in results))
+
+
+def _check_result_file_entry(host: HostName, service: ServiceName, state: ServiceState,
+                             output: ServiceDetails, now: float) -> bytes:
+    output = output.replace("\n", "\\n")
+    return ensure_binary("""host_name=%s
 service_description=%s
 check_type=1
 check_options=0
@@ -881,7 +933,7 @@ finish_time=%.1f
 return_code=%d
 output=%s
 
-""" % (ensure_str(host), ensure_str(service), now, now, state, ensure_str(output))))
+""" % (ensure_str(host), ensure_str(service), now, now, state, ensure_str(output)))
 
 
 def _open_checkresult_file() -> None:
@@ -970,18 +1022,86 @@ def _close_checkresult_file() -> None:
 
 def _submit_via_command_pipe(host: HostName, service: ServiceName, state: ServiceState,
                              output: ServiceDetails) -> None:
-    output = output.replace("\n", "\\n")
     _open_command_pipe()
     if _nagios_command_pipe is not None and not isinstance(_nagios_command_pipe, bool):
-        # [<timestamp>] PROCESS_SERVICE_CHECK_RESULT;<host_name>;<svc_description>;<return_code>;<plugin_output>
-        msg = "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s\n" % (time.time(), host, service,
-                                                                   state, output)
-        _nagios_command_pipe.write(ensure_binary(msg))
+        _nagios_command_pipe.write(_command_pipe_line(host, service, state, output, time.time()))
         # Important: Nagios needs the complete command in one single write() block!
         # Python buffers and sends chunks of 4096 bytes, if we do not flush.
         _nagios_command_pipe.flush()
 
 
+def _submit_many_via_command_pipe(
+        results: List[Tuple[HostName, ServiceName, ServiceState, ServiceDetails, float]]) -> None:
+    """Write the commands of many check results with as few writes as possible
+
+    Each write only contains complete commands and is not larger than the configured
+    maximum write size (unless a single command is larger). In case the command pipe can
+    not be used, the results are written to a check result file when the Nagios core is
+    used. Other cores do not read check result files, so the error is raised.
+    """
+    written = 0
+    try:
+        _open_command_pipe()
+        if _nagios_command_pipe is None or isinstance(_nagios_command_pipe, bool):
+            raise MKGeneralException("Command pipe '%s' is not available" %
+                                     cmk.utils.paths.nagios_command_pipe_path)
+
+        for num_results, chunk in _command_pipe_chunks(results,
+                                                       config.check_submission_max_write_size):
+            _nagios_command_pipe.write(chunk)
+            _nagios_command_pipe.flush()
+            written += num_results
+
+    except OSError as e:
+        _close_command_pipe()
+        _submit_remaining_via_check_result_file(
+            results[written:], MKGeneralException("Error writing to command pipe: %s" % e))
+
+    except MKGeneralException as e:
+        _submit_remaining_via_check_result_file(results[written:], e)
+
+
+def _submit_remaining_via_check_result_file(
+    results: List[Tuple[HostName, ServiceName, ServiceState, ServiceDetails, float]],
+    error: MKGeneralException,
+) -> None:
+    if config.monitoring_core != "nagios":
+        raise error
+
+    console.warning("%s, writing %d check results to a check result file\n" % (error, len(results)))
+    _submit_many_via_check_result_file(results)
+
+
+def _command_pipe_chunks(
+    results: List[Tuple[HostName, ServiceName, ServiceState, ServiceDetails, float]],
+    max_size: int,
+) -> Iterator[Tuple[int, bytes]]:
+    """Group the commands of the results to chunks of at most max_size bytes
+
+    Yields the number of results in the chunk together with the chunk itself.
+    """
+    lines: List[bytes] = []
+    size = 0
+    for result in results:
+        line = _command_pipe_line(*result)
+        if lines and size + len(line) > max_size:
+            yield len(lines), b"".join(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+
+    if lines:
+        yield len(lines), b"".join(lines)
+
+
+def _command_pipe_line(host: HostName, service: ServiceName, state: ServiceState,
+                       output: ServiceDetails, now: float) -> bytes:
+    output = output.replace("\n", "\\n")
+    # [<timestamp>] PROCESS_SERVICE_CHECK_RESULT;<host_name>;<svc_description>;<return_code>;<plugin_output>
+    return ensure_binary("[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s\n" %
+                         (now, host, service, state, output))
+
+
 def _open_command_pipe() -> None:
     global _nagios_command_pipe
     if _nagios_command_pipe is None:
@@ -999,6 +1119,17 @@ def _open_command_pipe() -> None:
             raise MKGeneralException("Error writing to command pipe: %s" % e)
 
 
+def _close_command_pipe() -> None:
+    """Close the command pipe after an error. It is opened again for the next submission"""
+    global _nagios_command_pipe
+    if _nagios_command_pipe is not None and not isinstance(_nagios_command_pipe, bool):
+        try:
+            _nagios_command_pipe.close()
+        except OSError:
+            pass
+    _nagios_command_pipe = None
+
+
 def _core_pipe_open_timeout(signum: int, stackframe: Optional[FrameType]) -> None:
     raise IOError("Timeout while opening pipe")
 
@@ -2621,6 +2621,7 @@ class HostConfig:
             is_usewalk_host=self.is_usewalk_host,
             is_inline_snmp_host=self._is_inline_snmp_host(),
             record_stats=record_inline_snmp_stats,
+            bulk_backend_settings=self._snmp_bulk_backend_settings(),
         )
 
     def _snmp_credentials(self) -> SNMPCredentials:
@@ -2672,6 +2673,12 @@ class HostConfig:
             return 10
         return bulk_sizes[0]
 
+    def _snmp_bulk_backend_settings(self) -> Optional[Dict[str, int]]:
+        entries = self._config_cache.host_extra_conf(self.hostname, snmp_bulk_backend)
+        if not entries:
+            return None
+        return entries[0]
+
     def _snmp_character_encoding(self) -> Optional[str]:
         entries = self._config_cache.host_extra_conf(self.hostname, snmp_character_encodings)
         if not entries:
@@ -3083,6 +3090,7 @@ class HostConfig:
             is_usewalk_host=self.is_usewalk_host,
             is_inline_snmp_host=self._is_inline_snmp_host(),
             record_stats=record_inline_snmp_stats,
+            bulk_backend_settings=self._snmp_bulk_backend_settings(),
         )
 
     @property
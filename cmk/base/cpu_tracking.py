@@ -18,12 +18,14 @@ from cmk.utils.log import console
 times: Dict[str, List[float]] = {}
 last_time_snapshot: List[float] = []
 phase_stack: List[str] = []
+counters: Dict[str, int] = {}
 
 
 def start(initial_phase: str) -> None:
-    global times, last_time_snapshot
+    global times, last_time_snapshot, counters
     console.vverbose("[cpu_tracking] Start with phase '%s'\n" % initial_phase)
     times = {}
+    counters = {}
     last_time_snapshot = _time_snapshot()
 
     del phase_stack[:]
@@ -32,6 +34,8 @@ def start(initial_phase: str) -> None:
 
 def end() -> None:
     console.vverbose("[cpu_tracking] End\n")
+    for name, value in sorted(counters.items()):
+        console.vverbose("[cpu_tracking] Counter %s: %d\n" % (name, value))
     _add_times_to_phase()
     del phase_stack[:]
 
@@ -58,6 +62,17 @@ def get_times() -> Dict[str, List[float]]:
     return times
 
 
+def count(name: str) -> None:
+    """Increase a counter, e.g. of cache hits, of the current tracking"""
+    if _is_not_tracking():
+        return
+    counters[name] = counters.get(name, 0) + 1
+
+
+def get_counters() -> Dict[str, int]:
+    return counters
+
+
 def _is_not_tracking() -> bool:
     return not bool(phase_stack)
 
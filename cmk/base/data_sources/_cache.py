@@ -8,12 +8,14 @@
 import errno
 import logging
 import os
+import pickle
 import time
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Set, Tuple, Union
 
 import cmk.utils
 import cmk.utils.store as store
+import cmk.utils.version as cmk_version
 from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import VERBOSE
 from cmk.utils.type_defs import SectionName
@@ -79,6 +81,78 @@ class SectionStore:
         return sections
 
 
+class ParsedSectionStore:
+    """Persisted parse results of the sections of a host
+
+    Each parse result is stored together with a digest of the raw section content
+    it was created from. A stored result is only used as long as the digest of the
+    current raw section is the same. Results that were not used during a run are
+    dropped when storing.
+    """
+    def __init__(self, path: Union[str, Path], logger: logging.Logger) -> None:
+        super(ParsedSectionStore, self).__init__()
+        self.path = Path(path)
+        self._logger = logger
+        self._entries: Optional[Dict[str, Tuple[bytes, bytes]]] = None
+        self._used: Set[str] = set()
+        self._changed = False
+
+    def _load(self) -> Dict[str, Tuple[bytes, bytes]]:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        raw = store.load_bytes_from_file(self.path)
+        if not raw:
+            return self._entries
+        try:
+            version, entries = pickle.loads(raw)
+        except Exception as e:
+            self._logger.debug("Ignoring invalid parsed sections file %s: %s", self.path, e)
+            return self._entries
+        if version == cmk_version.__version__:
+            self._entries = entries
+        return self._entries
+
+    def get(self, key: str, digest: bytes) -> Tuple[bool, Any]:
+        """Return whether a result for the digest was found and the result"""
+        self._used.add(key)
+        entry = self._load().get(key)
+        if entry is None or entry[0] != digest:
+            return False, None
+        try:
+            return True, pickle.loads(entry[1])
+        except Exception as e:
+            self._logger.debug("Ignoring invalid parsed section %s: %s", key, e)
+            return False, None
+
+    def set(self, key: str, digest: bytes, parsed: Any) -> None:
+        self._used.add(key)
+        try:
+            pickled = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self._logger.debug("Not storing parsed section %s: %s", key, e)
+            return
+        self._load()[key] = (digest, pickled)
+        self._changed = True
+
+    def store(self) -> None:
+        entries = self._load()
+        unused = set(entries) - self._used
+        if not self._changed and not unused:
+            return
+
+        for key in unused:
+            del entries[key]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        store.save_bytes_to_file(
+            self.path,
+            pickle.dumps((cmk_version.__version__, entries), protocol=pickle.HIGHEST_PROTOCOL))
+        self._changed = False
+        self._logger.debug("Stored parsed sections: %s", ", ".join(sorted(entries)))
+
+
 class FileCache:
     def __init__(
         self,
@@ -5,9 +5,22 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import abc
+import collections.abc
+import hashlib
 import os
 import time
-from typing import AnyStr, cast, Dict, List, Optional, Set, Tuple, Union
+from typing import (
+    AnyStr,
+    cast,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from six import ensure_binary, ensure_str
 
@@ -40,7 +53,125 @@ from cmk.base.exceptions import MKGeneralException
 
 from .abstract import DataSource
 
-__all__ = ["AgentHostSections", "AgentDataSource"]
+__all__ = ["AgentHostSections", "AgentDataSource", "LazyAgentSections"]
+
+RawSectionChunk = NamedTuple("RawSectionChunk", [
+    ("data", memoryview),
+    ("separator", Optional[str]),
+    ("encoding", Optional[str]),
+    ("nostrip", bool),
+])
+
+
+class LazyAgentSections(collections.abc.MutableMapping):
+    """Agent sections that are only decoded and tokenized on first access
+
+    The parser only records zero-copy views of the section bodies into the
+    raw agent data. A section is converted into its list of rows when it is
+    requested for the first time, e.g. by MultiHostSections.get_parsed_section().
+    Sections that are never requested are never decoded.
+    """
+    def __init__(self) -> None:
+        super(LazyAgentSections, self).__init__()
+        # None marks sections that have not been tokenized yet
+        self._content: Dict[SectionName, Optional[AgentSectionContent]] = {}
+        self._pending: Dict[SectionName, List[RawSectionChunk]] = {}
+
+    def __len__(self) -> int:
+        return len(self._content)
+
+    def __iter__(self) -> Iterator[SectionName]:
+        return iter(list(self._content))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._content
+
+    def __getitem__(self, key: SectionName) -> AgentSectionContent:
+        content = self._content[key]
+        if content is None:
+            content = self._content[key] = []
+            for chunk in self._pending.pop(key):
+                content.extend(_tokenize_section_chunk(chunk))
+        return content
+
+    def __setitem__(self, key: SectionName, value: AgentSectionContent) -> None:
+        self._pending.pop(key, None)
+        self._content[key] = value
+
+    def __delitem__(self, key: SectionName) -> None:
+        del self._content[key]
+        self._pending.pop(key, None)
+
+    def __repr__(self) -> str:
+        return "%s(%r)" % (type(self).__name__, dict(self.items()))
+
+    def add_chunk(self, key: SectionName, chunk: RawSectionChunk) -> None:
+        content = self._content.get(key)
+        if content is not None:
+            content.extend(_tokenize_section_chunk(chunk))
+            return
+        self._content[key] = None
+        self._pending.setdefault(key, []).append(chunk)
+
+    def content_digest(self, key: SectionName) -> bytes:
+        """Digest of the content of a section, pending chunks are hashed without tokenizing"""
+        digest = hashlib.sha1()
+        content = self._content[key]
+        if content is not None:
+            digest.update(repr(content).encode("utf-8", "surrogatepass"))
+            return b"T" + digest.digest()
+
+        for chunk in self._pending[key]:
+            digest.update(
+                repr((chunk.separator, chunk.encoding, chunk.nostrip, len(chunk.data))).encode())
+            digest.update(chunk.data)
+        return b"R" + digest.digest()
+
+    def merge(self, other: "LazyAgentSections") -> None:
+        """Append the sections of other to ours without tokenizing pending chunks"""
+        for key, content in other._content.items():
+            if content is None:
+                for chunk in other._pending[key]:
+                    self.add_chunk(key, chunk)
+            else:
+                self.setdefault(key, []).extend(content)
+
+
+def _tokenize_section_chunk(chunk: RawSectionChunk) -> AgentSectionContent:
+    encoding = "utf-8" if chunk.encoding is None else chunk.encoding
+    content: AgentSectionContent = []
+    for line in chunk.data.tobytes().split(b"\n"):
+        stripped_line = line.strip()
+        if stripped_line == b'':
+            continue
+
+        decoded_line = ensure_str_with_fallback(
+            line.rstrip(b"\r") if chunk.nostrip else stripped_line,
+            encoding=encoding,
+            fallback="latin-1",
+        )
+        content.append(decoded_line.split(chunk.separator))
+    return content
+
+
+def _iter_header_lines(raw_data: bytes) -> Iterator[Tuple[int, int, bytes]]:
+    """Yield start offset, end offset and stripped content of all header lines
+
+    Only the lines containing "<<<" are looked at, the section bodies are skipped
+    without being split into lines.
+    """
+    pos = raw_data.find(b"<<<")
+    while pos != -1:
+        line_start = raw_data.rfind(b"\n", 0, pos) + 1
+        line_end = raw_data.find(b"\n", pos)
+        if line_end == -1:
+            line_end = len(raw_data)
+
+        stripped_line = raw_data[line_start:line_end].strip()
+        if stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
+            yield line_start, line_end, stripped_line
+
+        pos = raw_data.find(b"<<<", line_end)
 
 
 class AgentHostSections(AbstractHostSections[RawAgentData, AgentSections, PersistedAgentSections,
@@ -51,12 +182,18 @@ class AgentHostSections(AbstractHostSections[RawAgentData, AgentSections, Persis
                  piggybacked_raw_data: Optional[PiggybackRawData] = None,
                  persisted_sections: Optional[PersistedAgentSections] = None) -> None:
         super(AgentHostSections, self).__init__(
-            sections=sections if sections is not None else {},
+            sections=sections if sections is not None else LazyAgentSections(),
             cache_info=cache_info if cache_info is not None else {},
             piggybacked_raw_data=piggybacked_raw_data if piggybacked_raw_data is not None else {},
             persisted_sections=persisted_sections if persisted_sections is not None else {},
         )
 
+    def _update_sections(self, sections: AgentSections) -> None:
+        if isinstance(self.sections, LazyAgentSections) and isinstance(sections, LazyAgentSections):
+            self.sections.merge(sections)
+            return
+        super(AgentHostSections, self)._update_sections(sections)
+
     def _extend_section(self, section_name: SectionName,
                         section_content: AgentSectionContent) -> None:
         self.sections.setdefault(section_name, []).extend(section_content)
@@ -135,11 +272,15 @@ class AgentDataSource(DataSource[RawAgentData, AgentSections, PersistedAgentSect
         return self._parse_host_section(raw_data)
 
     def _parse_host_section(self, raw_data: RawAgentData) -> AgentHostSections:
-        """Split agent output in chunks, splits lines by whitespaces.
+        """Split agent output in chunks
+
+        Only the section headers are parsed here. The section bodies are kept as
+        views into raw_data and are split into lines and words when a section is
+        accessed for the first time (see LazyAgentSections).
 
         Returns a HostSections() object.
         """
-        sections: AgentSections = {}
+        sections = LazyAgentSections()
         # Unparsed info for other hosts. A dictionary, indexed by the piggybacked host name.
         # The value is a list of lines which were received for this host.
         piggybacked_raw_data: PiggybackRawData = {}
@@ -150,34 +291,46 @@ class AgentDataSource(DataSource[RawAgentData, AgentSections, PersistedAgentSect
 
         # handle sections with option persist(...)
         persisted_sections: PersistedAgentSections = {}
-        section_content: Optional[AgentSectionContent] = None
+        persisted_until: Dict[SectionName, Tuple[int, int]] = {}
+        section_name: Optional[SectionName] = None
         section_options: Dict[str, Optional[str]] = {}
         agent_cache_info: SectionCacheInfo = {}
         separator: Optional[str] = None
         encoding = None
-        for line in raw_data.split(b"\n"):
-            line = line.rstrip(b"\r")
-            stripped_line = line.strip()
+        nostrip = False
+
+        view = memoryview(raw_data)
+        body_start = 0
+        for line_start, line_end, stripped_line in _iter_header_lines(raw_data):
+            # Handle the lines between the previous header and this one
+            if piggybacked_hostname:
+                if body_start < line_start:
+                    piggybacked_raw_data.setdefault(piggybacked_hostname, []).extend(
+                        line.rstrip(b"\r")
+                        for line in raw_data[body_start:line_start - 1].split(b"\n"))
+            elif section_name is not None:
+                sections.add_chunk(
+                    section_name,
+                    RawSectionChunk(view[body_start:line_start], separator, encoding, nostrip))
+            body_start = line_end + 1
+
             if stripped_line[:4] == b'<<<<' and stripped_line[-4:] == b'>>>>':
                 piggybacked_hostname =\
                     self._get_sanitized_and_translated_piggybacked_hostname(stripped_line)
 
             elif piggybacked_hostname:  # processing data for an other host
-                if stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
-                    line = self._add_cached_info_to_piggybacked_section_header(
-                        stripped_line, piggybacked_cached_at, piggybacked_cache_age)
-                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(line)
+                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(
+                    self._add_cached_info_to_piggybacked_section_header(
+                        stripped_line, piggybacked_cached_at, piggybacked_cache_age))
 
             # Found normal section header
             # section header has format <<<name:opt1(args):opt2:opt3(args)>>>
-            elif stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
+            else:
                 section_name, section_options = self._parse_section_header(stripped_line[3:-3])
 
                 if section_name is None:
                     self._logger.warning("Ignoring invalid raw section: %r" % stripped_line)
-                    section_content = None
                     continue
-                section_content = sections.setdefault(section_name, [])
 
                 raw_separator = section_options.get("sep")
                 if raw_separator is None:
@@ -192,7 +345,7 @@ class AgentDataSource(DataSource[RawAgentData, AgentSections, PersistedAgentSect
                     cached_at = int(time.time())  # Estimate age of the data
                     cache_interval = int(until - cached_at)
                     agent_cache_info[section_name] = (cached_at, cache_interval)
-                    persisted_sections[section_name] = (cached_at, until, section_content)
+                    persisted_until[section_name] = (cached_at, until)
 
                 raw_cached = section_options.get("cached")
                 if raw_cached is not None:
@@ -201,19 +354,20 @@ class AgentDataSource(DataSource[RawAgentData, AgentSections, PersistedAgentSect
 
                 # The section data might have a different encoding
                 encoding = section_options.get("encoding")
-
-            elif stripped_line != b'':
-                if section_content is None:
-                    continue
-
-                raw_nostrip = section_options.get("nostrip")
-                if raw_nostrip is None:
-                    line = stripped_line
-
-                decoded_line = ensure_str_with_fallback(
-                    line, encoding=("utf-8" if encoding is None else encoding), fallback="latin-1")
-
-                section_content.append(decoded_line.split(separator))
+                nostrip = section_options.get("nostrip") is not None
+
+        # Handle the lines after the last header
+        if piggybacked_hostname:
+            if body_start <= len(raw_data):
+                piggybacked_raw_data.setdefault(piggybacked_hostname, []).extend(
+                    line.rstrip(b"\r") for line in raw_data[body_start:].split(b"\n"))
+        elif section_name is not None:
+            sections.add_chunk(section_name,
+                               RawSectionChunk(view[body_start:], separator, encoding, nostrip))
+
+        # Persisted sections are written to disk anyways, so tokenize them right away
+        for persisted_name, (cached_at, until) in persisted_until.items():
+            persisted_sections[persisted_name] = (cached_at, until, sections[persisted_name])
 
         return AgentHostSections(sections, agent_cache_info, piggybacked_raw_data,
                                  persisted_sections)
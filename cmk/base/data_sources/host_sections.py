@@ -5,10 +5,14 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import collections.abc
+import hashlib
+import logging
+import marshal
 import sys
 from typing import Any, Callable, NamedTuple, cast, Dict, List, Optional, Tuple, Union
 
 import cmk.utils.debug
+import cmk.utils.paths
 from cmk.utils.check_utils import section_name_of
 from cmk.utils.type_defs import (
     HostAddress,
@@ -20,6 +24,7 @@ from cmk.utils.type_defs import (
 
 import cmk.base.caching as caching
 import cmk.base.config as config
+import cmk.base.cpu_tracking as cpu_tracking
 import cmk.base.ip_lookup as ip_lookup
 import cmk.base.item_state as item_state
 from cmk.base.api.agent_based.section_types import (
@@ -41,7 +46,9 @@ from cmk.base.check_utils import (
 )
 from cmk.base.exceptions import MKParseFunctionError
 
+from ._cache import ParsedSectionStore
 from .abstract import AbstractHostSections
+from .agent import LazyAgentSections
 
 HostKey = NamedTuple("HostKey", [
     ("hostname", HostName),
@@ -65,6 +72,7 @@ class MultiHostSections(collections.abc.MutableMapping):
         # It holy holds the result of individual calls of the parse_function.
         self._parsed_sections = caching.DictCache()
         self._parsed_to_raw_map = caching.DictCache()
+        self._parsed_section_stores: Dict[HostName, ParsedSectionStore] = {}
 
     def __len__(self) -> int:
         return len(self._data)
@@ -188,10 +196,38 @@ class MultiHostSections(collections.abc.MutableMapping):
         except KeyError:
             return self._parsed_sections.setdefault(cache_key, None)
 
-        parsed = parse_function(string_table)
+        if str(raw_section_name) not in config.cached_parsed_sections:
+            return self._parsed_sections.setdefault(cache_key, parse_function(string_table))
+
+        store = self._get_parsed_section_store(host_key.hostname)
+        store_key = "%s:%s" % (host_key.source_type.name, parsed_section_name)
+        digest = _section_digest(hosts_raw_sections, raw_section_name, parse_function)
+        found, parsed = store.get(store_key, digest)
+        if found:
+            cpu_tracking.count("parsed_section_cache_hits")
+            return self._parsed_sections.setdefault(cache_key, parsed)
 
+        cpu_tracking.count("parsed_section_cache_misses")
+        parsed = parse_function(string_table)
+        store.set(store_key, digest, parsed)
         return self._parsed_sections.setdefault(cache_key, parsed)
 
+    def _get_parsed_section_store(self, hostname: HostName) -> ParsedSectionStore:
+        try:
+            return self._parsed_section_stores[hostname]
+        except KeyError:
+            return self._parsed_section_stores.setdefault(
+                hostname,
+                ParsedSectionStore(
+                    cmk.utils.paths.parsed_sections_cache_dir / hostname,
+                    logging.getLogger("cmk.base.data_sources.parsed_sections"),
+                ))
+
+    def store_parsed_sections(self) -> None:
+        """Persist the parse results of the sections configured in cached_parsed_sections"""
+        for parsed_section_store in self._parsed_section_stores.values():
+            parsed_section_store.store()
+
     def _get_raw_section(
         self,
         host_key: HostKey,
@@ -491,3 +527,33 @@ class MultiHostSections(collections.abc.MutableMapping):
 
         finally:
             item_state.set_item_state_prefix(*orig_item_state_prefix)
+
+
+def _section_digest(raw_sections: Any, raw_section_name: SectionName,
+                    parse_function: Callable) -> bytes:
+    """Digest of a raw section and the parse function creating the parsed section from it"""
+    digest = hashlib.sha1()
+    _update_function_digest(digest, parse_function)
+    if isinstance(raw_sections, LazyAgentSections):
+        digest.update(raw_sections.content_digest(raw_section_name))
+    else:
+        digest.update(repr(raw_sections[raw_section_name]).encode("utf-8", "surrogatepass"))
+    return digest.digest()
+
+
+def _update_function_digest(digest: Any, function: Callable) -> None:
+    # Legacy parse functions are wrapped in closures, the wrapped functions are hashed too
+    digest.update(
+        ("%s.%s" %
+         (getattr(function, "__module__", None), getattr(function, "__qualname__", None))).encode())
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return
+    digest.update(marshal.dumps(code))
+    for cell in getattr(function, "__closure__", None) or ():
+        try:
+            content = cell.cell_contents
+        except ValueError:
+            continue
+        if callable(content) and content is not function:
+            _update_function_digest(digest, content)
@@ -29,12 +29,27 @@ use_dns_cache = True  # prevent DNS by using own cache file
 delay_precompile = False  # delay Python compilation to Nagios execution
 restart_locking = "abort"  # also possible: "wait", None
 check_submission = "file"  # alternative: "pipe"
+# Collect the results of a check run and submit them with few large writes instead of
+# one write per service. The buffered results are flushed at the end of the check run
+# or when the given number of results is reached.
+check_submission_buffered = False
+check_submission_flush_results = 1000
+# Maximum size of a single write to the command pipe. Writes up to PIPE_BUF (4096 bytes
+# on Linux) are atomic, so the core never reads interleaved commands.
+check_submission_max_write_size = 4096
+# Compute the predictions of predictive levels with "cmk --precompute-predictions", which
+# is run by cron, instead of in the check helpers.
+prediction_precompute = False
 agent_min_version = 0  # warn, if plugin has not at least version
 default_host_group = 'check_mk'
 
 check_max_cachefile_age = 0  # per default do not use cache files when checking
 cluster_max_cachefile_age = 90  # secs.
 piggyback_max_cachefile_age = 3600  # secs
+# Sections whose parse results are kept between the check cycles. These sections are only
+# parsed again when their raw content changed. Their parse functions must not depend on
+# the current time or on stored values.
+cached_parsed_sections: _List[str] = []
 # Ruleset for translating piggyback host names
 piggyback_translation: _List = []
 # Ruleset for translating service descriptions
@@ -66,6 +81,9 @@ non_inline_snmp_hosts: _List = []
 snmp_limit_oid_range: _List = []
 # Ruleset to customize bulk size
 snmp_bulk_size: _List = []
+# Ruleset to fetch SNMP v1/v2c hosts with the in-process bulk backend. The value is a
+# dictionary of its settings, e.g. {"max_outstanding": 10}
+snmp_bulk_backend: _List = []
 record_inline_snmp_stats = False
 snmp_default_community = 'public'
 snmp_communities: _List = []
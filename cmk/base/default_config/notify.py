@@ -23,6 +23,12 @@ notification_rules: _List[_Dict[str, _Any]] = []
 # Check every 10 seconds for ripe bulks
 notification_bulk_interval = 10
 notification_plugin_timeout = 60
+# Number of parallel calls per notification plugin in keepalive mode (0: call
+# the plugins one after another) and the number of notifications waiting for them
+notification_plugin_workers = 0
+notification_plugin_queue_size = 1000
+# Cache the members of the contact groups for this number of seconds
+notification_contactgroups_cache_ttl = 60
 
 # Notification Spooling.
 
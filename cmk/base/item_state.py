@@ -19,7 +19,10 @@ Do not store long-time things here. Also do not store complex
 structures like log files or stuff.
 """
 
+import ast
+import marshal
 import os
+import struct
 import traceback
 from typing import Any, AnyStr, Dict, List, Optional, Tuple, Union
 
@@ -48,6 +51,88 @@ class MKCounterWrapped(MKException):
     pass
 
 
+class CountersFile:
+    """The on-disk format of the item states of a host
+
+    The file starts with a magic, followed by length prefixed marshal records.
+    The first record is a snapshot of all item states. Each following record
+    holds the keys removed and the item states updated by one save, so saving
+    only appends the changes instead of serializing all item states again.
+    Once the appended records are larger than the snapshot, the file is
+    rewritten with a new snapshot.
+
+    Files in the previous format (a Python literal written with repr()) are
+    still read. They are replaced by a snapshot on the next save.
+    """
+    magic = b"CMKITEMSTATES1\n"
+    _record_header = struct.Struct("<I")
+    _snapshot, _delta = 0, 1
+
+    def __init__(self, path: str) -> None:
+        super(CountersFile, self).__init__()
+        self.path = path
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._needs_compaction = False
+
+    def parse(self, raw: bytes) -> ItemStates:
+        self._snapshot_size = self._journal_size = 0
+        self._needs_compaction = False
+        if not raw:
+            self._needs_compaction = True
+            return {}
+
+        if not raw.startswith(self.magic):
+            # Previous format, migrated with the next save
+            self._needs_compaction = True
+            return ast.literal_eval(raw.decode("utf-8"))
+
+        item_states: ItemStates = {}
+        offset = len(self.magic)
+        while offset < len(raw):
+            try:
+                record_size, = self._record_header.unpack_from(raw, offset)
+                record_end = offset + self._record_header.size + record_size
+                if record_end > len(raw):
+                    raise ValueError("truncated record")
+                record = marshal.loads(raw[offset + self._record_header.size:record_end])
+            except (struct.error, ValueError, EOFError, TypeError):
+                # A writer died while appending. Drop the incomplete record.
+                self._needs_compaction = True
+                break
+
+            if record[0] == self._snapshot:
+                item_states = record[1]
+                self._snapshot_size = record_end - offset
+                self._journal_size = 0
+            else:
+                for key in record[1]:
+                    item_states.pop(key, None)
+                item_states.update(record[2])
+                self._journal_size += record_end - offset
+            offset = record_end
+        return item_states
+
+    def write(self, item_states: ItemStates, removed_keys: List[ItemStateKey],
+              updated_item_states: ItemStates) -> None:
+        """Persist the changes, item_states must already contain them"""
+        delta = self._encode_record((self._delta, removed_keys, updated_item_states))
+        if self._needs_compaction or self._journal_size + len(delta) > self._snapshot_size:
+            snapshot = self._encode_record((self._snapshot, item_states))
+            store.save_bytes_to_file(self.path, self.magic + snapshot)
+            self._snapshot_size, self._journal_size = len(snapshot), 0
+            self._needs_compaction = False
+            return
+
+        with open(self.path, "ab") as f:
+            f.write(delta)
+        self._journal_size += len(delta)
+
+    def _encode_record(self, record: Tuple) -> bytes:
+        payload = marshal.dumps(record)
+        return self._record_header.pack(len(payload)) + payload
+
+
 class CachedItemStates:
     def __init__(self) -> None:
         super(CachedItemStates, self).__init__()
@@ -58,6 +143,7 @@ class CachedItemStates:
         self._item_state_prefix: ItemStateKey = ()
         # timestamp of last modification
         self._last_mtime: Optional[float] = None
+        self._counters_file: Optional[CountersFile] = None
         self._removed_item_state_keys: List[ItemStateKey] = []
         self._updated_item_states: ItemStates = {}
 
@@ -68,13 +154,11 @@ class CachedItemStates:
 
     def load(self, hostname: HostName) -> None:
         filename = cmk.utils.paths.counters_dir + "/" + hostname
+        self._counters_file = CountersFile(filename)
         try:
             # TODO: refactoring. put these two values into a named tuple
-            self._item_states = store.load_object_from_file(
-                filename,
-                default={},
-                lock=True,
-            )
+            self._item_states = self._counters_file.parse(
+                store.load_bytes_from_file(filename, lock=True))
             self._last_mtime = os.stat(filename).st_mtime
         finally:
             store.release_lock(filename)
@@ -87,7 +171,7 @@ class CachedItemStates:
         It simply returns, if it detects that the data wasn't changed at all since the last loading
         If the data on disk has been changed in the meantime, the cached data is updated from disk.
         Afterwards only the actual modifications (update/remove) are applied to the updated cached
-        data before it is written back to disk.
+        data before they are written back to disk (see CountersFile).
         """
         filename = cmk.utils.paths.counters_dir + "/" + hostname
         if not self._removed_item_state_keys and not self._updated_item_states:
@@ -99,8 +183,10 @@ class CachedItemStates:
 
             store.aquire_lock(filename)
             last_mtime = os.stat(filename).st_mtime
-            if last_mtime != self._last_mtime:
-                self._item_states = store.load_object_from_file(filename, default={})
+            if (self._counters_file is None or self._counters_file.path != filename or
+                    last_mtime != self._last_mtime):
+                self._counters_file = CountersFile(filename)
+                self._item_states = self._counters_file.parse(store.load_bytes_from_file(filename))
 
                 # Remove obsolete keys
                 for key in self._removed_item_state_keys:
@@ -112,7 +198,8 @@ class CachedItemStates:
                 # Add updated keys
                 self._item_states.update(self._updated_item_states)
 
-            store.save_object_to_file(filename, self._item_states, pretty=False)
+            self._counters_file.write(self._item_states, self._removed_item_state_keys,
+                                      self._updated_item_states)
         except Exception:
             raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
         finally:
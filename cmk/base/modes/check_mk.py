@@ -54,6 +54,7 @@ import cmk.base.localize
 import cmk.base.obsolete_output as out
 import cmk.base.packaging
 import cmk.base.parent_scan
+import cmk.base.prediction as prediction
 import cmk.base.profiling as profiling
 from cmk.base.core_factory import create_core
 from cmk.base.modes import keepalive_option, Mode, modes, Option
@@ -744,6 +745,36 @@ modes.register(
         short_help="Cleanup outdated piggyback files",
     ))
 
+#.
+#   .--predictions---------------------------------------------------------.
+#   |                             _ _      _   _                           |
+#   |          _ __  _ __ ___  __| (_) ___| |_(_) ___  _ __  ___           |
+#   |         | '_ \| '__/ _ \/ _` | |/ __| __| |/ _ \| '_ \/ __|          |
+#   |         | |_) | | |  __/ (_| | | (__| |_| | (_) | | | \__ \          |
+#   |         | .__/|_|  \___|\__,_|_|\___|\__|_|\___/|_| |_|___/          |
+#   |         |_|                                                          |
+#   '----------------------------------------------------------------------'
+
+
+def mode_precompute_predictions() -> None:
+    if not config.prediction_precompute:
+        return
+    prediction.precompute_predictions()
+
+
+modes.register(
+    Mode(
+        long_option="precompute-predictions",
+        handler_function=mode_precompute_predictions,
+        short_help="Compute the outdated predictions of predictive levels",
+        long_help=[
+            "Computes the predictions of predictive levels which are missing or outdated. "
+            "This is only done if the predictions are not computed by the check helpers "
+            "(global setting prediction_precompute)."
+        ],
+        needs_checks=False,
+    ))
+
 #.
 #   .--scan-parents--------------------------------------------------------.
 #   |                                                         _            |
@@ -19,14 +19,18 @@
 import io
 import logging
 import os
+import queue
 import re
 import signal
 import subprocess
 import sys
+import threading
 import time
-from typing import Dict, Tuple, List, Any, Optional, FrozenSet, Set, Union, cast
+from typing import (Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple, Union,
+                    cast)
 import traceback
 import uuid
+import zlib
 
 from six import ensure_str
 
@@ -103,6 +107,12 @@ NotificationKey = Tuple[ContactNames, NotificationPluginNameStr]
 NotificationValue = Tuple[bool, NotifyPluginParams, Optional[NotifyBulkParameters]]
 Notifications = Dict[NotificationKey, NotificationValue]
 
+# Only used in keepalive mode, see notify_keepalive()
+_compiled_rules: Optional["CompiledRules"] = None
+_dispatcher: Optional["NotificationDispatcher"] = None
+
+_contactgroup_members_cache: Optional[Tuple[float, Dict[str, List[ContactName]]]] = None
+
 #   .--Configuration-------------------------------------------------------.
 #   |    ____             __ _                       _   _                 |
 #   |   / ___|___  _ __  / _(_) __ _ _   _ _ __ __ _| |_(_) ___  _ __      |
@@ -431,14 +441,175 @@ def notification_analyse_backlog(nr: int) -> Optional[NotifyAnalysisInfo]:
 
 # TODO: Make use of the generic do_keepalive() mechanism?
 def notify_keepalive() -> None:
+    global _compiled_rules, _dispatcher
     cmk.base.utils.register_sigint_handler()
+
+    # The helper restarts itself as soon as the configuration has changed (see
+    # events.event_keepalive()), so the rules only need to be compiled once.
+    _compiled_rules = compile_notification_rules()
+    if config.notification_plugin_workers > 0:
+        _dispatcher = NotificationDispatcher(config.notification_plugin_workers,
+                                             config.notification_plugin_queue_size)
+
     events.event_keepalive(
         event_function=notify_notify,
-        call_every_loop=send_ripe_bulks,
+        call_every_loop=_notify_keepalive_loop,
         loop_interval=config.notification_bulk_interval,
+        shutdown_function=_notify_keepalive_shutdown,
     )
 
 
+def _notify_keepalive_loop() -> None:
+    send_ripe_bulks()
+    if _dispatcher is not None:
+        _dispatcher.log_statistics()
+
+
+def _notify_keepalive_shutdown() -> None:
+    if _dispatcher is not None:
+        _dispatcher.shutdown()
+
+
+class NotificationDispatcher:
+    """Executes the notification plugins in worker threads
+
+    Each notification plugin gets a pool of worker threads. In this way a slow
+    plugin (e.g. a ticket system with a slow API) does not delay the
+    notifications via other plugins. All notifications of a host or service
+    are executed by the same worker of a plugin, one after another, so e.g. a
+    RECOVERY is never sent before the PROBLEM it belongs to.
+
+    Each worker has a bounded queue. When it is full, submit() blocks until
+    the worker has finished a notification. The notifications waiting in the
+    queues are only kept in memory: once submit() returned, the core
+    considers the notification as handed over. They are lost when the helper
+    is killed or crashes, only a regular shutdown waits for them.
+    """
+    def __init__(self, num_workers: int, queue_size: int) -> None:
+        self._num_workers = num_workers
+        # The queue size is the limit for all workers of a plugin
+        self._queue_size = max(1, queue_size // num_workers)
+        self._lock = threading.Lock()
+        self._queues: Dict[NotificationPluginNameStr,
+                           List["queue.Queue[Optional[PluginContext]]"]] = {}
+        self._workers: List[threading.Thread] = []
+        self._counters: Dict[NotificationPluginNameStr, Dict[str, float]] = {}
+        self._last_log = time.time()
+        self._last_counters: Dict[NotificationPluginNameStr, Dict[str, float]] = {}
+
+    def submit(self, plugin_name: NotificationPluginNameStr, plugin_context: PluginContext) -> None:
+        plugin_queues = self._queues.get(plugin_name)
+        if plugin_queues is None:
+            plugin_queues = self._start_workers(plugin_name)
+        plugin_queue = plugin_queues[self._worker_index(plugin_context)]
+
+        self._count(plugin_name, "submitted")
+        try:
+            plugin_queue.put_nowait(plugin_context)
+        except queue.Full:
+            self._count(plugin_name, "queue_full")
+            logger.info("   - queue of plugin %s is full, waiting for a free worker", plugin_name)
+            plugin_queue.put(plugin_context)
+
+    def _worker_index(self, plugin_context: PluginContext) -> int:
+        """The same host or service is always handled by the same worker"""
+        key = plugin_context.get("HOSTNAME", "")
+        if plugin_context.get("WHAT") == "SERVICE":
+            key += ";" + plugin_context.get("SERVICEDESC", "")
+        return zlib.crc32(key.encode("utf-8")) % self._num_workers
+
+    def _start_workers(
+            self,
+            plugin_name: NotificationPluginNameStr) -> List["queue.Queue[Optional[PluginContext]]"]:
+        plugin_queues: List["queue.Queue[Optional[PluginContext]]"] = [
+            queue.Queue(self._queue_size) for _number in range(self._num_workers)
+        ]
+        self._queues[plugin_name] = plugin_queues
+        with self._lock:
+            self._counters.setdefault(plugin_name, {
+                "submitted": 0,
+                "queue_full": 0,
+                "executed": 0,
+                "failed": 0,
+                "busy_time": 0.0,
+            })
+        for number, plugin_queue in enumerate(plugin_queues):
+            worker = threading.Thread(
+                target=self._work,
+                args=(plugin_name, plugin_queue),
+                name="notify-%s-%d" % (plugin_name, number),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+        return plugin_queues
+
+    def _work(self, plugin_name: NotificationPluginNameStr,
+              plugin_queue: "queue.Queue[Optional[PluginContext]]") -> None:
+        while True:
+            plugin_context = plugin_queue.get()
+            if plugin_context is None:
+                return
+
+            start = time.time()
+            try:
+                exitcode = call_notification_script(plugin_name, plugin_context)
+            except Exception:
+                logger.exception("    ERROR:")
+                exitcode = 2
+            self._count(plugin_name, "busy_time", time.time() - start)
+            self._count(plugin_name, "executed")
+            if exitcode != 0:
+                self._count(plugin_name, "failed")
+
+    def _count(self, plugin_name: NotificationPluginNameStr, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[plugin_name][key] += value
+
+    def statistics(self) -> Dict[NotificationPluginNameStr, Dict[str, float]]:
+        with self._lock:
+            statistics = {
+                plugin_name: counters.copy() for plugin_name, counters in self._counters.items()
+            }
+        for plugin_name, counters in statistics.items():
+            counters["queued"] = sum(
+                plugin_queue.qsize() for plugin_queue in self._queues.get(plugin_name, []))
+        return statistics
+
+    def log_statistics(self, interval: float = 60.0) -> None:
+        """Log the throughput of the plugins since the last call, at most every interval seconds"""
+        now = time.time()
+        duration = now - self._last_log
+        if duration < interval:
+            return
+
+        statistics = self.statistics()
+        for plugin_name, counters in sorted(statistics.items()):
+            last = self._last_counters.get(plugin_name, {})
+            executed = counters["executed"] - last.get("executed", 0)
+            if not executed and not counters["queued"]:
+                continue
+            busy_time = counters["busy_time"] - last.get("busy_time", 0.0)
+            logger.info(
+                "Plugin %s: %d notifications executed (%.2f/s, %.2f s per call), %d failed, "
+                "%d queued, queue was full %d times", plugin_name, executed, executed / duration,
+                busy_time / executed if executed else 0.0,
+                counters["failed"] - last.get("failed", 0), counters["queued"],
+                counters["queue_full"] - last.get("queue_full", 0))
+        self._last_log = now
+        self._last_counters = statistics
+
+    def shutdown(self) -> None:
+        """Wait for the queued notifications to be executed and stop the workers"""
+        for plugin_queues in self._queues.values():
+            for plugin_queue in plugin_queues:
+                plugin_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._queues = {}
+
+
 #.
 #   .--Rule-Based-Notifications--------------------------------------------.
 #   |            ____        _      _                        _             |
@@ -468,10 +639,16 @@ def notify_rulebased(raw_context: EventContext, analyse: bool = False) -> Notify
     num_rule_matches = 0
     rule_info = []
 
-    for rule in config.notification_rules + user_notification_rules():
+    compiled_rules = _compiled_rules or compile_notification_rules()
+    # The analysis shows the reason of the first failed condition of each rule,
+    # so all conditions have to be evaluated there.
+    static_mismatches = {} if analyse else compiled_rules.mismatches.get(
+        (raw_context.get("WHAT"), "EC_ID" in raw_context), {})
+
+    for index, rule in enumerate(compiled_rules.rules):
         contact_info = _get_contact_info_text(rule)
 
-        why_not = rbn_match_rule(rule, raw_context)
+        why_not = static_mismatches.get(index) or rbn_match_rule(rule, raw_context)
         if why_not:
             logger.log(log.VERBOSE, contact_info)
             logger.log(log.VERBOSE, " -> does not match: %s", why_not)
@@ -489,6 +666,55 @@ def notify_rulebased(raw_context: EventContext, analyse: bool = False) -> Notify
     return rule_info, plugin_info
 
 
+class CompiledRules(NamedTuple):
+    rules: List[EventRule]
+    # The reasons why a rule cannot match any notification of a kind. The kind
+    # is (WHAT, is_ec_notification), the reasons are indexed by rule.
+    mismatches: Dict[Tuple[str, bool], Dict[int, str]]
+
+
+def compile_notification_rules() -> CompiledRules:
+    """Prepare the global and user specific rules for matching them against many notifications
+
+    The conditions which only depend on the kind of the notification are evaluated
+    here once, so the matching of a notification can skip the rules which cannot match.
+    """
+    rules = config.notification_rules + user_notification_rules()
+    mismatches: Dict[Tuple[str, bool], Dict[int, str]] = {}
+    for what in ["HOST", "SERVICE"]:
+        for is_ec_notification in [False, True]:
+            mismatches[(what, is_ec_notification)] = {
+                index: why_not for index, rule in enumerate(rules)
+                for why_not in [_rule_mismatch_of_kind(rule, what, is_ec_notification)]
+                if why_not
+            }
+    return CompiledRules(rules=rules, mismatches=mismatches)
+
+
+def _rule_mismatch_of_kind(rule: EventRule, what: str, is_ec_notification: bool) -> Optional[str]:
+    """The reason why the rule cannot match any notification of the given kind
+
+    The texts are the same as the ones of the matchers evaluating these conditions."""
+    if rule.get("disabled"):
+        return "This rule is disabled"
+
+    if what == "HOST":
+        if rule.get("match_servicegroups") or rule.get("match_servicegroups_regex",
+                                                       (None, None))[1]:
+            return "This rule requires membership in a service group, but this is a host notification"
+        if "match_service_event" in rule and "match_host_event" not in rule:
+            return "This is a host notification, but the rule just matches service events"
+    elif "match_host_event" in rule and "match_service_event" not in rule:
+        return "This is a service notification, but the rule just matches host events"
+
+    match_ec = rule.get("match_ec")
+    if match_ec is False and is_ec_notification:
+        return "Notification has been created by the Event Console."
+    if "match_ec" in rule and match_ec is not False and not is_ec_notification:
+        return "Notification has not been created by the Event Console."
+    return None
+
+
 def _get_contact_info_text(rule: EventRule) -> str:
     if "contact" in rule:
         return "User %s's rule '%s'..." % (rule["contact"], rule["description"])
@@ -629,6 +855,10 @@ def _process_notifications(raw_context: EventContext, notifications: Notificatio
                         do_bulk_notify(plugin_name, params, context, bulk)
                     elif config.notification_spooling in ("local", "both"):
                         create_spoolfile({"context": context, "plugin": plugin_name})
+                    elif _dispatcher is not None and plugin_name:
+                        # The plain email changes the LANG of the process, so it
+                        # is never executed in a worker thread.
+                        _dispatcher.submit(plugin_name, context)
                     else:
                         call_notification_script(plugin_name, context)
 
@@ -1069,24 +1299,39 @@ def rbn_groups_contacts(groups: List[str]) -> Set[str]:
     if not groups:
         return set()
 
-    query = "GET contactgroups\nColumns: members\n"
+    members = _contactgroup_members()
+    contacts: Set[ContactName] = set()
     for group in groups:
-        query += "Filter: name = %s\n" % group
-    query += "Or: %d\n" % len(groups)
+        contacts.update(members.get(group, []))
+    return contacts
 
-    try:
-        contacts: Set[ContactName] = set()
-        for contact_list in livestatus.LocalConnection().query_column(query):
-            contacts.update(contact_list)
-        return contacts
 
-    except livestatus.MKLivestatusNotFoundError:
-        return set()
+def _contactgroup_members() -> Dict[str, List[ContactName]]:
+    """The members of all contact groups, cached for notification_contactgroups_cache_ttl seconds
 
+    During alert storms many notifications are processed one after another, so
+    one query for all groups replaces the queries of each rule and notification."""
+    global _contactgroup_members_cache
+    now = time.time()
+    if _contactgroup_members_cache is not None:
+        cache_time, members = _contactgroup_members_cache
+        if cache_time <= now < cache_time + config.notification_contactgroups_cache_ttl:
+            return members
+
+    try:
+        members = {
+            name: group_members for name, group_members in livestatus.LocalConnection().query(
+                "GET contactgroups\nColumns: name members\n")
+        }
+    except livestatus.MKLivestatusNotFoundError:
+        return {}
     except Exception:
         if cmk.utils.debug.enabled():
             raise
-        return set()
+        return {}
+
+    _contactgroup_members_cache = now, members
+    return members
 
 
 def rbn_emails_contacts(emails: List[str]) -> List[str]:
@@ -1447,42 +1692,78 @@ def call_notification_script(plugin_name: NotificationPluginNameStr,
         return 2
 
     plugin_log("executing %s" % path)
+    if threading.current_thread() is not threading.main_thread():
+        exitcode = _call_notification_script_in_thread(path, plugin_context, plugin_log)
+    else:
+        try:
+            set_notification_timeout()
+            p = _start_notification_script(path, plugin_context)
+            _log_notification_script_output(p, plugin_log)
+            # the stdout is closed but the return code may not be available just yet - wait for
+            # the process to actually finish
+            exitcode = p.wait()
+            clear_notification_timeout()
+        except NotificationTimeout:
+            plugin_log("Notification plugin did not finish within %d seconds. Terminating." %
+                       config.notification_plugin_timeout)
+            # p.kill() requires python 2.6!
+            os.kill(p.pid, signal.SIGTERM)
+            exitcode = 1
+
+    if exitcode != 0:
+        plugin_log("Plugin exited with code %d" % exitcode)
+
+    return exitcode
+
+
+def _call_notification_script_in_thread(path: str, plugin_context: PluginContext,
+                                        plugin_log: Callable[[str], None]) -> int:
+    # SIGALRM is only delivered to the main thread, so the worker threads of the
+    # NotificationDispatcher terminate the plugin with a timer.
+    p = _start_notification_script(path, plugin_context)
+    timed_out = threading.Event()
+
+    def terminate() -> None:
+        timed_out.set()
+        p.terminate()
+
+    timer = threading.Timer(config.notification_plugin_timeout, terminate)
+    timer.start()
     try:
-        set_notification_timeout()
-        p = subprocess.Popen([path],
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.STDOUT,
-                             env=notification_script_env(plugin_context),
-                             encoding="utf-8",
-                             close_fds=True)
-
-        stdout = p.stdout
-        assert stdout is not None
-        while True:
-            # read and output stdout linewise to ensure we don't force python to produce
-            # one - potentially huge - memory buffer
-            line = stdout.readline()
-            if line != '':
-                plugin_log("Output: %s" % line.rstrip())
-                if _log_to_stdout:
-                    out.output(ensure_str(line))
-            else:
-                break
-        # the stdout is closed but the return code may not be available just yet - wait for the
-        # process to actually finish
+        _log_notification_script_output(p, plugin_log)
         exitcode = p.wait()
-        clear_notification_timeout()
-    except NotificationTimeout:
+    finally:
+        timer.cancel()
+
+    if timed_out.is_set():
         plugin_log("Notification plugin did not finish within %d seconds. Terminating." %
                    config.notification_plugin_timeout)
-        # p.kill() requires python 2.6!
-        os.kill(p.pid, signal.SIGTERM)
-        exitcode = 1
+        return 1
+    return exitcode
 
-    if exitcode != 0:
-        plugin_log("Plugin exited with code %d" % exitcode)
 
-    return exitcode
+def _start_notification_script(path: str, plugin_context: PluginContext) -> subprocess.Popen:
+    return subprocess.Popen([path],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            env=notification_script_env(plugin_context),
+                            encoding="utf-8",
+                            close_fds=True)
+
+
+def _log_notification_script_output(p: subprocess.Popen, plugin_log: Callable[[str], None]) -> None:
+    stdout = p.stdout
+    assert stdout is not None
+    while True:
+        # read and output stdout linewise to ensure we don't force python to produce
+        # one - potentially huge - memory buffer
+        line = stdout.readline()
+        if line != '':
+            plugin_log("Output: %s" % line.rstrip())
+            if _log_to_stdout:
+                out.output(ensure_str(line))
+        else:
+            break
 
 
 # Construct the environment for the notification script
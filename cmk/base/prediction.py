@@ -7,9 +7,9 @@
 
 import json
 import logging
-import math
 import os
 import time
+from pathlib import Path
 from typing import Optional, List, Any, cast, Dict, Union, Callable, Tuple, TypedDict
 
 import cmk.utils.debug
@@ -17,12 +17,14 @@ import cmk.utils
 import cmk.utils.defines as defines
 import cmk.utils.store as store
 from cmk.utils.log import VERBOSE
+import cmk.utils.paths
 import cmk.utils.prediction
 from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.type_defs import HostName, ServiceName, MetricName
 from cmk.utils.prediction import (
     Timestamp,
     Timegroup,
+    TimeSeries,
     TimeSeriesValues,
     Seconds,
     TimeWindow,
@@ -32,6 +34,8 @@ from cmk.utils.prediction import (
     EstimatedLevels,
 )
 
+import cmk.base.config as config
+
 logger = logging.getLogger("cmk.prediction")
 
 GroupByFunction = Callable[[Timestamp], Tuple[Timegroup, Timestamp]]
@@ -152,10 +156,8 @@ def time_slices(timestamp: Timestamp, horizon: Seconds, period_info: PeriodInfo,
     return slices
 
 
-def retrieve_grouped_data_from_rrd(
-        rrd_column: RRDColumnFunction,
-        time_windows: TimeSlices) -> Tuple[TimeWindow, List[TimeSeriesValues]]:
-    "Collect all time slices and up-sample them to same resolution"
+def _fetch_slices(rrd_column: RRDColumnFunction,
+                  time_windows: TimeSlices) -> Tuple[TimeWindow, List[Tuple[TimeSeries, Seconds]]]:
     from_time = time_windows[0][0]
 
     slices = [(rrd_column(start, end), from_time - start) for start, end in time_windows]
@@ -167,35 +169,60 @@ def retrieve_grouped_data_from_rrd(
     if twindow[2] == 0:
         raise MKGeneralException("Got no historic metrics")
 
-    return twindow, [ts.bfill_upsample(twindow, shift) for ts, shift in slices]
+    return twindow, slices
 
 
-def data_stats(slices: List[TimeSeriesValues]) -> DataStats:
-    "Statistically summarize all the upsampled RRD data"
-
-    descriptors: DataStats = []
+def retrieve_grouped_data_from_rrd(
+        rrd_column: RRDColumnFunction,
+        time_windows: TimeSlices) -> Tuple[TimeWindow, List[TimeSeriesValues]]:
+    "Collect all time slices and up-sample them to same resolution"
+    twindow, slices = _fetch_slices(rrd_column, time_windows)
+    return twindow, [ts.bfill_upsample(twindow, shift) for ts, shift in slices]
 
-    for time_column in zip(*slices):
-        point_line = [x for x in time_column if x is not None]
-        if point_line:
-            average = sum(point_line) / float(len(point_line))
-            descriptors.append([
-                average,
-                min(point_line),
-                max(point_line),
-                stdev(point_line, average),
-            ])
-        else:
-            descriptors.append([None, None, None, None])
 
-    return descriptors
+def data_stats(slices: List[Any]) -> DataStats:
+    """Statistically summarize all the upsampled RRD data
+
+    The slices are lists of values or arrays of the same length. All time slots
+    are summarized at once with NumPy, which is only imported when predictions
+    are actually computed."""
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+    from cmk.utils.array_timeseries import to_values
+
+    points = np.array(slices, dtype=float)
+    valid = ~np.isnan(points)
+    samples = valid.sum(axis=0)
+    filled = np.where(valid, points, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = filled.sum(axis=0) / samples
+        # In the case of a single data-point an unbiased standard deviation is
+        # undefined. In this case we take the magnitude of the measured value
+        # itself as a measure of the dispersion.
+        stdev = np.where(
+            samples == 1,
+            np.abs(average),
+            np.sqrt(np.abs((filled**2).sum(axis=0) - average**2 * samples) / (samples - 1)),
+        )
+        minimum = np.fmin.reduce(points, axis=0)
+        maximum = np.fmax.reduce(points, axis=0)
+
+    return [
+        list(descriptor)
+        for descriptor in zip(*(to_values(a) for a in (average, minimum, maximum, stdev)))
+    ]
 
 
 def calculate_data_for_prediction(time_windows: TimeSlices,
                                   rrd_datacolumn: RRDColumnFunction) -> PredictionData:
-    twindow, slices = retrieve_grouped_data_from_rrd(rrd_datacolumn, time_windows)
+    # pylint: disable=import-outside-toplevel
+    from cmk.utils.array_timeseries import ArrayTimeSeries
 
-    descriptors = data_stats(slices)
+    twindow, slices = _fetch_slices(rrd_datacolumn, time_windows)
+    descriptors = data_stats([
+        ArrayTimeSeries.from_time_series(ts).bfill_upsample(twindow, shift).array
+        for ts, shift in slices
+    ])
 
     return {
         u"columns": [u"average", u"min", u"max", u"stdev"],
@@ -213,16 +240,6 @@ def save_predictions(pred_file: str, info: PredictionInfo, data_for_pred: Predic
         json.dump(data_for_pred, fname)
 
 
-def stdev(point_line: List[float], average: float) -> float:
-    samples = len(point_line)
-    # In the case of a single data-point an unbiased standard deviation is
-    # undefined. In this case we take the magnitude of the measured value
-    # itself as a measure of the dispersion.
-    if samples == 1:
-        return abs(average)
-    return math.sqrt(abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1))
-
-
 def is_prediction_up2date(pred_file: str, timegroup: Timegroup,
                           params: PredictionParameters) -> bool:
     """Check, if we need to (re-)compute the prediction file.
@@ -250,6 +267,39 @@ def is_prediction_up2date(pred_file: str, timegroup: Timegroup,
     return True
 
 
+def _compute_prediction(
+    hostname: HostName,
+    service_description: ServiceName,
+    dsname: MetricName,
+    params: PredictionParameters,
+    cf: ConsolidationFunctionName,
+    timestamp: Timestamp,
+    pred_file: str,
+    timegroup: Timegroup,
+    fetch_cache: "RRDFetchCache",
+) -> PredictionData:
+    logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
+    cmk.utils.prediction.clean_prediction_files(pred_file, force=True)
+
+    period_info = prediction_periods[params["period"]]
+    time_windows = time_slices(timestamp, int(params["horizon"] * 86400), period_info, timegroup)
+
+    rrd_datacolumn = fetch_cache.rrd_datacolumn(hostname, service_description, dsname, cf)
+
+    data_for_pred = calculate_data_for_prediction(time_windows, rrd_datacolumn)
+
+    info: PredictionInfo = {
+        u"time": timestamp,
+        u"range": time_windows[0],
+        u"cf": cf,
+        u"dsname": dsname,
+        u"slice": period_info["slice"],
+        u"params": params,
+    }
+    save_predictions(pred_file, info, data_for_pred)
+    return data_for_pred
+
+
 # cf: consilidation function (MAX, MIN, AVERAGE)
 # levels_factor: this multiplies all absolute levels. Usage for example
 # in the cpu.loads check the multiplies the levels by the number of CPU
@@ -273,6 +323,11 @@ def get_levels(
     pred_file = os.path.join(pred_dir, timegroup)
     cmk.utils.prediction.clean_prediction_files(pred_file)
 
+    if config.prediction_precompute:
+        # The prediction is computed by "cmk --precompute-predictions" as long as the
+        # check keeps requesting it
+        request_prediction(pred_dir, hostname, service_description, dsname, params, cf)
+
     data_for_pred: Optional[PredictionData] = None
     if is_prediction_up2date(pred_file, timegroup, params):
         # Suppression: I am not sure how to check what this function returns
@@ -280,28 +335,167 @@ def get_levels(
         data_for_pred = cmk.utils.prediction.retrieve_data_for_prediction(  # type: ignore[assignment]
             pred_file, timegroup)
 
-    if data_for_pred is None:
-        logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
-        cmk.utils.prediction.clean_prediction_files(pred_file, force=True)
-
-        time_windows = time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
-
-        rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                            cf)
-
-        data_for_pred = calculate_data_for_prediction(time_windows, rrd_datacolumn)
+    elif config.prediction_precompute:
+        # Until the prediction is computed, an outdated prediction of this time group
+        # is used, if there is one.
+        data_for_pred = cmk.utils.prediction.retrieve_data_for_prediction(  # type: ignore[assignment]
+            pred_file, timegroup)
+        if data_for_pred is None:
+            return None, (None, None, None, None)
 
-        info: PredictionInfo = {
-            u"time": now,
-            u"range": time_windows[0],
-            u"cf": cf,
-            u"dsname": dsname,
-            u"slice": period_info["slice"],
-            u"params": params,
-        }
-        save_predictions(pred_file, info, data_for_pred)
+    if data_for_pred is None:
+        data_for_pred = _compute_prediction(hostname, service_description, dsname, params, cf, now,
+                                            pred_file, timegroup, RRDFetchCache())
 
     # Find reference value in data_for_pred
     index = int(rel_time / cast(int, data_for_pred["step"]))  # fixed: true-division
     reference = dict(zip(data_for_pred["columns"], data_for_pred["points"][index]))
     return cmk.utils.prediction.estimate_levels(reference, params, levels_factor)
+
+
+class RRDFetchCache:
+    """Share the RRD fetches of a metric between the slices and time groups
+
+    The fetches are done for whole (local) days. Shorter slices, like the hours
+    of the "minute" period, are cut out of the fetched day. The number of
+    requested points is raised accordingly, so the day is fetched with the
+    resolution a fetch of the single slice would have.
+    """
+    def __init__(self) -> None:
+        self._fetched: Dict[Tuple[HostName, ServiceName, MetricName, ConsolidationFunctionName,
+                                  Timestamp, Timestamp], TimeSeries] = {}
+
+    def rrd_datacolumn(self, hostname: HostName, service_description: ServiceName,
+                       dsname: MetricName, cf: ConsolidationFunctionName) -> RRDColumnFunction:
+        def time_boundaries(fromtime: Timestamp, untiltime: Timestamp) -> TimeSeries:
+            return self.get(hostname, service_description, dsname, cf, fromtime, untiltime)
+
+        return time_boundaries
+
+    def get(self, hostname: HostName, service_description: ServiceName, dsname: MetricName,
+            cf: ConsolidationFunctionName, fromtime: Timestamp, untiltime: Timestamp) -> TimeSeries:
+        max_entries = 400
+        fetch_from, fetch_until = fromtime, untiltime
+        if untiltime - fromtime < 86400:
+            day_start = fromtime - window_start(fromtime, 86400)
+            if untiltime <= day_start + 86400:
+                fetch_from, fetch_until = day_start, day_start + 86400
+                max_entries = max_entries * 86400 // (untiltime - fromtime)
+
+        key = (hostname, service_description, dsname, cf, fetch_from, fetch_until)
+        if key not in self._fetched:
+            self._fetched[key] = cmk.utils.prediction.get_rrd_data(hostname,
+                                                                   service_description,
+                                                                   dsname,
+                                                                   cf,
+                                                                   fetch_from,
+                                                                   fetch_until,
+                                                                   max_entries=max_entries)
+
+        time_series = self._fetched[key]
+        if (fetch_from, fetch_until) == (fromtime, untiltime):
+            return time_series
+        return _cut_time_series(time_series, fromtime, untiltime)
+
+
+def _cut_time_series(time_series: TimeSeries, fromtime: Timestamp,
+                     untiltime: Timestamp) -> TimeSeries:
+    """The part of the time series a fetch from fromtime to untiltime returns"""
+    start, _end, step = time_series.twindow
+    if step == 0:
+        return time_series
+    first = max((fromtime - start) // step, 0)
+    last = min(-((start - untiltime) // step), len(time_series.values))
+    return TimeSeries(time_series.values[first:last],
+                      (start + first * step, start + last * step, step))
+
+
+# With prediction_precompute the check helpers do not compute the predictions. They
+# leave a request in the prediction directory of the metric, which is processed by
+# "cmk --precompute-predictions". The checks refresh their requests every hour. Requests
+# which have not been refreshed for a day belong to services which have been removed or
+# do not use predictive levels anymore. They are removed.
+_REQUEST_FILE = "precompute.request"
+_REQUEST_REFRESH_INTERVAL = 3600
+_REQUEST_TIMEOUT = 86400
+
+# The requests written or refreshed by this process: request file -> (content, time)
+_last_requests: Dict[str, Tuple[str, float]] = {}
+
+
+def request_prediction(pred_dir: str, hostname: HostName, service_description: ServiceName,
+                       dsname: MetricName, params: PredictionParameters,
+                       cf: ConsolidationFunctionName) -> None:
+    request = {
+        u"host_name": hostname,
+        u"service_description": service_description,
+        u"dsname": dsname,
+        u"params": params,
+        u"cf": cf,
+    }
+    content = json.dumps(request, sort_keys=True)
+    request_file = os.path.join(pred_dir, _REQUEST_FILE)
+
+    now = time.time()
+    last_content, last_time = _last_requests.get(request_file, (None, 0.0))
+    if content == last_content and now - last_time < _REQUEST_REFRESH_INTERVAL:
+        return
+
+    if store.load_text_from_file(request_file) != content:
+        store.save_text_to_file(request_file, content)
+    else:
+        os.utime(request_file)
+    _last_requests[request_file] = (content, now)
+
+
+def _prediction_requests(now: float) -> List[Dict[str, Any]]:
+    requests = []
+    for request_file in sorted(
+            Path(cmk.utils.paths.var_dir, "prediction").glob("*/*/*/%s" % _REQUEST_FILE)):
+        try:
+            if now - request_file.stat().st_mtime > _REQUEST_TIMEOUT:
+                logger.log(VERBOSE, "Removing outdated prediction request %s", request_file)
+                request_file.unlink()
+                continue
+        except FileNotFoundError:
+            continue
+
+        try:
+            requests.append(json.loads(store.load_text_from_file(str(request_file))))
+        except ValueError:
+            logger.warning("Ignoring invalid prediction request %s", request_file)
+    return requests
+
+
+def precompute_predictions(lookahead: Seconds = 3600) -> None:
+    """Compute all requested predictions which are missing or outdated
+
+    Besides the time groups of now, also the time groups of the next lookahead
+    seconds are computed, so they are ready when the checks need them. These are
+    computed from the data available now, like all other predictions."""
+    now = int(time.time())
+    num_computed = 0
+    for request in _prediction_requests(now):
+        hostname = request["host_name"]
+        service_description = request["service_description"]
+        dsname = request["dsname"]
+        params = request["params"]
+        period_info = prediction_periods[params["period"]]
+        pred_dir = cmk.utils.prediction.predictions_dir(hostname, service_description, dsname)
+        fetch_cache = RRDFetchCache()
+        groupby = cast(GroupByFunction, period_info["groupby"])
+        for timegroup in [groupby(now)[0], groupby(now + lookahead)[0]]:
+            pred_file = os.path.join(pred_dir, timegroup)
+            if is_prediction_up2date(pred_file, timegroup, params):
+                continue
+            try:
+                _compute_prediction(hostname, service_description, dsname, params, request["cf"],
+                                    now, pred_file, timegroup, fetch_cache)
+                num_computed += 1
+            except MKGeneralException as e:
+                if cmk.utils.debug.enabled():
+                    raise
+                logger.warning("Cannot compute prediction for %s/%s/%s: %s", hostname,
+                               service_description, dsname, e)
+
+    logger.log(VERBOSE, "Computed %d predictions", num_computed)
@@ -13,9 +13,13 @@
 
 import abc
 import ast
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 import errno
 import json
 from logging import Logger, getLogger
+import multiprocessing
 import os
 from pathlib import Path
 import pprint
@@ -28,7 +32,8 @@ import threading
 import time
 import traceback
 from types import FrameType
-from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from typing import (Any, AnyStr, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set,
+                    Tuple, Type, Union)
 
 from six import ensure_binary
 
@@ -50,6 +55,7 @@ import livestatus
 from .actions import do_notify, do_event_action, do_event_actions, event_has_opened
 from .crash_reporting import ECCrashReport, CrashReportStore
 from .history import ActiveHistoryPeriod, History, scrub_string, quote_tab, get_logfile
+from .prefilter import RulePrefilter
 from .query import MKClientError, Query, QueryGET
 from .rule_packs import load_config as load_config_using
 from .settings import FileDescriptor, PortNumber, Settings, settings as create_settings
@@ -471,6 +477,7 @@ class Perfcounters:
         "messages",
         "rule_tries",
         "rule_hits",
+        "prefilter_skips",
         "drops",
         "overflows",
         "events",
@@ -499,9 +506,9 @@ class Perfcounters:
 
         self._logger = logger.getChild("Perfcounters")
 
-    def count(self, counter: str) -> None:
+    def count(self, counter: str, value: int = 1) -> None:
         with self._lock:
-            self._counters[counter] += 1
+            self._counters[counter] += value
 
     def count_time(self, counter: str, ptime: float) -> None:
         with self._lock:
@@ -560,6 +567,163 @@ class Perfcounters:
             return row
 
 
+#.
+#   .--EventPipeline-------------------------------------------------------.
+#   |     _____                 _   ____  _            _ _                 |
+#   |    | ____|_   _____ _ __ | |_|  _ \(_)_ __   ___| (_)_ __   ___      |
+#   |    |  _| \ \ / / _ \ '_ \| __| |_) | | '_ \ / _ \ | | '_ \ / _ \     |
+#   |    | |___ \ V /  __/ | | | |_|  __/| | |_) |  __/ | | | | |  __/     |
+#   |    |_____| \_/ \___|_| |_|\__|_|   |_| .__/ \___|_|_|_| |_|\___|     |
+#   |                                      |_|                             |
+#   |                                                                      |
+#   +----------------------------------------------------------------------+
+#   |  Matching of the incoming messages in worker processes               |
+#   '----------------------------------------------------------------------'
+
+
+class RuleMatch:
+    """The outcome of matching an event with the rules"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.tries = 0
+        self.prefilter_skips = 0
+        # The rule packs and ids of all rules hit by the event, including the dropping ones
+        self.hits: List[Tuple[str, str]] = []
+        self.drop = False
+        # The rule the event is processed with, None for orphaned events
+        self.rule_id: Optional[str] = None
+        self.cancelling = False
+        self.match_groups: Dict[str, Any] = {}
+
+
+MatchedEvents = List[Tuple[Dict[str, Any], RuleMatch]]
+
+# The event server of a worker process, a copy of the one forked at the start of
+# the worker together with the rules compiled at that time.
+_pipeline_event_server: Optional['EventServer'] = None
+
+
+def _init_pipeline_worker(event_server: 'EventServer') -> None:
+    global _pipeline_event_server
+    _pipeline_event_server = event_server
+    # The signal handlers of the event daemon are inherited, but the workers are
+    # shut down by the EventServer.
+    for signum in [signal.SIGHUP, signal.SIGINT, signal.SIGQUIT]:
+        signal.signal(signum, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _match_raw_lines(data: bytes, address: Optional[Any]) -> MatchedEvents:
+    assert _pipeline_event_server is not None
+    return _pipeline_event_server.match_raw_lines(data, address)
+
+
+class EventPipeline:
+    """Creates the events from the incoming messages and matches them in worker processes
+
+    Creating an event and finding the rule it matches does not change the state of
+    the event daemon, so this is done by a pool of worker processes in parallel.
+    Everything else (counting, cancelling, opening events, actions, history...)
+    is done by the EventServer thread, which applies the results in the order
+    the messages have been received. The workers are forked with the compiled
+    rules and restarted by the EventServer after the rules have changed."""
+
+    # The number of chunks of messages handed over to each worker at a time
+    _max_pending_per_worker = 16
+
+    def __init__(self, logger: Logger, event_server: 'EventServer',
+                 lock_configuration: ECLock) -> None:
+        super().__init__()
+        self._logger = logger
+        self._event_server = event_server
+        self._lock_configuration = lock_configuration
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._pending: Deque[Tuple[concurrent.futures.Future, bytes, Optional[Any],
+                                   Optional[Callable[[], None]]]] = collections.deque()
+        self._num_workers = 0
+        self._rules: Optional[List[Any]] = None
+        self._broken = False
+
+    @property
+    def active(self) -> bool:
+        return self._executor is not None and not self._broken
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def is_up_to_date(self, rules: List[Any], num_workers: int) -> bool:
+        if self._executor is None:
+            return num_workers == 0
+        return not self._broken and rules is self._rules and num_workers == self._num_workers
+
+    def start(self, rules: List[Any], num_workers: int) -> None:
+        self._rules = rules
+        self._num_workers = num_workers
+        self._broken = False
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_pipeline_worker,
+            initargs=(self._event_server,))
+
+    def stop(self) -> None:
+        """Apply the results of all pending messages and terminate the workers"""
+        while self._pending:
+            self._apply_next()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self,
+               data: bytes,
+               address: Optional[Any],
+               on_applied: Optional[Callable[[], None]] = None) -> None:
+        """Hand the messages over to the workers
+
+        on_applied is called once the results of the messages have been applied."""
+        assert self._executor is not None
+        while len(self._pending) >= self._num_workers * self._max_pending_per_worker:
+            self._apply_next()
+
+        try:
+            # The workers are forked on demand by submit(). Never fork them while
+            # the configuration is being changed by another thread.
+            with self._lock_configuration:
+                future = self._executor.submit(_match_raw_lines, data, address)
+        except BrokenProcessPool:
+            self._logger.exception("Event processing workers died, restarting them")
+            self._broken = True
+            self._event_server.process_raw_lines_inline(data, address)
+            if on_applied is not None:
+                on_applied()
+            return
+        self._pending.append((future, data, address, on_applied))
+
+    def apply_ready(self) -> None:
+        """Apply the results available without waiting, keeping the order of the messages"""
+        while self._pending and self._pending[0][0].done():
+            self._apply_next()
+
+    def _apply_next(self) -> None:
+        future, data, address, on_applied = self._pending.popleft()
+        try:
+            matched_events = future.result()
+        except BrokenProcessPool:
+            self._logger.exception("Event processing workers died, restarting them")
+            self._broken = True
+            self._event_server.process_raw_lines_inline(data, address)
+        except Exception:
+            self._logger.exception("Exception in event processing worker, processing the "
+                                   "messages in the event server")
+            self._event_server.process_raw_lines_inline(data, address)
+        else:
+            self._event_server.apply_matched_events(matched_events)
+
+        if on_applied is not None:
+            on_applied()
+
+
 #.
 #   .--EventServer---------------------------------------------------------.
 #   |      _____                 _   ____                                  |
@@ -613,6 +777,7 @@ class EventServer(ECServerThread):
 
         # TODO: Improve type!
         self._rules: List[Any] = []
+        self._rule_prefilter = RulePrefilter([])
         self._hash_stats = []
         for _unused_facility in range(32):
             self._hash_stats.append([0] * 8)
@@ -626,6 +791,9 @@ class EventServer(ECServerThread):
         self._message_period = ActiveHistoryPeriod()
         self._rule_matcher = RuleMatcher(self._logger, config)
         self._event_creator = EventCreator(self._logger, config)
+        self._pipeline = EventPipeline(self._logger, self, lock_configuration)
+        # Spool files handed over to the pipeline whose results have not been applied yet
+        self._pending_spool_files: Set[Path] = set()
 
         # HACK for testing: The real fix would involve breaking up these huge
         # class monsters.
@@ -832,9 +1000,12 @@ class EventServer(ECServerThread):
         client_sockets: Dict[int, Tuple[socket.socket, Any, bytes]] = {}
         select_timeout = 1
         while not self._terminate_event.is_set():
+            self._update_pipeline()
             try:
-                readable = select.select(listen_list + list(client_sockets.keys()), [], [],
-                                         select_timeout)[0]
+                # Do not wait long for new messages while the workers are busy
+                readable = select.select(
+                    listen_list + list(client_sockets.keys()), [], [],
+                    min(select_timeout, 0.01) if self._pipeline.has_pending else select_timeout)[0]
             except select.error as e:
                 if e.args[0] != errno.EINTR:
                     raise
@@ -939,13 +1110,43 @@ class EventServer(ECServerThread):
 
             try:
                 # process the first spool file we get
-                spool_file = next(self.settings.paths.spool_dir.value.glob('[!.]*'))
-                self.process_raw_lines(spool_file.read_bytes())
-                spool_file.unlink()
+                spool_file = next(path for path in self.settings.paths.spool_dir.value.glob('[!.]*')
+                                  if path not in self._pending_spool_files)
+                self._process_spool_file(spool_file)
                 select_timeout = 0  # enable fast processing to process further files
             except StopIteration:
                 select_timeout = 1  # restore default select timeout
 
+            self._pipeline.apply_ready()
+
+        self._pipeline.stop()
+
+    def _process_spool_file(self, spool_file: Path) -> None:
+        """Process the messages of a spool file and remove it after the results were applied"""
+        data = spool_file.read_bytes()
+        if not self._pipeline.active:
+            self.process_raw_lines_inline(data)
+            spool_file.unlink()
+            return
+
+        def unlink_spool_file() -> None:
+            self._pending_spool_files.discard(spool_file)
+            spool_file.unlink()
+
+        self._pending_spool_files.add(spool_file)
+        self._pipeline.submit(data, None, unlink_spool_file)
+
+    # (Re)start the workers of the pipeline in case the rules or the number of workers changed
+    def _update_pipeline(self) -> None:
+        num_workers = self._config["event_processing_workers"]
+        if self._pipeline.is_up_to_date(self._rules, num_workers):
+            return
+
+        self._pipeline.stop()
+        if num_workers:
+            self._logger.info("Processing the incoming messages with %d workers" % num_workers)
+            self._pipeline.start(self._rules, num_workers)
+
     # Processes incoming data, just a wrapper between the real data and the
     # handler function to record some statistics etc.
     def process_raw_data(self, handler):
@@ -961,6 +1162,12 @@ class EventServer(ECServerThread):
 
     # Takes several lines of messages, handles encoding and processes them separated
     def process_raw_lines(self, data: bytes, address: Optional[Any] = None) -> None:
+        if self._pipeline.active:
+            self._pipeline.submit(data, address)
+        else:
+            self.process_raw_lines_inline(data, address)
+
+    def process_raw_lines_inline(self, data: bytes, address: Optional[Any] = None) -> None:
         lines = data.splitlines()
         for line_bytes in lines:
             line = scrub_and_decode(line_bytes.rstrip())
@@ -975,6 +1182,31 @@ class EventServer(ECServerThread):
                     self._logger.exception('Exception handling a log line (skipping this one): %s' %
                                            e)
 
+    # The part of process_raw_lines() done by the workers of the EventPipeline
+    def match_raw_lines(self, data: bytes, address: Optional[Any] = None) -> MatchedEvents:
+        matched_events: MatchedEvents = []
+        for line_bytes in data.splitlines():
+            line = scrub_and_decode(line_bytes.rstrip())
+            if line:
+                try:
+                    event = self.create_event_from_line(line, address)
+                    matched_events.append((event, self._match_event(event)))
+                except Exception as e:
+                    self._logger.exception('Exception handling a log line (skipping this one): %s' %
+                                           e)
+        return matched_events
+
+    def apply_matched_events(self, matched_events: MatchedEvents) -> None:
+        for event, rule_match in matched_events:
+            try:
+
+                def handler(event=event, rule_match=rule_match):
+                    self.process_matched_event(event, rule_match)
+
+                self.process_raw_data(handler)
+            except Exception as e:
+                self._logger.exception('Exception handling a log line (skipping this one): %s' % e)
+
     def do_housekeeping(self) -> None:
         with self._event_status.lock:
             with self._lock_configuration:
@@ -1255,8 +1487,9 @@ class EventServer(ECServerThread):
     def compile_rules(self, legacy_rules, rule_packs):
         self._rules = []
         self._rule_by_id = {}
-        # Speedup-Hash for rule execution
-        self._rule_hash: Dict[int, Dict[int, Any]] = {}
+        # Speedup-Hash for rule execution: The positions of the rules in self._rules
+        # per facility and priority
+        self._rule_hash: Dict[int, Dict[int, Set[int]]] = {}
         count_disabled = 0
         count_rules = 0
         count_unspecific = 0
@@ -1313,7 +1546,7 @@ class EventServer(ECServerThread):
                             (rule["pack"], rule["id"], e))
 
                     if self._config["rule_optimizer"]:
-                        self.hash_rule(rule)
+                        self.hash_rule(rule, len(self._rules) - 1)
                         if "match_facility" not in rule \
                                 and "match_priority" not in rule \
                                 and "cancel_priority" not in rule \
@@ -1333,6 +1566,11 @@ class EventServer(ECServerThread):
                         stats.append("%s(%d)" % (SyslogPriority(prio), len(entries)))
                     self._logger.info(" %-12s: %s" % (SyslogFacility(facility), " ".join(stats)))
 
+            self._rule_prefilter = RulePrefilter(self._rules)
+            self._logger.info("Rule prefilter: %d rules indexed, %d unconditional" %
+                              (len(self._rules) - self._rule_prefilter.num_unconditional,
+                               self._rule_prefilter.num_unconditional))
+
     @staticmethod
     def _compile_matching_value(key, val):
         value = val.strip()
@@ -1349,16 +1587,16 @@ class EventServer(ECServerThread):
             return re.compile(value, re.IGNORECASE)
         return val.lower()
 
-    def hash_rule(self, rule):
+    def hash_rule(self, rule, position):
         # Construct rule hash for faster execution.
         facility = rule.get("match_facility")
         if facility and not rule.get("invert_matching"):
-            self.hash_rule_facility(rule, facility)
+            self.hash_rule_facility(rule, position, facility)
         else:
             for facility in range(32):  # all syslog facilities
-                self.hash_rule_facility(rule, facility)
+                self.hash_rule_facility(rule, position, facility)
 
-    def hash_rule_facility(self, rule, facility):
+    def hash_rule_facility(self, rule, position, facility):
         needed_prios = [False] * 8
         for key in ["match_priority", "cancel_priority"]:
             if key in rule:
@@ -1377,7 +1615,7 @@ class EventServer(ECServerThread):
         prio_hash = self._rule_hash.setdefault(facility, {})
         for prio, need in enumerate(needed_prios):
             if need:
-                prio_hash.setdefault(prio, []).append(rule)
+                prio_hash.setdefault(prio, set()).add(position)
 
     def output_hash_stats(self):
         self._logger.info("Top 20 of facility/priority:")
@@ -1397,6 +1635,9 @@ class EventServer(ECServerThread):
                                (100.0 * count / float(total_count))))
 
     def process_line(self, line, address):
+        self.process_event(self.create_event_from_line(line, address))
+
+    def create_event_from_line(self, line, address):
         line = line.rstrip()
         if self._config["debug_rules"]:
             if address:
@@ -1404,20 +1645,33 @@ class EventServer(ECServerThread):
             else:
                 self._logger.info(u"Processing message '%s'" % line)
 
-        event = self._event_creator.create_event_from_line(line, address)
-        self.process_event(event)
+        return self._event_creator.create_event_from_line(line, address)
 
     def process_event(self, event):
-        self.do_translate_hostname(event)
+        self.process_matched_event(event, self.match_event(event))
 
-        # Log all incoming messages into a syslog-like text file if that is enabled
-        if self._config["log_messages"]:
-            self.log_message(event)
+    def match_event(self, event: Dict[str, Any]) -> RuleMatch:
+        with self._lock_configuration:
+            return self._match_event(event)
+
+    # Finds the rule matching the event. This does not change the state of the
+    # event daemon, so it is also done by the workers of the EventPipeline.
+    def _match_event(self, event: Dict[str, Any]) -> RuleMatch:
+        self.do_translate_hostname(event)
+        rule_match = RuleMatch()
 
         # Rule optimizer
         if self._config["rule_optimizer"]:
-            self._hash_stats[event["facility"]][event["priority"]] += 1
-            rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
+            rule_hash = self._rule_hash.get(event["facility"], {}).get(event["priority"], set())
+            rule_candidates = [
+                self._rules[position]
+                for position in self._rule_prefilter.candidates(event)
+                if position in rule_hash
+            ]
+            rule_match.prefilter_skips = len(rule_hash) - len(rule_candidates)
+            if self._config["debug_rules"]:
+                self._logger.info("  %d of %d rules skipped by the prefilter" %
+                                  (rule_match.prefilter_skips, len(rule_hash)))
         else:
             rule_candidates = self._rules
 
@@ -1427,6 +1681,7 @@ class EventServer(ECServerThread):
                 continue  # still in the rule pack that we want to skip
             skip_pack = None  # new pack, reset skipping
 
+            rule_match.tries += 1
             try:
                 result = self.event_rule_matches(rule, event)
             except Exception as e:
@@ -1434,109 +1689,133 @@ class EventServer(ECServerThread):
                 result = False
 
             if result:  # A tuple with (True/False, {match_info}).. O.o
-                self._perfcounters.count("rule_hits")
                 cancelling, match_groups = result
 
                 if self._config["debug_rules"]:
                     self._logger.info("  matching groups:\n%s" % pprint.pformat(match_groups))
 
-                self._event_status.count_rule_match(rule["id"])
-                if self._config["log_rulehits"]:
-                    self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
-                                      (rule["pack"], rule["id"], SyslogFacility(event["facility"]),
-                                       SyslogPriority(event["priority"]), event["text"]))
-
+                rule_match.hits.append((rule["pack"], rule["id"]))
                 if rule.get("drop"):
                     if rule["drop"] == "skip_pack":
                         skip_pack = rule["pack"]
                         if self._config["debug_rules"]:
                             self._logger.info("  skipping this rule pack (%s)" % skip_pack)
                         continue
-                    self._perfcounters.count("drops")
-                    return
-
-                if cancelling:
-                    self._event_status.cancel_events(self, self._event_columns, event, match_groups,
-                                                     rule)
-                    return
-
-                # Remember the rule id that this event originated from
-                event["rule_id"] = rule["id"]
-
-                # Attach optional contact group information for visibility
-                # and eventually for notifications
-                self._add_rule_contact_groups_to_event(rule, event)
-
-                # Store groups from matching this event. In order to make
-                # persistence easier, we do not safe them as list but join
-                # them on ASCII-1.
-                event["match_groups"] = match_groups.get("match_groups_message", ())
-                event["match_groups_syslog_application"] = match_groups.get(
-                    "match_groups_syslog_application", ())
-                self.rewrite_event(rule, event, match_groups)
-
-                # Lookup the monitoring core hosts and add the core host
-                # name to the event when one can be matched.
-                #
-                # Needs to be done AFTER event rewriting, because the rewriting
-                # may change the "host" field.
-                #
-                # For the moment we have no rule/condition matching on this
-                # field. So we only add the core host info for matched events.
-                self._add_core_host_to_new_event(event)
-
-                if "count" in rule:
-                    count = rule["count"]
-                    # Check if a matching event already exists that we need to
-                    # count up. If the count reaches the limit, the event will
-                    # be opened and its rule actions performed.
-                    existing_event = \
-                        self._event_status.count_event(self, event, rule, count)
-                    if existing_event:
-                        if "delay" in rule:
-                            if self._config["debug_rules"]:
-                                self._logger.info("Event opening will be delayed for %d seconds" %
-                                                  rule["delay"])
-                            existing_event["delay_until"] = time.time() + rule["delay"]
-                            existing_event["phase"] = "delayed"
-                        else:
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule,
-                                             existing_event)
-
-                        self._history.add(existing_event, "COUNTREACHED")
-
-                        if "delay" not in rule and rule.get("autodelete"):
-                            existing_event["phase"] = "closed"
-                            self._history.add(existing_event, "AUTODELETE")
-                            with self._event_status.lock:
-                                self._event_status.remove_event(existing_event)
-                elif "expect" in rule:
-                    self._event_status.count_expected_event(self, event)
-                else:
-                    if "delay" in rule:
-                        if self._config["debug_rules"]:
-                            self._logger.info("Event opening will be delayed for %d seconds" %
-                                              rule["delay"])
-                        event["delay_until"] = time.time() + rule["delay"]
-                        event["phase"] = "delayed"
-                    else:
-                        event["phase"] = "open"
+                    rule_match.drop = True
+                    return rule_match
 
-                    if self.new_event_respecting_limits(event):
-                        if event["phase"] == "open":
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule, event)
-                            if rule.get("autodelete"):
-                                event["phase"] = "closed"
-                                self._history.add(event, "AUTODELETE")
-                                with self._event_status.lock:
-                                    self._event_status.remove_event(event)
-                return
+                rule_match.rule_id = rule["id"]
+                rule_match.cancelling = cancelling
+                rule_match.match_groups = match_groups
+                return rule_match
+
+        return rule_match
+
+    def process_matched_event(self, event: Dict[str, Any], rule_match: RuleMatch) -> None:
+        if self._config["rule_optimizer"]:
+            self._hash_stats[event["facility"]][event["priority"]] += 1
+        self._perfcounters.count("rule_tries", rule_match.tries)
+        self._perfcounters.count("prefilter_skips", rule_match.prefilter_skips)
 
-        # End of loop over rules.
-        if self._config["archive_orphans"]:
-            self._event_status.archive_event(event)
+        # Log all incoming messages into a syslog-like text file if that is enabled
+        if self._config["log_messages"]:
+            self.log_message(event)
+
+        for rule_pack, rule_id in rule_match.hits:
+            self._perfcounters.count("rule_hits")
+            self._event_status.count_rule_match(rule_id)
+            if self._config["log_rulehits"]:
+                self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
+                                  (rule_pack, rule_id, SyslogFacility(event["facility"]),
+                                   SyslogPriority(event["priority"]), event["text"]))
+
+        if rule_match.drop:
+            self._perfcounters.count("drops")
+            return
+
+        # The rule may have been removed by a reload while the event was matched
+        rule = self._rule_by_id.get(rule_match.rule_id) if rule_match.rule_id else None
+        if rule is None:
+            if self._config["archive_orphans"]:
+                self._event_status.archive_event(event)
+            return
+
+        match_groups = rule_match.match_groups
+        if rule_match.cancelling:
+            self._event_status.cancel_events(self, self._event_columns, event, match_groups, rule)
+            return
+
+        # Remember the rule id that this event originated from
+        event["rule_id"] = rule["id"]
+
+        # Attach optional contact group information for visibility
+        # and eventually for notifications
+        self._add_rule_contact_groups_to_event(rule, event)
+
+        # Store groups from matching this event. In order to make
+        # persistence easier, we do not safe them as list but join
+        # them on ASCII-1.
+        event["match_groups"] = match_groups.get("match_groups_message", ())
+        event["match_groups_syslog_application"] = match_groups.get(
+            "match_groups_syslog_application", ())
+        self.rewrite_event(rule, event, match_groups)
+
+        # Lookup the monitoring core hosts and add the core host
+        # name to the event when one can be matched.
+        #
+        # Needs to be done AFTER event rewriting, because the rewriting
+        # may change the "host" field.
+        #
+        # For the moment we have no rule/condition matching on this
+        # field. So we only add the core host info for matched events.
+        self._add_core_host_to_new_event(event)
+
+        if "count" in rule:
+            count = rule["count"]
+            # Check if a matching event already exists that we need to
+            # count up. If the count reaches the limit, the event will
+            # be opened and its rule actions performed.
+            existing_event = \
+                self._event_status.count_event(self, event, rule, count)
+            if existing_event:
+                if "delay" in rule:
+                    if self._config["debug_rules"]:
+                        self._logger.info("Event opening will be delayed for %d seconds" %
+                                          rule["delay"])
+                    existing_event["delay_until"] = time.time() + rule["delay"]
+                    existing_event["phase"] = "delayed"
+                else:
+                    event_has_opened(self._history, self.settings, self._config, self._logger, self,
+                                     self._event_columns, rule, existing_event)
+
+                self._history.add(existing_event, "COUNTREACHED")
+
+                if "delay" not in rule and rule.get("autodelete"):
+                    existing_event["phase"] = "closed"
+                    self._history.add(existing_event, "AUTODELETE")
+                    with self._event_status.lock:
+                        self._event_status.remove_event(existing_event)
+        elif "expect" in rule:
+            self._event_status.count_expected_event(self, event)
+        else:
+            if "delay" in rule:
+                if self._config["debug_rules"]:
+                    self._logger.info("Event opening will be delayed for %d seconds" %
+                                      rule["delay"])
+                event["delay_until"] = time.time() + rule["delay"]
+                event["phase"] = "delayed"
+            else:
+                event["phase"] = "open"
+
+            if self.new_event_respecting_limits(event):
+                if event["phase"] == "open":
+                    event_has_opened(self._history, self.settings, self._config, self._logger, self,
+                                     self._event_columns, rule, event)
+                    if rule.get("autodelete"):
+                        event["phase"] = "closed"
+                        self._history.add(event, "AUTODELETE")
+                        with self._event_status.lock:
+                            self._event_status.remove_event(event)
 
     def _add_rule_contact_groups_to_event(self, rule, event):
         if rule.get("contact_groups") is None:
@@ -1586,22 +1865,18 @@ class EventServer(ECServerThread):
     # if matched regex groups in either text (normal) or match_ok (cancelling)
     # match.
     def event_rule_matches(self, rule, event):
-        self._perfcounters.count("rule_tries")
-        with self._lock_configuration:
-            result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
-            if rule.get("invert_matching"):
-                if result is False:
-                    result = False, {}
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would not match, but due to inverted matching does.")
-                else:
-                    result = False
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would match, but due to inverted matching does not.")
+        result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
+        if rule.get("invert_matching"):
+            if result is False:
+                result = False, {}
+                if self._config["debug_rules"]:
+                    self._logger.info("  Rule would not match, but due to inverted matching does.")
+            else:
+                result = False
+                if self._config["debug_rules"]:
+                    self._logger.info("  Rule would match, but due to inverted matching does not.")
 
-            return result
+        return result
 
     # Rewrite texts and compute other fields in the event
     def rewrite_event(self, rule, event, groups, set_first=True):
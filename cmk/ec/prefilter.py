@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Preselection of the rules an event may match
+
+Trying all rules on an event means evaluating the conditions of every rule,
+including the regular expressions on the message text, the host name and the
+syslog application. The RulePrefilter derives cheap necessary conditions from
+the rules instead: the exact host name of a rule and the literal substrings
+every value matching a text pattern or regular expression must contain.
+
+Each rule is indexed by one of these requirements, its anchor. The anchors of
+a field are searched in one pass of a single regular expression built from all
+of them. Only the rules having an anchor found in an event, and the rules
+without any requirement, are checked for the rest of their requirements. The
+remaining candidates are tried as usual, so the prefilter never changes the
+outcome of the rule matching, it only skips rules which can not match.
+
+The regular expressions of the rules are case insensitive. Literals derived
+from them are only compared with ASCII values, where comparing the lower case
+values is equivalent to the case insensitive matching.
+"""
+
+import re
+import sre_constants
+import sre_parse
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple, Union
+
+# The fields of an event the prefilter looks at
+_FIELDS = ["text", "host", "application"]
+
+# Shorter literals derived from regular expressions are not worth an index entry
+_MIN_LITERAL_LENGTH = 3
+
+RulePattern = Union[None, str, Pattern]
+
+
+class Requirement(NamedTuple):
+    field: str
+    literal: str
+    # The value has to be equal to the literal instead of containing it
+    exact: bool
+    # The literal is derived from a case insensitive regular expression
+    ascii_only: bool
+
+
+def regex_literals(pattern: Pattern) -> List[str]:
+    """The lower case literals every text matched by the regular expression contains"""
+    literals: List[str] = []
+    _collect_literals(sre_parse.parse(pattern.pattern, pattern.flags), literals)
+    return [literal for literal in literals if len(literal) >= _MIN_LITERAL_LENGTH]
+
+
+def _collect_literals(subpattern: Any, literals: List[str]) -> None:
+    run: List[str] = []
+    for op, av in subpattern:
+        if op == sre_constants.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+
+        literals.append("".join(run))
+        run = []
+        # The content of groups and of repetitions occurring at least once is required, too.
+        # Everything else (alternatives, character sets, optional parts, ...) ends a literal.
+        if op == sre_constants.SUBPATTERN:
+            _collect_literals(av[-1], literals)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            _collect_literals(av[2], literals)
+    literals.append("".join(run))
+
+
+def _pattern_requirements(field: str, pattern: RulePattern, exact: bool) -> List[Requirement]:
+    if pattern is None:
+        return []
+    if isinstance(pattern, str):  # compared with the lower case value by match()
+        return [Requirement(field, pattern, exact, False)]
+    return [Requirement(field, literal, False, True) for literal in regex_literals(pattern)]
+
+
+def rule_requirements(rule: Dict[str, Any]) -> List[Requirement]:
+    """The requirements of a compiled rule an event has to fulfill to match it"""
+    if rule.get("disabled") or rule.get("invert_matching"):
+        return []
+
+    requirements = _pattern_requirements("host", rule.get("match_host"), exact=True)
+    # A rule with a cancelling condition matches an event if one of the conditions does
+    if "cancel_application" not in rule:
+        requirements += _pattern_requirements("application",
+                                              rule.get("match_application"),
+                                              exact=False)
+    if "match_ok" not in rule:
+        requirements += _pattern_requirements("text", rule.get("match"), exact=False)
+    return requirements
+
+
+def _trie_regex(literals: Iterable[str]) -> str:
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node: Dict[str, Any]) -> str:
+    alternatives = [
+        re.escape(char) + _trie_node_regex(child) for char, child in sorted(node.items()) if char
+    ]
+    if not alternatives:
+        return ""
+
+    regex = alternatives[0] if len(alternatives) == 1 else "(?:%s)" % "|".join(alternatives)
+    if "" in node:
+        # Prefer the longer literals
+        regex = "(?:%s)?" % regex
+    return regex
+
+
+def _anchor_preference(requirement: Requirement) -> Tuple[bool, bool, int]:
+    return requirement.exact, not requirement.ascii_only, len(requirement.literal)
+
+
+class _AnchorIndex:
+    """Finds the rules having an anchor contained in a value of one field"""
+    def __init__(self, anchors: Dict[Requirement, Set[int]]) -> None:
+        self._positions: Dict[str, Set[int]] = {}
+        self._ascii_only_positions: Set[int] = set()
+        for anchor, positions in anchors.items():
+            self._positions.setdefault(anchor.literal, set()).update(positions)
+            if anchor.ascii_only:
+                self._ascii_only_positions.update(positions)
+
+        # The regex finds the longest anchor starting at each position of the value. All
+        # other anchors starting there are prefixes of it.
+        self._prefixes: Dict[str, List[str]] = {}
+        for literal in self._positions:
+            prefixes = (literal[:end] for end in range(1, len(literal) + 1))
+            self._prefixes[literal] = [prefix for prefix in prefixes if prefix in self._positions]
+        self._regex = re.compile("(?=(%s))" % _trie_regex(self._positions))
+
+    def find(self, value: str, is_ascii: bool) -> Set[int]:
+        found = set() if is_ascii else set(self._ascii_only_positions)
+        for literal in {match.group(1) for match in self._regex.finditer(value)}:
+            for prefix in self._prefixes[literal]:
+                found.update(self._positions[prefix])
+        return found
+
+
+class RulePrefilter:
+    def __init__(self, rules: List[Dict[str, Any]]) -> None:
+        super().__init__()
+        self._requirements: List[List[Requirement]] = []
+        self._unconditional: Set[int] = set()
+        self._exact: Dict[str, Dict[str, Set[int]]] = {field: {} for field in _FIELDS}
+
+        anchors: Dict[str, Dict[Requirement, Set[int]]] = {field: {} for field in _FIELDS}
+        for position, rule in enumerate(rules):
+            requirements = rule_requirements(rule)
+            self._requirements.append(requirements)
+            anchor = self._anchor(requirements)
+            if anchor is None:
+                self._unconditional.add(position)
+            elif anchor.exact:
+                self._exact[anchor.field].setdefault(anchor.literal, set()).add(position)
+            else:
+                anchors[anchor.field].setdefault(anchor, set()).add(position)
+
+        self._anchors = {
+            field: _AnchorIndex(field_anchors)
+            for field, field_anchors in anchors.items()
+            if field_anchors
+        }
+
+    @staticmethod
+    def _anchor(requirements: List[Requirement]) -> Optional[Requirement]:
+        if not requirements:
+            return None
+        return max(requirements, key=_anchor_preference)
+
+    @property
+    def num_unconditional(self) -> int:
+        return len(self._unconditional)
+
+    def candidates(self, event: Dict[str, Any]) -> List[int]:
+        """The positions of the rules the event may match in ascending order"""
+        values = {field: event[field].lower() for field in _FIELDS}
+        is_ascii = {field: value.isascii() for field, value in values.items()}
+
+        found = set(self._unconditional)
+        for field, exact_index in self._exact.items():
+            found.update(exact_index.get(values[field], ()))
+        for field, anchor_index in self._anchors.items():
+            found.update(anchor_index.find(values[field], is_ascii[field]))
+
+        return sorted(position for position in found
+                      if self._fulfills(self._requirements[position], values, is_ascii))
+
+    @staticmethod
+    def _fulfills(requirements: List[Requirement], values: Dict[str, str],
+                  is_ascii: Dict[str, bool]) -> bool:
+        for requirement in requirements:
+            value = values[requirement.field]
+            if requirement.exact:
+                if value != requirement.literal:
+                    return False
+            elif requirement.ascii_only and not is_ascii[requirement.field]:
+                continue
+            elif requirement.literal not in value:
+                return False
+        return True
@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Package containing the fetchers to the data sources."""
 
+from ._base import MKFetcherError
 from .ipmi import IPMIDataFetcher
 from .piggyback import PiggyBackDataFetcher
 from .program import ProgramDataFetcher
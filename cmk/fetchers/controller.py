@@ -10,11 +10,13 @@
 import enum
 import json
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, cast, Dict, List, Union
 
-from cmk.utils.paths import core_fetcher_config_dir
+import cmk.utils.store as store
+from cmk.utils.paths import core_fetcher_config_dir, tcp_cache_dir
 
 from . import TCPDataFetcher
+from .tcp import fetch_concurrently
 
 #
 # At the moment Protocol and API are opened to critic.
@@ -121,6 +123,40 @@ def run(serial, host, timeout):
     return 0
 
 
+def run_batch(serial: str, hosts: List[str], timeout: int, max_concurrent: int = 100) -> int:
+    """Fetch the agent data of many TCP hosts concurrently and write them to the cache files
+
+    The data is written to the agent cache files of the hosts. The checking only reads
+    these files when it may use cache files, i.e. with "cmk --cache" or when the files
+    are younger than the maximum cache file age of the host. check_max_cachefile_age
+    is 0 by default, so cmk --check fetches the data itself unless this is configured.
+    One answer is printed per host: the host name on success and the error message on
+    failure.
+    """
+    fetchers: Dict[str, TCPDataFetcher] = {}
+    failed = 0
+    for host in hosts:
+        try:
+            json_content = read_json_file(serial=serial, host=host)
+            fetchers[host] = cast(TCPDataFetcher,
+                                  TCPDataFetcher.from_json(json.loads(json_content)))
+        except Exception as e:
+            print(make_failure_answer("%s: %s" % (host, e), "json"))
+            failed += 1
+
+    Path(tcp_cache_dir).mkdir(parents=True, exist_ok=True)
+    for host, result in fetch_concurrently(fetchers, timeout, max_concurrent).items():
+        if isinstance(result, Exception):
+            print(make_failure_answer("%s: %s" % (host, result), "fetch"))
+            failed += 1
+            continue
+
+        store.save_bytes_to_file(Path(tcp_cache_dir, host), result)
+        print(make_success_answer(host))
+
+    return 1 if failed else 0
+
+
 def read_json_file(serial: str, host: str) -> str:
     json_file = build_json_file_path(serial=serial, host=host)
     return json_file.read_text(encoding="utf-8")
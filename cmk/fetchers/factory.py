@@ -8,7 +8,7 @@ from typing import Optional
 
 from cmk.snmplib.type_defs import ABCSNMPBackend, SNMPHostConfig
 
-from .snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from .snmp_backend import BulkSNMPBackend, ClassicSNMPBackend, StoredWalkSNMPBackend
 
 try:
     from .cee.snmp_backend import inline  # type: ignore[import]
@@ -36,6 +36,9 @@ def backend(snmp_config: SNMPHostConfig, *, use_cache: Optional[bool] = None) ->
     if use_cache or snmp_config.is_usewalk_host:
         return StoredWalkSNMPBackend(snmp_config)
 
+    if snmp_config.bulk_backend_settings is not None and not snmp_config.is_snmpv3_host:
+        return BulkSNMPBackend(snmp_config)
+
     if snmp_config.is_inline_snmp_host:
         return inline.InlineSNMPBackend(snmp_config)
 
@@ -50,6 +50,12 @@ class SNMPDataFetcher:
         pass
 
     def data(self) -> SNMPRawData:
+        backend = factory.backend(self._snmp_config)
+        backend.prefetch([
+            oid for oid_info in self._oid_infos.values() for entry in oid_info
+            for oid in snmp_table.get_fetch_oids(entry, self._use_snmpwalk_cache)
+        ])
+
         info: SNMPRawData = {}
         for section_name, oid_info in self._oid_infos.items():
             self._logger.debug("%s: Fetching data", section_name)
@@ -58,7 +64,7 @@ class SNMPDataFetcher:
             # and fetches a separate snmp table.
             get_snmp = partial(snmp_table.get_snmp_table_cached
                                if self._use_snmpwalk_cache else snmp_table.get_snmp_table,
-                               backend=factory.backend(self._snmp_config))
+                               backend=backend)
             # branch: List[SNMPTree]
             check_info: List[SNMPTable] = []
             for entry in oid_info:
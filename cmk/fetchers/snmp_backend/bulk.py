@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""In-process SNMP backend pipelining the requests of many walks over one UDP socket"""
+
+import collections
+import random
+import socket
+import time
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import console
+
+from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
+    OID,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+__all__ = ["BulkSNMPBackend"]
+
+# ASN.1 BER tags used by SNMP v1 and v2c
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_IP_ADDRESS = 0x40
+TAG_COUNTER32 = 0x41
+TAG_GAUGE32 = 0x42
+TAG_TIMETICKS = 0x43
+TAG_OPAQUE = 0x44
+TAG_COUNTER64 = 0x46
+TAG_UINTEGER32 = 0x47
+TAG_NO_SUCH_OBJECT = 0x80
+TAG_NO_SUCH_INSTANCE = 0x81
+TAG_END_OF_MIB_VIEW = 0x82
+
+PDU_GET = 0xa0
+PDU_GET_NEXT = 0xa1
+PDU_RESPONSE = 0xa2
+PDU_GET_BULK = 0xa5
+
+ERROR_NO_ERROR = 0
+ERROR_TOO_BIG = 1
+ERROR_NO_SUCH_NAME = 2
+
+_ERROR_NAMES = {
+    1: "tooBig",
+    2: "noSuchName",
+    3: "badValue",
+    4: "readOnly",
+    5: "genErr",
+    6: "noAccess",
+}
+
+_UNSIGNED_TAGS = {TAG_COUNTER32, TAG_GAUGE32, TAG_TIMETICKS, TAG_COUNTER64, TAG_UINTEGER32}
+
+# A variable binding: the OID, the tag of the value and the encoded value
+Varbind = Tuple[OID, int, bytes]
+
+# In GETBULK requests error_status and error_index are non-repeaters and max-repetitions
+Message = NamedTuple("Message", [
+    ("version", int),
+    ("community", bytes),
+    ("pdu_type", int),
+    ("request_id", int),
+    ("error_status", int),
+    ("error_index", int),
+    ("varbinds", List[Varbind]),
+])
+
+#.
+#   .--BER-----------------------------------------------------------------.
+#   |                          ____  _____ ____                            |
+#   |                         | __ )| ____|  _ \                           |
+#   |                         |  _ \|  _| | |_) |                          |
+#   |                         | |_) | |___|  _ <                           |
+#   |                         |____/|_____|_| \_\                          |
+#   |                                                                      |
+#   +----------------------------------------------------------------------+
+#   | Encoding and decoding of the few ASN.1 types needed for SNMP         |
+#   '----------------------------------------------------------------------'
+
+
+def _encode_tlv(tag: int, payload: bytes) -> bytes:
+    length = len(payload)
+    if length < 0x80:
+        return bytes((tag, length)) + payload
+    encoded_length = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((tag, 0x80 | len(encoded_length))) + encoded_length + payload
+
+
+def _encode_integer(value: int) -> bytes:
+    return _encode_tlv(TAG_INTEGER, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def _encode_oid(oid: OID) -> bytes:
+    parts = [int(p) for p in oid.strip(".").split(".")]
+    if len(parts) < 2:
+        parts.append(0)
+    payload = bytearray()
+    for number in [40 * parts[0] + parts[1]] + parts[2:]:
+        chunk = [number & 0x7f]
+        number >>= 7
+        while number:
+            chunk.append(0x80 | (number & 0x7f))
+            number >>= 7
+        payload.extend(reversed(chunk))
+    return _encode_tlv(TAG_OID, bytes(payload))
+
+
+def encode_message(message: Message) -> bytes:
+    varbinds = b"".join(
+        _encode_tlv(TAG_SEQUENCE,
+                    _encode_oid(oid) + _encode_tlv(tag, value))
+        for oid, tag, value in message.varbinds)
+    pdu = _encode_tlv(
+        message.pdu_type,
+        _encode_integer(message.request_id) + _encode_integer(message.error_status) +
+        _encode_integer(message.error_index) + _encode_tlv(TAG_SEQUENCE, varbinds))
+    return _encode_tlv(
+        TAG_SEQUENCE,
+        _encode_integer(message.version) + _encode_tlv(TAG_OCTET_STRING, message.community) + pdu)
+
+
+def _decode_tlv(data: bytes,
+                offset: int,
+                expected_tag: Optional[int] = None) -> Tuple[int, int, int]:
+    """Return the tag, the start and the end of the payload of the TLV at offset"""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+    except IndexError:
+        raise ValueError("Truncated message")
+    offset += 2
+    if length & 0x80:
+        num_bytes = length & 0x7f
+        length = int.from_bytes(data[offset:offset + num_bytes], "big")
+        offset += num_bytes
+    if offset + length > len(data):
+        raise ValueError("Truncated message")
+    if expected_tag is not None and tag != expected_tag:
+        raise ValueError("Expected tag 0x%02x, got 0x%02x" % (expected_tag, tag))
+    return tag, offset, offset + length
+
+
+def _decode_integer(data: bytes, offset: int) -> Tuple[int, int]:
+    _tag, start, end = _decode_tlv(data, offset, TAG_INTEGER)
+    return int.from_bytes(data[start:end], "big", signed=True), end
+
+
+def _decode_oid(payload: bytes) -> OID:
+    parts: List[int] = []
+    number = 0
+    for byte in payload:
+        number = (number << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(number)
+            number = 0
+    if not parts:
+        raise ValueError("Empty OID")
+    first = min(parts[0] // 40, 2)
+    return "." + ".".join(map(str, [first, parts[0] - 40 * first] + parts[1:]))
+
+
+def decode_message(data: bytes) -> Message:
+    _tag, offset, _end = _decode_tlv(data, 0, TAG_SEQUENCE)
+    version, offset = _decode_integer(data, offset)
+    _tag, community_start, offset = _decode_tlv(data, offset, TAG_OCTET_STRING)
+    community = data[community_start:offset]
+    pdu_type, offset, _end = _decode_tlv(data, offset)
+    request_id, offset = _decode_integer(data, offset)
+    error_status, offset = _decode_integer(data, offset)
+    error_index, offset = _decode_integer(data, offset)
+
+    varbinds: List[Varbind] = []
+    _tag, offset, varbinds_end = _decode_tlv(data, offset, TAG_SEQUENCE)
+    while offset < varbinds_end:
+        _tag, varbind_start, offset = _decode_tlv(data, offset, TAG_SEQUENCE)
+        _tag, oid_start, oid_end = _decode_tlv(data, varbind_start, TAG_OID)
+        tag, value_start, value_end = _decode_tlv(data, oid_end)
+        varbinds.append((_decode_oid(data[oid_start:oid_end]), tag, data[value_start:value_end]))
+
+    return Message(version, community, pdu_type, request_id, error_status, error_index, varbinds)
+
+
+def decode_value(tag: int, value: bytes) -> SNMPRawValue:
+    """Convert a value to the representation of the other backends"""
+    if tag == TAG_INTEGER:
+        return b"%d" % int.from_bytes(value, "big", signed=True)
+    if tag in _UNSIGNED_TAGS:
+        return b"%d" % int.from_bytes(value, "big")
+    if tag == TAG_IP_ADDRESS:
+        return ".".join(str(b) for b in value).encode("ascii")
+    if tag == TAG_OID:
+        return _decode_oid(value).encode("ascii")
+    if tag == TAG_NULL:
+        return b""
+    return value
+
+
+#.
+#   .--Backend-------------------------------------------------------------.
+#   |                ____             _                  _                 |
+#   |               | __ )  __ _  ___| | _____ _ __   __| |                |
+#   |               |  _ \ / _` |/ __| |/ / _ \ '_ \ / _` |                |
+#   |               | |_) | (_| | (__|   <  __/ | | | (_| |                |
+#   |               |____/ \__,_|\___|_|\_\___|_| |_|\__,_|                |
+#   |                                                                      |
+#   '----------------------------------------------------------------------'
+
+
+class _Walk:
+    def __init__(self, oid: OID, max_repetitions: int) -> None:
+        super(_Walk, self).__init__()
+        self.oid = oid
+        self.prefix = oid + "."
+        self.next_oid = oid
+        self.max_repetitions = max_repetitions
+        self.rows: SNMPRowInfo = []
+
+
+class _Request:
+    def __init__(self, walk: _Walk, packet: bytes, deadline: float, retries: int) -> None:
+        super(_Request, self).__init__()
+        self.walk = walk
+        self.packet = packet
+        self.deadline = deadline
+        self.retries = retries
+
+
+class BulkSNMPBackend(ABCSNMPBackend):
+    """SNMP v1 and v2c client sending the requests of many walks at the same time
+
+    The walks are done with GETBULK requests on bulkwalk hosts and with GETNEXT
+    requests on all other hosts, like the classic backend does. Up to max_outstanding
+    requests of different walks are sent without waiting for the responses in
+    between. All columns of all sections of a host are walked at the same time,
+    when they are announced with prefetch().
+
+    SNMPv3 is not supported, the factory uses another backend for SNMPv3 hosts.
+    """
+    def __init__(self, snmp_config: SNMPHostConfig) -> None:
+        super(BulkSNMPBackend, self).__init__(snmp_config)
+        settings = snmp_config.bulk_backend_settings or {}
+        self._max_outstanding = max(1, settings.get("max_outstanding", 10))
+        self._timeout = snmp_config.timing.get("timeout", 1.0)
+        self._retries = snmp_config.timing.get("retries", 5)
+        self._prefetched: Dict[OID, SNMPRowInfo] = {}
+        self._request_id = random.randrange(1, 2**30)
+
+    @property
+    def _version(self) -> int:
+        if self.config.is_bulkwalk_host or self.config.is_snmpv2or3_without_bulkwalk_host:
+            return 1
+        return 0
+
+    def get(self,
+            oid: OID,
+            context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
+        if oid.endswith(".*"):
+            oid_prefix = oid[:-2]
+            pdu_type = PDU_GET_NEXT
+        else:
+            oid_prefix = oid
+            pdu_type = PDU_GET
+
+        with self._open_socket() as sock:
+            response = self._request(sock, pdu_type, oid_prefix)
+
+        if response.error_status != ERROR_NO_ERROR or not response.varbinds:
+            return None
+
+        response_oid, tag, value = response.varbinds[0]
+        if tag in (TAG_NO_SUCH_OBJECT, TAG_NO_SUCH_INSTANCE, TAG_END_OF_MIB_VIEW):
+            return None
+
+        # In case of .*, check if prefix is the one we are looking for
+        if pdu_type == PDU_GET_NEXT and not response_oid.startswith(oid_prefix + "."):
+            return None
+
+        return decode_value(tag, value)
+
+    def walk(self,
+             oid: OID,
+             check_plugin_name: Optional[str] = None,
+             table_base_oid: Optional[OID] = None,
+             context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
+        try:
+            return list(self._prefetched[oid])
+        except KeyError:
+            return self.walk_many([oid])[oid]
+
+    def prefetch(self, oids: List[OID]) -> None:
+        self._prefetched.update(self.walk_many(o for o in oids if o not in self._prefetched))
+
+    def walk_many(self, oids: Iterable[OID]) -> Dict[OID, SNMPRowInfo]:
+        """Walk all OIDs at the same time"""
+        walks = [_Walk(oid, self.config.bulk_walk_size_of) for oid in dict.fromkeys(oids)]
+        if not walks:
+            return {}
+
+        console.vverbose("Walking %d OIDs of %s with up to %d outstanding requests\n" %
+                         (len(walks), self.address, self._max_outstanding))
+        with self._open_socket() as sock:
+            self._run_walks(sock, collections.deque(walks))
+        return {walk.oid: walk.rows for walk in walks}
+
+    def _open_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if self.config.is_ipv6_primary else socket.AF_INET,
+                             socket.SOCK_DGRAM)
+        try:
+            sock.connect((self.address, self.config.port))
+        except socket.error as e:
+            sock.close()
+            raise MKSNMPError("SNMP Error on %s: %s" % (self.address, e))
+        return sock
+
+    def _next_request_id(self) -> int:
+        self._request_id = self._request_id % (2**31 - 1) + 1
+        return self._request_id
+
+    def _encode_request(self, request_id: int, pdu_type: int, oid: OID,
+                        max_repetitions: int) -> bytes:
+        if not isinstance(self.config.credentials, str):
+            raise TypeError()
+        return encode_message(
+            Message(
+                version=self._version,
+                community=self.config.credentials.encode("utf-8"),
+                pdu_type=pdu_type,
+                request_id=request_id,
+                error_status=0,
+                error_index=max_repetitions if pdu_type == PDU_GET_BULK else 0,
+                varbinds=[(oid, TAG_NULL, b"")],
+            ))
+
+    def _request(self, sock: socket.socket, pdu_type: int, oid: OID) -> Message:
+        request_id = self._next_request_id()
+        packet = self._encode_request(request_id, pdu_type, oid, 0)
+        for _attempt in range(self._retries + 1):
+            sock.send(packet)
+            deadline = time.monotonic() + self._timeout
+            while True:
+                response = self._receive(sock, deadline)
+                if response is None:
+                    break
+                if response.request_id == request_id:
+                    return response
+        raise MKSNMPError("Timeout: No Response from %s" % self.address)
+
+    def _receive(self, sock: socket.socket, deadline: float) -> Optional[Message]:
+        """Return the next valid response or None when the deadline is reached"""
+        while True:
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                return None
+            except socket.error as e:
+                # e.g. ICMP port unreachable of the previously sent request
+                raise MKSNMPError("SNMP Error on %s: %s" % (self.address, e))
+
+            try:
+                response = decode_message(data)
+            except ValueError as e:
+                console.vverbose("Ignoring invalid SNMP response from %s: %s\n" % (self.address, e))
+                continue
+            if response.pdu_type == PDU_RESPONSE:
+                return response
+
+    def _send_walk_request(self, sock: socket.socket, walk: _Walk,
+                           requests: Dict[int, _Request]) -> None:
+        request_id = self._next_request_id()
+        pdu_type = PDU_GET_BULK if self.config.is_bulkwalk_host else PDU_GET_NEXT
+        packet = self._encode_request(request_id, pdu_type, walk.next_oid, walk.max_repetitions)
+        sock.send(packet)
+        requests[request_id] = _Request(walk, packet,
+                                        time.monotonic() + self._timeout, self._retries)
+
+    def _run_walks(self, sock: socket.socket, pending: Deque[_Walk]) -> None:
+        requests: Dict[int, _Request] = {}
+        while pending or requests:
+            while pending and len(requests) < self._max_outstanding:
+                self._send_walk_request(sock, pending.popleft(), requests)
+
+            response = self._receive(sock, min(r.deadline for r in requests.values()))
+            if response is None:
+                self._retry_expired_requests(sock, requests)
+                continue
+
+            request = requests.pop(response.request_id, None)
+            if request is None:
+                continue  # Late answer to a request which has been sent again
+
+            if self._process_walk_response(request.walk, response):
+                pending.append(request.walk)
+
+    def _retry_expired_requests(self, sock: socket.socket, requests: Dict[int, _Request]) -> None:
+        now = time.monotonic()
+        for request in requests.values():
+            if request.deadline > now:
+                continue
+            if not request.retries:
+                raise MKSNMPError("Timeout: No Response from %s" % self.address)
+            request.retries -= 1
+            request.deadline = now + self._timeout
+            sock.send(request.packet)
+
+    def _process_walk_response(self, walk: _Walk, response: Message) -> bool:
+        """Add the rows of the response to the walk and return whether it needs to continue"""
+        if response.error_status == ERROR_TOO_BIG and walk.max_repetitions > 1:
+            walk.max_repetitions //= 2
+            return True
+
+        if response.error_status == ERROR_NO_SUCH_NAME:
+            return False  # SNMPv1 end of the MIB view
+
+        if response.error_status != ERROR_NO_ERROR:
+            raise MKSNMPError("SNMP Error on %s: %s while walking %s" % (
+                self.address,
+                _ERROR_NAMES.get(response.error_status, response.error_status),
+                walk.oid,
+            ))
+
+        for oid, tag, value in response.varbinds:
+            if tag == TAG_END_OF_MIB_VIEW or not oid.startswith(walk.prefix):
+                return False
+            if tag in (TAG_NO_SUCH_OBJECT, TAG_NO_SUCH_INSTANCE):
+                continue
+            if oid == walk.next_oid:
+                console.vverbose("Detected broken SNMP agent. OID %s is not increasing.\n" % oid)
+                return False
+            walk.rows.append((oid, decode_value(tag, value)))
+            walk.next_oid = oid
+
+        return bool(response.varbinds)
@@ -5,23 +5,144 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Abstract classes and types."""
 
-from typing import List, Optional, Tuple
+import array
+import mmap
+import os
+import re
+import struct
+from typing import Dict, Optional, Sequence, Tuple, Union
 
-from six import ensure_binary, ensure_str
+from six import ensure_str
 
 import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.cleanup
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException, MKSNMPError
 from cmk.utils.log import console
-from cmk.utils.type_defs import CheckPluginNameStr
+from cmk.utils.type_defs import CheckPluginNameStr, HostName
 
-import cmk.snmplib.snmp_cache as snmp_cache
 from cmk.snmplib.type_defs import ABCSNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
 
 from ._utils import strip_snmp_value
 
 __all__ = ["StoredWalkSNMPBackend"]
 
+_walk_cache: Dict[HostName, "StoredWalk"] = {}
+
+
+def _cleanup_walk_cache() -> None:
+    _walk_cache.clear()
+
+
+cmk.utils.cleanup.register_cleanup(_cleanup_walk_cache)
+
+
+class StoredWalk:
+    """Random access to the rows of a stored walk file
+
+    The OID lines of the walk are indexed by their offsets in the walk file,
+    sorted by the numeric OID. The index is persisted next to the walk as
+    ".HOSTNAME.index" and rebuilt when the walk file changes. Both files are
+    memory mapped, so walking a subtree only parses the OIDs visited by the
+    binary search and the rows that are returned.
+    """
+    _magic = b"CMKWALKINDEX1\n"
+    # Size and mtime (in ns) of the indexed walk file
+    _header = struct.Struct("<QQ")
+    _oid_pattern = re.compile(rb"[^ \t\r\n]*")
+
+    def __init__(self, path: str) -> None:
+        super(StoredWalk, self).__init__()
+        self.path = path
+        with open(path, "rb") as f:
+            self._walk_stat = self._header.pack(
+                os.fstat(f.fileno()).st_size,
+                os.fstat(f.fileno()).st_mtime_ns)
+            self._data = self._map(f)
+        self._offsets = self._load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(os.path.dirname(self.path), ".%s.index" % os.path.basename(self.path))
+
+    @staticmethod
+    def _map(f) -> Union[mmap.mmap, bytes]:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""  # An empty file can not be mapped
+
+    def _load_index(self) -> Sequence[int]:
+        header = self._magic + self._walk_stat
+        try:
+            with open(self.index_path, "rb") as f:
+                index = self._map(f)
+            if index[:len(header)] == header:
+                return memoryview(index)[len(header):].cast("Q")
+        except (IOError, ValueError, TypeError):
+            pass
+
+        console.vverbose("  Building index of %s\n" % self.path)
+        offsets = self._build_index()
+        try:
+            store.save_bytes_to_file(self.index_path, header + offsets.tobytes())
+        except MKGeneralException as e:
+            # Not being able to persist the index only makes the next run slower
+            console.vverbose("  Cannot write index: %s\n" % e)
+        return offsets
+
+    def _build_index(self) -> array.array:
+        keyed_offsets = []
+        offset = 0
+        while offset < len(self._data):
+            line_end = self._data.find(b"\n", offset)
+            if line_end == -1:
+                line_end = len(self._data)
+            # Lines not starting with a dot continue the value of the previous OID
+            if self._data[offset:offset + 1] == b".":
+                try:
+                    keyed_offsets.append((self._oid_key(offset), offset))
+                except MKGeneralException:
+                    pass  # Ignore lines with invalid OIDs, they can not be looked up anyways
+            offset = line_end + 1
+        keyed_offsets.sort()
+        return array.array("Q", (offset for _key, offset in keyed_offsets))
+
+    def _oid_key(self, offset: int) -> Tuple[int, ...]:
+        match = self._oid_pattern.match(self._data, offset)
+        assert match is not None
+        return StoredWalkSNMPBackend._to_bin_string(ensure_str(match.group()))
+
+    def _bisect(self, oid_prefix: Tuple[int, ...], hit: int) -> int:
+        """Find the first row for which the comparison with oid_prefix is less than hit"""
+        begin, end = 0, len(self._offsets)
+        while begin < end:
+            current = (begin + end) // 2
+            if _compare_oid_keys(oid_prefix, self._oid_key(self._offsets[current])) >= hit:
+                begin = current + 1
+            else:
+                end = current
+        return begin
+
+    def rows(self, oid_prefix: Tuple[int, ...]) -> SNMPRowInfo:
+        """Return all rows of the given OID and below"""
+        rows = []
+        for index in range(self._bisect(oid_prefix, 1), self._bisect(oid_prefix, 0)):
+            offset = self._offsets[index]
+            line_end = self._data.find(b"\n", offset)
+            parts = self._data[offset:len(self._data) if line_end == -1 else line_end].split(
+                None, 1)
+            value = ensure_str(agent_simulator.process(parts[1])) if len(parts) > 1 else ""
+            rows.append((ensure_str(parts[0]), strip_snmp_value(value)))
+        return rows
+
+
+def _compare_oid_keys(a: Tuple[int, ...], b: Tuple[int, ...]) -> int:
+    if len(a) <= len(b) and b[:len(a)] == a:
+        return 0
+    return (a > b) - (a < b)
+
 
 class StoredWalkSNMPBackend(ABCSNMPBackend):
     def get(self,
@@ -51,56 +172,31 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             oid_prefix = oid
             dot_star = False
 
-        if snmp_cache.host_cache_contains(self.config.hostname):
-            lines = snmp_cache.host_cache_get(self.config.hostname)
-        else:
-            path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
-            console.vverbose("  Loading %s from %s\n" % (oid, path))
-            try:
-                lines = open(path).readlines()
-            except IOError:
-                raise MKSNMPError("No snmpwalk file %s" % path)
-            snmp_cache.host_cache_set(self.config.hostname, lines)
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            # skip over values including newlines to the next oid
-            while not lines[current].startswith(".") and current < end:
-                current += 1
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
-                break
-            if hit == 1:  # we are too low
-                begin = current + 1
-            else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
-
+        rowinfo = self._stored_walk().rows(self._to_bin_string(oid_prefix))
         if dot_star:
-            return [rowinfo[0]]
+            # Like GETNEXT: The first OID below the given one
+            return [row for row in rowinfo if row[0] != "." + oid_prefix][:1]
 
         return rowinfo
 
+    def _stored_walk(self) -> StoredWalk:
+        try:
+            return _walk_cache[self.config.hostname]
+        except KeyError:
+            pass
+
+        path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
+        console.vverbose("  Loading %s\n" % path)
+        try:
+            stored_walk = _walk_cache[self.config.hostname] = StoredWalk(path)
+        except IOError:
+            raise MKSNMPError("No snmpwalk file %s" % path)
+        return stored_walk
+
     @staticmethod
     def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[:len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
+        return _compare_oid_keys(StoredWalkSNMPBackend._to_bin_string(a),
+                                 StoredWalkSNMPBackend._to_bin_string(b))
 
     @staticmethod
     def _to_bin_string(oid: OID) -> Tuple[int, ...]:
@@ -108,33 +204,3 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             return tuple(map(int, oid.strip(".").split(".")))
         except Exception:
             raise MKGeneralException("Invalid OID %s" % oid)
-
-    @staticmethod
-    def _collect_until(oid: OID, oid_prefix: OID, lines: List[str], index: int,
-                       direction: int) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith('.'):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong os horrible...
-                    value = ensure_str(agent_simulator.process(ensure_binary(parts[1])))
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(('.' + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
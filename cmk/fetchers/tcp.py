@@ -4,11 +4,12 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import asyncio
 import logging
 import socket
 from hashlib import sha256, md5
 from types import TracebackType
-from typing import Dict, List, Optional, Tuple, Type
+from typing import Dict, List, Mapping, Optional, Tuple, Type, TypeVar, Union
 
 from Cryptodome.Cipher import AES
 
@@ -17,6 +18,8 @@ from cmk.utils.type_defs import HostAddress, RawAgentData
 
 from ._base import AbstractDataFetcher, MKFetcherError
 
+_TKey = TypeVar("_TKey")
+
 
 class TCPDataFetcher(AbstractDataFetcher):
     def __init__(
@@ -82,6 +85,38 @@ class TCPDataFetcher(AbstractDataFetcher):
                 raise
             raise MKFetcherError("Communication failed: %s" % e)
 
+    async def async_data(self) -> RawAgentData:
+        """Fetch the data like data() does, but without blocking the event loop
+
+        The connection is opened and closed by this method, the fetcher must not be
+        entered for this.
+        """
+        self._logger.debug("Connecting via TCP to %s:%d (%ss timeout)", self._address[0],
+                           self._address[1], self._timeout)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._address[0], self._address[1], family=self._family),
+                self._timeout,
+            )
+        except asyncio.TimeoutError:
+            raise MKFetcherError("Timeout connecting to %s:%d" %
+                                 (self._address[0], self._address[1]))
+        except socket.error as e:
+            raise MKFetcherError("Failed to connect to %s:%d: %s" %
+                                 (self._address[0], self._address[1], e))
+
+        try:
+            self._logger.debug("Reading data from agent")
+            output = await reader.read()
+        except socket.error as e:
+            raise MKFetcherError("Communication failed: %s" % e)
+        finally:
+            self._logger.debug("Closing TCP connection to %s:%d", self._address[0],
+                               self._address[1])
+            writer.close()
+
+        return self._decrypt(output)
+
     def _decrypt(self, output: RawAgentData) -> RawAgentData:
         if output.startswith(b"<<<"):
             self._logger.debug("Output is not encrypted")
@@ -135,3 +170,42 @@ class TCPDataFetcher(AbstractDataFetcher):
         decrypted_pkg = decryption_suite.decrypt(encrypted_pkg)
         # Strip of fill bytes of openssl
         return decrypted_pkg[0:-decrypted_pkg[-1]]
+
+
+def fetch_concurrently(
+    fetchers: Mapping[_TKey, TCPDataFetcher],
+    timeout: float,
+    max_concurrent: int = 100,
+) -> Dict[_TKey, Union[RawAgentData, MKFetcherError]]:
+    """Fetch the data of many TCP agents at the same time in one process
+
+    At most max_concurrent connections are open at the same time. Each fetch has to
+    be finished within timeout seconds, including the time to connect. Failed fetches
+    are returned as the exception describing the error.
+    """
+    return asyncio.run(_fetch_concurrently(fetchers, timeout, max_concurrent))
+
+
+async def _fetch_concurrently(
+    fetchers: Mapping[_TKey, TCPDataFetcher],
+    timeout: float,
+    max_concurrent: int,
+) -> Dict[_TKey, Union[RawAgentData, MKFetcherError]]:
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def fetch(fetcher: TCPDataFetcher) -> Union[RawAgentData, MKFetcherError]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(fetcher.async_data(), timeout)
+            except asyncio.TimeoutError:
+                return MKFetcherError("Timeout after %s seconds" % timeout)
+            except MKFetcherError as e:
+                return e
+            except Exception as e:
+                if cmk.utils.debug.enabled():
+                    raise
+                return MKFetcherError("%s" % e)
+
+    keys = list(fetchers)
+    results = await asyncio.gather(*(fetch(fetchers[key]) for key in keys))
+    return dict(zip(keys, results))
@@ -19,7 +19,9 @@ import cmk.utils.store as store
 from cmk.utils.type_defs import HostName, ServiceName
 
 import cmk.gui.utils as utils
+import cmk.gui.availability_store as availability_store
 import cmk.gui.bi as bi
+import cmk.gui.config as config
 import cmk.gui.sites as sites
 from cmk.gui.view_utils import CSSClass
 from cmk.gui.type_defs import Rows, Row
@@ -673,6 +675,29 @@ def get_availability_rawdata(what, context, filterheaders, only_sites, av_object
 
     time_range, _range_title = avoptions["range"]
 
+    if _may_use_availability_store(what, av_object, include_output, include_long_output, avoptions):
+        site_ids = only_sites or [
+            site_id for site_id, site_status in sites.states().items()
+            if site_status.get("state") == "online"
+        ]
+        materialized = availability_store.AvailabilityStore().materialized_days(
+            site_ids, *time_range)
+        if materialized:
+            return _get_availability_rawdata_with_store(what, filterheaders, site_ids, avoptions,
+                                                        time_range, materialized)
+
+    spans, logrow_limit_reached_entry = _query_availability_spans(what, context, filterheaders,
+                                                                  only_sites, av_object,
+                                                                  include_output,
+                                                                  include_long_output, avoptions,
+                                                                  time_range)
+    return spans_by_object(spans, logrow_limit_reached_entry)
+
+
+def _query_availability_spans(what: AVObjectType, context, filterheaders: str, only_sites,
+                              av_object: AVObjectSpec, include_output: bool,
+                              include_long_output: bool, avoptions: AVOptions,
+                              time_range: AVTimeRange) -> _Tuple[List[AVSpan], _Optional[AVSpan]]:
     av_filter = "Filter: time >= %d\nFilter: time < %d\n" % time_range
     if av_object:
         tl_site, tl_host, tl_service = av_object
@@ -742,7 +767,83 @@ def get_availability_rawdata(what, context, filterheaders, only_sites, av_object
     if logrow_limit and len(data) >= logrow_limit + 1:
         logrow_limit_reached_entry = dict(zip(columns, data[-1]))
 
-    return spans_by_object(spans, logrow_limit_reached_entry)
+    return spans, logrow_limit_reached_entry
+
+
+# The materialized daily durations of availability_store can be used when the
+# result only depends on the summed up durations of the spans of each object.
+def _may_use_availability_store(what: AVObjectType, av_object: AVObjectSpec, include_output: bool,
+                                include_long_output: bool, avoptions: AVOptions) -> bool:
+    os_aggrs, os_states = get_outage_statistic_options(avoptions)
+    return bool(config.availability_store_days and what in ["host", "service"] and not av_object and
+                not include_output and not include_long_output and
+                not avoptions["show_timeline"] and not avoptions["short_intervals"] and
+                not (os_aggrs and os_states) and avoptions["grouping"] in [None, "host"])
+
+
+def _get_availability_rawdata_with_store(what: AVObjectType, filterheaders: str,
+                                         site_ids: List[SiteId], avoptions: AVOptions,
+                                         time_range: AVTimeRange,
+                                         materialized: _Tuple[int, int]) -> _Tuple[AVRawData, bool]:
+    """Combine the durations of the materialized days with the live history of the rest
+
+    The live history of the partial day at the start and of the last day of the time range
+    determines the objects matching the filters. Objects not existing anymore in the last day
+    are thus not shown. Hosts having annotations within the materialized days are completely
+    computed from the live history, so that the annotations are applied to their real spans."""
+    store_from, store_until = materialized
+    live_spans: List[List[AVSpan]] = []
+    logrow_limit_reached_entry: _Optional[AVSpan] = None
+    for window in [(time_range[0], store_from), (store_until, time_range[1])]:
+        window_spans: List[AVSpan] = []
+        if window[0] < window[1]:
+            window_spans, limit_entry = _query_availability_spans(what, {}, filterheaders, site_ids,
+                                                                  None, False, False, avoptions,
+                                                                  window)
+            logrow_limit_reached_entry = logrow_limit_reached_entry or limit_entry
+        live_spans.append(window_spans)
+    head_spans, tail_spans = live_spans
+
+    objects: Dict[_Tuple[SiteId, HostName, ServiceName], AVSpan] = {}
+    for span in head_spans + tail_spans:
+        objects.setdefault((span["site"], span["host_name"], span["service_description"]), span)
+
+    object_hosts = {(site, host_name) for site, host_name, _service in objects}
+    annotated_hosts: Set[SiteHost] = set()
+    for (site, host_name, _service), entries in load_annotations().items():
+        if (site, host_name) in object_hosts and any(
+                entry["from"] < store_until and entry["until"] > store_from for entry in entries):
+            annotated_hosts.add((site, host_name))
+
+    middle_spans: List[AVSpan] = []
+    if annotated_hosts:
+        host_filter = "".join(
+            "Filter: host_name = %s\n" % host_name for _site, host_name in sorted(annotated_hosts))
+        if len(annotated_hosts) > 1:
+            host_filter += "Or: %d\n" % len(annotated_hosts)
+        raw_spans, limit_entry = _query_availability_spans(what, {}, filterheaders + host_filter,
+                                                           site_ids, None, False, False, avoptions,
+                                                           (store_from, store_until))
+        middle_spans += [
+            span for span in raw_spans
+            if (span["site"], span["host_name"], span["service_description"]) in objects and
+            (span["site"], span["host_name"]) in annotated_hosts
+        ]
+        if limit_entry and (limit_entry["site"], limit_entry["host_name"],
+                            limit_entry["service_description"]) in objects:
+            logrow_limit_reached_entry = logrow_limit_reached_entry or limit_entry
+
+    for span in availability_store.AvailabilityStore().spans(site_ids, what, store_from,
+                                                             store_until):
+        live_span = objects.get((span["site"], span["host_name"], span["service_description"]))
+        if live_span is None or (span["site"], span["host_name"]) in annotated_hosts:
+            continue
+        for column in ["service_display_name", "host_alias"]:
+            if column in live_span:
+                span[column] = live_span[column]
+        middle_spans.append(span)
+
+    return spans_by_object(head_spans + middle_spans + tail_spans, logrow_limit_reached_entry)
 
 
 def filter_groups_of_entries(context, avoptions, spans):
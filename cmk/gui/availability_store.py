@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Materialized daily state durations of the monitoring history
+
+Computing the availability of a long time range means fetching and classifying
+every state history span of all objects in the range via livestatus. The spans
+of completed days do not change anymore, so the cron job
+update_availability_store() sums up the durations of each day once per object
+and combination of the columns the availability computation classifies the
+spans by. These sums are kept in a SQLite database below var/availability.
+
+cmk.gui.availability combines the sums of the materialized days with the live
+state history of the partial days at the start and the end of a time range.
+The sums are returned as synthetic spans: one span per object and combination
+of the classification columns covering the materialized days, having the summed
+up duration.
+"""
+
+import datetime
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from livestatus import MKLivestatusException, SiteId
+
+import cmk.utils.paths
+from cmk.utils.type_defs import HostName, ServiceName
+
+import cmk.gui.config as config
+import cmk.gui.sites as sites
+from cmk.gui.log import logger
+
+# The columns of the state history the availability computation classifies by
+KEY_COLUMNS = [
+    "state",
+    "host_down",
+    "in_downtime",
+    "in_host_downtime",
+    "in_notification_period",
+    "in_service_period",
+    "is_flapping",
+]
+
+# Completed days are materialized after this time, so that the monitoring core
+# has written the state changes of the day to its history
+_SETTLE_TIME = 3600
+
+# Limit the number of days materialized per run of the cron job
+_MAX_DAYS_PER_RUN = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    site TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    PRIMARY KEY (site, day)
+);
+CREATE TABLE IF NOT EXISTS durations (
+    site TEXT NOT NULL,
+    host_name TEXT NOT NULL,
+    service_description TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    %s,
+    duration INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS durations_site_day ON durations (site, day);
+""" % ",\n    ".join("%s INTEGER" % column for column in KEY_COLUMNS)
+
+DayStart = int
+DurationKey = Tuple[HostName, ServiceName, Tuple[Optional[int], ...]]
+
+
+def day_start(timestamp: float) -> DayStart:
+    """The local midnight starting the day of the timestamp"""
+    return int(time.mktime(datetime.date.fromtimestamp(timestamp).timetuple()))
+
+
+def days_between(from_time: float, until_time: float) -> List[DayStart]:
+    """The starts of the days completely within the time range"""
+    day = datetime.date.fromtimestamp(from_time)
+    if day_start(from_time) < from_time:
+        day += datetime.timedelta(days=1)
+
+    days = []
+    while True:
+        start = int(time.mktime(day.timetuple()))
+        day += datetime.timedelta(days=1)
+        if time.mktime(day.timetuple()) > until_time:
+            return days
+        days.append(start)
+
+
+def day_end(day: DayStart) -> int:
+    return int(
+        time.mktime((datetime.date.fromtimestamp(day) + datetime.timedelta(days=1)).timetuple()))
+
+
+class AvailabilityStore:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self._path = path or Path(cmk.utils.paths.var_dir, "availability", "store.sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self._path), timeout=10)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def days(self, site_id: SiteId) -> Set[DayStart]:
+        if not self._path.exists():
+            return set()
+        with closing(self._connect()) as connection:
+            return {
+                day
+                for day, in connection.execute("SELECT day FROM days WHERE site = ?", (site_id,))
+            }
+
+    def add_day(self, site_id: SiteId, day: DayStart, durations: Dict[DurationKey, int]) -> None:
+        """Replace the durations of the day in one transaction"""
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM durations WHERE site = ? AND day = ?", (site_id, day))
+            connection.executemany(
+                "INSERT INTO durations VALUES (?, ?, ?, ?, %s, ?)" %
+                ", ".join("?" * len(KEY_COLUMNS)),
+                ((site_id, host_name, service_description, day) + key_values + (duration,)
+                 for (host_name, service_description, key_values), duration in durations.items()))
+            connection.execute("INSERT OR REPLACE INTO days VALUES (?, ?)", (site_id, day))
+
+    def remove_days_before(self, site_id: SiteId, day: DayStart) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM durations WHERE site = ? AND day < ?", (site_id, day))
+            connection.execute("DELETE FROM days WHERE site = ? AND day < ?", (site_id, day))
+
+    def spans(self, site_ids: Iterable[SiteId], what: str, from_day: DayStart,
+              until_day: DayStart) -> List[Dict[str, Any]]:
+        """The synthetic spans of the hosts or services of the days in [from_day, until_day)"""
+        site_ids = list(site_ids)
+        if not site_ids or not self._path.exists():
+            return []
+
+        key_columns = ", ".join(KEY_COLUMNS)
+        query = ("SELECT site, host_name, service_description, %s, SUM(duration) FROM durations "
+                 "WHERE site IN (%s) AND day >= ? AND day < ? AND service_description %s '' "
+                 "GROUP BY site, host_name, service_description, %s" % (key_columns, ", ".join(
+                     "?" * len(site_ids)), "!=" if what == "service" else "=", key_columns))
+        columns = ["site", "host_name", "service_description"] + KEY_COLUMNS + ["duration"]
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, site_ids + [from_day, until_day]).fetchall()
+
+        spans = []
+        for row in rows:
+            span = dict(zip(columns, row))
+            span["from"] = from_day
+            span["until"] = until_day
+            spans.append(span)
+        return spans
+
+    def materialized_days(self, site_ids: Iterable[SiteId], from_time: float,
+                          until_time: float) -> Optional[Tuple[DayStart, DayStart]]:
+        """The range of the complete days of the time range materialized for all sites
+
+        The day containing the end of the time range is never taken from the store.
+        Returns None in case not all of these days are materialized."""
+        days = days_between(from_time, day_start(until_time - 1))
+        if not days:
+            return None
+        for site_id in site_ids:
+            if not set(days) <= self.days(site_id):
+                return None
+        return days[0], day_end(days[-1])
+
+
+def aggregate_durations(rows: Iterable[List[Any]]) -> Dict[DurationKey, int]:
+    """Sum up rows of host name, service description, duration and the KEY_COLUMNS"""
+    durations: Dict[DurationKey, int] = {}
+    for row in rows:
+        key = row[0], row[1], tuple(row[3:])
+        durations[key] = durations.get(key, 0) + row[2]
+    return durations
+
+
+def _query_day(site_id: SiteId, day: DayStart) -> List[List[Any]]:
+    query = ("GET statehist\n"
+             "Filter: time >= %d\n"
+             "Filter: time < %d\n"
+             "Columns: host_name service_description duration %s\n" %
+             (day, day_end(day), " ".join(KEY_COLUMNS)))
+    with sites.only_sites(site_id):
+        return sites.live().query(query)
+
+
+def update_availability_store() -> None:
+    """Materialize the completed days missing in the store (cron job)"""
+    if not config.availability_store_days:
+        return
+
+    store = AvailabilityStore()
+    now = time.time()
+    oldest_day = day_start(now - config.availability_store_days * 86400)
+    for site_id, site_status in sites.states().items():
+        if site_status.get("state") != "online":
+            continue
+
+        materialized = store.days(site_id)
+        missing = [
+            day for day in days_between(oldest_day, now - _SETTLE_TIME) if day not in materialized
+        ]
+        for day in sorted(missing, reverse=True)[:_MAX_DAYS_PER_RUN]:
+            try:
+                durations = aggregate_durations(_query_day(site_id, day))
+            except MKLivestatusException:
+                logger.exception("Failed to fetch the state history of site %s", site_id)
+                break
+            store.add_day(site_id, day, durations)
+
+        store.remove_days_before(site_id, oldest_day)
@@ -55,6 +55,8 @@ BIHostSpec = Tuple[SiteId, HostName]
 BIStatusInfoRow = LivestatusRow  # TODO: Improve this type
 BIStatusInfo = Dict[BIHostSpec, BIStatusInfoRow]
 BINeededHosts = Set[BIHostSpec]
+BIHostFingerprints = Dict[BIHostSpec, Tuple[str, str]]
+BIChangedHosts = Dict[BIHostSpec, Set[str]]
 BIAggregationGroupTitle = str
 BIAggregationTitle = str
 BITreeState = Any  # TODO: Improve this type
@@ -170,7 +172,6 @@ NT_PLACEHOLDER = 4  # temporary dummy entry needed for REMAINING
 g_bi_cache_manager: 'Optional[BICacheManager]' = None
 g_bi_sitedata_manager: 'Optional[BISitedataManager]' = None
 g_bi_job_manager: 'Optional[BIJobManager]' = None
-g_services_items = None
 g_services: Dict[BIHostSpec, Tuple[Any, Any, Any, Any, Any]] = {}
 g_services_by_hostname: Dict[HostName, List[Tuple[SiteId, Tuple[Any, Any, Any, Any, Any]]]] = {}
 g_remaining_refs: List[Tuple[BIHostSpec, Any, Any]] = []
@@ -183,8 +184,16 @@ did_compilation = False  # Is set to true if anything has been compiled
 
 regex_host_hit_cache: Set[Tuple[Any, Any]] = set()
 regex_host_miss_cache: Set[Tuple[Any, Any]] = set()
-regex_svc_hit_cache: Set[Tuple[Any, Any]] = set()
-regex_svc_miss_cache: Set[Tuple[Any, Any]] = set()
+
+# The hosts of g_services matching a host name or alias pattern and the services
+# matching a service pattern, see matching_hosts() and matching_services()
+g_host_match_index: Dict[Tuple[Any, bool], List[Tuple[BIHostSpec, Any]]] = {}
+g_service_match_index: Dict[str, Dict[ServiceName, Tuple[str, ...]]] = {}
+g_service_names: Set[ServiceName] = set()
+g_match_index_source: Optional[Dict[BIHostSpec, Any]] = None
+
+# What the aggregation currently compiled by a JobWorker depends on, see get_affected_jobs()
+g_compile_dependencies: Dict[str, Any] = {}
 
 
 # Load the static configuration of all services and hosts (including tags)
@@ -393,7 +402,6 @@ class JobWorker(multiprocessing.Process):
         aggr_type, aggr_idx, groups = job
 
         global g_services
-        global g_services_items
         global g_services_by_hostname
 
         # Prepare service globals for this job
@@ -415,7 +423,7 @@ class JobWorker(multiprocessing.Process):
                 if key in hostnames:
                     g_services_by_hostname[key] = values
 
-        g_services_items = list(g_services.items())
+        reset_compile_dependencies()
 
         log("Compiling aggregation %d/%d: %r with %d hosts" % (
             aggr_type,
@@ -525,6 +533,9 @@ class JobWorker(multiprocessing.Process):
                         group,
                         aggr_hash,
                     ))
+
+        new_data["dependencies"] = dict(g_compile_dependencies,
+                                        aggregation=aggregation_fingerprint(job))
         return new_data
 
 
@@ -648,14 +659,14 @@ class BICacheFile:
         except OSError:
             return False
 
-    def load(self):
+    def load(self, force=False):
         try:
             filestats = os.stat(self._filepath)
             if filestats.st_size == 0:
                 self._cached_data = None
                 return None
 
-            if (not self._filetime or self._filetime != filestats.st_mtime):
+            if force or not self._filetime or self._filetime != filestats.st_mtime:
                 with BILock(self._filepath, shared=True):
                     log("Loaded data from %s" % self._filepath)
                     self._cached_data = marshal_load_data(self._filepath)
@@ -1020,9 +1031,14 @@ class BIJobManager:
                 g_bi_cache_manager.load_cachefile()
                 return
 
-            log("Do compilation, discarding old caches")
-            self._queued_jobs = self._get_all_jobs()
-            self._prepare_compilation(discard_old_cache=True)
+            if self._prepare_incremental_compilation():
+                log("Do incremental compilation")
+                self._queued_jobs = self._get_all_missing_jobs()
+                self._prepare_compilation()
+            else:
+                log("Do compilation, discarding old caches")
+                self._queued_jobs = self._get_all_jobs()
+                self._prepare_compilation(discard_old_cache=True)
             self._set_compilation_info(current_sitestats)
 
             error_info = ""
@@ -1048,7 +1064,10 @@ class BIJobManager:
             except MKConfigError as e:
                 error_info += str(e)
 
-            g_bi_cache_manager.get_compiled_trees()["compiled_all"] = True
+            compiled_trees = g_bi_cache_manager.get_compiled_trees()
+            compiled_trees["compiled_all"] = True
+            compiled_trees["host_fingerprints"] = host_fingerprints(
+                g_bi_sitedata_manager.get_data()["services"])
             g_bi_cache_manager.generate_cachefiles(error_info=error_info)
 
         # Everything is compiled, clear cached data
@@ -1056,6 +1075,39 @@ class BIJobManager:
         g_bi_cache_manager.discard_cachefile_data()
         return True  # Did compilation
 
+    # Keeps the compiled aggregations not affected by the changes of the hosts and the
+    # configuration since the last compilation. Returns False if the cache does not
+    # allow this, e.g. because it has been compiled by a former version.
+    def _prepare_incremental_compilation(self) -> bool:
+        if g_bi_cache_manager is None:
+            raise Exception("_prepare_incremental_compilation: g_bi_cache_manager is None")
+        if g_bi_sitedata_manager is None:
+            raise Exception("_prepare_incremental_compilation: g_bi_sitedata_manager is None")
+
+        if not g_bi_cache_manager.load_cachefile_for_update():
+            return False
+
+        compiled_trees = g_bi_cache_manager.get_compiled_trees()
+        if not compiled_trees["host_fingerprints"]:
+            return False
+
+        changed_hosts = get_changed_hosts(
+            compiled_trees["host_fingerprints"],
+            host_fingerprints(g_bi_sitedata_manager.get_data()["services"]))
+        affected_jobs = get_affected_jobs(compiled_trees, changed_hosts)
+        log("Changed hosts: %d, affected jobs: %r" % (len(changed_hosts), sorted(affected_jobs)))
+
+        # The compilation info of the sites is written anew when the compilation is done
+        g_bi_cache_manager.truncate_cacheinfofile()
+        g_bi_cache_manager.invalidate(affected_jobs, set(changed_hosts))
+        return True
+
+    def _get_all_missing_jobs(self) -> List[Dict[str, Any]]:
+        if g_bi_sitedata_manager is None:
+            raise Exception("_get_all_missing_jobs: g_bi_sitedata_manager is None")
+        missing_jobs = self.get_missing_jobs(None, None, g_bi_sitedata_manager.get_all_hosts())
+        return [{"id": aggr_id, "info": info} for aggr_id, info in missing_jobs.items()]
+
     def _get_all_jobs(self) -> List[Dict[str, Any]]:
         if g_bi_sitedata_manager is None:
             raise Exception("_get_all_jobs: g_bi_sitedata_manager is None")
@@ -1108,6 +1160,11 @@ class BICacheManager:
             "compiled_host_aggr": {},
             "compiled_multi_aggr": {},
 
+            # Parameters for the incremental compilation
+            "dependencies": {},
+            "job_refs": {},
+            "host_fingerprints": {},
+
             # Parameters to slim the cache file
             "aggr_ref": {},
             "forest_ref": {},
@@ -1136,6 +1193,9 @@ class BICacheManager:
         self._bicache_file.truncate()
         self._bicacheinfo_file.truncate()
 
+    def truncate_cacheinfofile(self):
+        self._bicacheinfo_file.truncate()
+
     def get_online_sites(self):
         cacheinfo_content = self.get_bicacheinfo()
         return cacheinfo_content.get('compiled_sites', []) if cacheinfo_content else []
@@ -1186,39 +1246,51 @@ class BICacheManager:
             log("Cachefile has no new data - Sitestats also valid")
             return True
 
-        def reinstiate_references(cachefile_content):
-            self._compiled_trees = cachefile_content
-            self._compiled_trees["forest"] = {}
-
-            for what in [
-                    "aggregations_by_hostname",
-                    "host_aggregations",
-                    "affected_hosts",
-                    "affected_services",
-            ]:
-                self._compiled_trees[what] = {}
-                for key, values in self._compiled_trees["%s_ref" % what].items():
-                    self._compiled_trees[what].setdefault(key, [])
-                    for value in values:
-                        new_value = value
-                        if isinstance(value[1], str):  # a reference
-                            new_value = self._compiled_trees["aggr_ref"][value[1]]
-                        self._compiled_trees[what][key].append((value[0], new_value))
-
-            for key, values in self._compiled_trees["forest_ref"].items():
-                self._compiled_trees["forest"][key] = []
-                for aggr in values:
-                    new_value = aggr
-                    if isinstance(aggr, str):
-                        new_value = self._compiled_trees["aggr_ref"][aggr]
-                    self._compiled_trees["forest"][key].append(new_value)
-
         cachefile_content = self._bicache_file.load()
         if cachefile_content:
-            reinstiate_references(cachefile_content)
+            self._reinstantiate_references(cachefile_content)
 
         return True
 
+    # Loads the cachefile regardless of the sitestats it was compiled for, in order to
+    # update it incrementally. Returns False if there is no cachefile.
+    def load_cachefile_for_update(self):
+        cachefile_content = self._bicache_file.load(force=True)
+        if not cachefile_content:
+            return False
+
+        self._reinstantiate_references(cachefile_content)
+        return True
+
+    def _reinstantiate_references(self, cachefile_content):
+        self._compiled_trees = cachefile_content
+        self._compiled_trees["forest"] = {}
+        for what, value in BICacheManager.empty_compiled_tree().items():
+            self._compiled_trees.setdefault(what, value)
+
+        for what in [
+                "aggregations_by_hostname",
+                "host_aggregations",
+                "affected_hosts",
+                "affected_services",
+        ]:
+            self._compiled_trees[what] = {}
+            for key, values in self._compiled_trees["%s_ref" % what].items():
+                self._compiled_trees[what].setdefault(key, [])
+                for value in values:
+                    new_value = value
+                    if isinstance(value[1], str):  # a reference
+                        new_value = self._compiled_trees["aggr_ref"][value[1]]
+                    self._compiled_trees[what][key].append((value[0], new_value))
+
+        for key, values in self._compiled_trees["forest_ref"].items():
+            self._compiled_trees["forest"][key] = []
+            for aggr in values:
+                new_value = aggr
+                if isinstance(aggr, str):
+                    new_value = self._compiled_trees["aggr_ref"][aggr]
+                self._compiled_trees["forest"][key].append(new_value)
+
     def generate_cachefiles(self, error_info=""):
         self._save_cacheinfofile(error_info=error_info)
         self._save_cachefile()
@@ -1270,6 +1342,9 @@ class BICacheManager:
             "compiled_host_aggr",
             "compiled_multi_aggr",
             "compiled_all",
+            "dependencies",
+            "job_refs",
+            "host_fingerprints",
         ]
         cache_to_dump = {}
         for what in keys_for_cachefile:
@@ -1314,6 +1389,20 @@ class BICacheManager:
         job_id = job["id"]
         aggr_type, _idx, _aggr_groups = job_id
 
+        self._compiled_trees["job_refs"].setdefault(job_id, []).extend(new_data.get("aggr_ref", {}))
+        dependencies = new_data.get("dependencies")
+        if dependencies:
+            known_dependencies = self._compiled_trees["dependencies"].setdefault(
+                job_id, {
+                    "rules": {},
+                    "hosts": set(),
+                    "patterns": set(),
+                })
+            known_dependencies["aggregation"] = dependencies["aggregation"]
+            known_dependencies["rules"].update(dependencies["rules"])
+            known_dependencies["hosts"].update(dependencies["hosts"])
+            known_dependencies["patterns"].update(dependencies["patterns"])
+
         if aggr_type == AGGR_HOST:
             self._compiled_trees["compiled_host_aggr"].setdefault(job_id,
                                                                   {"compiled_hosts": set([])})
@@ -1323,6 +1412,56 @@ class BICacheManager:
             self._compiled_trees["compiled_multi_aggr"].setdefault(job_id, {})
             self._compiled_trees["compiled_multi_aggr"][job_id]["compiled"] = True
 
+    # Removes the compiled aggregations of the affected jobs and the aggregations of single
+    # host aggregation jobs requiring one of the changed hosts. These are compiled again
+    # by the next compilation.
+    def invalidate(self, affected_jobs, changed_hosts):
+        trees = self._compiled_trees
+        removed = set()
+        for job_id in affected_jobs:
+            removed.update(trees["job_refs"].pop(job_id, []))
+            trees["dependencies"].pop(job_id, None)
+            trees["compiled_host_aggr"].pop(job_id, None)
+            trees["compiled_multi_aggr"].pop(job_id, None)
+
+        for job_id, compiled in trees["compiled_host_aggr"].items():
+            compiled["compiled_hosts"] -= changed_hosts
+            kept = []
+            for aggr_hash in trees["job_refs"].get(job_id, []):
+                aggr = trees["aggr_ref"].get(aggr_hash)
+                if aggr is None or changed_hosts.intersection(aggr["reqhosts"]):
+                    removed.add(aggr_hash)
+                else:
+                    kept.append(aggr_hash)
+            trees["job_refs"][job_id] = kept
+
+        def is_removed(value):
+            return isinstance(value, str) and value in removed
+
+        trees["aggr_ref"] = {
+            aggr_hash: aggr
+            for aggr_hash, aggr in trees["aggr_ref"].items()
+            if aggr_hash not in removed
+        }
+        for group, aggrs in list(trees["forest_ref"].items()):
+            trees["forest_ref"][group] = [aggr for aggr in aggrs if not is_removed(aggr)]
+
+        for what in [
+                "aggregations_by_hostname",
+                "host_aggregations",
+                "affected_hosts",
+                "affected_services",
+        ]:
+            references = trees["%s_ref" % what]
+            for key, values in list(references.items()):
+                references[key] = [value for value in values if not is_removed(value[1])]
+                if not references[key]:
+                    del references[key]
+        trees["compiled_all"] = False
+        self._reinstantiate_references(trees)
+        log("Invalidated %d aggregations of %d jobs and %d changed hosts" %
+            (len(removed), len(affected_jobs), len(changed_hosts)))
+
 
 def get_enabled_aggregations():
     result = []
@@ -1356,6 +1495,101 @@ def get_aggr_ids(what=None):  # AGGR_HOST / AGGR_MULTI
     return result
 
 
+# During the compilation of an aggregation the rules and host patterns it uses
+# are recorded. When the hosts or the configuration change, only the affected
+# aggregations need to be compiled again.
+def reset_compile_dependencies():
+    global g_compile_dependencies
+    g_compile_dependencies = {"rules": {}, "hosts": set(), "patterns": set()}
+
+
+def track_host_pattern(host_spec, honor_site):
+    if g_compile_dependencies:
+        g_compile_dependencies["patterns"].add((host_spec, honor_site))
+
+
+def track_hosts(host_specs):
+    if g_compile_dependencies:
+        g_compile_dependencies["hosts"].update(host_specs)
+
+
+def _fingerprint(obj):
+    return hashlib.md5(ensure_binary(repr(obj))).hexdigest()
+
+
+def aggregation_fingerprint(aggr_id):
+    aggr_type, aggr_idx, groups = aggr_id
+    enabled_aggregations = get_enabled_aggregations()
+    if aggr_idx >= len(enabled_aggregations):
+        return None
+
+    this_type, aggr_def = enabled_aggregations[aggr_idx]
+    if this_type != aggr_type or get_aggr_groups(aggr_def) != groups:
+        return None
+    return _fingerprint(aggr_def)
+
+
+def rule_fingerprint(rulename):
+    if rulename not in config.aggregation_rules:
+        return None
+    return _fingerprint((config.aggregation_rules[rulename], _rule_to_pack_lookup.get(rulename)))
+
+
+def host_fingerprints(services: Dict[BIHostSpec, Any]) -> BIHostFingerprints:
+    """Fingerprint and alias of the tags, services, childs, parents and alias of each host"""
+    return {host_spec: (_fingerprint(entry), entry[4]) for host_spec, entry in services.items()}
+
+
+def get_changed_hosts(old_fingerprints: BIHostFingerprints,
+                      new_fingerprints: BIHostFingerprints) -> BIChangedHosts:
+    """The added, removed and changed hosts with their old and new alias"""
+    changed_hosts: BIChangedHosts = {}
+    for host_spec in set(old_fingerprints) | set(new_fingerprints):
+        old, new = old_fingerprints.get(host_spec), new_fingerprints.get(host_spec)
+        if old is None or new is None or old[0] != new[0]:
+            changed_hosts[host_spec] = {entry[1] for entry in [old, new] if entry is not None}
+    return changed_hosts
+
+
+def is_affected_by_hosts(dependencies: Dict[str, Any], changed_hosts: BIChangedHosts) -> bool:
+    if dependencies["hosts"].intersection(changed_hosts):
+        return True
+
+    for host_spec, honor_site in dependencies["patterns"]:
+        for (site, hostname), aliases in changed_hosts.items():
+            for alias in aliases:
+                if match_host(hostname, alias, host_spec, [], [], site, honor_site) is not None:
+                    return True
+    return False
+
+
+def get_affected_jobs(compiled_trees: Dict[str, Any], changed_hosts: BIChangedHosts) -> Set[Any]:
+    """The compiled jobs whose aggregations need to be compiled again
+
+    These are the jobs of changed aggregations or rules. Multi host aggregations are also
+    affected by hosts matching their host patterns. The single host aggregations are
+    compiled per host, so the changed hosts are handled by BICacheManager.invalidate()."""
+    affected_jobs = set()
+    compiled_jobs = set(compiled_trees["compiled_host_aggr"])
+    compiled_jobs.update(compiled_trees["compiled_multi_aggr"])
+    for job_id in compiled_jobs:
+        dependencies = compiled_trees["dependencies"].get(job_id)
+        if dependencies is None or dependencies["aggregation"] != aggregation_fingerprint(job_id):
+            affected_jobs.add(job_id)
+        elif _rules_changed(dependencies["rules"]):
+            affected_jobs.add(job_id)
+        elif job_id[0] == AGGR_MULTI and is_affected_by_hosts(dependencies, changed_hosts):
+            affected_jobs.add(job_id)
+    return affected_jobs
+
+
+def _rules_changed(rule_fingerprints: Dict[str, str]) -> bool:
+    for rulename, fingerprint in rule_fingerprints.items():
+        if rule_fingerprint(rulename) != fingerprint:
+            return True
+    return False
+
+
 def num_filelocks():
     return len(os.listdir("/proc/%s/fd" % os.getpid()))
 
@@ -1571,6 +1805,8 @@ def compile_rule_node(aggr_type, calllist, lvl):
               "There is no rule named <tt>%s</tt>. Available are: <tt>%s</tt>") %
             (rulename, "</tt>, <tt>".join(config.aggregation_rules.keys())))
     rule = config.aggregation_rules[rulename]
+    if g_compile_dependencies and rulename not in g_compile_dependencies["rules"]:
+        g_compile_dependencies["rules"][rulename] = rule_fingerprint(rulename)
     if rule.get("disabled", False):
         return []
 
@@ -1651,6 +1887,8 @@ def find_matching_services(aggr_type, what, calllist):
 
             elif what == config.FOREACH_CHILD_WITH:
                 for child_name in childs:
+                    track_hosts((child_site, child_name)
+                                for child_site, _entry in g_services_by_hostname[child_name])
                     child_tags = g_services_by_hostname[child_name][0][1][0]
                     child_alias = g_services_by_hostname[child_name][0][1][4]
                     child_matches = match_host(child_name, child_alias, child_spec, child_tags,
@@ -1669,36 +1907,26 @@ def find_matching_services(aggr_type, what, calllist):
                 matches.add(((hostname, alias), host_matches))
                 continue
 
+            if not isinstance(service_re, str):
+                raise Exception("funny service_re %r in find_matching_services" % service_re)
+            service_matches = matching_services(service_re)
             for service in services:
-                mo = (service_re, service)
-                if mo in regex_svc_miss_cache:
-                    continue
-
-                if not isinstance(service_re, str):
-                    raise Exception("funny service_re %r in find_matching_services" % service_re)
-                m = regex(service_re).match(service)
-                if mo not in regex_svc_hit_cache:
-                    if m:
-                        regex_svc_hit_cache.add(mo)
-                    else:
-                        regex_svc_miss_cache.add(mo)
-                        continue
-
-                svc_matches = tuple(m.groups())
-                matches.add(((hostname, alias), host_matches + svc_matches))
+                svc_matches = service_matches.get(service)
+                if svc_matches is not None:
+                    matches.add(((hostname, alias), host_matches + svc_matches))
 
     return sorted(list(matches))
 
 
 def get_services_filtered_by_host_alias(host_spec):
     honor_site = SITE_SEP in host_spec[1]
-    if g_services_items:
-        return host_spec, honor_site, g_services_items
-    return host_spec, honor_site, list(g_services.items())
+    track_host_pattern(host_spec, honor_site)
+    return host_spec, honor_site, matching_hosts(host_spec, honor_site)
 
 
 def get_services_filtered_by_host_name(host_re):
     honor_site = SITE_SEP in host_re
+    track_host_pattern(host_re, honor_site)
 
     if host_re.startswith("^(") and host_re.endswith(")$"):
         # Exact host match
@@ -1712,15 +1940,54 @@ def get_services_filtered_by_host_name(host_re):
         entries = [((e[0], host_re), e[1]) for e in g_services_by_hostname.get(host_re, [])]
 
     else:
-        # All services
-        if g_services_items:
-            entries = g_services_items
-        else:
-            entries = list(g_services.items())
+        # All hosts matching the host name
+        entries = matching_hosts(host_re, honor_site)
 
     return host_re, honor_site, entries
 
 
+def _update_match_index_source():
+    global g_host_match_index, g_service_match_index, g_service_names, g_match_index_source
+    if g_match_index_source is not g_services:
+        g_host_match_index = {}
+        g_service_match_index = {}
+        g_service_names = set()
+        for _tags, services, _childs, _parents, _alias in g_services.values():
+            g_service_names.update(services)
+        g_match_index_source = g_services
+
+
+def matching_hosts(host_spec, honor_site):
+    """The entries of g_services whose host name or alias matches the host spec
+
+    The result is memoized per host spec, so that rule nodes using the same pattern do not
+    scan all hosts again. The host tags are not checked here."""
+    _update_match_index_source()
+    key = (host_spec, honor_site)
+    if key not in g_host_match_index:
+        g_host_match_index[key] = [
+            ((site, hostname), entry)
+            for (site, hostname), entry in g_services.items()
+            if match_host(hostname, entry[4], host_spec, [], [], site, honor_site) is not None
+        ]
+    return g_host_match_index[key]
+
+
+def matching_services(service_re):
+    """The match groups of all service names of g_services matching the pattern
+
+    Each distinct service name is matched once, instead of once per host having it."""
+    _update_match_index_source()
+    if service_re not in g_service_match_index:
+        service_matches = {}
+        for service in g_service_names:
+            mo = regex(service_re).match(service)
+            if mo:
+                service_matches[service] = tuple(mo.groups())
+        g_service_match_index[service_re] = service_matches
+    return g_service_match_index[service_re]
+
+
 def do_match(reg, text):
     mo = regex(reg).match(text)
     if not mo:
@@ -1978,6 +2245,7 @@ def compile_aggregation_rule(aggr_type, rule, args, lvl, rulename=None):
 
 
 def find_remaining_services(hostspec, aggregation):
+    track_hosts([hostspec])
     _tags, all_services, _childs, _parents, _alias = g_services[hostspec]
     all_services = set(all_services)
 
@@ -2076,15 +2344,13 @@ def compile_leaf_node(host_re, service_re=config.HOST_STATE):
         return found
 
     honor_site = SITE_SEP in host_re
+    track_host_pattern(host_re, honor_site)
     if not honor_site and '*' not in host_re and '$' not in host_re and '|' not in host_re and '[' not in host_re:
         # Exact host match
         entries = [((e[0], host_re), e[1]) for e in g_services_by_hostname.get(host_re, [])]
 
     else:
-        if g_services_items:
-            entries = g_services_items
-        else:
-            entries = list(g_services.items())
+        entries = matching_hosts(host_re, honor_site)
 
     # TODO: If we already know the host we deal with, we could avoid this loop
     for (site, hostname), (_tags, services, _childs, _parents, _alias) in entries:
@@ -2131,18 +2397,11 @@ def compile_leaf_node(host_re, service_re=config.HOST_STATE):
                 "host": (site, hostname)
             })
         else:
+            service_matches = matching_services(service_re)
             for service in services:
-                mo = (service_re, service)
-                if mo in regex_svc_miss_cache:
+                if service not in service_matches:
                     continue
 
-                if mo not in regex_svc_hit_cache:
-                    if regex(service_re).match(service):
-                        regex_svc_hit_cache.add(mo)
-                    else:
-                        regex_svc_miss_cache.add(mo)
-                        continue
-
                 found.append({
                     "type": NT_LEAF,
                     "reqhosts": [(site, hostname)],
@@ -78,6 +78,12 @@ _vars_before_plugins: Set[str] = set()
 # TODO: Clean this up
 permission_declaration_functions = []
 
+# The configuration loaded by load_config() and the stamp of the files it was loaded from
+ConfigStamp = Tuple[Tuple[str, ...], List[Tuple[str, float, int]]]
+_config_cache_stamp: Optional[ConfigStamp] = None
+_config_cache_values: Dict[str, Any] = {}
+_last_load_duration = 0.0
+
 # Constants for BI
 ALL_HOSTS = '(.*)'
 HOST_STATE = ('__HOST_STATE__',)
@@ -161,12 +167,28 @@ def _load_config_file(path: str) -> None:
 
 
 # Load multisite.mk and all files in multisite.d/. This will happen
-# for *each* HTTP request.
-# FIXME: Optimize this to cache the config etc. until either the config files or plugins
-# have changed. We could make this being cached for multiple requests just like the
-# plugins of other modules. This may save significant time in case of small requests like
-# the graph ajax page or similar.
+# for *each* HTTP request. The loaded configuration is cached for the
+# following requests until either the config files or plugins have changed.
 def load_config() -> None:
+    global _last_load_duration, _config_cache_stamp, _config_cache_values
+    start_time = time.time()
+
+    stamp = _config_stamp()
+    if stamp == _config_cache_stamp:
+        _apply_config_values(_config_cache_values)
+    else:
+        # Invalid until the configuration has been loaded successfully
+        _config_cache_stamp = None
+        _config_cache_values = _copy_config_values(_load_config_files())
+        _config_cache_stamp = stamp
+
+    _prepare_tag_config()
+    execute_post_config_load_hooks()
+    _last_load_duration = time.time() - start_time
+
+
+def _load_config_files() -> Dict[str, Any]:
+    """Load the configuration and return the values set by it"""
     global sites
 
     # Set default values for all user-changable configuration settings
@@ -176,10 +198,28 @@ def load_config() -> None:
     # override possibly deleted sites
     sites = default_single_site_configuration()
 
-    # First load main file
-    _load_config_file(cmk.utils.paths.default_config_dir + "/multisite.mk")
+    values_before = dict(globals())
+    for path in [_multisite_mk()] + _multisite_d_files():
+        _load_config_file(path)
+
+    if sites:
+        sites = migrate_old_site_config(sites)
+    else:
+        sites = default_single_site_configuration()
+
+    # The variables assigned by the configuration files in addition to the defaults
+    names = set(default_config) | {"sites"}
+    names.update(name for name, value in globals().items()
+                 if name not in values_before or value is not values_before[name])
+    return {name: globals()[name] for name in names}
+
+
+def _multisite_mk() -> str:
+    return cmk.utils.paths.default_config_dir + "/multisite.mk"
+
 
-    # Load also recursively all files below multisite.d
+def _multisite_d_files() -> List[str]:
+    """All files below multisite.d in the order of loading"""
     conf_dir = cmk.utils.paths.default_config_dir + "/multisite.d"
     filelist = []
     if os.path.isdir(conf_dir):
@@ -189,16 +229,52 @@ def load_config() -> None:
                     filelist.append(root + "/" + filename)
 
     filelist.sort()
-    for p in filelist:
-        _load_config_file(p)
+    return filelist
 
-    if sites:
-        sites = migrate_old_site_config(sites)
-    else:
-        sites = default_single_site_configuration()
 
-    _prepare_tag_config()
-    execute_post_config_load_hooks()
+def _config_plugin_files() -> List[str]:
+    filelist = []
+    for plugins_path in [
+            Path(cmk.utils.paths.web_dir, "plugins", "config"),
+            cmk.utils.paths.local_web_dir / "plugins" / "config",
+    ]:
+        if plugins_path.exists():
+            filelist += sorted(str(file_path) for file_path in plugins_path.iterdir())
+    return filelist
+
+
+def _config_stamp() -> ConfigStamp:
+    """Identifies the state of the configuration files and the config plugins
+
+    Added and removed files change the list of files, changed files their modification
+    time. Files saved by replacing them get a new inode.
+    """
+    file_stamps: List[Tuple[str, float, int]] = []
+    for path in [_multisite_mk()] + _multisite_d_files() + _config_plugin_files():
+        try:
+            stat_result = os.stat(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            continue
+        file_stamps.append((path, stat_result.st_mtime, stat_result.st_ino))
+
+    module_names = tuple(sorted(module.__name__ for module in _config_plugin_modules()))
+    return module_names, file_stamps
+
+
+def _copy_config_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: copy.deepcopy(v) if isinstance(v, (dict, list)) else v for k, v in values.items()}
+
+
+def _apply_config_values(values: Dict[str, Any]) -> None:
+    """Set the cached configuration, each request gets its own copy of the mutable values"""
+    globals().update(_copy_config_values(values))
+
+
+def last_load_duration() -> float:
+    """Time needed by the last load_config() in seconds"""
+    return _last_load_duration
 
 
 def _prepare_tag_config() -> None:
@@ -5,7 +5,14 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Default configuration settings for the Check_MK GUI"""
 
-from typing import Any as _Any, Dict as _Dict, List as _List, Tuple as _Tuple, Union as _Union
+from typing import (
+    Any as _Any,
+    Dict as _Dict,
+    List as _List,
+    Optional as _Optional,
+    Tuple as _Tuple,
+    Union as _Union,
+)
 
 #.
 #   .--Generic-------------------------------------------------------------.
@@ -197,6 +204,10 @@ login_screen: _Dict = {}
 # Timeout for rescheduling of host- and servicechecks
 reschedule_timeout = 10.0
 
+# Number of days of the monitoring history to materialize for the availability
+# computation, None disables the availability store
+availability_store_days: _Optional[int] = None
+
 # Number of columsn in "Filter" form
 filter_columns = 2
 
@@ -421,6 +432,7 @@ mkeventd_connect_timeout = 10
 log_level = 0
 log_rulehits = False
 rule_optimizer = True
+event_processing_workers = 0
 
 mkeventd_service_levels = [
     (0, "(no Service level)"),
@@ -12,7 +12,8 @@ from typing import Any, Callable, Dict, List, Set, Tuple, Union, Optional, Itera
 import livestatus
 
 from cmk.gui.plugins.metrics.utils import check_metrics
-from cmk.gui.plugins.metrics.timeseries import op_func_wrapper, time_series_operators
+from cmk.gui.plugins.metrics.timeseries import time_series_math
+from cmk.utils.array_timeseries import ArrayTimeSeries
 from cmk.utils.prediction import livestatus_lql, TimeSeries
 from cmk.gui.i18n import _
 from cmk.gui.exceptions import MKGeneralException
@@ -70,10 +71,12 @@ def align_and_resample_rrds(rrd_data, cf):
             start_time, end_time, step = rrddata.twindow
         else:
             if (start_time, end_time, step) != rrddata.twindow:
+                array_data = ArrayTimeSeries.from_time_series(rrddata)
+                twindow = (start_time, end_time, step)
                 if step >= rrddata.twindow[2]:
-                    rrddata.values = rrddata.downsample((start_time, end_time, step), spec[4] or cf)
+                    rrddata.values = array_data.downsample(twindow, spec[4] or cf).values
                 elif step < rrddata.twindow[2]:
-                    rrddata.values = rrddata.bfill_upsample((start_time, end_time, step), 0)
+                    rrddata.values = array_data.bfill_upsample(twindow, 0).values
 
     return start_time, end_time, step
 
@@ -201,7 +204,4 @@ def merge_multicol(row: Dict, rrdcols: List[ColumnName], params: Dict) -> TimeSe
     if not relevant_ts:
         return TimeSeries([0, 0, 0])
 
-    _op_title, op_func = time_series_operators()['MERGE']
-    single_value_series = [op_func_wrapper(op_func, tsp) for tsp in zip(*relevant_ts)]
-
-    return TimeSeries(single_value_series)
+    return TimeSeries(time_series_math('MERGE', relevant_ts))
@@ -4,15 +4,12 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-import operator
-import functools
-
 import cmk.utils.version as cmk_version
 from cmk.utils.prediction import TimeSeries
+from cmk.utils.array_timeseries import array_operators, percentile, to_array, to_values
 import cmk.gui.escaping as escaping
 from cmk.gui.exceptions import MKGeneralException
 from cmk.gui.i18n import _
-from cmk.gui.plugins.metrics import stats
 
 #.
 #   .--Curves--------------------------------------------------------------.
@@ -94,24 +91,23 @@ def evaluate_time_series_expression(expression, rrd_data):
     raise NotImplementedError()
 
 
+# The operators of the graph expressions, see cmk.utils.array_timeseries.array_operators()
+TIME_SERIES_OPERATORS = {"+", "*", "-", "/", "MAX", "MIN", "AVERAGE", "MERGE"}
+
+
 def time_series_math(operator_id, operands_evaluated):
-    operators = time_series_operators()
-    if operator_id not in operators:
+    if operator_id not in TIME_SERIES_OPERATORS:
         raise MKGeneralException(
             _("Undefined operator '%s' in graph expression") %
             escaping.escape_attribute(operator_id))
-    _op_title, op_func = operators[operator_id]
+    _op_title, op_func = array_operators()[operator_id]
 
-    return [op_func_wrapper(op_func, tsp) for tsp in zip(*operands_evaluated)]
+    if not operands_evaluated:
+        return []
 
-
-def op_func_wrapper(op_func, tsp):
-    if tsp.count(None) < len(tsp):  # At least one non-None value
-        try:
-            return op_func(tsp)
-        except ZeroDivisionError:
-            pass
-    return None
+    # Like zip() the result is as long as the shortest operand
+    num_points = min(len(operand) for operand in operands_evaluated)
+    return to_values(op_func([to_array(operand)[:num_points] for operand in operands_evaluated]))
 
 
 def clean_time_series_point(tsp):
@@ -119,56 +115,5 @@ def clean_time_series_point(tsp):
     return [x for x in tsp if x is not None]
 
 
-def time_series_operator_sum(tsp):
-    return sum(clean_time_series_point(tsp))
-
-
-def time_series_operator_product(tsp):
-    if None in tsp:
-        return None
-    return functools.reduce(operator.mul, tsp, 1)
-
-
-def time_series_operator_difference(tsp):
-    if None in tsp:
-        return None
-    return tsp[0] - tsp[1]
-
-
-def time_series_operator_fraction(tsp):
-    if None in tsp:
-        return None
-    return tsp[0] / tsp[1]
-
-
-def time_series_operator_maximum(tsp):
-    return max(clean_time_series_point(tsp))
-
-
-def time_series_operator_minimum(tsp):
-    return min(clean_time_series_point(tsp))
-
-
-def time_series_operator_average(tsp):
-    tsp = clean_time_series_point(tsp)
-    return sum(tsp) / len(tsp)
-
-
-def time_series_operator_perc(tsp, percentile):
-    points = len(tsp)
-    tsp = clean_time_series_point(tsp)
-    perc = stats.percentile(tsp, percentile) if tsp else None
-    return [perc] * points
-
-
-def time_series_operators():
-    return {
-        "+": (_("Sum"), time_series_operator_sum),
-        "*": (_("Product"), time_series_operator_product),
-        "-": (_("Difference"), time_series_operator_difference),
-        "/": (_("Fraction"), time_series_operator_fraction),
-        "MAX": (_("Maximum"), time_series_operator_maximum),
-        "MIN": (_("Minimum"), time_series_operator_minimum),
-        "AVERAGE": (_("Average"), time_series_operator_average),
-        "MERGE": ("First non None", lambda x: next(iter(clean_time_series_point(x)))),
-    }
+def time_series_operator_perc(tsp, q):
+    return [percentile(to_array(tsp), q)] * len(tsp)
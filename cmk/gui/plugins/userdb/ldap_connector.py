@@ -28,6 +28,7 @@
 #   '----------------------------------------------------------------------'
 
 import abc
+import bisect
 import copy
 import errno
 import logging
@@ -37,7 +38,7 @@ import shutil
 import sys
 import time
 from pathlib import Path
-from typing import Optional, IO, Union, Dict, List, Set
+from typing import Any, Optional, IO, Union, Dict, List, NamedTuple, Set
 
 # docs: http://www.python-ldap.org/doc/html/index.html
 import ldap  # type: ignore[import]
@@ -145,6 +146,33 @@ class MKLDAPException(MKGeneralException):
 DistinguishedName = str
 GroupMemberships = Dict[DistinguishedName, Dict[str, Union[str, List[str]]]]
 
+
+class NestedGroupGraph(NamedTuple):
+    """The direct members of all groups, separated into users and sub groups"""
+    users: Dict[DistinguishedName, List[DistinguishedName]]
+    groups: Dict[DistinguishedName, List[DistinguishedName]]
+
+    def members(self, group_dn: DistinguishedName) -> List[DistinguishedName]:
+        """The users being member of the group directly or by one of its (nested) sub groups
+
+        A group may contain itself. This is prevented by some LDAP editing tools, like "Active
+        Directory Users & Computers", but can somehow be configured, e.g. when configuring
+        universal distribution lists using ADSIEdit it was possible to configure something like
+        this at least in older directories. Each group is only visited once to handle such loops.
+        """
+        members: Set[DistinguishedName] = set()
+        visited = {group_dn.lower()}
+        todo = [group_dn.lower()]
+        while todo:
+            dn = todo.pop()
+            members.update(self.users.get(dn, []))
+            for sub_group_dn in self.groups.get(dn, []):
+                if sub_group_dn not in visited:
+                    visited.add(sub_group_dn)
+                    todo.append(sub_group_dn)
+        return sorted(members)
+
+
 #.
 #   .--UserConnector-------------------------------------------------------.
 #   | _   _                ____                            _               |
@@ -210,6 +238,9 @@ class LDAPUserConnector(UserConnector):
         self._user_cache = {}
         self._group_cache = {}
         self._group_search_cache = {}
+        self._nested_group_graph: Optional[NestedGroupGraph] = None
+        # Set while syncing a single user (e.g. on login)
+        self._sync_user_dn: Optional[DistinguishedName] = None
 
         # File for storing the time of the last success event
         self._sync_time_file = Path(cmk.utils.paths.var_dir).joinpath('web/ldap_%s_sync_time.mk' %
@@ -898,91 +929,104 @@ class LDAPUserConnector(UserConnector):
         return groups
 
     # Nested querying is more complicated. We have no option to simply do a query for group objects
-    # to make them resolve the memberships here. So we need to query all users with the nested
-    # memberof filter to get all group memberships of that group. We need one query for each group.
+    # to make them resolve the memberships here. Previously we used the filter
+    # "memberOf:1.2.840.113556.1.4.1941:" which seemed to be a performance problem, later one
+    # "(memberof=...)" query per group and sub group. Now the direct memberships of all objects are
+    # fetched with a single paged query once per sync and the nesting is resolved from them.
     def _get_nested_group_memberships(self, filters: List[str], filt_attr: str) -> GroupMemberships:
         groups: GroupMemberships = {}
 
-        # Search group members in common ancestor of group and user base DN to be able to use a single
-        # query instead of one for groups and one for users below when searching for the members.
-        base_dn = self._group_and_user_base_dn()
-
-        for filter_val in filters:
-            matched_groups = {}
-
-            # The memberof query below is only possible when knowing the DN of groups. We need
-            # to look for the DN when the caller gives us CNs (e.g. when using the the groups
-            # to contact groups plugin).
-            if filt_attr == 'cn':
-                result = self._ldap_search(
-                    self.get_group_dn(), '(&%s(cn=%s))' % (self.ldap_filter('groups'), filter_val),
-                    ['dn', 'cn'], self._config['group_scope'])
-                if not result:
-                    continue  # Skip groups which can not be found
-
-                for dn, attrs in result:
+        # The memberships are resolved by the DN of the groups. We need to look for the DN when
+        # the caller gives us CNs (e.g. when using the the groups to contact groups plugin).
+        matched_groups: Dict[DistinguishedName, Optional[str]] = {}
+        if filt_attr == 'cn':
+            if filters:
+                filt = '(&%s(|%s))' % (self.ldap_filter('groups'), ''.join(
+                    ['(cn=%s)' % f for f in filters]))
+                for dn, attrs in self._ldap_search(self.get_group_dn(), filt, ['dn', 'cn'],
+                                                   self._config['group_scope']):
                     matched_groups[dn] = attrs["cn"][0]
-            else:
-                # in case of asking with DNs in nested mode, the resulting objects have the
-                # cn set to None for all objects. We do not need it in that case.
-                dn = filter_val
+        else:
+            # in case of asking with DNs in nested mode, the cn is fetched below
+            for dn in filters:
                 matched_groups[dn] = None
 
-            # Now lookup the memberships. Previously we used the filter "memberOf:1.2.840.113556.1.4.1941:"
-            # here which seemed to be a performance problem. Resolving the nesting involves more single
-            # queries but performs much better.
-            for dn, cn in matched_groups.items():
-                # Try to get members from group cache
-                try:
-                    groups[dn] = self._group_cache[True][dn]
-                    continue
-                except KeyError:
-                    pass
+        for dn, cn in matched_groups.items():
+            # Try to get members from group cache
+            try:
+                groups[dn] = self._group_cache[True][dn]
+                continue
+            except KeyError:
+                pass
+
+            # In case we don't have the cn we need to fetch it. It may be needed, e.g. by the contact group
+            # sync plugin
+            if cn is None:
+                group = self._ldap_search(dn,
+                                          filt="(objectclass=group)",
+                                          columns=['cn'],
+                                          scope='base')
+                if group:
+                    cn = group[0][1]["cn"][0]
+
+            groups[dn] = self._group_cache[True][dn] = {
+                'cn': cn,
+                'members': self._get_nested_group_graph().members(dn),
+            }
 
-                # In case we don't have the cn we need to fetch it. It may be needed, e.g. by the contact group
-                # sync plugin
-                if cn is None:
-                    group = self._ldap_search(dn,
-                                              filt="(objectclass=group)",
-                                              columns=['cn'],
-                                              scope='base')
-                    if group:
-                        cn = group[0][1]["cn"][0]
-
-                filt = '(memberof=%s)' % dn
-                groups[dn] = {
-                    'members': [],
-                    'cn': cn,
-                }
+        return groups
 
-                members = groups[dn]['members']
-                assert isinstance(members, list)
+    def _get_nested_group_graph(self) -> NestedGroupGraph:
+        if self._nested_group_graph is not None:
+            return self._nested_group_graph
 
-                # Register the group construct, collect the members later. This way we can also
-                # catch the case where a group refers to itself, which is prevented by some LDAP
-                # editing tools, like "Active Directory Users & Computers", but can somehow be
-                # configured, e.g. when configuring universal distribution lists using ADSIEdit
-                # it was possible to configure something like this at least in older directories.
-                self._group_cache[True][dn] = groups[dn]
+        if self._sync_user_dn is not None:
+            self._nested_group_graph = self._get_user_nested_group_graph(self._sync_user_dn)
+            return self._nested_group_graph
 
-                sub_group_filters = []
-                for obj_dn, obj in self._ldap_search(base_dn, filt, ['dn', 'objectclass'], 'sub'):
-                    if "user" in obj['objectclass']:
-                        members.append(obj_dn)
+        # Search group members in common ancestor of group and user base DN to be able to use a single
+        # query instead of one for groups and one for users below when searching for the members.
+        graph = NestedGroupGraph({}, {})
+        for obj_dn, obj in self._ldap_search(self._group_and_user_base_dn(), '(memberof=*)',
+                                             ['memberof', 'objectclass'], 'sub'):
+            if "user" in obj['objectclass']:
+                direct_members = graph.users
+            elif "group" in obj['objectclass']:
+                direct_members = graph.groups
+            else:
+                continue
 
-                    elif "group" in obj['objectclass']:
-                        sub_group_filters.append(obj_dn)
+            for group_dn in obj['memberof']:
+                direct_members.setdefault(group_dn.lower(), []).append(obj_dn)
 
-                # TODO: This could be optimized by first collecting all sub groups of all searched
-                # groups, then collecting them all together
-                for _sub_group_dn, sub_group in self.get_group_memberships(sub_group_filters,
-                                                                           filt_attr='dn',
-                                                                           nested=True).items():
-                    members += sub_group["members"]
+        self._nested_group_graph = graph
+        return graph
 
-                members.sort()
+    def _get_user_nested_group_graph(self, user_dn: DistinguishedName) -> NestedGroupGraph:
+        """The graph of the groups a single user is member of, directly or by nested groups
 
-        return groups
+        Fetching the memberships of all objects does not pay off when only one user is synced.
+        Starting with the user, the memberof attributes are followed up to the top level groups
+        instead. The members of the groups in this graph are limited to the given user."""
+        graph = NestedGroupGraph({}, {})
+        visited = {user_dn}
+        todo = [user_dn]
+        while todo:
+            obj_dn = todo.pop()
+            direct_members = graph.users if obj_dn == user_dn else graph.groups
+            try:
+                result = self._ldap_search(obj_dn, columns=['memberof'], scope='base')
+            except MKLDAPException:
+                continue  # e.g. a group in another domain
+
+            for _dn, obj in result:
+                for group_dn in obj.get('memberof', []):
+                    group_dn = group_dn.lower()
+                    direct_members.setdefault(group_dn, []).append(obj_dn)
+                    if group_dn not in visited:
+                        visited.add(group_dn)
+                        todo.append(group_dn)
+        return graph
 
     def _group_and_user_base_dn(self):
         user_dn = ldap.dn.str2dn(self._get_user_dn())
@@ -1163,7 +1207,17 @@ class LDAPUserConnector(UserConnector):
         self._logger.info('SYNC STARTED')
         self._logger.info('  SYNC PLUGINS: %s' % ', '.join(self._config['active_plugins'].keys()))
 
-        ldap_users = self.get_users()
+        # Syncing a single user (e.g. on login) does not affect the state of the incremental sync
+        sync_state = None if only_username else self._get_sync_state(start_time)
+        changed_filter = self._incremental_sync_filter(sync_state)
+        if changed_filter is None:
+            ldap_users = self.get_users()
+        else:
+            self._logger.info('  INCREMENTAL SYNC: %s' % changed_filter)
+            ldap_users = self.get_users(add_filter=changed_filter)
+
+        if only_username and only_username in ldap_users:
+            self._sync_user_dn = ldap_users[only_username]['dn']
 
         users = load_users_func(lock=True)
 
@@ -1179,13 +1233,15 @@ class LDAPUserConnector(UserConnector):
             return mode_create, user
 
         # Remove users which are controlled by this connector but can not be found in
-        # LDAP anymore
-        for user_id, user in users.items():
-            user_connection_id = cleanup_connection_id(user.get('connector'))
-            if user_connection_id == connection_id and self._strip_suffix(
-                    user_id) not in ldap_users:
-                del users[user_id]  # remove the user
-                changes.append(_("LDAP [%s]: Removed user %s") % (connection_id, user_id))
+        # LDAP anymore. The incremental sync only gets the changed users, the removed
+        # ones are found by the next full sync.
+        if changed_filter is None:
+            for user_id, user in users.items():
+                user_connection_id = cleanup_connection_id(user.get('connector'))
+                if user_connection_id == connection_id and self._strip_suffix(
+                        user_id) not in ldap_users:
+                    del users[user_id]  # remove the user
+                    changes.append(_("LDAP [%s]: Removed user %s") % (connection_id, user_id))
 
         has_changed_passwords = False
         profiles_to_synchronize = {}
@@ -1285,6 +1341,8 @@ class LDAPUserConnector(UserConnector):
             release_users_lock()
 
         self._set_last_sync_time()
+        if sync_state is not None:
+            self._save_sync_state(sync_state)
 
     def _find_changed_user_keys(self, keys, user, new_user):
         changed = {}
@@ -1309,6 +1367,134 @@ class LDAPUserConnector(UserConnector):
         self._user_cache.clear()
         self._group_cache.clear()
         self._group_search_cache.clear()
+        self._nested_group_graph = None
+        self._sync_user_dn = None
+
+    def _sync_state_filepath(self) -> Path:
+        return self._ldap_caches_filepath() / ("sync_state.%s" % self.id())
+
+    def _get_sync_state(self, start_time: float) -> Optional[Dict[str, Any]]:
+        """Describes the state of the directory at the start of this sync
+
+        The state is used by the next sync to find the objects changed since then. Active
+        Directory counts all changes of a domain controller in the update sequence number
+        (USN), other directories are asked for the modification time of the objects.
+        """
+        if "incremental_sync" not in self._config:
+            return None
+
+        if self.is_active_directory():
+            try:
+                root_dse = self._ldap_search('',
+                                             columns=['highestcommittedusn', 'dsservicename'],
+                                             scope='base')
+            except MKLDAPException:
+                return None
+            if not root_dse or 'highestcommittedusn' not in root_dse[0][1]:
+                return None
+            attrs = root_dse[0][1]
+            # The USN is local to each domain controller
+            server = attrs.get('dsservicename', [''])[0].lower()
+            changed_filter = '(usnchanged>=%d)' % (int(attrs['highestcommittedusn'][0]) + 1)
+        else:
+            server = ''
+            # Allow some difference between the clocks of the LDAP server and this system
+            changed_filter = '(modifytimestamp>=%s)' % time.strftime('%Y%m%d%H%M%SZ',
+                                                                     time.gmtime(start_time - 300))
+
+        from cmk.gui.groups import load_contact_group_information
+        return {
+            "server": server,
+            "changed_filter": changed_filter,
+            "last_full_sync": start_time,
+            # The sync plugins depend on this local configuration, too
+            "contact_groups": sorted(load_contact_group_information().keys()),
+            "default_roles": sorted(config.default_user_profile['roles']),
+        }
+
+    def _save_sync_state(self, sync_state: Dict[str, Any]) -> None:
+        self._ldap_caches_filepath().mkdir(parents=True, exist_ok=True)
+        store.save_object_to_file(self._sync_state_filepath(), sync_state)
+
+    def _incremental_sync_filter(self, sync_state: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Returns the filter for the users changed since the last sync, None for a full sync
+
+        The group memberships of a user are not necessarily part of the user object, so a
+        change of any group (including nested groups and the groups a user filter refers to
+        with memberof) leads to a full sync. This is also the case when the previous
+        sync used another server, the local configuration the sync depends on has changed
+        or the last full sync is longer ago than configured.
+        """
+        if sync_state is None:
+            return None
+
+        last_state = store.load_object_from_file(self._sync_state_filepath(), default=None)
+        if not last_state:
+            return None
+
+        for key in ["server", "contact_groups", "default_roles"]:
+            if last_state.get(key) != sync_state[key]:
+                return None
+
+        if sync_state["last_full_sync"] - last_state["last_full_sync"] \
+                >= self._config["incremental_sync"]:
+            return None
+
+        if self._uses_groups_of_other_connections():
+            return None
+
+        # The users matched by a memberof clause change with the groups, not with the users
+        if 'memberof' in self._config.get('user_filter', '').lower():
+            return None
+
+        changed_filter = last_state["changed_filter"]
+        for base, filt, scope in self._group_change_searches(changed_filter):
+            if self._ldap_search(base, filt, ['dn'], scope):
+                self._logger.info('  GROUPS CHANGED BELOW: %s' % base)
+                return None
+
+        sync_state["last_full_sync"] = last_state["last_full_sync"]
+        return changed_filter
+
+    def _group_change_searches(self, changed_filter: str) -> List[List[str]]:
+        searches = []
+        if self._uses_nested_groups():
+            # The nested groups are resolved from all groups below this base DN
+            searches.append([
+                self._group_and_user_base_dn(),
+                '(&(objectclass=group)%s)' % changed_filter,
+                'sub',
+            ])
+        elif self.has_group_base_dn_configured():
+            searches.append([
+                self.get_group_dn(),
+                '(&%s%s)' % (self.ldap_filter('groups'), changed_filter),
+                self._config['group_scope'],
+            ])
+
+        filter_group_dn = self._config.get('user_filter_group')
+        if filter_group_dn:
+            searches.append([self._replace_macros(filter_group_dn), changed_filter, 'base'])
+        return searches
+
+    def _uses_nested_groups(self) -> bool:
+        return any(
+            params.get("nested")
+            for params in self._config['active_plugins'].values()
+            if isinstance(params, dict))
+
+    def _uses_groups_of_other_connections(self) -> bool:
+        for key, params in self._config['active_plugins'].items():
+            if key in ["groups_to_contactgroups", "groups_to_attributes"]:
+                if (params or {}).get("other_connections"):
+                    return True
+            elif key == "groups_to_roles":
+                for group_specs in (params or {}).values():
+                    if isinstance(group_specs, list) and any(
+                            isinstance(group_spec, tuple) and
+                            group_spec[1] not in [None, self.id()] for group_spec in group_specs):
+                        return True
+        return False
 
     def _set_last_sync_time(self) -> None:
         with self._sync_time_file.open('w', encoding="utf-8") as f:
@@ -1810,6 +1996,22 @@ class LDAPConnectionValuespec(Transform):
                  default_value=300,
                  display=["days", "hours", "minutes"],
              )),
+            ("incremental_sync",
+             Age(
+                 title=_('Incremental synchronization'),
+                 help=_(
+                     'Only synchronize the users which have been changed in LDAP since the last '
+                     'synchronization. The changes are found by the update sequence number '
+                     '(<tt>uSNChanged</tt>) of Active Directory or by the <tt>modifyTimestamp</tt> '
+                     'attribute of other directories. When a group has been changed, the users '
+                     'are synchronized from another server or the contact groups have been changed, '
+                     'all users are synchronized. Users removed from LDAP are only removed by a '
+                     'full synchronization. This option defines the interval of these full '
+                     'synchronizations.'),
+                 minvalue=300,
+                 default_value=86400,
+                 display=["days", "hours", "minutes"],
+             )),
         ]
 
         return other_elements
@@ -2075,6 +2277,13 @@ def get_group_member_cmp_val(connection, user_id, ldap_user):
     return user_id if connection._member_attr().lower() == 'memberuid' else ldap_user['dn']
 
 
+def _is_group_member(group, user_cmp_val):
+    # The members of the groups are sorted, so there is no need to scan the whole list
+    members = group['members']
+    index = bisect.bisect_left(members, user_cmp_val)
+    return index < len(members) and members[index] == user_cmp_val
+
+
 def get_groups_of_user(connection, user_id, ldap_user, cg_names, nested, other_connection_ids):
     # Figure out how to check group membership.
     user_cmp_val = get_group_member_cmp_val(connection, user_id, ldap_user)
@@ -2095,7 +2304,7 @@ def get_groups_of_user(connection, user_id, ldap_user, cg_names, nested, other_c
     # Now add the groups the user is a member off
     group_cns = []
     for group in ldap_groups.values():
-        if user_cmp_val in group['members']:
+        if _is_group_member(group, user_cmp_val):
             group_cns.append(group['cn'])
 
     return group_cns
@@ -2610,7 +2819,7 @@ class LDAPAttributePluginGroupsToRoles(LDAPBuiltinAttributePlugin):
                 dn = dn.lower()  # lower case matching for DNs!
 
                 # if group could be found and user is a member, add the role
-                if dn in ldap_groups and user_cmp_val in ldap_groups[dn]['members']:
+                if dn in ldap_groups and _is_group_member(ldap_groups[dn], user_cmp_val):
                     roles.add(role_id)
 
         # Load default roles from default user profile when the user got no role
@@ -829,6 +829,38 @@ class ConfigVariableRescheduleTimeout(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableAvailabilityStoreDays(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupUserInterface
+
+    def domain(self):
+        return ConfigDomainGUI
+
+    def ident(self):
+        return "availability_store_days"
+
+    def valuespec(self):
+        return Optional(
+            Integer(
+                title=_("Keep the durations of"),
+                minvalue=1,
+                unit=_("days"),
+                default_value=400,
+            ),
+            title=_("Precomputed availability"),
+            help=_("When enabled, the durations of the states of all hosts and services are "
+                   "summed up once per day in the background and kept for the configured "
+                   "number of days. Availability tables of long time ranges are then computed "
+                   "from these sums and the state history of the current day, instead of "
+                   "fetching and processing the complete state history. Timelines, outage "
+                   "statistics, the plugin output and the grouping by host or service groups "
+                   "still need the complete state history."),
+            label=_("Precompute the daily state durations"),
+            none_label=_('(disabled)'),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableSidebarShowVersionInSidebar(ConfigVariable):
     def group(self):
@@ -2436,6 +2468,31 @@ class ConfigVariableSimulationMode(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariablePredictionPrecompute(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupCheckExecution
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "prediction_precompute"
+
+    def valuespec(self):
+        return Checkbox(
+            title=_("Compute predictions in the background"),
+            label=_("Compute the predictions of predictive levels in the background"),
+            help=_("Per default the predictions of predictive levels are computed by the "
+                   "check helpers when a check needs a new prediction, which happens for "
+                   "many services at the same time, e.g. at midnight. With this option the "
+                   "predictions are computed every 10 minutes by a cron job, which also "
+                   "computes the predictions of the next hour in advance. Until a prediction "
+                   "is available the checks use the outdated prediction of the same time "
+                   "group, if there is one."),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableRestartLocking(ConfigVariable):
     def group(self):
@@ -4357,6 +4414,37 @@ rulespec_registry.register(
     ))
 
 
+def _valuespec_snmp_bulk_backend():
+    return Dictionary(
+        title=_("Bulk walk: Fetch SNMP data in-process with pipelined requests"),
+        help=_("Hosts matching this rule are queried by Check_MK itself instead of the SNMP "
+               "command line tools or Inline SNMP. All tables of all sections are walked at the "
+               "same time, using GETBULK requests on bulk walk hosts and GETNEXT requests "
+               "otherwise. This reduces the number of processes and the total time needed to "
+               "query a device a lot. This is only used for SNMP v1 and v2c hosts."),
+        elements=[
+            ("max_outstanding",
+             Integer(
+                 title=_("Maximum number of requests sent without an answer"),
+                 help=_("Raise this value to query faster, lower it in case the device drops "
+                        "requests when it is queried too fast."),
+                 minvalue=1,
+                 maxvalue=100,
+                 default_value=10,
+             )),
+        ],
+        optional_keys=False,
+    )
+
+
+rulespec_registry.register(
+    HostRulespec(
+        group=RulespecGroupAgentSNMP,
+        name="snmp_bulk_backend",
+        valuespec=_valuespec_snmp_bulk_backend,
+    ))
+
+
 def _help_snmp_without_sys_descr():
     return _("Devices which do not publish the system description OID .1.3.6.1.2.1.1.1.0 are "
              "normally ignored by the SNMP inventory. Use this ruleset to select hosts which "
@@ -1653,6 +1653,15 @@ def _special_agents_jolokia_mk_jolokia_elements():
              ("http", "HTTP"),
              ("https", "HTTPS"),
          ])),
+        ("bulk_size",
+         Integer(
+             title=_("Number of MBeans read per request"),
+             help=_("The MBeans are read in bulk requests of up to this number of read "
+                    "requests. This saves a round trip to the Jolokia agent for each MBean. "
+                    "If you do not set this, a request is sent for each MBean."),
+             default_value=100,
+             minvalue=1,
+         )),
     ]
 
 
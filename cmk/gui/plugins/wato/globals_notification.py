@@ -164,6 +164,71 @@ class ConfigVariableNotificationPluginTimeout(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableNotificationPluginWorkers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupNotifications
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "notification_plugin_workers"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Parallel calls of notification plugins"),
+            help=_("The notification helper of the Check_MK Micro Core executes up to this "
+                   "number of notifications of the same notification plugin in parallel. "
+                   "The notifications of one host or service are still executed one after "
+                   "another. Notifications waiting for a free worker are only kept in memory "
+                   "and are lost when the notification helper is killed or crashes. "
+                   "Set this to 0 to execute all notifications one after another."),
+            minvalue=0,
+        )
+
+
+@config_variable_registry.register
+class ConfigVariableNotificationPluginQueueSize(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupNotifications
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "notification_plugin_queue_size"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Maximum number of waiting notifications per plugin"),
+            help=_("When this number of notifications is waiting for the parallel calls of a "
+                   "notification plugin, the notification helper stops accepting new "
+                   "notifications until a call has finished."),
+            minvalue=1,
+        )
+
+
+@config_variable_registry.register
+class ConfigVariableNotificationContactgroupsCacheTTL(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupNotifications
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "notification_contactgroups_cache_ttl"
+
+    def valuespec(self):
+        return Age(
+            title=_("Cache time of contact group members"),
+            help=_("The members of the contact groups used by rule based notifications are "
+                   "fetched from the monitoring core and reused for this time."),
+            minvalue=0,
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableNotificationLogging(ConfigVariable):
     def group(self):
@@ -3069,6 +3069,31 @@ class ConfigVariableEventConsoleRuleOptimizer(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableEventConsoleEventProcessingWorkers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self):
+        return ConfigDomainEventConsole
+
+    def ident(self):
+        return "event_processing_workers"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Event processing workers"),
+            help=_("The number of worker processes creating the events from the incoming "
+                   "messages and matching them with the rules in parallel. The events are "
+                   "still processed in the order the messages have been received. With "
+                   "<tt>0</tt> all messages are processed by the Event Console daemon itself. "
+                   "Use workers in case the Event Console can not keep up with a high rate of "
+                   "incoming messages and your system has spare CPU cores."),
+            minvalue=0,
+            unit=_("workers"),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableEventConsoleActions(ConfigVariable):
     def group(self):
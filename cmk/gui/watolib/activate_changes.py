@@ -20,12 +20,15 @@ import errno
 import ast
 import os
 import shutil
+import stat
 import time
 import abc
 import multiprocessing
 import traceback
 import subprocess
 import hashlib
+import json
+import tempfile
 from logging import Logger
 from pathlib import Path
 from typing import Dict, Set, List, Optional, Tuple, Union, NamedTuple, Any
@@ -295,6 +298,12 @@ def remove_site_config_directory(site_id: SiteId) -> None:
         if e.errno != errno.ENOENT:  # No such file or directory
             raise
 
+    try:
+        _config_sync_manifest_path(site_id).unlink()
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
 
 class ActivateChanges:
     def __init__(self):
@@ -1488,7 +1497,9 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
         # central files to only be done ad-hoc in _get_file_names_to_sync when the other attributes
         # are not enough to detect a differing file.
         site_config_dir = Path(self._snapshot_settings.work_dir)
-        central_file_infos = _get_config_sync_file_infos(replication_paths, site_config_dir)
+        manifest = ConfigSyncManifest(_config_sync_manifest_path(self._site_id))
+        central_file_infos = _get_config_sync_file_infos(replication_paths, site_config_dir,
+                                                         manifest)
         self._logger.debug("Got %d file infos from %s", len(remote_file_infos), site_config_dir)
 
         self._set_sync_state(_("Computing differences"))
@@ -1500,6 +1511,7 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
         self._logger.debug("Obsolete files to be deleted: %r", to_delete)
 
         if not to_sync_new and not to_sync_changed and not to_delete:
+            manifest.save()
             self._logger.debug("Finished config sync (Nothing to be done)")
             return
 
@@ -1508,6 +1520,7 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
             (len(to_sync_new), len(to_sync_changed), len(to_delete)))
         self._synchronize_files(to_sync_new + to_sync_changed, to_delete, remote_config_generation,
                                 site_config_dir)
+        manifest.save()
         self._logger.debug("Finished config sync")
 
     def _set_sync_state(self, status_details: Optional[str] = None) -> None:
@@ -2054,6 +2067,32 @@ def _unpack_sync_archive(sync_archive: bytes, base_dir: Path) -> None:
             _("Failed to create sync archive [%d]: %s") % (p.returncode, ensure_str(stderr)))
 
 
+def _move_synchronized_files(staging_dir: Path, base_dir: Path) -> None:
+    """Move the unpacked files to the site, replacing things of another type like tar -U does
+
+    Existing directories and symlinks to directories are kept, like tar does it. Only files
+    and dangling symlinks in the way of a directory are replaced by it.
+    """
+    for dirpath, dirnames, filenames in os.walk(str(staging_dir)):
+        target_dir = base_dir.joinpath(os.path.relpath(dirpath, str(staging_dir)))
+        if not target_dir.is_dir():  # follows symlinks
+            if target_dir.is_symlink() or target_dir.exists():
+                target_dir.unlink()
+            target_dir.mkdir()
+            os.chmod(str(target_dir), stat.S_IMODE(os.stat(dirpath).st_mode))
+
+        # Symlinks to directories are listed as directories, but are not walked into
+        for name in [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]:
+            dirnames.remove(name)
+            filenames.append(name)
+
+        for name in filenames:
+            target = target_dir / name
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(str(target))
+            os.replace(os.path.join(dirpath, name), str(target))
+
+
 ConfigSyncFileInfo = NamedTuple("ConfigSyncFileInfo", [
     ("st_mode", int),
     ("st_size", int),
@@ -2090,8 +2129,11 @@ class AutomationGetConfigSyncState(AutomationCommand):
 
     def execute(self, request: List[ReplicationPath]) -> GetConfigSyncStateResponse:
         with store.lock_checkmk_configuration():
+            manifest = ConfigSyncManifest(_config_sync_manifest_path(config.omd_site()))
             file_infos = _get_config_sync_file_infos(request,
-                                                     base_dir=Path(cmk.utils.paths.omd_root))
+                                                     base_dir=Path(cmk.utils.paths.omd_root),
+                                                     manifest=manifest)
+            manifest.save()
             transport_file_infos = {
                 k: (v.st_mode, v.st_size, v.link_target, v.file_hash)
                 for k, v in file_infos.items()
@@ -2099,12 +2141,15 @@ class AutomationGetConfigSyncState(AutomationCommand):
             return (transport_file_infos, _get_current_config_generation())
 
 
-def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
-                                base_dir: Path) -> Dict[str, ConfigSyncFileInfo]:
+def _get_config_sync_file_infos(
+        replication_paths: List[ReplicationPath],
+        base_dir: Path,
+        manifest: 'Optional[ConfigSyncManifest]' = None) -> Dict[str, ConfigSyncFileInfo]:
     """Scans the given replication paths for the information needed for the config sync
 
     It produces a dictionary of sync file infos. One entry is created for each file.  Directories
-    are not added to the dictionary.
+    are not added to the dictionary. The hashes of files which have not been changed since the
+    manifest was saved are taken from the manifest.
     """
     infos = {}
 
@@ -2115,7 +2160,7 @@ def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
             continue  # Only report back existing things
 
         if replication_path.ty == "file":
-            infos[replication_path.site_path] = _get_config_sync_file_info(path)
+            infos[replication_path.site_path] = _get_config_sync_file_info(path, manifest)
 
         elif replication_path.ty == "dir":
             for entry in path.glob("**/*"):
@@ -2123,21 +2168,29 @@ def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
                     continue  # Do not add directories at all
 
                 entry_site_path = entry.relative_to(base_dir)
-                infos[str(entry_site_path)] = _get_config_sync_file_info(entry)
+                infos[str(entry_site_path)] = _get_config_sync_file_info(entry, manifest)
 
         else:
             raise NotImplementedError()
     return infos
 
 
-def _get_config_sync_file_info(file_path: Path) -> ConfigSyncFileInfo:
+def _get_config_sync_file_info(file_path: Path,
+                               manifest: 'Optional[ConfigSyncManifest]' = None
+                              ) -> ConfigSyncFileInfo:
     stat = file_path.lstat()
     is_symlink = file_path.is_symlink()
+    if is_symlink:
+        file_hash = None
+    elif manifest is None:
+        file_hash = _create_config_sync_file_hash(file_path)
+    else:
+        file_hash = manifest.file_hash(file_path, stat)
     return ConfigSyncFileInfo(
         stat.st_mode,
         stat.st_size,
         os.readlink(str(file_path)) if is_symlink else None,
-        _create_config_sync_file_hash(file_path) if not is_symlink else None,
+        file_hash,
     )
 
 
@@ -2152,6 +2205,49 @@ def _create_config_sync_file_hash(file_path: Path) -> str:
     return sha256.hexdigest()
 
 
+class ConfigSyncManifest:
+    """The hashes of the files compared during the last config sync
+
+    Hashing all files is the most expensive part of computing the differences between the
+    central and a remote site. A file having the same inode, size and modification time as
+    during the last sync still has the same content, so its hash is taken from the manifest.
+    The site_config directories of the central site consist of hard links to the
+    configuration files, so the unchanged files keep their inodes between activations.
+    """
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._known_files = self._load()
+        self._files: Dict[str, List] = {}
+
+    def _load(self) -> Dict[str, List]:
+        try:
+            return json.loads(store.load_text_from_file(self._path, default="{}"))
+        except ValueError:
+            return {}
+
+    def file_hash(self, file_path: Path, stat: os.stat_result) -> str:
+        key = [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+        known = self._known_files.get(str(file_path))
+        if known is not None and known[:3] == key:
+            file_hash = known[3]
+        else:
+            file_hash = _create_config_sync_file_hash(file_path)
+
+        # A file modified just now may be modified again within the resolution of the
+        # modification time. Hash it again during the next sync.
+        if stat.st_mtime < time.time() - 2:
+            self._files[str(file_path)] = key + [file_hash]
+        return file_hash
+
+    def save(self) -> None:
+        store.makedirs(self._path.parent)
+        store.save_text_to_file(self._path, json.dumps(self._files))
+
+
+def _config_sync_manifest_path(site_id: SiteId) -> Path:
+    return Path(cmk.utils.paths.var_dir) / "wato" / "config_sync_manifests" / ("%s.json" % site_id)
+
+
 def update_config_generation():
     """Increase the config generation ID
 
@@ -2215,20 +2311,34 @@ class AutomationReceiveConfigSync(AutomationCommand):
             return True
 
     def _update_config_on_remote_site(self, sync_archive: bytes, to_delete: List[str]) -> None:
-        """Use the given tar archive and list of files to be deleted to update the local files"""
+        """Use the given tar archive and list of files to be deleted to update the local files
+
+        The archive is unpacked to a staging directory first, so a broken archive does not
+        change anything. Then the obsolete files are deleted and the received files are renamed
+        to their final location, which replaces each of them atomically.
+        """
         base_dir = Path(cmk.utils.paths.omd_root)
 
-        for site_path in to_delete:
-            site_file = base_dir.joinpath(site_path)
-            try:
-                site_file.unlink()
-            except OSError as e:
-                # errno.ENOENT - File already removed. Fine
-                # errno.ENOTDIR - dir with files was replaced by e.g. symlink
-                if e.errno not in [errno.ENOENT, errno.ENOTDIR]:
-                    raise
+        # The staging directory has to be on the same file system as the configuration
+        staging_base_dir = Path(cmk.utils.paths.var_dir) / "wato"
+        store.makedirs(staging_base_dir)
+        staging_dir = Path(tempfile.mkdtemp(prefix="config_sync_", dir=str(staging_base_dir)))
+        try:
+            _unpack_sync_archive(sync_archive, staging_dir)
 
-        _unpack_sync_archive(sync_archive, base_dir)
+            for site_path in to_delete:
+                site_file = base_dir.joinpath(site_path)
+                try:
+                    site_file.unlink()
+                except OSError as e:
+                    # errno.ENOENT - File already removed. Fine
+                    # errno.ENOTDIR - dir with files was replaced by e.g. symlink
+                    if e.errno not in [errno.ENOENT, errno.ENOTDIR]:
+                        raise
+
+            _move_synchronized_files(staging_dir, base_dir)
+        finally:
+            shutil.rmtree(str(staging_dir), ignore_errors=True)
 
 
 def activate_changes_start(
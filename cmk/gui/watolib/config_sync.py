@@ -357,15 +357,30 @@ def extract_from_buffer(buffer_: bytes, base_dir: Path, elements: List[Replicati
 
 
 def _extract(tar: tarfile.TarFile, base_dir: Path, components: List[ReplicationPath]) -> None:
-    """Extract a tar archive with the new site configuration received from a central site"""
+    """Extract a tar archive with the new site configuration received from a central site
+
+    All component archives are read before the first file is changed, so a damaged snapshot
+    does not leave a partially updated configuration behind.
+    """
+    subtars = []
     for component in components:
         try:
-            try:
-                subtarstream = tar.extractfile(component.ident + ".tar")
-            except Exception:
-                continue  # may be missing, e.g. sites.tar is only present
-                # if some sites have been created.
+            subtarstream = tar.extractfile(component.ident + ".tar")
+        except Exception:
+            continue  # may be missing, e.g. sites.tar is only present
+            # if some sites have been created.
 
+        try:
+            # Extract without use of temporary files
+            subtar = tarfile.open(fileobj=subtarstream)
+            subtar.getmembers()
+        except Exception:
+            raise MKGeneralException('Failed to extract subtar %s: %s' %
+                                     (component.ident, traceback.format_exc()))
+        subtars.append((component, subtar))
+
+    for component, subtar in subtars:
+        try:
             component_path = str(base_dir.joinpath(component.site_path))
 
             if component.ty == "dir":
@@ -373,9 +388,6 @@ def _extract(tar: tarfile.TarFile, base_dir: Path, components: List[ReplicationP
             else:
                 target_dir = os.path.dirname(component_path)
 
-            # Extract without use of temporary files
-            subtar = tarfile.open(fileobj=subtarstream)
-
             # Remove old stuff
             if os.path.exists(component_path):
                 if component.ident == "usersettings":
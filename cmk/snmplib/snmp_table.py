@@ -64,6 +64,15 @@ SPECIAL_COLUMNS = [
 ]
 
 
+def get_fetch_oids(oid_info: Union[OIDInfo, SNMPTree], use_snmpwalk_cache: bool) -> List[OID]:
+    """Return the OIDs walked for getting the table, except the ones read from the walk cache"""
+    oid, suboids, targetcolumns = _make_target_columns(oid_info)
+    return [
+        _compute_fetch_oid(oid, suboid, column) for suboid in suboids for column in targetcolumns if
+        column not in SPECIAL_COLUMNS and not (use_snmpwalk_cache and isinstance(column, OIDCached))
+    ]
+
+
 # TODO: OID_END_OCTET_STRING is not used at all. Drop it.
 def _get_snmp_table(check_plugin_name: CheckPluginNameStr, oid_info: Union[OIDInfo, SNMPTree],
                     use_snmpwalk_cache: bool, *, backend: ABCSNMPBackend) -> SNMPTable:
@@ -87,6 +87,7 @@ class SNMPHostConfig(
             ("is_usewalk_host", bool),
             ("is_inline_snmp_host", bool),
             ("record_stats", bool),
+            ("bulk_backend_settings", Optional[Dict[str, int]]),
         ])):
     @property
     def is_snmpv3_host(self) -> bool:
@@ -147,6 +148,13 @@ class ABCSNMPBackend(metaclass=abc.ABCMeta):
              context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
         return []
 
+    def prefetch(self, oids: List[OID]) -> None:
+        """Announce the OIDs that are going to be walked
+
+        Backends that are able to walk many OIDs at the same time may do so here
+        and return the results on the following calls of walk().
+        """
+
 
 OID_END = 0  # Suffix-part of OID that was not specified
 OID_STRING = -1  # Complete OID as string ".1.3.6.1.4.1.343...."
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Array based time series for the graph and prediction math
+
+The values of cmk.utils.prediction.TimeSeries are lists containing None for
+missing values, which have to be processed point by point. Here the values are
+kept in NumPy arrays of floats having NaN for the missing values, so that the
+operators, the resampling and the percentiles are computed for all points at
+once. to_array() and to_values() convert between both representations.
+"""
+
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np  # type: ignore[import]
+
+from cmk.utils.prediction import (
+    ConsolidationFunctionName,
+    TimeSeries,
+    TimeSeriesValue,
+    TimeSeriesValues,
+    TimeWindow,
+)
+from cmk.utils.type_defs import Seconds
+
+ArrayOperator = Callable[[List[np.ndarray]], np.ndarray]
+
+
+def to_array(values: Union[np.ndarray, Sequence[TimeSeriesValue]]) -> np.ndarray:
+    """Convert the values of a time series to an array, None becomes NaN"""
+    if isinstance(values, TimeSeries):
+        values = values.values
+    return np.array(values, dtype=float)
+
+
+def to_values(array: np.ndarray) -> TimeSeriesValues:
+    """Convert an array to the values of a time series, NaN becomes None"""
+    values = array.tolist()
+    for index in np.flatnonzero(np.isnan(array)).tolist():
+        values[index] = None
+    return values
+
+
+class ArrayTimeSeries:
+    """A TimeSeries keeping its values in an array
+
+    The constructor takes the same arguments as TimeSeries. The values property,
+    indexing and time_data_pairs() provide the list based interface of TimeSeries.
+    """
+    def __init__(self,
+                 data: Union[np.ndarray, TimeSeriesValues],
+                 timewindow: Optional[Tuple[float, float, float]] = None) -> None:
+        if timewindow is None:
+            if data[0] is None or data[1] is None or data[2] is None:
+                raise ValueError("timewindow must not contain None")
+
+            timewindow = data[0], data[1], data[2]
+            data = data[3:]
+
+        self.start = int(timewindow[0])
+        self.end = int(timewindow[1])
+        self.step = int(timewindow[2])
+        self.array = to_array(data)
+
+    @classmethod
+    def from_time_series(cls, time_series: TimeSeries) -> 'ArrayTimeSeries':
+        return cls(time_series.values, time_series.twindow)
+
+    def to_time_series(self) -> TimeSeries:
+        return TimeSeries(self.values, self.twindow)
+
+    @property
+    def twindow(self) -> TimeWindow:
+        return self.start, self.end, self.step
+
+    @property
+    def values(self) -> TimeSeriesValues:
+        return to_values(self.array)
+
+    def timestamps(self) -> np.ndarray:
+        return self.start + self.step * np.arange(1, len(self.array) + 1)
+
+    def time_data_pairs(self) -> List[Tuple[int, TimeSeriesValue]]:
+        return list(zip(self.timestamps().tolist(), self.values))
+
+    def bfill_upsample(self, twindow: TimeWindow, shift: Seconds) -> 'ArrayTimeSeries':
+        """Upsample by backward filling values, see TimeSeries.bfill_upsample()"""
+        if twindow == self.twindow:
+            return ArrayTimeSeries(self.array.copy(), twindow)
+        return ArrayTimeSeries(bfill_upsample(self.array, self.twindow, twindow, shift), twindow)
+
+    def downsample(self,
+                   twindow: TimeWindow,
+                   cf: ConsolidationFunctionName = 'max') -> 'ArrayTimeSeries':
+        """Downsample by the consolidation function, see TimeSeries.downsample()"""
+        if twindow == self.twindow:
+            return ArrayTimeSeries(self.array.copy(), twindow)
+        return ArrayTimeSeries(downsample(self.array, self.twindow, twindow, cf), twindow)
+
+    def percentile(self, q: float) -> Optional[float]:
+        return percentile(self.array, q)
+
+    def _operate(self,
+                 other: Union['ArrayTimeSeries', float],
+                 operator_id: str,
+                 reverse: bool = False) -> 'ArrayTimeSeries':
+        other_array = other.array if isinstance(other, ArrayTimeSeries) else np.full_like(
+            self.array, other)
+        operands = [other_array, self.array] if reverse else [self.array, other_array]
+        return ArrayTimeSeries(array_operators()[operator_id][1](operands), self.twindow)
+
+    def __add__(self, other: Union['ArrayTimeSeries', float]) -> 'ArrayTimeSeries':
+        return self._operate(other, "+")
+
+    def __radd__(self, other: float) -> 'ArrayTimeSeries':
+        return self._operate(other, "+", reverse=True)
+
+    def __sub__(self, other: Union['ArrayTimeSeries', float]) -> 'ArrayTimeSeries':
+        return self._operate(other, "-")
+
+    def __rsub__(self, other: float) -> 'ArrayTimeSeries':
+        return self._operate(other, "-", reverse=True)
+
+    def __mul__(self, other: Union['ArrayTimeSeries', float]) -> 'ArrayTimeSeries':
+        return self._operate(other, "*")
+
+    def __rmul__(self, other: float) -> 'ArrayTimeSeries':
+        return self._operate(other, "*", reverse=True)
+
+    def __truediv__(self, other: Union['ArrayTimeSeries', float]) -> 'ArrayTimeSeries':
+        return self._operate(other, "/")
+
+    def __rtruediv__(self, other: float) -> 'ArrayTimeSeries':
+        return self._operate(other, "/", reverse=True)
+
+    def __repr__(self) -> str:
+        return "ArrayTimeSeries(%s, timewindow=%s)" % (self.values, self.twindow)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ArrayTimeSeries):
+            return NotImplemented
+        return self.twindow == other.twindow and self.values == other.values
+
+    def __getitem__(self, i: int) -> TimeSeriesValue:
+        value = self.array[i]
+        return None if math.isnan(value) else float(value)
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+
+#.
+#   .--Resampling----------------------------------------------------------.
+#   |           ____                                 _ _                   |
+#   |          |  _ \ ___  ___  __ _ _ __ ___  _ __ | (_)_ __   __ _       |
+#   |          | |_) / _ \/ __|/ _` | '_ ` _ \| '_ \| | | '_ \ / _` |      |
+#   |          |  _ <  __/\__ \ (_| | | | | | | |_) | | | | | | (_| |      |
+#   |          |_| \_\___||___/\__,_|_| |_| |_| .__/|_|_|_| |_|\__, |      |
+#   |                                         |_|              |___/       |
+#   '----------------------------------------------------------------------'
+
+
+def bfill_upsample(array: np.ndarray, source: TimeWindow, target: TimeWindow,
+                   shift: Seconds) -> np.ndarray:
+    """Each target point takes the value of the source interval it lies in
+
+    The points after the end of the source are NaN."""
+    start, end, step = target
+    source_timestamps = source[0] + source[2] * np.arange(1, len(array) + 1) + shift
+    indices = np.searchsorted(source_timestamps, np.arange(start, end, step), side="right")
+    upsampled = np.full(len(indices), np.nan)
+    valid = indices < len(array)
+    upsampled[valid] = array[indices[valid]]
+    return upsampled
+
+
+def downsample(array: np.ndarray, source: TimeWindow, target: TimeWindow,
+               cf: Optional[ConsolidationFunctionName]) -> np.ndarray:
+    """Consolidate the source points of each target interval like RRDtool
+
+    Missing values are ignored, target intervals without values are NaN."""
+    start, end, step = target
+    num_points = len(range(start, end, step))
+    consolidated = np.full(num_points, np.nan)
+    if not num_points or not len(array):
+        return consolidated
+
+    # The source point at timestamp t belongs to the target interval ]t_i - step; t_i]
+    timestamps = source[0] + source[2] * np.arange(1, len(array) + 1)
+    buckets = np.maximum(np.ceil((timestamps - start) / step).astype(int) - 1, 0)
+    in_range = buckets < num_points
+    buckets = buckets[in_range]
+    values = array[in_range]
+    valid = ~np.isnan(values)
+    buckets = buckets[valid]
+    values = values[valid]
+    if not len(values):
+        return consolidated
+
+    # The buckets are ascending: reduce each run of equal buckets
+    run_starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    cf = (cf or "max").lower()
+    if cf == "max":
+        reduced = np.maximum.reduceat(values, run_starts)
+    elif cf == "min":
+        reduced = np.minimum.reduceat(values, run_starts)
+    elif cf == "average":
+        reduced = np.add.reduceat(values, run_starts) / np.diff(np.r_[run_starts, len(values)])
+    else:
+        raise ValueError("Invalid Aggregation function %s, only max, min, average allowed" % cf)
+
+    consolidated[buckets[run_starts]] = reduced
+    return consolidated
+
+
+def percentile(array: np.ndarray, q: float) -> Optional[float]:
+    """The q-th percentile of the values using midpoint interpolation
+
+    Same as cmk.gui.plugins.metrics.stats.percentile(), missing values are ignored."""
+    values = array[~np.isnan(array)]
+    if not len(values):
+        return None
+
+    target_index = q / 100.0 * len(values) - 0.5
+    index_f = max(int(math.floor(target_index)), 0)
+    index_c = min(int(math.ceil(target_index)), len(values) - 1)
+    if target_index < 0 or index_f >= index_c:
+        return float(np.partition(values, index_f)[index_f])
+
+    partitioned = np.partition(values, [index_f, index_c])
+    return float((partitioned[index_f] + partitioned[index_c]) / 2.0)
+
+
+#.
+#   .--Operators-----------------------------------------------------------.
+#   |             ___                       _                              |
+#   |            / _ \ _ __   ___ _ __ __ _| |_ ___  _ __ ___              |
+#   |           | | | | '_ \ / _ \ '__/ _` | __/ _ \| '__/ __|             |
+#   |           | |_| | |_) |  __/ | | (_| | || (_) | |  \__ \             |
+#   |            \___/| .__/ \___|_|  \__,_|\__\___/|_|  |___/             |
+#   |                 |_|                                                  |
+#   +----------------------------------------------------------------------+
+#   |  The operators of the graph expressions. They behave like the point  |
+#   |  wise operators of cmk.gui.plugins.metrics.timeseries: the result is |
+#   |  missing if all operands are missing or the operator fails.          |
+#   '----------------------------------------------------------------------'
+
+
+def _operator_sum(arrays: List[np.ndarray]) -> np.ndarray:
+    stacked = np.vstack(arrays)
+    valid = ~np.isnan(stacked)
+    result = np.where(valid, stacked, 0.0).sum(axis=0)
+    result[~valid.any(axis=0)] = np.nan
+    return result
+
+
+def _operator_product(arrays: List[np.ndarray]) -> np.ndarray:
+    return np.prod(np.vstack(arrays), axis=0)
+
+
+def _operator_difference(arrays: List[np.ndarray]) -> np.ndarray:
+    return arrays[0] - arrays[1]
+
+
+def _operator_fraction(arrays: List[np.ndarray]) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = arrays[0] / arrays[1]
+    result[arrays[1] == 0] = np.nan
+    return result
+
+
+def _operator_maximum(arrays: List[np.ndarray]) -> np.ndarray:
+    return np.fmax.reduce(np.vstack(arrays), axis=0)
+
+
+def _operator_minimum(arrays: List[np.ndarray]) -> np.ndarray:
+    return np.fmin.reduce(np.vstack(arrays), axis=0)
+
+
+def _operator_average(arrays: List[np.ndarray]) -> np.ndarray:
+    stacked = np.vstack(arrays)
+    valid = ~np.isnan(stacked)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, stacked, 0.0).sum(axis=0) / valid.sum(axis=0)
+
+
+def _operator_merge(arrays: List[np.ndarray]) -> np.ndarray:
+    result = arrays[-1]
+    for array in reversed(arrays[:-1]):
+        result = np.where(np.isnan(array), result, array)
+    return result
+
+
+def array_operators() -> Dict[str, Tuple[str, ArrayOperator]]:
+    return {
+        "+": ("Sum", _operator_sum),
+        "*": ("Product", _operator_product),
+        "-": ("Difference", _operator_difference),
+        "/": ("Fraction", _operator_fraction),
+        "MAX": ("Maximum", _operator_maximum),
+        "MIN": ("Minimum", _operator_minimum),
+        "AVERAGE": ("Average", _operator_average),
+        "MERGE": ("First non None", _operator_merge),
+    }
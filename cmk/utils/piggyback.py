@@ -4,12 +4,15 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+from contextlib import closing
 import errno
 import logging
 import os
 from pathlib import Path
+import sqlite3
 import tempfile
-from typing import Optional, Dict, Iterator, List, Tuple, NamedTuple
+import time
+from typing import Optional, Dict, Iterable, Iterator, List, Set, Tuple, NamedTuple
 
 import cmk.utils
 import cmk.utils.paths
@@ -43,6 +46,16 @@ PiggybackRawDataInfo = NamedTuple('PiggybackRawDataInfo', [
 
 PiggybackTimeSettings = List[Tuple[Optional[str], str, int]]
 
+# The modification times of a piggyback file and of the status file of its source.
+# None means the file does not exist.
+_PiggybackFileState = NamedTuple('_PiggybackFileState', [
+    ('file_mtime', Optional[float]),
+    ('status_mtime', Optional[float]),
+])
+
+# The piggyback file states per piggybacked host and source
+_PiggybackFileStates = Dict[str, Dict[str, _PiggybackFileState]]
+
 # ***** Terminology *****
 # "piggybacked_host_folder":
 # - tmp/check_mk/piggyback/HOST
@@ -59,6 +72,9 @@ PiggybackTimeSettings = List[Tuple[Optional[str], str, int]]
 # "source_hostname":
 # - Path(tmp/check_mk/piggyback/HOST/SOURCE).name
 # - Path(tmp/check_mk/piggyback_sources/SOURCE).name
+#
+# "catalog":
+# - tmp/check_mk/piggyback/.catalog.sqlite
 
 
 def get_piggyback_raw_data(piggybacked_hostname: str,
@@ -133,15 +149,11 @@ def get_source_and_piggyback_hosts(
         time_settings: PiggybackTimeSettings) -> Iterator[Tuple[str, str]]:
     """Generates all piggyback pig/piggybacked host pairs that have up-to-date data"""
 
-    # Pylint bug (https://github.com/PyCQA/pylint/issues/1660). Fixed with pylint 2.x
-    for piggybacked_host_folder in _get_piggybacked_host_folders():
-        for file_info in _get_piggyback_processed_file_infos(
-                piggybacked_host_folder.name,
-                time_settings,
-        ):
+    for piggybacked_hostname, file_states in _get_piggyback_file_states(None).items():
+        for file_info in _get_file_infos(piggybacked_hostname, file_states, time_settings):
             if not file_info.successfully_processed:
                 continue
-            yield file_info.source_hostname, piggybacked_host_folder.name
+            yield file_info.source_hostname, piggybacked_hostname
 
 
 def has_piggyback_raw_data(piggybacked_hostname: str, time_settings: PiggybackTimeSettings) -> bool:
@@ -160,22 +172,26 @@ def _get_piggyback_processed_file_infos(
     functions. Therefor all these functions needs to deal with suddenly vanishing or
     updated files/directories.
     """
-    source_hostnames = get_source_hostnames(piggybacked_hostname)
-    matching_time_settings = _get_matching_time_settings(source_hostnames, piggybacked_hostname,
-                                                         time_settings)
+    return _get_file_infos(
+        piggybacked_hostname,
+        _get_piggyback_file_states(piggybacked_hostname).get(piggybacked_hostname, {}),
+        time_settings,
+    )
 
-    file_infos: List[PiggybackFileInfo] = []
-    for source_hostname in source_hostnames:
-        if source_hostname.startswith("."):
-            continue
 
-        piggyback_file_path = _get_piggybacked_file_path(source_hostname, piggybacked_hostname)
+def _get_file_infos(piggybacked_hostname: str, file_states: Dict[str, _PiggybackFileState],
+                    time_settings: PiggybackTimeSettings) -> List[PiggybackFileInfo]:
+    matching_time_settings = _get_matching_time_settings(list(file_states), piggybacked_hostname,
+                                                         time_settings)
 
+    file_infos: List[PiggybackFileInfo] = []
+    for source_hostname, file_state in file_states.items():
         successfully_processed, reason, reason_status = _get_piggyback_processed_file_info(
-            source_hostname, piggybacked_hostname, piggyback_file_path, matching_time_settings)
+            source_hostname, piggybacked_hostname, file_state, matching_time_settings)
 
-        piggyback_file_info = PiggybackFileInfo(source_hostname, piggyback_file_path,
-                                                successfully_processed, reason, reason_status)
+        piggyback_file_info = PiggybackFileInfo(
+            source_hostname, _get_piggybacked_file_path(source_hostname, piggybacked_hostname),
+            successfully_processed, reason, reason_status)
         file_infos.append(piggyback_file_info)
     return file_infos
 
@@ -199,27 +215,27 @@ def _get_matching_time_settings(
 
 
 def _get_piggyback_processed_file_info(
-        source_hostname: str, piggybacked_hostname: str, piggyback_file_path: Path,
+        source_hostname: str, piggybacked_hostname: str, file_state: _PiggybackFileState,
         time_settings: Dict[Tuple[Optional[str], str], int]) -> Tuple[bool, str, int]:
 
     max_cache_age = _get_max_cache_age(source_hostname, piggybacked_hostname, time_settings)
     validity_period = _get_validity_period(source_hostname, piggybacked_hostname, time_settings)
     validity_state = _get_validity_state(source_hostname, piggybacked_hostname, time_settings)
 
-    try:
-        file_age = cmk.utils.cachefile_age(piggyback_file_path)
-    except MKGeneralException:
+    if file_state.file_mtime is None:
         return False, "Piggyback file might have been deleted", 0
 
+    file_age = time.time() - file_state.file_mtime
     if file_age > max_cache_age:
         return False, "Piggyback file too old: %s" % Age(file_age - max_cache_age), 0
 
-    status_file_path = _get_source_status_file_path(source_hostname)
-    if not status_file_path.exists():
+    if file_state.status_mtime is None:
         reason = "Source '%s' not sending piggyback data" % source_hostname
         return _eval_file_in_validity_period(file_age, validity_period, validity_state, reason)
 
-    if _is_piggyback_file_outdated(status_file_path, piggyback_file_path):
+    # The status file and the piggyback files get the same mtime while storing. Compare only
+    # the seconds, like os.stat()[8] did before.
+    if int(file_state.status_mtime) > int(file_state.file_mtime):
         reason = "Piggyback file not updated by source '%s'" % source_hostname
         return _eval_file_in_validity_period(file_age, validity_period, validity_state, reason)
 
@@ -258,19 +274,6 @@ def _eval_file_in_validity_period(file_age: float, validity_period: Optional[int
     return False, reason, 0
 
 
-def _is_piggyback_file_outdated(status_file_path: Path, piggyback_file_path: Path) -> bool:
-    try:
-        # TODO use Path.stat() but be aware of:
-        # On POSIX platforms Python reads atime and mtime at nanosecond resolution
-        # but only writes them at microsecond resolution.
-        # (We're using os.utime() in _store_status_file_of())
-        return os.stat(str(status_file_path))[8] > os.stat(str(piggyback_file_path))[8]
-    except OSError as e:
-        if e.errno == errno.ENOENT:
-            return True
-        raise
-
-
 def _remove_piggyback_file(piggyback_file_path: Path) -> bool:
     try:
         piggyback_file_path.unlink()
@@ -285,7 +288,9 @@ def remove_source_status_file(source_hostname: str) -> bool:
     """Remove the source_status_file of this piggyback host which will
     mark the piggyback data from this source as outdated."""
     source_status_path = _get_source_status_file_path(source_hostname)
-    return _remove_piggyback_file(source_status_path)
+    removed = _remove_piggyback_file(source_status_path)
+    _update_catalog(source_status=[(source_hostname, None)])
+    return removed
 
 
 def store_piggyback_raw_data(source_hostname: str, piggybacked_raw_data: Dict[str,
@@ -312,13 +317,22 @@ def store_piggyback_raw_data(source_hostname: str, piggybacked_raw_data: Dict[st
         logger.log(VERBOSE, "Received piggyback data for %d hosts", len(piggybacked_raw_data))
 
         status_file_path = _get_source_status_file_path(source_hostname)
-        _store_status_file_of(status_file_path, piggyback_file_paths)
+        status_file_stats = _store_status_file_of(status_file_path, piggyback_file_paths)
+        _update_catalog(
+            stored_files=[(piggybacked_hostname, source_hostname, status_file_stats.st_mtime)
+                          for piggybacked_hostname in piggybacked_raw_data],
+            folders=[(piggyback_file_path.parent.name, _get_mtime_ns(piggyback_file_path.parent))
+                     for piggyback_file_path in piggyback_file_paths],
+            source_status=[(source_hostname, status_file_stats.st_mtime_ns)],
+            create=True,
+        )
     else:
         logger.log(VERBOSE, "Received no piggyback data")
         remove_source_status_file(source_hostname)
 
 
-def _store_status_file_of(status_file_path: Path, piggyback_file_paths: List[Path]) -> None:
+def _store_status_file_of(status_file_path: Path,
+                          piggyback_file_paths: List[Path]) -> os.stat_result:
     store.makedirs(status_file_path.parent)
 
     # Cannot use store.save_bytes_to_file like:
@@ -350,6 +364,7 @@ def _store_status_file_of(status_file_path: Path, piggyback_file_paths: List[Pat
                     continue
                 raise
     os.rename(tmp_path, str(status_file_path))
+    return tmp_stats
 
 
 #   .--folders/files-------------------------------------------------------.
@@ -363,19 +378,104 @@ def _store_status_file_of(status_file_path: Path, piggyback_file_paths: List[Pat
 
 
 def get_source_hostnames(piggybacked_hostname: Optional[str] = None) -> List[str]:
-    if piggybacked_hostname is None:
-        return [
-            source_host.name
-            for piggybacked_host_folder in _get_piggybacked_host_folders()
-            for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
-        ]
-
-    piggybacked_host_folder = cmk.utils.paths.piggyback_dir / Path(piggybacked_hostname)
     return [
-        source_host.name for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
+        source_hostname
+        for file_states in _get_piggyback_file_states(piggybacked_hostname).values()
+        for source_hostname in file_states
     ]
 
 
+def _get_piggyback_file_states(piggybacked_hostname: Optional[str]) -> _PiggybackFileStates:
+    """Returns the states of the piggyback files of one or all (None) piggybacked hosts
+
+    The folder of a single piggybacked host is looked at directly, reading the catalog
+    does not pay off for a few files. When listing all hosts the states are taken from the
+    catalog for the piggybacked host folders and the source status files which were not
+    changed since the catalog was updated. The other folders and files are looked at directly.
+    """
+    if piggybacked_hostname is not None:
+        piggybacked_host_folder = cmk.utils.paths.piggyback_dir / piggybacked_hostname
+        return {piggybacked_hostname: _get_folder_file_states(piggybacked_host_folder)}
+
+    catalog = _read_catalog()
+    piggybacked_host_folders = _get_piggybacked_host_folders()
+
+    status_file_states: Dict[str, Tuple[bool, Optional[float]]] = {}
+    file_states: _PiggybackFileStates = {}
+    for piggybacked_host_folder in piggybacked_host_folders:
+        piggybacked_host = piggybacked_host_folder.name
+        if catalog is None or piggybacked_host not in catalog.folders:
+            file_states[piggybacked_host] = _get_folder_file_states(piggybacked_host_folder)
+            continue
+
+        folder_stats = _get_file_stats(piggybacked_host_folder)
+        if folder_stats is None:
+            continue
+
+        if folder_stats.st_mtime_ns != catalog.folders[piggybacked_host]:
+            # Files were added or removed without updating the catalog
+            file_states[piggybacked_host] = _get_folder_file_states(piggybacked_host_folder)
+            continue
+
+        file_states_of_host = file_states.setdefault(piggybacked_host, {})
+        for source_hostname, file_mtime in catalog.files.get(piggybacked_host, {}).items():
+            if source_hostname not in status_file_states:
+                status_file_states[source_hostname] = _get_status_file_state(
+                    source_hostname, catalog)
+
+            # Only the files written together with the current status file are taken from the
+            # catalog. The status file may have been changed without updating the catalog and
+            # the files of older runs are rarely looked at.
+            is_cataloged, status_mtime = status_file_states[source_hostname]
+            if is_cataloged and file_mtime == status_mtime:
+                file_states_of_host[source_hostname] = _PiggybackFileState(file_mtime, status_mtime)
+            else:
+                file_states_of_host[source_hostname] = _get_file_state(
+                    source_hostname, piggybacked_host)
+    return file_states
+
+
+def _get_folder_file_states(piggybacked_host_folder: Path) -> Dict[str, _PiggybackFileState]:
+    return {
+        source_host.name: _get_file_state(source_host.name, piggybacked_host_folder.name)
+        for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
+    }
+
+
+def _get_status_file_state(source_hostname: str,
+                           catalog: "_PiggybackCatalog") -> Tuple[bool, Optional[float]]:
+    """Returns whether or not the status file of the source is the one known to the catalog
+    together with the mtime of the status file"""
+    status_file_stats = _get_file_stats(_get_source_status_file_path(source_hostname))
+    if status_file_stats is None:
+        return source_hostname not in catalog.source_status, None
+    return (catalog.source_status.get(source_hostname) == status_file_stats.st_mtime_ns,
+            status_file_stats.st_mtime)
+
+
+def _get_file_state(source_hostname: str, piggybacked_hostname: str) -> _PiggybackFileState:
+    file_stats = _get_file_stats(_get_piggybacked_file_path(source_hostname, piggybacked_hostname))
+    status_file_stats = _get_file_stats(_get_source_status_file_path(source_hostname))
+    return _PiggybackFileState(
+        None if file_stats is None else file_stats.st_mtime,
+        None if status_file_stats is None else status_file_stats.st_mtime,
+    )
+
+
+def _get_file_stats(path: Path) -> Optional[os.stat_result]:
+    try:
+        return path.stat()
+    except OSError as e:
+        if e.errno in [errno.ENOENT, errno.ENOTDIR]:
+            return None
+        raise
+
+
+def _get_mtime_ns(path: Path) -> Optional[int]:
+    stats = _get_file_stats(path)
+    return None if stats is None else stats.st_mtime_ns
+
+
 def _get_piggybacked_host_folders() -> List[Path]:
     try:
         return [
@@ -423,6 +523,206 @@ def _get_piggybacked_file_path(source_hostname: str, piggybacked_hostname: str)
     return cmk.utils.paths.piggyback_dir / piggybacked_hostname / source_hostname
 
 
+#.
+#   .--catalog-------------------------------------------------------------.
+#   |                         _        _                                   |
+#   |                ___ __ _| |_ __ _| | ___   __ _                       |
+#   |               / __/ _` | __/ _` | |/ _ \ / _` |                      |
+#   |              | (_| (_| | || (_| | | (_) | (_| |                      |
+#   |               \___\__,_|\__\__,_|_|\___/ \__, |                      |
+#   |                                         |___/                        |
+#   +----------------------------------------------------------------------+
+#   | The catalog is an SQLite database listing the stored piggyback files |
+#   | together with their mtimes and the mtimes of the source status files.|
+#   | It is updated by all functions changing the piggyback files, so the  |
+#   | readers do not need to scan the directories and stat all files.      |
+#   '----------------------------------------------------------------------'
+
+# The catalog of the piggyback files:
+# - files: the mtimes of the piggyback files per piggybacked host and source
+# - folders: the st_mtime_ns of the piggybacked host folders
+# - source_status: the st_mtime_ns of the status files of the sources
+_PiggybackCatalog = NamedTuple('_PiggybackCatalog', [
+    ('files', Dict[str, Dict[str, float]]),
+    ('folders', Dict[str, int]),
+    ('source_status', Dict[str, int]),
+])
+
+_CATALOG_TIMEOUT = 10.0
+
+# The read only connection to the catalog is kept open for further lookups of the same process
+# as long as the catalog file is not changed.
+_catalog_connection: Optional[Tuple[Tuple[str, int, int, int, int], sqlite3.Connection]] = None
+
+_CATALOG_SCHEMA = """
+CREATE TABLE piggyback_files (
+    piggybacked_host TEXT NOT NULL,
+    source TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (piggybacked_host, source)
+);
+CREATE TABLE piggybacked_host_folders (
+    piggybacked_host TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE source_status (
+    source TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+def _get_catalog_path() -> Path:
+    return cmk.utils.paths.piggyback_dir / ".catalog.sqlite"
+
+
+def _read_catalog() -> Optional[_PiggybackCatalog]:
+    """Read the catalog entries of all piggybacked hosts
+
+    Returns None when there is no usable catalog."""
+    query = ("SELECT folders.piggybacked_host, folders.mtime_ns, files.source, files.mtime,"
+             " status.mtime_ns FROM piggybacked_host_folders AS folders"
+             " LEFT JOIN piggyback_files AS files"
+             " ON files.piggybacked_host = folders.piggybacked_host"
+             " LEFT JOIN source_status AS status ON status.source = files.source")
+    try:
+        connection = _get_catalog_connection()
+        if connection is None:
+            return None
+
+        catalog = _PiggybackCatalog({}, {}, {})
+        for (piggybacked_host, folder_mtime_ns, source_hostname, file_mtime,
+             status_mtime_ns) in connection.execute(query):
+            catalog.folders[piggybacked_host] = folder_mtime_ns
+            files = catalog.files.setdefault(piggybacked_host, {})
+            if source_hostname is not None:
+                files[source_hostname] = file_mtime
+            if status_mtime_ns is not None:
+                catalog.source_status[source_hostname] = status_mtime_ns
+    except sqlite3.Error as e:
+        logger.log(VERBOSE, "Cannot read piggyback catalog: %s", e)
+        return None
+    return catalog
+
+
+def _get_catalog_connection() -> Optional[sqlite3.Connection]:
+    global _catalog_connection
+
+    catalog_path = _get_catalog_path()
+    catalog_stats = _get_file_stats(catalog_path)
+    if catalog_stats is None:
+        return None
+
+    key = (str(catalog_path), os.getpid(), catalog_stats.st_dev, catalog_stats.st_ino,
+           catalog_stats.st_ctime_ns)
+    if _catalog_connection is not None:
+        if _catalog_connection[0] == key:
+            return _catalog_connection[1]
+
+        # Never use a connection of the parent process
+        if _catalog_connection[0][1] == key[1]:
+            _catalog_connection[1].close()
+        _catalog_connection = None
+
+    connection = sqlite3.connect(catalog_path.as_uri() + "?mode=ro",
+                                 uri=True,
+                                 timeout=_CATALOG_TIMEOUT)
+    _catalog_connection = key, connection
+    return connection
+
+
+def _update_catalog(
+    stored_files: Iterable[Tuple[str, str, float]] = (),
+    folders: Iterable[Tuple[str, Optional[int]]] = (),
+    source_status: Iterable[Tuple[str, Optional[int]]] = (),
+    create: bool = False,
+    replace: bool = False,
+) -> None:
+    """Apply the changes of the piggyback files in one transaction
+
+    The folders and source status files are given with their current st_mtime_ns, None
+    means they were removed. With replace all files and folders not given are removed from
+    the catalog. The catalog is created from the piggyback directories if it does not exist
+    and create is set. In case it can not be updated it is removed. The readers then fall
+    back to the directories until the catalog is created again.
+    """
+    catalog_path = _get_catalog_path()
+    try:
+        if not catalog_path.exists():
+            if not create:
+                return
+            _create_catalog(catalog_path)
+
+        with closing(sqlite3.connect(str(catalog_path), timeout=_CATALOG_TIMEOUT)) as connection:
+            with connection:
+                if replace:
+                    connection.execute("DELETE FROM piggyback_files")
+                    connection.execute("DELETE FROM piggybacked_host_folders")
+                connection.executemany("INSERT OR REPLACE INTO piggyback_files VALUES (?, ?, ?)",
+                                       stored_files)
+                _update_mtimes(connection, "piggybacked_host_folders", "piggybacked_host", folders)
+                _update_mtimes(connection, "source_status", "source", source_status)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Cannot update piggyback catalog, removing it: %s", e)
+        _remove_piggyback_file(catalog_path)
+
+
+def _update_mtimes(connection: sqlite3.Connection, table: str, key: str,
+                   mtimes: Iterable[Tuple[str, Optional[int]]]) -> None:
+    for name, mtime_ns in mtimes:
+        if mtime_ns is None:
+            connection.execute("DELETE FROM %s WHERE %s = ?" % (table, key), (name,))
+        else:
+            connection.execute("INSERT OR REPLACE INTO %s VALUES (?, ?)" % table, (name, mtime_ns))
+
+
+def _create_catalog(catalog_path: Path) -> None:
+    """Create the catalog of the currently existing piggyback files
+
+    The catalog is created under a temporary name and then linked to its final path, which
+    fails in case another process created it in the meantime.
+    """
+    store.makedirs(catalog_path.parent)
+    with tempfile.NamedTemporaryFile("wb",
+                                     dir=str(catalog_path.parent),
+                                     prefix=".%s.new" % catalog_path.name,
+                                     delete=False) as tmp:
+        tmp_path = tmp.name
+
+    try:
+        os.chmod(tmp_path, 0o660)
+        with closing(sqlite3.connect(tmp_path)) as connection:
+            connection.executescript(_CATALOG_SCHEMA)
+            with connection:
+                for piggybacked_host_folder in _get_piggybacked_host_folders():
+                    folder_stats = _get_file_stats(piggybacked_host_folder)
+                    if folder_stats is None:
+                        continue
+
+                    for source_host in _get_piggybacked_host_sources(piggybacked_host_folder):
+                        file_stats = _get_file_stats(source_host)
+                        if file_stats is not None:
+                            connection.execute("INSERT INTO piggyback_files VALUES (?, ?, ?)",
+                                               (piggybacked_host_folder.name, source_host.name,
+                                                file_stats.st_mtime))
+
+                    connection.execute("INSERT INTO piggybacked_host_folders VALUES (?, ?)",
+                                       (piggybacked_host_folder.name, folder_stats.st_mtime_ns))
+
+                for source_state_file in _get_source_state_files():
+                    status_file_stats = _get_file_stats(source_state_file)
+                    if status_file_stats is not None:
+                        connection.execute("INSERT INTO source_status VALUES (?, ?)",
+                                           (source_state_file.name, status_file_stats.st_mtime_ns))
+
+        try:
+            os.link(tmp_path, str(catalog_path))
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(tmp_path)
+
+
 #.
 #   .--clean up------------------------------------------------------------.
 #   |                     _                                                |
@@ -448,48 +748,70 @@ def cleanup_piggyback_files(time_settings: List[Tuple[Optional[str], str, int]])
         time_settings,
     )
 
+    # The folders are looked at before the files. Files stored in the meantime make the
+    # folders differ from the catalog written below.
+    folder_mtimes = {
+        piggybacked_host_folder.name: _get_mtime_ns(piggybacked_host_folder)
+        for piggybacked_host_folder in _get_piggybacked_host_folders()
+    }
+
     piggybacked_hosts_settings = _get_piggybacked_hosts_settings(time_settings)
 
-    _cleanup_old_source_status_files(piggybacked_hosts_settings)
-    _cleanup_old_piggybacked_files(piggybacked_hosts_settings)
+    removed_sources = _cleanup_old_source_status_files(piggybacked_hosts_settings)
+    removed_files, removed_folders = _cleanup_old_piggybacked_files(piggybacked_hosts_settings,
+                                                                    removed_sources)
+    _update_catalog(
+        stored_files=[
+            (piggybacked_hostname, source_hostname, file_state.file_mtime)
+            for piggybacked_hostname, file_states, _time_settings in piggybacked_hosts_settings
+            for source_hostname, file_state in file_states.items()
+            if file_state.file_mtime is not None and (piggybacked_hostname,
+                                                      source_hostname) not in removed_files
+        ],
+        folders=[(piggybacked_hostname, mtime_ns)
+                 for piggybacked_hostname, mtime_ns in folder_mtimes.items()
+                 if piggybacked_hostname not in removed_folders],
+        source_status=[(source_hostname, None) for source_hostname in removed_sources],
+        replace=True,
+    )
 
 
 def _get_piggybacked_hosts_settings(
     time_settings: List[Tuple[Optional[str], str, int]]
-) -> List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]]:
+) -> List[Tuple[str, Dict[str, _PiggybackFileState], Dict[Tuple[Optional[str], str], int]]]:
     piggybacked_hosts_settings = []
-    for piggybacked_host_folder in _get_piggybacked_host_folders():
-        source_hosts = _get_piggybacked_host_sources(piggybacked_host_folder)
+    for piggybacked_hostname, file_states in _get_piggyback_file_states(None).items():
         matching_time_settings = _get_matching_time_settings(
-            [source_host.name for source_host in source_hosts],
-            piggybacked_host_folder.name,
+            list(file_states),
+            piggybacked_hostname,
             time_settings,
         )
         piggybacked_hosts_settings.append(
-            (piggybacked_host_folder, source_hosts, matching_time_settings))
+            (piggybacked_hostname, file_states, matching_time_settings))
     return piggybacked_hosts_settings
 
 
 def _cleanup_old_source_status_files(
-    piggybacked_hosts_settings: List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]]
-) -> None:
+    piggybacked_hosts_settings: List[Tuple[str, Dict[str, _PiggybackFileState],
+                                           Dict[Tuple[Optional[str], str], int]]]
+) -> List[str]:
     """Remove source status files which exceed configured maximum cache age.
     There may be several 'Piggybacked Host Files' rules where the max age is configured.
     We simply use the greatest one per source."""
 
     max_cache_age_by_sources: Dict[str, int] = {}
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for source_host in source_hosts:
-            max_cache_age = _get_max_cache_age(source_host.name, piggybacked_host_folder.name,
-                                               time_settings)
+    for piggybacked_hostname, file_states, time_settings in piggybacked_hosts_settings:
+        for source_hostname in file_states:
+            max_cache_age = _get_max_cache_age(source_hostname, piggybacked_hostname, time_settings)
 
-            max_cache_age_of_source = max_cache_age_by_sources.get(source_host.name)
+            max_cache_age_of_source = max_cache_age_by_sources.get(source_hostname)
             if max_cache_age_of_source is None:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[source_hostname] = max_cache_age
 
             elif max_cache_age >= max_cache_age_of_source:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[source_hostname] = max_cache_age
 
+    removed_sources = []
     for source_state_file in _get_source_state_files():
         try:
             file_age = cmk.utils.cachefile_age(source_state_file)
@@ -514,36 +836,49 @@ def _cleanup_old_source_status_files(
                 Age(file_age - max_cache_age_of_source),
             )
             _remove_piggyback_file(source_state_file)
+            removed_sources.append(source_state_file.name)
+    return removed_sources
 
 
 def _cleanup_old_piggybacked_files(
-    piggybacked_hosts_settings: List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]]
-) -> None:
+    piggybacked_hosts_settings: List[Tuple[str, Dict[str, _PiggybackFileState],
+                                           Dict[Tuple[Optional[str], str], int]]],
+    removed_sources: List[str],
+) -> Tuple[Set[Tuple[str, str]], Set[str]]:
     """Remove piggybacked data files which exceed configured maximum cache age."""
 
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for piggybacked_host_source in source_hosts:
+    removed_files: Set[Tuple[str, str]] = set()
+    removed_folders: Set[str] = set()
+    for piggybacked_hostname, file_states, time_settings in piggybacked_hosts_settings:
+        for source_hostname, file_state in file_states.items():
+            if source_hostname in removed_sources:
+                file_state = file_state._replace(status_mtime=None)
+
             successfully_processed, reason, _reason_status = _get_piggyback_processed_file_info(
-                piggybacked_host_source.name,
-                piggybacked_host_folder.name,
-                piggybacked_host_source,
+                source_hostname,
+                piggybacked_hostname,
+                file_state,
                 time_settings=time_settings,
             )
 
             if not successfully_processed:
+                piggyback_file_path = _get_piggybacked_file_path(source_hostname,
+                                                                 piggybacked_hostname)
                 logger.log(
                     VERBOSE,
                     "Piggyback file '%s' is outdated (%s). Remove it.",
-                    piggybacked_host_source,
+                    piggyback_file_path,
                     reason,
                 )
-                _remove_piggyback_file(piggybacked_host_source)
+                _remove_piggyback_file(piggyback_file_path)
+                removed_files.add((piggybacked_hostname, source_hostname))
 
         # Remove empty backed host directory
+        piggybacked_host_folder = cmk.utils.paths.piggyback_dir / piggybacked_hostname
         try:
             piggybacked_host_folder.rmdir()
         except OSError as e:
-            if e.errno == errno.ENOTEMPTY:
+            if e.errno in [errno.ENOTEMPTY, errno.ENOENT]:
                 continue
             raise
         else:
@@ -552,3 +887,5 @@ def _cleanup_old_piggybacked_files(
                 "Piggyback folder '%s' is empty. Removed it.",
                 piggybacked_host_folder,
             )
+            removed_folders.add(piggybacked_hostname)
+    return removed_files, removed_folders
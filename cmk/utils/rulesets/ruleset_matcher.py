@@ -5,7 +5,10 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """This module provides generic Check_MK ruleset processing functionality"""
 
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Pattern, Set, Tuple
+import itertools
+import re
+from typing import (TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Generator, Iterable, List,
+                    Optional, Pattern, Set, Tuple)
 
 from cmk.utils.rulesets.tuple_rulesets import (
     ALL_HOSTS,
@@ -16,7 +19,8 @@ from cmk.utils.rulesets.tuple_rulesets import (
 )
 from cmk.utils.regex import regex
 from cmk.utils.exceptions import MKGeneralException
-from cmk.utils.type_defs import HostName, ServiceName, TagGroups, TagList, Ruleset, RuleValue
+from cmk.utils.type_defs import (HostName, ServiceName, TagGroups, TagList, Ruleset, RuleValue,
+                                 Labels)
 
 if TYPE_CHECKING:
     from cmk.utils.labels import LabelManager
@@ -91,7 +95,7 @@ class RulesetMatcher:
             nodes_of,
         )
 
-        self._service_match_cache: Dict = {}
+        self._service_description_matchers: Dict[int, ServiceDescriptionMatcher] = {}
 
     def is_matching_host_ruleset(self, match_object: RulesetMatchObject,
                                  ruleset: List[Dict]) -> bool:
@@ -171,49 +175,33 @@ class RulesetMatcher:
                                                                        with_foreign_hosts,
                                                                        is_binary=is_binary)
 
-        for value, hosts, service_labels_condition, service_labels_condition_cache_id, service_description_condition in optimized_ruleset:
-            if match_object.service_description is None:
-                continue
+        if match_object.service_description is None:
+            return
+
+        # The service conditions of all rules are matched at once and the result is
+        # cached per service description
+        try:
+            description_matcher = self._service_description_matchers[id(optimized_ruleset)]
+        except KeyError:
+            description_matcher = ServiceDescriptionMatcher(
+                [rule[4][1] for rule in optimized_ruleset])
+            self._service_description_matchers[id(optimized_ruleset)] = description_matcher
+        matching_rules = description_matcher.matching_rules(match_object.service_description)
 
+        for index, (value, hosts, service_labels_condition, _service_labels_condition_cache_id,
+                    service_description_condition) in enumerate(optimized_ruleset):
             if match_object.host_name not in hosts:
                 continue
 
-            service_cache_id = (match_object.service_cache_id, service_description_condition,
-                                service_labels_condition_cache_id)
-
-            if service_cache_id in self._service_match_cache:
-                match = self._service_match_cache[service_cache_id]
-            else:
-                match = self._matches_service_conditions(service_description_condition,
-                                                         service_labels_condition, match_object)
-                self._service_match_cache[service_cache_id] = match
-
-            if match:
-                yield value
-
-    def _matches_service_conditions(self, service_description_condition: Tuple[bool, Pattern[str]],
-                                    service_labels_condition: Dict[str, str],
-                                    match_object: RulesetMatchObject) -> bool:
-        if not self._matches_service_description_condition(service_description_condition,
-                                                           match_object):
-            return False
-
-        if service_labels_condition \
-           and not _matches_labels(match_object.service_labels, service_labels_condition):
-            return False
-
-        return True
+            negate = service_description_condition[0]
+            if (index in matching_rules) is negate:
+                continue
 
-    def _matches_service_description_condition(self,
-                                               service_description_condition: Tuple[bool,
-                                                                                    Pattern[str]],
-                                               match_object: RulesetMatchObject) -> bool:
-        negate, pattern = service_description_condition
+            if service_labels_condition \
+               and not _matches_labels(match_object.service_labels, service_labels_condition):
+                continue
 
-        if match_object.service_description is not None \
-            and pattern.match(match_object.service_description) is not None:
-            return not negate
-        return negate
+            yield value
 
     # TODO: Find a way to use the generic get_host_ruleset_values
     def get_values_for_generic_agent_host(self, ruleset: Ruleset) -> List[RuleValue]:
@@ -273,29 +261,17 @@ class RulesetOptimizer:
         # may contain a reduced set of hosts, since each process handles a subset
         self._all_processed_hosts = self._all_configured_hosts
 
-        # A factor which indicates how much hosts share the same host tag configuration (excluding folders).
-        # len(all_processed_hosts) / len(different tag combinations)
-        # It is used to determine the best rule evualation method
-        self._all_processed_hosts_similarity = 1.0
-
         self._service_ruleset_cache: Dict = {}
         self._host_ruleset_cache: Dict = {}
         self._all_matching_hosts_match_cache: Dict = {}
 
-        # Reference dirname -> hosts in this dir including subfolders
-        self._folder_host_lookup: Dict[Tuple[bool, str], Set[HostName]] = {}
-
-        # Provides a list of hosts with the same hosttags, excluding the folder
-        self._hosts_grouped_by_tags: Dict = {}
-        # Reference hostname -> tag group reference
-        self._host_grouped_ref: Dict = {}
-
-        # TODO: The folder will not be part of new dict tags anymore. This can
-        # be cleaned up then.
-        self._hosttags_without_folder: Dict[HostName, TagList] = {}
-
-        # TODO: Clean this one up?
-        self._initialize_host_lookup()
+        self._host_index = HostConditionIndex(
+            self._all_configured_hosts,
+            host_tag_lists,
+            host_paths,
+            lambda hostname: self._labels.labels_of_host(self._ruleset_matcher, hostname),
+        )
+        self._all_processed_hosts_bits = self._host_index.all_hosts_bits
 
     def clear_host_ruleset_cache(self) -> None:
         self._host_ruleset_cache.clear()
@@ -316,29 +292,7 @@ class RulesetOptimizer:
         nodes_and_clusters.intersection_update(self._all_configured_hosts)
 
         self._all_processed_hosts.update(nodes_and_clusters)
-
-        # The folder host lookup includes a list of all -processed- hosts within a given
-        # folder. Any update with set_all_processed hosts invalidates this cache, because
-        # the scope of relevant hosts has changed. This is -good-, since the values in this
-        # lookup are iterated one by one later on in all_matching_hosts
-        self._folder_host_lookup = {}
-
-        self._adjust_processed_hosts_similarity()
-
-    def _adjust_processed_hosts_similarity(self) -> None:
-        """ This function computes the tag similarities between of the processed hosts
-        The result is a similarity factor, which helps finding the most perfomant operation
-        for the current hostset """
-        used_groups = set()
-        for hostname in self._all_processed_hosts:
-            used_groups.add(self._host_grouped_ref.get(hostname, ()))
-
-        if not used_groups:
-            self._all_processed_hosts_similarity = 1.0
-            return
-
-        self._all_processed_hosts_similarity = (1.0 * len(self._all_processed_hosts) /
-                                                len(used_groups))
+        self._all_processed_hosts_bits = self._host_index.bits_of_hosts(self._all_processed_hosts)
 
     def get_host_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
                          is_binary: bool) -> PreprocessedHostRuleset:
@@ -440,57 +394,38 @@ class RulesetOptimizer:
         except KeyError:
             pass
 
+        if hostlist == []:
+            # Empty host list -> Nothing matches
+            self._all_matching_hosts_match_cache[cache_id] = set()
+            return set()
+
+        # The tag, label, folder and specific host conditions are evaluated as intersections
+        # of the host bitsets of the index
         if with_foreign_hosts:
-            valid_hosts = self._all_configured_hosts
+            matching_bits = self._host_index.all_hosts_bits
         else:
-            valid_hosts = self._all_processed_hosts
+            matching_bits = self._all_processed_hosts_bits
+        matching_bits &= self._host_index.folder_bits(rule_path)
 
-        # Thin out the valid hosts further. If the rule is located in a folder
-        # we only need the intersection of the folders hosts and the previously determined valid_hosts
-        valid_hosts = self.get_hosts_within_folder(rule_path,
-                                                   with_foreign_hosts).intersection(valid_hosts)
+        for tag_spec in tags.values():
+            matching_bits &= self._host_index.tag_spec_bits(tag_spec)
 
-        if tags and hostlist is None and not labels:
-            # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tags)
-            if matched_by_tags is not None:
-                return matched_by_tags
+        if labels:
+            matching_bits &= self._host_index.label_conditions_bits(labels, matching_bits)
 
-        matching: Set[str] = set()
         only_specific_hosts = hostlist is not None \
             and not isinstance(hostlist, dict) \
             and all(not isinstance(x, dict) for x in hostlist)
 
-        if hostlist == []:
-            pass  # Empty host list -> Nothing matches
-        elif not tags and not labels and not hostlist:
-            # If no tags are specified and the hostlist only include @all (all hosts)
-            matching = valid_hosts
-        elif not tags and not labels and only_specific_hosts and hostlist is not None:
-            # If no tags are specified and there are only specific hosts we already have the matches
-            matching = valid_hosts.intersection(hostlist)
-        else:
-            # If the rule has only exact host restrictions, we can thin out the list of hosts to check
-            if only_specific_hosts and hostlist is not None:
-                hosts_to_check = valid_hosts.intersection(hostlist)
-            else:
-                hosts_to_check = valid_hosts
-
-            for hostname in hosts_to_check:
-                # When no tag matching is requested, do not filter by tags. Accept all hosts
-                # and filter only by hostlist
-                if tags and not self.matches_host_tags(self._host_tag_lists[hostname], tags):
-                    continue
-
-                if labels:
-                    host_labels = self._labels.labels_of_host(self._ruleset_matcher, hostname)
-                    if not _matches_labels(host_labels, labels):
-                        continue
+        if only_specific_hosts:
+            matching_bits &= self._host_index.bits_of_hosts(hostlist)
 
-                if not self.matches_host_name(hostlist, hostname):
-                    continue
-
-                matching.add(hostname)
+        matching = self._host_index.hosts_of_bits(matching_bits)
+        if hostlist and not only_specific_hosts:
+            # Regex and negated host conditions need to be matched host by host
+            matching = {
+                hostname for hostname in matching if self.matches_host_name(hostlist, hostname)
+            }
 
         self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
@@ -576,93 +511,216 @@ class RulesetOptimizer:
             rule_path,
         )
 
-    # TODO: Generalize this optimization: Build some kind of key out of the tag conditions
-    # (positive, negative, ...). Make it work with the new tag group based "$or" handling.
-    def _match_hosts_by_tags(self, cache_id, valid_hosts, tags):
-        matching = set()
-        negative_match_tags = set()
-        positive_match_tags = set()
-        for tag in tags.values():
-            if isinstance(tag, dict):
-                if "$ne" in tag:
-                    negative_match_tags.add(tag["$ne"])
-                    continue
+    def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
+        relevant_hosts_bits = (self._host_index.all_hosts_bits
+                               if with_foreign_hosts else self._all_processed_hosts_bits)
+        return self._host_index.hosts_of_bits(
+            self._host_index.folder_bits(folder_path) & relevant_hosts_bits)
 
-                if "$or" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
 
-                if "$nor" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
+_global_inline_flags = re.compile(r"\(\?[aiLmsux]+\)")
+# Numbered backreferences and conditional groups refer to the group numbers, which are
+# different within the combined pattern
+_group_references = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
 
-                raise NotImplementedError()
 
-            positive_match_tags.add(tag)
-
-        # TODO:
-        #if has_specific_folder_tag or self._all_processed_hosts_similarity < 3.0:
-        if self._all_processed_hosts_similarity < 3.0:
-            # Without shared folders
-            for hostname in valid_hosts:
-                host_tags = self._host_tag_lists[hostname]
-                if not positive_match_tags - host_tags:
-                    if not negative_match_tags.intersection(host_tags):
-                        matching.add(hostname)
-
-            self._all_matching_hosts_match_cache[cache_id] = matching
-            return matching
-
-        # With shared folders
-        checked_hosts: Set[str] = set()
-        for hostname in valid_hosts:
-            if hostname in checked_hosts:
-                continue
+class ServiceDescriptionMatcher:
+    """Matches service descriptions against the service description patterns of all
+    rules of a ruleset at once
 
-            hosts_with_same_tag = self._filter_hosts_with_same_tags_as_host(hostname, valid_hosts)
-            checked_hosts.update(hosts_with_same_tag)
+    The distinct patterns are combined into a single regex. Each pattern is an optional
+    lookahead with its own named group, so a single match tells which of the patterns
+    match the service description. Patterns referring to their groups are matched one
+    by one. The results are cached per service description.
+    """
+    def __init__(self, rule_patterns: List[Pattern[str]]) -> None:
+        super(ServiceDescriptionMatcher, self).__init__()
+        pattern_numbers: Dict[str, int] = {}
+        self._rule_pattern_numbers = [
+            pattern_numbers.setdefault(pattern.pattern, len(pattern_numbers))
+            for pattern in rule_patterns
+        ]
+        self._patterns = sorted(pattern_numbers, key=pattern_numbers.__getitem__)
+
+        self._single_numbers = [
+            number for number, pattern in enumerate(self._patterns)
+            if _group_references.search(pattern)
+        ]
+        combined_numbers = [
+            number for number in range(len(self._patterns)) if number not in self._single_numbers
+        ]
+
+        self._combined_pattern: Optional[Pattern[str]] = None
+        self._group_numbers: List[Tuple[int, int]] = []
+        try:
+            # Global inline flags would affect all combined patterns. Match them one by one.
+            if any(_global_inline_flags.search(pattern) for pattern in self._patterns):
+                raise re.error("Global inline flags")
+
+            self._combined_pattern = re.compile("".join("(?:(?=(?P<_p%d>%s)))?" %
+                                                        (number, self._patterns[number])
+                                                        for number in combined_numbers))
+        except (re.error, RecursionError, OverflowError):
+            self._single_numbers = list(range(len(self._patterns)))
+        else:
+            self._group_numbers = [(number, self._combined_pattern.groupindex["_p%d" % number])
+                                   for number in combined_numbers]
 
-            tags = self._host_tag_lists[hostname]
-            if not positive_match_tags - tags:
-                if not negative_match_tags.intersection(tags):
-                    matching.update(hosts_with_same_tag)
+        self._cache: Dict[ServiceName, FrozenSet[int]] = {}
 
-        self._all_matching_hosts_match_cache[cache_id] = matching
-        return matching
+    def matching_rules(self, service_description: ServiceName) -> FrozenSet[int]:
+        """Returns the indices of the rules having a pattern matching the description"""
+        try:
+            return self._cache[service_description]
+        except KeyError:
+            pass
 
-    def _filter_hosts_with_same_tags_as_host(self, hostname, hosts):
-        return self._hosts_grouped_by_tags[self._host_grouped_ref[hostname]].intersection(hosts)
+        matching_patterns = self._matching_patterns(service_description)
+        result = frozenset(index for index, number in enumerate(self._rule_pattern_numbers)
+                           if number in matching_patterns)
+        self._cache[service_description] = result
+        return result
 
-    def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
-        cache_id = with_foreign_hosts, folder_path
-        if cache_id not in self._folder_host_lookup:
-            hosts_in_folder = set()
-            relevant_hosts = self._all_configured_hosts if with_foreign_hosts else self._all_processed_hosts
-
-            for hostname in relevant_hosts:
-                host_path = self._host_paths.get(hostname, "/")
-                if host_path.startswith(folder_path):
-                    hosts_in_folder.add(hostname)
-
-            self._folder_host_lookup[cache_id] = hosts_in_folder
-            return hosts_in_folder
-
-        return self._folder_host_lookup[cache_id]
-
-    def _initialize_host_lookup(self):
-        # Determine hosttags without folder tag
-        for hostname in self._all_configured_hosts:
-            tags_without_folder = set(self._host_tag_lists[hostname])
-            try:
-                tags_without_folder.remove(self._host_paths.get(hostname, "/"))
-            except (KeyError, ValueError):
-                pass
-
-            self._hosttags_without_folder[hostname] = tags_without_folder
-
-        # Determine hosts with same tag setup (ignoring folder tag)
-        for hostname in self._all_configured_hosts:
-            group_ref = tuple(sorted(self._hosttags_without_folder[hostname]))
-            self._hosts_grouped_by_tags.setdefault(group_ref, set()).add(hostname)
-            self._host_grouped_ref[hostname] = group_ref
+    def _matching_patterns(self, service_description: ServiceName) -> Set[int]:
+        matching_patterns = {
+            number for number in self._single_numbers
+            if regex(self._patterns[number]).match(service_description) is not None
+        }
+        if self._combined_pattern is None:
+            return matching_patterns
+
+        # All parts of the combined pattern are optional, so it always matches
+        spans = self._combined_pattern.match(service_description).regs  # type: ignore[union-attr]
+        matching_patterns.update(
+            number for number, group_number in self._group_numbers if spans[group_number][0] != -1)
+        return matching_patterns
+
+
+# Translates the binary representation of a bitset to a selector for itertools.compress()
+_bit_selectors = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class HostConditionIndex:
+    """Inverted index from host tags, host labels and folders to the matching hosts
+
+    All hosts are numbered once. A set of hosts is represented as bitset (a Python
+    integer) having the bits of the host numbers set. This way the host conditions of
+    a rule can be evaluated with a few bitwise operations instead of being checked for
+    each host one by one.
+    """
+    def __init__(self, hostnames: Iterable[HostName], host_tag_lists: Dict[HostName, TagList],
+                 host_paths: Dict[HostName, str], labels_of_host: Callable[[HostName],
+                                                                           Labels]) -> None:
+        super(HostConditionIndex, self).__init__()
+        self._hosts: List[HostName] = sorted(hostnames)
+        self._host_numbers: Dict[HostName, int] = {
+            hostname: number for number, hostname in enumerate(self._hosts)
+        }
+        self._num_bytes = (len(self._hosts) + 7) // 8
+        self.all_hosts_bits = (1 << len(self._hosts)) - 1
+
+        tag_numbers: Dict[str, List[int]] = {}
+        path_numbers: Dict[str, List[int]] = {}
+        for number, hostname in enumerate(self._hosts):
+            for tag in host_tag_lists[hostname]:
+                tag_numbers.setdefault(tag, []).append(number)
+            path_numbers.setdefault(host_paths.get(hostname, "/"), []).append(number)
+
+        self._tag_bits = {
+            tag: self._bits_of_numbers(numbers) for tag, numbers in tag_numbers.items()
+        }
+        self._path_bits = {
+            path: self._bits_of_numbers(numbers) for path, numbers in path_numbers.items()
+        }
+        self._folder_bits: Dict[str, int] = {}
+
+        # The labels of a host may be expensive to compute. They are only added to the
+        # index for the hosts which are affected by a label condition.
+        self._labels_of_host = labels_of_host
+        self._label_bits: Dict[Tuple[str, str], int] = {}
+        self._labels_indexed_bits = 0
+
+    def _bits_of_numbers(self, numbers: Iterable[int]) -> int:
+        data = bytearray(self._num_bytes)
+        for number in numbers:
+            data[number >> 3] |= 1 << (number & 7)
+        return int.from_bytes(data, "little")
+
+    def bits_of_hosts(self, hostnames: Iterable[HostName]) -> int:
+        """Returns the bitset of the given hosts. Hosts unknown to the index are ignored."""
+        host_numbers = self._host_numbers
+        return self._bits_of_numbers(
+            host_numbers[hostname] for hostname in hostnames if hostname in host_numbers)
+
+    def hosts_of_bits(self, bits: int) -> Set[HostName]:
+        # The binary representation starts with the highest bit, so it is reversed
+        # to get the bit of the first host first
+        selectors = bin(bits)[:1:-1].encode("ascii").translate(_bit_selectors)
+        return set(itertools.compress(self._hosts, selectors))
+
+    def folder_bits(self, folder_path: str) -> int:
+        """Returns the hosts within the given folder, including the subfolders"""
+        try:
+            return self._folder_bits[folder_path]
+        except KeyError:
+            pass
+
+        bits = 0
+        for host_path, path_bits in self._path_bits.items():
+            if host_path.startswith(folder_path):
+                bits |= path_bits
+        self._folder_bits[folder_path] = bits
+        return bits
+
+    def tag_spec_bits(self, tag_spec: Any) -> int:
+        """Returns the hosts matching a single tag condition (See _matches_tag_spec)"""
+        if isinstance(tag_spec, dict):
+            if "$ne" in tag_spec:
+                return self.all_hosts_bits & ~self._tag_bits.get(tag_spec["$ne"], 0)
+
+            if "$or" in tag_spec:
+                bits = 0
+                for sub_tag_spec in tag_spec["$or"]:
+                    bits |= self.tag_spec_bits(sub_tag_spec)
+                return bits
+
+            if "$nor" in tag_spec:
+                bits = 0
+                for sub_tag_spec in tag_spec["$nor"]:
+                    bits |= self.tag_spec_bits(sub_tag_spec)
+                return self.all_hosts_bits & ~bits
+
+            raise NotImplementedError()
+
+        return self._tag_bits.get(tag_spec, 0)
+
+    def label_conditions_bits(self, label_conditions: LabelConditions, candidates_bits: int) -> int:
+        """Returns the hosts out of the candidates matching all given label conditions
+        (See _matches_labels)"""
+        self._index_labels(candidates_bits & ~self._labels_indexed_bits)
+
+        bits = candidates_bits
+        for label_id, label_spec in label_conditions.items():
+            if isinstance(label_spec, dict):
+                bits &= ~self._label_bits.get((label_id, label_spec["$ne"]), 0)
+            else:
+                bits &= self._label_bits.get((label_id, label_spec), 0)
+        return bits
+
+    def _index_labels(self, bits: int) -> None:
+        if not bits:
+            return
+
+        label_numbers: Dict[Tuple[str, str], List[int]] = {}
+        for hostname in self.hosts_of_bits(bits):
+            number = self._host_numbers[hostname]
+            for label in self._labels_of_host(hostname).items():
+                label_numbers.setdefault(label, []).append(number)
+
+        for label, numbers in label_numbers.items():
+            self._label_bits[label] = self._label_bits.get(label,
+                                                           0) | self._bits_of_numbers(numbers)
+        self._labels_indexed_bits |= bits
 
 
 def _tags_or_labels_cache_id(tag_or_label_spec):
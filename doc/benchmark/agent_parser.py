@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the lazy agent output parser with the previous eager parser
+
+Usage: PYTHONPATH=. doc/benchmark/agent_parser.py [-n RUNS] AGENT_OUTPUT [AGENT_OUTPUT ...]
+
+The agent outputs are recorded agent outputs, e.g. the cache files from
+tmp/check_mk/cache/HOSTNAME. For each file the following is measured:
+
+  eager:    the previous parser which tokenizes all sections
+  lazy:     the current parser, no section is accessed
+  lazy+one: the current parser, one (the largest) section is accessed
+  lazy+all: the current parser, all sections are accessed
+"""
+
+import argparse
+import logging
+import sys
+import time
+import timeit
+from typing import cast, Dict, List, Optional
+
+from six import ensure_str
+
+from cmk.utils.encoding import ensure_str_with_fallback
+
+import cmk.base.config as config
+from cmk.base.data_sources.agent import AgentDataSource
+
+
+class _HostConfig:
+    check_mk_check_interval = 1
+
+
+class _BenchmarkDataSource(AgentDataSource):
+    # pylint: disable=super-init-not-called
+    def __init__(self) -> None:
+        self._logger = logging.getLogger("cmk.base.data_source.benchmark")
+        self._host_config = cast(config.HostConfig, _HostConfig())
+
+    hostname = "benchmark"
+
+    def id(self) -> str:
+        return "benchmark"
+
+    def describe(self) -> str:
+        return "Benchmark"
+
+    def _execute(self) -> bytes:
+        return b""
+
+
+def _parse_eager(source: _BenchmarkDataSource, raw_data: bytes) -> Dict[str, List[List[str]]]:
+    """The parsing of the section lines as done by the previous parser (piggyback data omitted)"""
+    sections: Dict[str, List[List[str]]] = {}
+    section_content: Optional[List[List[str]]] = None
+    section_options: Dict[str, Optional[str]] = {}
+    separator: Optional[str] = None
+    encoding = None
+    for line in raw_data.split(b"\n"):
+        line = line.rstrip(b"\r")
+        stripped_line = line.strip()
+        if stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
+            section_name, section_options = source._parse_section_header(stripped_line[3:-3])
+            if section_name is None:
+                section_content = None
+                continue
+            section_content = sections.setdefault(section_name, [])
+            raw_separator = section_options.get("sep")
+            separator = None if raw_separator is None else chr(int(raw_separator))
+            encoding = section_options.get("encoding")
+        elif stripped_line != b'':
+            if section_content is None:
+                continue
+            if section_options.get("nostrip") is None:
+                line = stripped_line
+            decoded_line = ensure_str_with_fallback(
+                line, encoding=("utf-8" if encoding is None else encoding), fallback="latin-1")
+            section_content.append(decoded_line.split(separator))
+    return sections
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Number of runs per file")
+    parser.add_argument("files", nargs="+", metavar="AGENT_OUTPUT")
+    options = parser.parse_args(args)
+
+    config.translate_piggyback_host = lambda _source, backed: ensure_str(backed)
+    source = _BenchmarkDataSource()
+
+    print("%-40s %8s %10s %10s %10s %10s" %
+          ("file", "size", "eager", "lazy", "lazy+one", "lazy+all"))
+    for path in options.files:
+        with open(path, "rb") as f:
+            raw_data = f.read()
+
+        sections = source._parse_host_section(raw_data).sections
+        largest = max(sections, key=lambda name: len(sections[name]), default=None)
+
+        def lazy_one() -> None:
+            host_sections = source._parse_host_section(raw_data)
+            if largest is not None:
+                host_sections.sections.get(largest)
+
+        results = [
+            min(timeit.repeat(func, number=1, repeat=options.runs, timer=time.perf_counter))
+            for func in [
+                lambda: _parse_eager(source, raw_data),
+                lambda: source._parse_host_section(raw_data),
+                lazy_one,
+                lambda: dict(source._parse_host_section(raw_data).sections.items()),
+            ]
+        ]
+        print("%-40s %8d %s" %
+              (path[-40:], len(raw_data), " ".join("%8.2fms" % (1000 * r) for r in results)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the overhead of submitting check results to the Nagios core
+
+Usage: PYTHONPATH=. doc/benchmark/check_submission.py [--services N] [-n RUNS]
+
+The check results are written to a FIFO, which is drained by a reader thread
+(like the command pipe read by the core), and to check result files in a
+temporary directory. For both submission methods the following is measured
+per 1,000 services:
+
+  unbuffered: one write per check result (check_submission_buffered = False)
+  buffered:   the results are collected and written at the end of the run
+              (check_submission_buffered = True)
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+import cmk.utils.paths
+
+import cmk.base.checking as checking
+import cmk.base.config as config
+
+
+def _drain(path: str) -> None:
+    with open(path, "rb") as f:
+        while f.read(65536):
+            pass
+
+
+def _submit_run(num_services: int) -> None:
+    for number in range(num_services):
+        checking._do_submit_to_core(
+            "benchmark-host",
+            "Interface %d" % number,
+            0,
+            "OK - [%d] (up) speed 1 GBit/s|in=1234.5;;;0;125000000 out=543.2;;;0;125000000" %
+            number,
+            None,
+        )
+    # What do_check does at the end of a run
+    checking._flush_check_results()
+    checking._close_checkresult_file()
+
+
+def _measure(func: Callable[[], None], runs: int) -> float:
+    timings: List[float] = []
+    for _run in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--services", type=int, default=1000, help="Services per check run")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Number of runs")
+    options = parser.parse_args(args)
+
+    tmp_dir = tempfile.mkdtemp(prefix="check_submission")
+    try:
+        fifo_path = os.path.join(tmp_dir, "nagios.cmd")
+        os.mkfifo(fifo_path)
+        reader = threading.Thread(target=_drain, args=(fifo_path,), daemon=True)
+        reader.start()
+
+        cmk.utils.paths.nagios_command_pipe_path = fifo_path
+        cmk.utils.paths.check_result_path = os.path.join(tmp_dir, "checkresults")
+        os.mkdir(cmk.utils.paths.check_result_path)
+        config.monitoring_core = "nagios"
+
+        print("%-6s %12s %12s" % ("method", "unbuffered", "buffered"))
+        for method in ["pipe", "file"]:
+            config.check_submission = method
+            results = []
+            for buffered in [False, True]:
+                config.check_submission_buffered = buffered
+                results.append(
+                    _measure(lambda: _submit_run(options.services), options.runs) * 1000 * 1000 /
+                    options.services)
+            print("%-6s %s" % (method, " ".join("%10.2fms" % r for r in results)))
+
+        checking._close_command_pipe()
+        reader.join()
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the message throughput of the Event Console
+
+Usage: PYTHONPATH=. doc/benchmark/ec_pipeline.py [--messages N] [--rules N] [--workers N,...]
+       PYTHONPATH=. doc/benchmark/ec_pipeline.py --site [--messages N] [--connections N]
+
+Without --site an event server is created in this process, loaded with
+synthetic rules and fed with syslog messages the way the received data is
+handed over by EventServer.serve(): in chunks of up to 4096 bytes. For each
+number of event processing workers (0 = processing in the event server thread)
+the messages per second are reported.
+
+With --site the messages are sent to the event socket of the running site
+($OMD_ROOT) over parallel connections. The throughput is measured until the
+"messages" counter of the status socket has grown by the number of messages
+sent. The number of workers is the one configured in the site.
+"""
+
+import argparse
+import logging
+import os
+import pathlib  # pylint: disable=import-error
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import cmk.utils.paths
+
+_HOSTS = ["host%03d" % nr for nr in range(200)]
+_WORDS = ["disk", "link", "error", "timeout", "user", "session", "service", "port", "login"]
+
+
+def _generate_rule_packs(rnd: random.Random, num_rules: int) -> List[Dict[str, Any]]:
+    rules: List[Dict[str, Any]] = []
+    for nr in range(num_rules):
+        rule: Dict[str, Any] = {
+            "id": "rule%d" % nr,
+            "state": rnd.choice([0, 1, 2]),
+            "sl": {
+                "value": 0,
+                "precedence": "message"
+            },
+            "match": "%s (.*) %s %d" % (rnd.choice(_WORDS), rnd.choice(_WORDS), nr),
+        }
+        if rnd.random() < 0.3:
+            rule["match_host"] = rnd.choice(_HOSTS)
+        rules.append(rule)
+    return [{"id": "benchmark", "disabled": False, "rules": rules}]
+
+
+def _generate_lines(rnd: random.Random, num_messages: int, num_rules: int) -> List[bytes]:
+    return [
+        b"<78>Dec 12 10:00:00 %s app[%d]: %s %d %s %d\n" %
+        (rnd.choice(_HOSTS).encode(), nr, rnd.choice(_WORDS).encode(), nr,
+         rnd.choice(_WORDS).encode(), rnd.randrange(num_rules)) for nr in range(num_messages)
+    ]
+
+
+def _chunks(lines: List[bytes], size: int) -> List[bytes]:
+    chunks: List[bytes] = []
+    chunk = b""
+    for line in lines:
+        if len(chunk) + len(line) > size:
+            chunks.append(chunk)
+            chunk = b""
+        chunk += line
+    return chunks + [chunk]
+
+
+def _event_server(rule_packs: List[Dict[str, Any]], num_workers: int) -> Any:
+    import cmk.ec.export as ec
+    import cmk.ec.history
+    import cmk.ec.main
+
+    logger = logging.getLogger("cmk.mkeventd")
+    settings = ec.settings('', pathlib.Path(cmk.utils.paths.omd_root),
+                           pathlib.Path(cmk.utils.paths.default_config_dir), ['mkeventd'])
+    config = ec.default_config()
+    config["rule_packs"] = rule_packs
+    config["event_processing_workers"] = num_workers
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    history = cmk.ec.history.History(settings, config, logger,
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger)
+    event_server = cmk.ec.main.EventServer(logger, settings, config,
+                                           cmk.ec.main.default_slave_status_master(), perfcounters,
+                                           cmk.ec.main.ECLock(logger), history, event_status,
+                                           cmk.ec.main.StatusTableEvents.columns, False)
+    event_server.compile_rules([], rule_packs)
+    return event_server
+
+
+def _run_in_process(options: argparse.Namespace) -> int:
+    if "OMD_ROOT" not in os.environ:
+        # The event history is written below the site directory
+        cmk.utils.paths.omd_root = tempfile.mkdtemp()
+
+    rnd = random.Random(options.seed)
+    rule_packs = _generate_rule_packs(rnd, options.rules)
+    chunks = _chunks(_generate_lines(rnd, options.messages, options.rules), 4096)
+
+    print("%-8s %10s %12s (%d messages, %d rules)" %
+          ("workers", "time", "msgs/sec", options.messages, options.rules))
+    for num_workers in [int(n) for n in options.workers.split(",")]:
+        event_server = _event_server(rule_packs, num_workers)
+        event_server._update_pipeline()  # pylint: disable=protected-access
+        start = time.perf_counter()
+        for chunk in chunks:
+            event_server.process_raw_lines(chunk)
+        event_server._pipeline.stop()  # pylint: disable=protected-access
+        duration = time.perf_counter() - start
+        print("%-8d %8.2fms %12.0f" % (num_workers, 1000 * duration, options.messages / duration))
+    return 0
+
+
+def _query_messages(status_socket: str) -> int:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(status_socket)
+    sock.sendall(b"GET status\nColumns: status_messages\n")
+    sock.shutdown(socket.SHUT_WR)
+    response = b""
+    while True:
+        data = sock.recv(4096)
+        if not data:
+            break
+        response += data
+    sock.close()
+    return eval(response.decode("utf-8"))[1][0]  # pylint: disable=eval-used
+
+
+def _send(event_socket: str, lines: List[bytes]) -> None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(event_socket)
+    sock.sendall(b"".join(lines))
+    sock.close()
+
+
+def _run_against_site(options: argparse.Namespace) -> int:
+    run_dir = os.path.join(os.environ["OMD_ROOT"], "tmp", "run", "mkeventd")
+    status_socket = os.path.join(run_dir, "status")
+    event_socket = os.path.join(run_dir, "eventsocket")
+
+    rnd = random.Random(options.seed)
+    lines = _generate_lines(rnd, options.messages, options.rules)
+    messages_before = _query_messages(status_socket)
+
+    start = time.perf_counter()
+    senders = [
+        threading.Thread(target=_send, args=(event_socket, lines[nr::options.connections]))
+        for nr in range(options.connections)
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    sent = time.perf_counter() - start
+
+    while _query_messages(status_socket) < messages_before + options.messages:
+        if time.perf_counter() - start > options.timeout:
+            print("Timeout: Not all messages have been processed")
+            return 1
+        time.sleep(0.01)
+    duration = time.perf_counter() - start
+
+    print("%-12s %8.2fms" % ("sent", 1000 * sent))
+    print("%-12s %8.2fms" % ("processed", 1000 * duration))
+    print("%-12s %10.0f" % ("msgs/sec", options.messages / duration))
+    return 0
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=20000, help="Number of messages")
+    parser.add_argument("--rules", type=int, default=500, help="Number of generated rules")
+    parser.add_argument("--workers",
+                        default="0,1,2,4",
+                        help="Comma separated numbers of workers to measure")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data")
+    parser.add_argument("--site",
+                        action="store_true",
+                        help="Send the messages to the event console of the site $OMD_ROOT")
+    parser.add_argument("--connections",
+                        type=int,
+                        default=4,
+                        help="Parallel connections to the event socket of the site")
+    parser.add_argument("--timeout",
+                        type=float,
+                        default=300,
+                        help="Maximum time to wait for the site to process the messages")
+    options = parser.parse_args(args)
+
+    if options.site:
+        return _run_against_site(options)
+    return _run_in_process(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the log scanning of the mk_logwatch agent plugin
+
+Usage: doc/benchmark/logwatch.py [--lines N] [--patterns N] [--hit-rate F] [-n RUNS]
+
+A synthetic logfile is generated and scanned by process_logfile() like the
+agent plugin does for new log lines. Like most logwatch patterns, each of the
+generated patterns requires a literal rarely found in the other lines (an error
+code or the name of an exception). The lines per second are reported for:
+
+  patterns:   searching all patterns in each line (no prefilter)
+  literals:   only searching the lines containing a required literal
+  combined:   only searching the lines matching the combined patterns
+  nocontext:  literals, skipping the other lines in blocks (nocontext=yes)
+
+With --compare the outputs are verified to be equal to the ones of "patterns".
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from importlib.machinery import SourceFileLoader
+from typing import Any, List, Optional, Tuple
+
+_PLUGIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "agents", "plugins",
+                       "mk_logwatch")
+
+_WORDS = [
+    "connection", "request", "session", "timeout", "user", "service", "daemon", "worker", "cache",
+    "query", "socket", "backend", "thread", "handler", "transaction", "update"
+]
+
+
+class _Stdout:
+    def isatty(self) -> bool:
+        return False
+
+
+def _generate_patterns(rnd: random.Random, num_patterns: int) -> List[str]:
+    return [
+        "%s (.*) (failed|refused|lost)" % _problem(nr) if nr % 2 else "^.*%s: .*" % _problem(nr)
+        for nr in range(num_patterns)
+    ]
+
+
+def _problem(nr: int) -> str:
+    return "ERR%04d" % nr if nr % 2 else "%sException" % _WORDS[nr % len(_WORDS)].capitalize()
+
+
+def _write_logfile(rnd: random.Random, path: str, num_lines: int, num_patterns: int,
+                   hit_rate: float) -> None:
+    with open(path, "w") as logfile:
+        for nr in range(num_lines):
+            if rnd.random() < hit_rate:
+                message = "%s: %s id=%d lost" % (_problem(
+                    rnd.randrange(num_patterns)), rnd.choice(_WORDS), nr)
+            else:
+                message = "%s %d %s ok" % (rnd.choice(_WORDS), nr, rnd.choice(_WORDS))
+            logfile.write("Dec 12 10:00:00 host app[%d]: %s\n" % (nr % 30000, message))
+
+
+def _scan(mk_logwatch: Any, path: str, raw_patterns: List[str], prefilter: Optional[str],
+          nocontext: bool) -> Tuple[float, Any]:
+    section = mk_logwatch.LogfileSection((path, path))
+    section.patterns = [("C", raw_pattern, [], []) for raw_pattern in raw_patterns]
+    section.options.values["nocontext"] = nocontext
+    if prefilter == "combined":
+        section._line_prefilter = mk_logwatch.LinePrefilter(
+            re.compile("|".join("(?:%s)" % pattern.pattern
+                                for _level, pattern, _cont, _repl in section.compiled_patterns)),
+            False)
+    if prefilter != "literals":
+        section._line_prefilter_built = True
+
+    start = time.perf_counter()
+    result = mk_logwatch.process_logfile(section, {"offset": 0}, False)
+    return time.perf_counter() - start, result
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lines", type=int, default=500000, help="Lines of the logfile")
+    parser.add_argument("--patterns", type=int, default=50, help="Number of patterns")
+    parser.add_argument("--hit-rate",
+                        type=float,
+                        default=0.001,
+                        help="Fraction of the lines looking like the patterns")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Number of runs")
+    parser.add_argument("--compare",
+                        action="store_true",
+                        help="Verify that all modes produce the same output")
+    options = parser.parse_args(args)
+
+    mk_logwatch = SourceFileLoader("mk_logwatch", _PLUGIN).load_module()  # pylint: disable=deprecated-method,no-value-for-parameter
+    sys.stdout = _Stdout()  # type: ignore[assignment]
+    try:
+        stdout = sys.__stdout__
+        rnd = random.Random(options.seed)
+        raw_patterns = _generate_patterns(rnd, options.patterns)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "logfile")
+            _write_logfile(rnd, path, options.lines, options.patterns, options.hit_rate)
+
+            stdout.write("%-10s %10s %12s (%d lines, %d patterns)\n" %
+                         ("mode", "time", "lines/sec", options.lines, options.patterns))
+            mismatches = []
+            reference = {}
+            for mode, prefilter, nocontext in [
+                ("patterns", None, False),
+                ("literals", "literals", False),
+                ("combined", "combined", False),
+                ("nocontext", "literals", True),
+            ]:
+                timings = []
+                for _run in range(options.runs):
+                    duration, result = _scan(mk_logwatch, path, raw_patterns, prefilter, nocontext)
+                    timings.append(duration)
+                stdout.write("%-10s %8.2fms %12.0f\n" %
+                             (mode, 1000 * min(timings), options.lines / min(timings)))
+
+                if options.compare:
+                    if nocontext not in reference:
+                        reference[nocontext] = _scan(mk_logwatch, path, raw_patterns, None,
+                                                     nocontext)[1]
+                    if result != reference[nocontext]:
+                        mismatches.append(mode)
+    finally:
+        sys.stdout = sys.__stdout__
+
+    for mode in mismatches:
+        print("MISMATCH: %s" % mode)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the host condition matching of the RulesetOptimizer on a generated config
+
+Usage: PYTHONPATH=. doc/benchmark/ruleset_matcher.py [--hosts N] [--rules N] [--seed N]
+
+A random configuration with hosts in nested folders, host tags and host labels
+is generated together with rules having random tag, label, folder and host name
+conditions. The following is measured:
+
+  index:     creating the RulesetMatcher, which builds the host condition index
+  rules:     computing the matching hosts of all rules (cold caches)
+  per host:  the same rules evaluated by checking each host one by one, like
+             it was done before the index existed (only with --compare)
+
+With --compare the results of both evaluations are verified to be equal.
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Any, Dict, List, Set
+
+from cmk.utils.rulesets.ruleset_matcher import RulesetMatcher, _matches_labels
+from cmk.utils.type_defs import HostName, Labels
+
+_TAG_GROUPS = [["%s-%d" % (group, n) for n in range(size)] for group, size in [
+    ("agent", 3),
+    ("snmp", 3),
+    ("criticality", 4),
+    ("networking", 3),
+    ("address_family", 3),
+    ("location", 20),
+    ("os", 6),
+    ("app", 40),
+]]
+
+_LABEL_KEYS = ["cmk/os_family", "team", "env", "rack"]
+
+
+class _Labels:
+    def __init__(self, labels: Dict[HostName, Labels]) -> None:
+        self._labels = labels
+
+    def labels_of_host(self, _ruleset_matcher: RulesetMatcher, hostname: HostName) -> Labels:
+        return self._labels[hostname]
+
+
+def _generate_hosts(rnd: random.Random, num_hosts: int) -> Dict[str, Dict[HostName, Any]]:
+    folders = ["/wato/"]
+    for _n in range(max(num_hosts // 200, 1)):
+        folders.append("%sf%d/" % (rnd.choice(folders), len(folders)))
+
+    tags: Dict[HostName, Set[str]] = {}
+    paths: Dict[HostName, str] = {}
+    labels: Dict[HostName, Labels] = {}
+    for number in range(num_hosts):
+        hostname = "host%06d" % number
+        paths[hostname] = rnd.choice(folders)
+        tags[hostname] = {rnd.choice(group) for group in _TAG_GROUPS} | {paths[hostname]}
+        labels[hostname] = {
+            key: "%s-%d" % (key, rnd.randrange(5))
+            for key in _LABEL_KEYS
+            if rnd.random() < 0.7
+        }
+    return {"tags": tags, "paths": paths, "labels": labels, "folders": folders}
+
+
+def _generate_condition(rnd: random.Random, hosts: Dict[str, Any]) -> Dict[str, Any]:
+    condition: Dict[str, Any] = {}
+    if rnd.random() < 0.3:
+        condition["host_folder"] = rnd.choice(hosts["folders"])
+
+    tags: Dict[str, Any] = {}
+    for group_index in rnd.sample(range(len(_TAG_GROUPS)), rnd.randrange(3)):
+        group = _TAG_GROUPS[group_index]
+        choice = rnd.random()
+        if choice < 0.6:
+            tags["group%d" % group_index] = rnd.choice(group)
+        elif choice < 0.8:
+            tags["group%d" % group_index] = {"$ne": rnd.choice(group)}
+        else:
+            tags["group%d" % group_index] = {"$or": rnd.sample(group, 2)}
+    if tags:
+        condition["host_tags"] = tags
+
+    if rnd.random() < 0.2:
+        key = rnd.choice(_LABEL_KEYS)
+        value = "%s-%d" % (key, rnd.randrange(5))
+        condition["host_labels"] = {key: {"$ne": value} if rnd.random() < 0.3 else value}
+
+    choice = rnd.random()
+    if choice < 0.1:
+        condition["host_name"] = rnd.sample(sorted(hosts["tags"]), 5)
+    elif choice < 0.15:
+        condition["host_name"] = [{"$regex": "host0*%d" % rnd.randrange(100)}]
+    return condition
+
+
+def _matching_hosts_per_host(matcher: RulesetMatcher, hosts: Dict[str, Any],
+                             condition: Dict[str, Any]) -> Set[HostName]:
+    optimizer = matcher.ruleset_optimizer
+    hostlist = condition.get("host_name")
+    tags = condition.get("host_tags", {})
+    labels = condition.get("host_labels", {})
+    rule_path = condition.get("host_folder", "/")
+    if hostlist == []:
+        return set()
+    return {
+        hostname for hostname, host_tags in hosts["tags"].items()
+        if hosts["paths"][hostname].startswith(rule_path) and
+        optimizer.matches_host_tags(host_tags, tags) and
+        _matches_labels(hosts["labels"][hostname], labels) and
+        optimizer.matches_host_name(hostlist, hostname)
+    }
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--hosts", type=int, default=30000, help="Number of hosts")
+    parser.add_argument("--rules", type=int, default=3000, help="Number of rules")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated config")
+    parser.add_argument("--compare",
+                        action="store_true",
+                        help="Also evaluate the rules host by host and compare the results")
+    options = parser.parse_args(args)
+
+    rnd = random.Random(options.seed)
+    hosts = _generate_hosts(rnd, options.hosts)
+    ruleset = [{
+        "value": number,
+        "condition": _generate_condition(rnd, hosts)
+    } for number in range(options.rules)]
+
+    start = time.perf_counter()
+    matcher = RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists=hosts["tags"],
+        host_paths=hosts["paths"],
+        labels=_Labels(hosts["labels"]),  # type: ignore[arg-type]
+        all_configured_hosts=set(hosts["tags"]),
+        clusters_of={},
+        nodes_of={},
+    )
+    matcher.ruleset_optimizer.set_all_processed_hosts(set(hosts["tags"]))
+    print("index:    %8.2fms" % (1000 * (time.perf_counter() - start)))
+
+    start = time.perf_counter()
+    results = [
+        matcher.ruleset_optimizer._all_matching_hosts(rule["condition"], with_foreign_hosts=False)
+        for rule in ruleset
+    ]
+    print("rules:    %8.2fms (%d hosts, %d rules)" %
+          (1000 * (time.perf_counter() - start), options.hosts, options.rules))
+
+    if not options.compare:
+        return 0
+
+    start = time.perf_counter()
+    expected = [_matching_hosts_per_host(matcher, hosts, rule["condition"]) for rule in ruleset]
+    print("per host: %8.2fms" % (1000 * (time.perf_counter() - start)))
+
+    mismatches = [
+        rule["condition"] for rule, result, expect in zip(ruleset, results, expected)
+        if result != expect
+    ]
+    for condition in mismatches:
+        print("MISMATCH: %r" % (condition,))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
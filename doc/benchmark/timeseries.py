@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the list based and the array based time series math
+
+Usage: PYTHONPATH=. doc/benchmark/timeseries.py [--points N] [--missing F] [-n RUNS]
+
+Synthetic series with one value per minute and a fraction of missing values
+are generated. For each operation the list based implementation (point by point
+like the graph expressions were evaluated before) and the array based one of
+cmk.utils.array_timeseries are measured:
+
+  sum, max, average, merge:  operators of two series
+  percentile:                the 95th percentile of one series
+  downsample:                consolidating to 5 minutes (max)
+  upsample:                  backward filling to 30 seconds
+  convert:                   list -> array -> list of one series (array only)
+
+With --compare the results of both implementations are verified to be equal.
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from cmk.utils.array_timeseries import (
+    ArrayTimeSeries,
+    array_operators,
+    percentile,
+    to_array,
+    to_values,
+)
+from cmk.utils.prediction import TimeSeries, TimeSeriesValues
+
+
+def _generate_series(rnd: random.Random, num_points: int, missing: float) -> TimeSeriesValues:
+    return [None if rnd.random() < missing else rnd.uniform(0, 100) for _point in range(num_points)]
+
+
+def _point_wise(op_func: Callable[[List[float]], float],
+                operands: List[TimeSeriesValues]) -> TimeSeriesValues:
+    # The result of the operators per point, computed on the lists of values
+    result: TimeSeriesValues = []
+    for tsp in zip(*operands):
+        clean = [x for x in tsp if x is not None]
+        result.append(op_func(clean) if clean else None)
+    return result
+
+
+def _array_op(operator_id: str, arrays: List[Any]) -> TimeSeriesValues:
+    return to_values(array_operators()[operator_id][1](arrays))
+
+
+def _list_percentile(values: TimeSeriesValues, q: float) -> Optional[float]:
+    ordered = sorted(x for x in values if x is not None)
+    if not ordered:
+        return None
+    target_index = q / 100.0 * len(ordered) - 0.5
+    if target_index < 0:
+        return ordered[0]
+    index_f = int(math.floor(target_index))
+    index_c = int(math.ceil(target_index))
+    if index_f == index_c or index_c > len(ordered) - 1:
+        return ordered[index_f]
+    return (ordered[index_f] + ordered[index_c]) / 2.0
+
+
+def _measure(func: Callable[[], Any], runs: int) -> Tuple[float, Any]:
+    timings: List[float] = []
+    for _run in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--points", type=int, default=1000000, help="Points per series")
+    parser.add_argument("--missing", type=float, default=0.1, help="Fraction of missing values")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated series")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Number of runs")
+    parser.add_argument("--compare",
+                        action="store_true",
+                        help="Verify that both implementations compute the same results")
+    options = parser.parse_args(args)
+
+    rnd = random.Random(options.seed)
+    twindow = (0, 60 * options.points, 60)
+    series = [_generate_series(rnd, options.points, options.missing) for _series in range(2)]
+    arrays = [to_array(values) for values in series]
+    time_series = TimeSeries(series[0], twindow)
+    array_time_series = ArrayTimeSeries(arrays[0], twindow)
+    coarse = (0, 60 * options.points, 300)
+    fine = (0, 60 * options.points, 30)
+
+    operations: List[Tuple[str, Callable[[], Any], Callable[[], Any]]] = [
+        ("sum", lambda: _point_wise(sum, series), lambda: _array_op("+", arrays)),
+        ("max", lambda: _point_wise(max, series), lambda: _array_op("MAX", arrays)),
+        ("average", lambda: _point_wise(lambda x: sum(x) / len(x), series),
+         lambda: _array_op("AVERAGE", arrays)),
+        ("merge", lambda: _point_wise(lambda x: x[0], series), lambda: _array_op("MERGE", arrays)),
+        ("percentile", lambda: _list_percentile(series[0], 95), lambda: percentile(arrays[0], 95)),
+        ("downsample", lambda: time_series.downsample(coarse, "max"),
+         lambda: array_time_series.downsample(coarse, "max").values),
+        ("upsample", lambda: time_series.bfill_upsample(fine, 0),
+         lambda: array_time_series.bfill_upsample(fine, 0).values),
+    ]
+
+    print("%-10s %10s %10s %8s (%d points)" %
+          ("operation", "list", "array", "speedup", options.points))
+    mismatches = []
+    for name, list_func, array_func in operations:
+        list_time, list_result = _measure(list_func, options.runs)
+        array_time, array_result = _measure(array_func, options.runs)
+        print("%-10s %8.2fms %8.2fms %7.1fx" %
+              (name, 1000 * list_time, 1000 * array_time, list_time / array_time))
+        if options.compare and list_result != array_result:
+            mismatches.append(name)
+
+    convert_time, _result = _measure(lambda: to_values(to_array(series[0])), options.runs)
+    print("%-10s %10s %8.2fms" % ("convert", "", 1000 * convert_time))
+
+    for name in mismatches:
+        print("MISMATCH: %s" % name)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
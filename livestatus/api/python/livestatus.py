@@ -10,8 +10,12 @@ import time
 import re
 import os
 import ast
+import codecs
+import json
+import selectors
 import ssl
-from typing import NewType, AnyStr, Any, Type, List, Tuple, Union, Dict, Pattern, Optional, Set
+from typing import (NewType, AnyStr, Any, Type, List, Tuple, Union, Dict, Pattern, Optional, Set,
+                    Iterable, Iterator, NoReturn)
 
 # TODO: Find a better solution for this issue. Astroid 2.x bug prevents us from using NewType :(
 # (https://github.com/PyCQA/pylint/issues/2296)
@@ -43,6 +47,9 @@ persistent_connections: Dict[str, socket.socket] = {}
 # Regular expression for removing Cache: headers if caching is not allowed
 remove_cache_regex: Pattern = re.compile("\nCache:[^\n]*")
 
+# Whitespace and row separators between the rows of a JSON response
+_json_row_separators: Pattern = re.compile(r"[\s,]*")
+
 
 def _ensure_unicode(value: Union[str, bytes]) -> str:
     if isinstance(value, str):
@@ -219,6 +226,30 @@ class Helpers:
             result.append(dict(zip(headers, line)))
         return result
 
+    def query_rows(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        raise NotImplementedError()
+
+    def iter_table(self, query: 'QueryTypes') -> Iterator[LivestatusRow]:
+        """Like query_table(), but yields the rows while they are received instead
+           of reading the whole response into memory first"""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        return self.query_rows(normalized_query, "ColumnHeaders: off\n")
+
+    def iter_table_assoc(self, query: 'QueryTypes') -> Iterator[Dict[str, Any]]:
+        """Like query_table_assoc(), but yields the rows while they are received
+           instead of reading the whole response into memory first"""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        rows = self.query_rows(normalized_query, "ColumnHeaders: on\n")
+        headers = next(rows, None)
+        if headers is None:
+            return
+        for line in rows:
+            yield dict(zip(headers, line))
+
     def query_summed_stats(self,
                            query: 'QueryTypes',
                            add_headers: Union[str, bytes] = u"") -> List[int]:
@@ -268,6 +299,83 @@ QueryTypes = Union[str, bytes, Query]
 OnlySites = Optional[List[SiteId]]
 DeadSite = Dict[str, Union[str, int, Exception, SiteConfiguration]]
 
+
+def _parse_response_header(header: bytes) -> Tuple[str, int]:
+    """Returns the status code and the length of the response from a fixed16 header"""
+    # Headers are always ASCII encoded
+    code = header[0:3].decode("ascii")
+    try:
+        length = int(header[4:15].lstrip())
+    except Exception:
+        raise MKLivestatusSocketError(
+            "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+            "encryption settings are used.")
+    return code, length
+
+
+def _raise_response_error(code: str, data: str) -> NoReturn:
+    if code == "404":
+        raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, data.strip()))
+    raise MKLivestatusQueryError("%s: %s" % (code, data.strip()))
+
+
+class _JSONRowParser:
+    """Parses a response in the JSON output format while it is being received
+
+    The response is a JSON list of rows. Each row is returned as soon as it has been
+    received completely, so the whole response never needs to be held in memory."""
+    def __init__(self) -> None:
+        super(_JSONRowParser, self).__init__()
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._started = False
+        self._finished = False
+        self._buf = u""
+
+    def feed(self, chunk: bytes) -> List[LivestatusRow]:
+        """Adds the next chunk of the response and returns the rows completed by it"""
+        rows = []
+        buf = self._buf + self._text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            pos = _json_row_separators.match(buf, pos).end()
+            if pos == len(buf):
+                break
+
+            if self._finished:
+                raise MKLivestatusSocketError("Malformed output")
+
+            if not self._started:
+                if buf[pos] != u"[":
+                    raise MKLivestatusSocketError("Malformed output")
+                self._started = True
+                pos += 1
+            elif buf[pos] == u"]":
+                self._finished = True
+                pos += 1
+            else:
+                try:
+                    row, pos = self._decoder.raw_decode(buf, pos)
+                except ValueError:
+                    break  # The row is incomplete, wait for the next chunk
+                rows.append(row)
+        self._buf = buf[pos:]
+        return rows
+
+    def close(self) -> None:
+        """Verifies that the response has been received completely"""
+        if (not self._finished or self._buf.strip() or self._text_decoder.decode(b"", final=True)):
+            raise MKLivestatusSocketError("Malformed output")
+
+
+def _iter_json_rows(chunks: Iterable[bytes]) -> Iterator[LivestatusRow]:
+    parser = _JSONRowParser()
+    for chunk in chunks:
+        for row in parser.feed(chunk):
+            yield row
+    parser.close()
+
+
 #.
 #   .--SingleSiteConn------------------------------------------------------.
 #   |  ____  _             _      ____  _ _        ____                    |
@@ -428,6 +536,21 @@ class SingleSiteConnection(Helpers):
             result += packet
         return result
 
+    def _receive_chunks(self, size: int) -> Iterator[bytes]:
+        """Yields the next size bytes from the socket in the chunks they are received"""
+        if self.socket is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" % self.socketurl)
+
+        # Timeout is only honored when connecting
+        self.socket.settimeout(None)
+        while size > 0:
+            packet = self.socket.recv(min(size, 65536))
+            if not packet:
+                raise MKLivestatusSocketClosed(
+                    "Read zero data from socket, nagios server closed connection")
+            size -= len(packet)
+            yield packet
+
     # TODO: change all call sites to hand over Query + str
     def do_query(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
         self.send_query(query, add_headers)
@@ -436,7 +559,8 @@ class SingleSiteConnection(Helpers):
     def send_query(self,
                    query_obj: Query,
                    add_headers: str = u"",
-                   do_reconnect: bool = True) -> None:
+                   do_reconnect: bool = True,
+                   output_format: str = "python3") -> None:
         orig_query = query_obj
 
         query = u"%s" % query_obj
@@ -450,7 +574,7 @@ class SingleSiteConnection(Helpers):
             query += "\n"
         query += self.auth_header + self.add_headers
         query += "Localtime: %d\n" % int(time.time())
-        query += "OutputFormat: python3\n"
+        query += "OutputFormat: %s\n" % output_format
         query += "KeepAlive: on\n"
         query += "ResponseHeader: fixed16\n"
         query += add_headers
@@ -476,7 +600,7 @@ class SingleSiteConnection(Helpers):
                 # Automatically try to reconnect in case of an error, but
                 # only once.
                 self.connect()
-                self.send_query(orig_query, add_headers, False)
+                self.send_query(orig_query, add_headers, False, output_format)
                 return
 
             raise MKLivestatusSocketError("RC1:" + str(e))
@@ -489,17 +613,7 @@ class SingleSiteConnection(Helpers):
                       add_headers: str = "",
                       timeout_at: Optional[float] = None) -> LivestatusResponse:
         try:
-            # Headers are always ASCII encoded
-            resp = self.receive_data(16)
-            code = resp[0:3].decode("ascii")
-            try:
-                length = int(resp[4:15].lstrip())
-            except Exception:
-                self.disconnect()
-                raise MKLivestatusSocketError(
-                    "Malformed output. Livestatus TCP socket might be unreachable or wrong"
-                    "encryption settings are used.")
-
+            code, length = self._receive_response_header()
             data = self.receive_data(length).decode("utf-8")
 
             if code == "200":
@@ -509,11 +623,7 @@ class SingleSiteConnection(Helpers):
                     self.disconnect()
                     raise MKLivestatusSocketError("Malformed output")
 
-            elif code == "404":
-                raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, data.strip()))
-
-            else:
-                raise MKLivestatusQueryError("%s: %s" % (code, data.strip()))
+            _raise_response_error(code, data)
 
         except (MKLivestatusSocketClosed, IOError) as e:
             # In case of an IO error or the other side having
@@ -546,6 +656,52 @@ class SingleSiteConnection(Helpers):
             # FIXME: ? self.disconnect()
             raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
+    def recv_rows(self, query: Query = None, add_headers: str = "") -> Iterator[LivestatusRow]:
+        """Reads a response to a query sent in the JSON output format row by row
+
+        Like recv_response(), the query is sent again (once) in case the server closed
+        the connection before answering. Errors after the first rows have been received
+        are not retried, because the rows have already been handed over to the caller."""
+        try:
+            try:
+                code, length = self._receive_response_header()
+            except (MKLivestatusSocketClosed, IOError):
+                self.disconnect()
+                if not query:
+                    raise
+                time.sleep(0.1)
+                self.connect()
+                self.send_query(query, add_headers, output_format="json")
+                code, length = self._receive_response_header()
+
+            if code != "200":
+                _raise_response_error(code, self.receive_data(length).decode("utf-8"))
+        except (MKLivestatusSocketClosed, IOError) as e:
+            self.disconnect()
+            raise MKLivestatusSocketError(str(e))
+
+        completed = False
+        try:
+            for row in _iter_json_rows(self._receive_chunks(length)):
+                yield row
+            completed = True
+        except IOError as e:
+            raise MKLivestatusSocketError(str(e))
+        finally:
+            if not completed:
+                # The rest of the response may still be pending on the socket. The
+                # connection can not be used for further queries.
+                self.disconnect()
+
+    def _receive_response_header(self) -> Tuple[str, int]:
+        try:
+            return _parse_response_header(self.receive_data(16))
+        except MKLivestatusSocketClosed:
+            raise
+        except MKLivestatusSocketError:
+            self.disconnect()
+            raise
+
     def set_prepend_site(self, p: bool) -> None:
         self.prepend_site = p
 
@@ -573,6 +729,25 @@ class SingleSiteConnection(Helpers):
                 row.insert(0, b"")
         return response
 
+    def query_rows(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        """Like query(), but the response is requested in the JSON output format and
+           the rows are yielded while they are received"""
+        # Normalize argument types
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        if self.limit is not None:
+            normalized_query = Query(u"%sLimit: %d\n" % (normalized_query, self.limit),
+                                     normalized_query.suppress_exceptions)
+
+        self.send_query(normalized_query, normalized_add_headers, output_format="json")
+        for row in self.recv_rows(normalized_query, normalized_add_headers):
+            if self.prepend_site:
+                row.insert(0, b"")
+            yield row
+
     # TODO: Cleanup all call sites to hand over str types
     def command(self, command: AnyStr, site: Optional[SiteId] = None) -> None:
         self.do_command(command)
@@ -631,6 +806,116 @@ class SingleSiteConnection(Helpers):
 # TODO: Move the connect/disconnect stuff to separate methods. Then make
 # it possible to connect/disconnect duing existance of a single object.
 
+SiteConnection = Tuple[SiteId, SiteConfiguration, SingleSiteConnection]
+
+
+class _ResponseReader:
+    """Sends a query to a site and reads the response without blocking on the socket
+
+    The reader is used to process the responses of multiple sites concurrently.
+    read() has to be called whenever the socket is readable."""
+    def __init__(self, sitename: SiteId, site: SiteConfiguration, connection: SingleSiteConnection,
+                 query: Query, add_headers: str, output_format: str) -> None:
+        super(_ResponseReader, self).__init__()
+        self.sitename = sitename
+        self.site = site
+        self.connection = connection
+        self._query = query
+        self._add_headers = add_headers
+        self._output_format = output_format
+        self._retried = False
+        self._rows_returned = False
+        self._reset()
+        self.connection.send_query(query, add_headers, output_format=output_format)
+
+    def _reset(self) -> None:
+        self.finished = False
+        self._header = b""
+        self._code: Optional[str] = None
+        self._remaining = 0
+        self._body: List[bytes] = []
+        self._parser: Optional[_JSONRowParser] = None
+
+    @property
+    def site_connection(self) -> SiteConnection:
+        return self.sitename, self.site, self.connection
+
+    @property
+    def socket(self) -> socket.socket:
+        if self.connection.socket is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" %
+                                          self.connection.socketurl)
+        return self.connection.socket
+
+    def read(self, deadline: Optional[float]) -> List[LivestatusRow]:
+        """Reads the available data and returns the rows completed by it"""
+        sock = self.socket
+        # Only TLS sockets may block here, in case just a part of a TLS record has arrived
+        sock.settimeout(None if deadline is None else max(deadline - time.time(), 0.001))
+        data = sock.recv(65536)
+        if not data:
+            raise MKLivestatusSocketClosed(
+                "Read zero data from socket, nagios server closed connection")
+
+        # Decrypted data buffered by the TLS layer is not signalled by the selector
+        while isinstance(sock, ssl.SSLSocket) and sock.pending():
+            data += sock.recv(sock.pending())
+        sock.settimeout(None)
+
+        rows = self._process(data)
+        if rows:
+            self._rows_returned = True
+        return rows
+
+    def _process(self, data: bytes) -> List[LivestatusRow]:
+        if self._code is None:
+            self._header += data
+            if len(self._header) < 16:
+                return []
+            self._code, self._remaining = _parse_response_header(self._header[:16])
+            data = self._header[16:]
+            if self._code == "200" and self._output_format == "json":
+                self._parser = _JSONRowParser()
+
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise MKLivestatusSocketError("Malformed output")
+
+        rows = []
+        if self._parser is not None:
+            rows = self._parser.feed(data)
+        else:
+            self._body.append(data)
+
+        if self._remaining == 0:
+            self.finished = True
+            if self._parser is not None:
+                self._parser.close()
+            elif self._code != "200":
+                _raise_response_error(self._code, b"".join(self._body).decode("utf-8"))
+            else:
+                try:
+                    rows = ast.literal_eval(b"".join(self._body).decode("utf-8"))
+                except Exception:
+                    raise MKLivestatusSocketError("Malformed output")
+        return rows
+
+    def may_retry(self, exception: Exception) -> bool:
+        """Like SingleSiteConnection.recv_response() the query is sent again (once) in case
+        the server closed the connection, e.g. due to a keepalive timeout"""
+        return (isinstance(exception, (MKLivestatusSocketClosed, IOError)) and
+                not isinstance(exception, socket.timeout) and not self._retried and
+                not self._rows_returned)
+
+    def retry(self) -> None:
+        self._retried = True
+        self._reset()
+        self.connection.disconnect()
+        self.connection.connect()
+        self.connection.send_query(self._query,
+                                   self._add_headers,
+                                   output_format=self._output_format)
+
 
 class MultiSiteConnection(Helpers):
     def __init__(self,
@@ -640,12 +925,14 @@ class MultiSiteConnection(Helpers):
             disabled_sites = {}
 
         self.sites = sites
-        self.connections: List[Tuple[SiteId, SiteConfiguration, SingleSiteConnection]] = []
+        self.connections: List[SiteConnection] = []
         self.deadsites: Dict[SiteId, DeadSite] = {}
         self.prepend_site = False
         self.only_sites: OnlySites = None
         self.limit: Optional[int] = None
         self.parallelize = True
+        self.query_timeout: Optional[float] = None
+        self.latencies: Dict[SiteId, float] = {}
 
         # Status host: A status host helps to prevent trying to connect
         # to a remote site which is unreachable. This is done by looking
@@ -814,9 +1101,21 @@ class MultiSiteConnection(Helpers):
     def set_limit(self, limit: Optional[int] = None) -> None:
         self.limit = limit
 
+    def set_query_timeout(self, timeout: Optional[float] = None) -> None:
+        """Sets the time in seconds all sites have to answer a query
+
+        Sites not answering in time are marked as dead. In case None is given,
+        the queries wait for all sites to answer.
+        """
+        self.query_timeout = timeout
+
     def dead_sites(self) -> Dict[SiteId, DeadSite]:
         return self.deadsites
 
+    def site_latencies(self) -> Dict[SiteId, float]:
+        """Time in seconds the sites needed to answer the last parallel query"""
+        return self.latencies
+
     def alive_sites(self) -> List[SiteId]:
         return [s[0] for s in self.connections]
 
@@ -880,56 +1179,140 @@ class MultiSiteConnection(Helpers):
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
     def query_parallel(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
-        stillalive = []
-        if self.only_sites is not None:
-            connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
-            # Unused sites are assumed to be alive
-            stillalive.extend([c for c in self.connections if c[0] not in self.only_sites])
-        else:
-            connect_to_sites = self.connections
+        sitenames = [c[0] for c in self._split_connections_by_only_sites()[0]]
+        site_rows: Dict[SiteId, List[LivestatusRow]] = {}
+        for sitename, rows in self._query_sites_concurrently(query, add_headers, "python3"):
+            site_rows.setdefault(sitename, []).extend(rows)
 
-        limit = self.limit
-        if limit is not None:
-            limit_header = u"Limit: %d\n" % limit
-        else:
-            limit_header = u""
+        # The responses are received concurrently, but the rows are handed out in the
+        # order of the sites to give the caller a stable result
+        result = LivestatusResponse([])
+        for sitename in sitenames:
+            rows = site_rows.get(sitename, [])
+            if self.prepend_site:
+                for row in rows:
+                    row.insert(0, sitename)
+            result += rows
+        return result
 
-        # First send all queries
-        for sitename, site, connection in connect_to_sites:
-            try:
-                connection.send_query(query, add_headers + limit_header)
-            except Exception as e:
-                self.deadsites[sitename] = {
-                    "exception": e,
-                    "site": site,
-                }
+    def query_rows(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        """Streaming version of query_parallel(): The rows of all sites are yielded while
+        they are received. Rows of different sites are merged in the order they arrive.
+        The responses are requested in the JSON output format."""
+        # Normalize argument types
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
 
+        for sitename, rows in self._query_sites_concurrently(normalized_query,
+                                                             normalized_add_headers, "json"):
+            for row in rows:
+                if self.prepend_site:
+                    row.insert(0, sitename)
+                yield row
+
+    def _query_sites_concurrently(
+            self, query: Query, add_headers: str,
+            output_format: str) -> Iterator[Tuple[SiteId, List[LivestatusRow]]]:
+        """Sends the query to all sites and then reads all site sockets concurrently
+
+        The rows are yielded together with the site they belong to as soon as they have
+        been received, so a slow site does not delay the rows of the other sites. Sites
+        that fail to answer or do not answer until the query deadline are marked as dead.
+        The response time of each site is recorded in self.latencies."""
+        connect_to_sites, stillalive = self._split_connections_by_only_sites()
+
+        if self.limit is not None:
+            add_headers += u"Limit: %d\n" % self.limit
+
+        started = time.time()
+        deadline = None if self.query_timeout is None else started + self.query_timeout
+        self.latencies = {}
         suppress_exceptions = tuple(query.suppress_exceptions)
 
-        # Then retrieve all answers. We will be as slow as the slowest of all
-        # connections.
-        result = LivestatusResponse([])
+        selector = selectors.DefaultSelector()
+        # First send all queries
         for sitename, site, connection in connect_to_sites:
             try:
-                r = connection.recv_response(query, add_headers + limit_header)
-                stillalive.append((sitename, site, connection))
-                if self.prepend_site:
-                    for row in r:
-                        row.insert(0, sitename)
-                result += r
-            except suppress_exceptions:  # pylint: disable=catching-non-exception
-                stillalive.append((sitename, site, connection))
-                continue
-
+                reader = _ResponseReader(sitename, site, connection, query, add_headers,
+                                         output_format)
+                selector.register(reader.socket, selectors.EVENT_READ, reader)
             except Exception as e:
-                connection.disconnect()
                 self.deadsites[sitename] = {
                     "exception": e,
                     "site": site,
                 }
 
-        self.connections = stillalive
-        return result
+        # Then process the answers in the order they arrive
+        timed_out = False
+        try:
+            while selector.get_map():
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        timed_out = True
+                        break
+
+                for key, _events in selector.select(timeout):
+                    reader = key.data
+                    try:
+                        rows = reader.read(deadline)
+                    except suppress_exceptions:  # pylint: disable=catching-non-exception
+                        selector.unregister(key.fileobj)
+                        stillalive.append(reader.site_connection)
+                        continue
+
+                    except Exception as e:
+                        selector.unregister(key.fileobj)
+                        if reader.may_retry(e):
+                            try:
+                                reader.retry()
+                                selector.register(reader.socket, selectors.EVENT_READ, reader)
+                                continue
+                            except Exception as retry_exception:
+                                e = retry_exception
+
+                        reader.connection.disconnect()
+                        self.deadsites[reader.sitename] = {
+                            "exception": e,
+                            "site": reader.site,
+                        }
+                        continue
+
+                    if reader.finished:
+                        selector.unregister(key.fileobj)
+                        self.latencies[reader.sitename] = time.time() - started
+                        stillalive.append(reader.site_connection)
+
+                    if rows:
+                        yield reader.sitename, rows
+        finally:
+            for key in list(selector.get_map().values()):
+                reader = key.data
+                # The response has not been read completely, the connection can not be
+                # used for further queries.
+                reader.connection.disconnect()
+                if timed_out:
+                    self.deadsites[reader.sitename] = {
+                        "exception": MKLivestatusSocketError("No response within %.1f seconds" %
+                                                             self.query_timeout),
+                        "site": reader.site,
+                    }
+                else:
+                    # The caller stopped consuming the rows early
+                    stillalive.append(reader.site_connection)
+            selector.close()
+            self.connections = stillalive
+
+    def _split_connections_by_only_sites(self) -> Tuple[List[SiteConnection], List[SiteConnection]]:
+        """Returns the connections to query and the connections not affected by the query"""
+        if self.only_sites is None:
+            return self.connections, []
+        # Unused sites are assumed to be alive
+        return ([c for c in self.connections if c[0] in self.only_sites],
+                [c for c in self.connections if c[0] not in self.only_sites])
 
     # TODO: Is this SiteId(...) the way to go? Without this mypy complains about incompatible bytes
     # vs. Optional[SiteId]
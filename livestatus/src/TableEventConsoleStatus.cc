@@ -83,6 +83,17 @@ TableEventConsoleStatus::TableEventConsoleStatus(MonitoringCore *mc)
         "status_average_rule_hit_rate", "The average rule hit rate",
         Column::Offsets{}));
 
+    addColumn(std::make_unique<IntEventConsoleColumn>(
+        "status_prefilter_skips",
+        "The number of rules skipped by the rule prefilter since startup of the Event Console",
+        Column::Offsets{}));
+    addColumn(std::make_unique<DoubleEventConsoleColumn>(
+        "status_prefilter_skip_rate", "The prefilter skip rate",
+        Column::Offsets{}));
+    addColumn(std::make_unique<DoubleEventConsoleColumn>(
+        "status_average_prefilter_skip_rate", "The average prefilter skip rate",
+        Column::Offsets{}));
+
     addColumn(std::make_unique<DoubleEventConsoleColumn>(
         "status_average_processing_time",
         "The average incoming message processing time", Column::Offsets{}));
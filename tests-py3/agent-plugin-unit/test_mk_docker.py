@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=protected-access,redefined-outer-name
+
+import os
+import sys
+import json
+import threading
+import types
+
+import pytest  # type: ignore[import]
+from utils import import_module
+
+
+class FakeContainer(object):
+    def __init__(self, container_id, status="running"):
+        self.attrs = {
+            "Id": container_id * 64,
+            "Name": "/%s" % container_id,
+            "State": {
+                "Status": status
+            },
+        }
+        self.status = status
+        self.labels = {"label": container_id}
+        self.image = types.SimpleNamespace(tags=["image:latest"])
+        self.stats_calls = 0
+
+    def stats(self, stream=True):
+        assert stream is False
+        self.stats_calls += 1
+        return {
+            "memory_stats": {
+                "usage": 1
+            },
+            "cpu_stats": {
+                "usage": 2
+            },
+            "blkio_stats": {},
+        }
+
+
+class FakeDockerClient(object):
+    containers_to_list = []  # type: list
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        self.kwargs = kwargs
+        self.containers = types.SimpleNamespace(list=lambda all=False: self.containers_to_list)
+
+    def info(self):
+        return {"Name": "docker-node"}
+
+
+def _fake_docker_module(version):
+    docker = types.ModuleType("docker")
+    docker.__version__ = version
+    docker.version = version
+    docker.DockerClient = FakeDockerClient
+    docker.errors = types.SimpleNamespace(APIError=type("APIError", (Exception,), {}),
+                                          ImageNotFound=type("ImageNotFound", (Exception,), {}))
+    return docker
+
+
+@pytest.fixture(params=["4.3.0"])
+def mk_docker(request, monkeypatch, tmp_path):
+    # The plugin terminates on hosts without docker
+    docker_binary = tmp_path / "docker"
+    docker_binary.write_text(u"")
+    docker_binary.chmod(0o755)
+    monkeypatch.setenv("PATH", "%s%s%s" % (tmp_path, os.pathsep, os.environ["PATH"]))
+    monkeypatch.setitem(sys.modules, "docker", _fake_docker_module(request.param))
+    return import_module("mk_docker.py")
+
+
+def _config(mk_docker, max_workers):
+    return dict(mk_docker.DEFAULT_CFG_SECTION,
+                skip_sections=("docker_container_agent", "docker_container_diskstat"),
+                max_workers=max_workers)
+
+
+def _client(mk_docker, containers, max_workers=4):
+    FakeDockerClient.containers_to_list = containers
+    return mk_docker.MKDockerClient(_config(mk_docker, max_workers))
+
+
+@pytest.mark.parametrize("mk_docker, kwargs", [
+    ("4.3.0", {
+        "version": "auto",
+        "max_pool_size": 4
+    }),
+    ("4.2.2", {
+        "version": "auto"
+    }),
+],
+                         indirect=["mk_docker"])
+def test_client_max_pool_size(mk_docker, kwargs):
+    assert _client(mk_docker, []).kwargs == kwargs
+
+
+def test_get_container_stats(mk_docker):
+    running = FakeContainer("a")
+    stopped = FakeContainer("b", status="exited")
+    client = _client(mk_docker, [running, stopped])
+
+    threads = [
+        threading.Thread(target=client.get_container_stats, args=("a" * 12,)) for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.get_container_stats("a" * 12)["cpu_stats"] == {"usage": 2}
+    assert running.stats_calls == 1
+    assert client.get_container_stats("b" * 12) is None
+    assert stopped.stats_calls == 0
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_call_container_sections(mk_docker, capsys, max_workers):
+    containers = [FakeContainer(name) for name in "abcdefgh"]
+    client = _client(mk_docker, containers, max_workers)
+
+    mk_docker.call_container_sections(client, _config(mk_docker, max_workers))
+
+    # The sections of the containers may be written in any order, but the lines of
+    # each section must not be interleaved with the ones of other sections.
+    sections = {}
+    lines = capsys.readouterr().out.splitlines()
+    while lines:
+        assert lines[0].startswith("<<<<") and lines[0] != "<<<<>>>>"
+        end = lines.index("<<<<>>>>")
+        piggytarget = lines[0][4:-4]
+        header, version_info, data = lines[1:end]
+        assert version_info.startswith("@docker_version_info")
+        sections.setdefault(piggytarget, []).append((header, json.loads(data)))
+        lines = lines[end + 1:]
+
+    assert sorted(sections) == sorted(client.all_containers)
+    for container_id, container_sections in sections.items():
+        assert [header for header, _data in container_sections] == [
+            "<<<docker_container_node_name:sep(0)>>>",
+            "<<<docker_container_status:sep(0)>>>",
+            "<<<docker_container_labels:sep(0)>>>",
+            "<<<docker_container_network:sep(0)>>>",
+            "<<<docker_container_mem:sep(0)>>>",
+            "<<<docker_container_cpu:sep(0)>>>",
+        ]
+        assert container_sections[2][1] == {"label": container_id[0]}
+    assert [container.stats_calls for container in containers] == [1] * len(containers)
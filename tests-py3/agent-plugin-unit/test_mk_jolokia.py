@@ -5,6 +5,8 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 # pylint: disable=protected-access,redefined-outer-name
+import json
+
 import pytest  # type: ignore[import]
 from utils import import_module
 
@@ -143,3 +145,95 @@ def test_jolokia_validate_response_skip_instance(mk_jolokia):
 ])
 def test_jolokia_validate_response_ok(mk_jolokia, data):
     assert data == mk_jolokia.validate_response(_MockHttpResponse(200, **data))
+
+
+class _MockJsonResponse(object):  # pylint: disable=useless-object-inheritance
+    def __init__(self, payload):
+        self.status_code = 200
+        self.headers = {}
+        self.content = b'\x00'
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _MockJolokiaSession(object):  # pylint: disable=useless-object-inheritance
+    """Answers single and bulk requests like the Jolokia agent of a tomcat"""
+    verify = True
+
+    def __init__(self):
+        self.posted = []
+
+    def post(self, _url, data, verify):  # pylint: disable=unused-argument
+        request = json.loads(data)
+        self.posted.append(request)
+        if isinstance(request, list):
+            return _MockJsonResponse([self._respond(item) for item in request])
+        return _MockJsonResponse(self._respond(request))
+
+    @staticmethod
+    def _respond(request):
+        if request["type"] == "version":
+            return {"status": 200, "value": {"info": {"product": "tomcat", "version": "9.0"}}}
+        if request["type"] == "search":
+            return {"status": 200, "value": ["net.sf.ehcache:name=app,type=CacheStatistics"]}
+        if request["mbean"] == "*:type=Manager,*":
+            return {
+                "status": 200,
+                "value": {
+                    "Catalina:context=/app,type=Manager": {
+                        "activeSessions": 3
+                    }
+                }
+            }
+        if request["mbean"].startswith("net.sf.ehcache"):
+            return {"status": 200, "value": 7}
+        if request["mbean"] == "java.lang:type=Threading":
+            return {"status": 200, "value": {"ThreadCount": 42}}
+        return {"status": 404, "error": "not found"}
+
+
+def _query_instance(mk_jolokia, config):
+    inst = mk_jolokia.JolokiaInstance(dict(mk_jolokia.get_default_config_dict(), **config))
+    session = inst._session = _MockJolokiaSession()
+    output = mk_jolokia.StringIO()
+    mk_jolokia.query_instance(inst, output)
+    return output.getvalue(), session.posted
+
+
+def test_query_instance_bulk(mk_jolokia):
+    output, posted = _query_instance(mk_jolokia, {"instance": "bulk"})
+    bulk_output, bulk_posted = _query_instance(mk_jolokia, {"instance": "bulk", "bulk_size": 10})
+
+    assert bulk_output == output
+    assert "bulk,/app\x00activeSessions\x003\n" in output
+    assert "bulk\x00CacheHits\x007\n" in output
+    # The version, a search for each of the 20 ehcache MBeans and 29 reads
+    assert len(posted) == 50
+    # The version, one bulk request of the (equal) searches and the reads in bulks
+    bulk_sizes = [len(request) if isinstance(request, list) else 1 for request in bulk_posted]
+    assert bulk_sizes == [1, 1, 10, 10, 9]
+
+
+def test_prefetch_failed_bulk_request(mk_jolokia):
+    inst = mk_jolokia.JolokiaInstance(dict(mk_jolokia.get_default_config_dict(), bulk_size=2))
+    inst._session = _MockJolokiaSession()
+    inst._session.post = lambda _url, data, verify: _MockJsonResponse({"status": 400})
+
+    inst.prefetch([inst.get_post_data("java.lang:type=Threading", "read", use_target=True)])
+    assert not inst._prefetched
+
+
+def test_main_keeps_order_of_instances(mk_jolokia, monkeypatch, capsys):
+    def fake_query_instance(inst, output=None):
+        mk_jolokia.write_section("jolokia_info", [(inst.name,)], output)
+
+    monkeypatch.setattr(mk_jolokia, "query_instance", fake_query_instance)
+    configs = [
+        dict(mk_jolokia.get_default_config_dict(), instance="inst%d" % nr, max_workers=4)
+        for nr in range(10)
+    ]
+    mk_jolokia.main(configs)
+    assert capsys.readouterr().out == "".join(
+        "<<<jolokia_info:sep(0)>>>\ninst%d\n" % nr for nr in range(10))
@@ -643,3 +643,90 @@ def fake_filesystem(tmpdir):
     create_recursively(str(tmpdir), "root", "dir", root)
 
     return os.path.join(str(tmpdir), "root")
+
+
+@pytest.mark.parametrize("raw_pattern, literal", [
+    (u"disk (.*) full$", u"disk "),
+    (u"^ERROR: (.*) failed", u"ERROR: "),
+    (u"Link (up|down) on eth[0-9]+", u" on eth"),
+    (u"(Timeout)+ on port", u" on port"),
+    (u"\xe4\xf6\xfc", u"\xe4\xf6\xfc"),
+    (u"ab.d", None),
+    (u"foo|bar", None),
+    (u"(?i)disk full", None),
+    (u"x(?i:abcd)yz", None),
+])
+def test_required_literal(mk_logwatch, raw_pattern, literal):
+    assert mk_logwatch._required_literal(re.compile(raw_pattern, re.UNICODE)) == literal
+
+
+def _compiled(*raw_patterns):
+    return [('C', re.compile(raw_pattern, re.UNICODE), [], []) for raw_pattern in raw_patterns]
+
+
+def test_build_line_prefilter(mk_logwatch):
+    assert mk_logwatch.build_line_prefilter([]) is None
+
+    prefilter = mk_logwatch.build_line_prefilter(_compiled(u"disk (.*) full", u"Link down"))
+    assert prefilter.block_safe
+    assert prefilter.regex.search(u"xLink down on eth0")
+    assert not prefilter.regex.search(u"Link up")
+
+    prefilter = mk_logwatch.build_line_prefilter(_compiled(u"disk (.*) full", u"a|b"))
+    assert not prefilter.block_safe
+    assert prefilter.regex.search(u"b")
+
+    assert mk_logwatch.build_line_prefilter(_compiled(u"disk", u"(a)\\1")) is None
+    assert mk_logwatch.build_line_prefilter(_compiled(u"disk", u"(?i)a|b")) is None
+
+
+def test_log_lines_iter_skip_lines_not_matching(mk_logwatch, tmpdir):
+    log_path = os.path.join(str(tmpdir), "testlog")
+    with open(log_path, "wb") as f:
+        f.write(b"".join(b"line %d\n" % nr for nr in range(10)) + b"disk full\nlast\n")
+
+    regex = re.compile(u"disk|last", re.UNICODE)
+    with mk_logwatch.LogLinesIter(log_path, None) as log_iter:
+        assert log_iter.skip_lines_not_matching(regex, 3) == 3
+        assert log_iter.next_line() == u"line 3\n"
+        assert log_iter.get_position() == 28
+        assert log_iter.skip_lines_not_matching(regex, 100) == 6
+        assert log_iter.next_line() == u"disk full\n"
+        assert log_iter.skip_lines_not_matching(regex, 100) == 0
+        assert log_iter.next_line() == u"last\n"
+        assert log_iter.skip_lines_not_matching(regex, 100) == 0
+        assert log_iter.next_line() is None
+
+
+@pytest.mark.parametrize("opt_raw", [
+    {},
+    {
+        'nocontext': True
+    },
+    {
+        'nocontext': True,
+        'maxlines': 500
+    },
+])
+@pytest.mark.parametrize("raw_patterns", [
+    [u"disk (.*) full", u"Link (up|down) on eth[0-9]"],
+    [u"disk (.*) full", u"^[0-9]+ (a|l)ink"],
+])
+def test_process_logfile_prefilter(mk_logwatch, monkeypatch, tmpdir, opt_raw, raw_patterns):
+    log_path = os.path.join(str(tmpdir), "testlog")
+    with open(log_path, "wb") as f:
+        for nr in range(3000):
+            f.write(b"%d link %s\n" %
+                    (nr, [b"disk /var full", b"Link down on eth1", b"nothing"][nr % 7 % 3]))
+
+    def process(with_prefilter):
+        section = mk_logwatch.LogfileSection((log_path, log_path))
+        section.options.values.update(opt_raw)
+        section._compiled_patterns = _compiled(*raw_patterns)
+        if not with_prefilter:
+            section._line_prefilter_built = True
+        state = {'offset': 0}
+        return mk_logwatch.process_logfile(section, state, False), state
+
+    monkeypatch.setattr(sys, 'stdout', MockStdout())
+    assert process(True) == process(False)
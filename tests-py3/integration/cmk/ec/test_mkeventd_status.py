@@ -70,6 +70,9 @@ def test_status_table_via_core(site, ec, core):  # noqa: F811 # pylint: disable=
             'status_rule_hits',
             'status_rule_hit_rate',
             'status_average_rule_hit_rate',
+            'status_prefilter_skips',
+            'status_prefilter_skip_rate',
+            'status_average_prefilter_skip_rate',
             'status_average_processing_time',
             'status_average_request_time',
             'status_average_sync_time',
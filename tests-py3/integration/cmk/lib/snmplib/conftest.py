@@ -132,6 +132,7 @@ def backend_fixture(request, snmp_data_dir):
         is_usewalk_host=backend is StoredWalkSNMPBackend,
         is_inline_snmp_host=backend is InlineSNMPBackend,
         record_stats=False,
+        bulk_backend_settings=None,
     )
 
     snmpwalks_dir = cmk.utils.paths.snmpwalks_dir
@@ -25,6 +25,10 @@ pytestmark = pytest.mark.checks
         "--server", "address", "--port", "8080", "--user", "userID", "--password", "password",
         "--mode", "basic"
     ]),
+    ({
+        'port': 8080,
+        'bulk_size': 100
+    }, ["--server", "address", "--port", "8080", "--bulk_size", "100"]),
 ])
 def test_jolokia_argument_parsing(check_manager, params, expected_args):
     """Tests if all required arguments are present."""
@@ -46,3 +46,67 @@ def test_parse_section_header(headerline, section_name, section_options):
     parsed_name, parsed_options = agent.AgentDataSource._parse_section_header(headerline)
     assert parsed_name == section_name
     assert parsed_options == section_options
+
+
+def test_iter_header_lines():
+    raw_data = b"junk\n<<<one>>>\nfoo <<<no>>>\n  <<<two:sep(59)>>>  \r\n<<<<piggy>>>>"
+    assert [stripped for _start, _end, stripped in agent._iter_header_lines(raw_data)] == [
+        b"<<<one>>>",
+        b"<<<two:sep(59)>>>",
+        b"<<<<piggy>>>>",
+    ]
+
+
+def _chunk(data, separator=None, encoding=None, nostrip=False):
+    return agent.RawSectionChunk(memoryview(data), separator, encoding, nostrip)
+
+
+def test_lazy_agent_sections_tokenize_on_access():
+    sections = agent.LazyAgentSections()
+    sections.add_chunk(SectionName("one"), _chunk(b"a b\n\n  c d \r\n"))
+    sections.add_chunk(SectionName("two"), _chunk(b"a;b c\n", separator=";"))
+    sections.add_chunk(SectionName("one"), _chunk(b"\xe4\n", encoding="latin-1"))
+
+    assert list(sections) == [SectionName("one"), SectionName("two")]
+    assert SectionName("two") in sections
+    assert sections._content[SectionName("two")] is None
+
+    assert sections[SectionName("one")] == [["a", "b"], ["c", "d"], [u"ä"]]
+    assert sections[SectionName("two")] == [["a", "b c"]]
+    assert not sections._pending
+
+
+def test_lazy_agent_sections_merge():
+    sections = agent.LazyAgentSections()
+    sections.add_chunk(SectionName("one"), _chunk(b"1"))
+    sections[SectionName("two")] = [["2"]]
+
+    other = agent.LazyAgentSections()
+    other.add_chunk(SectionName("one"), _chunk(b"3"))
+    other.add_chunk(SectionName("two"), _chunk(b"4"))
+    other[SectionName("three")] = [["5"]]
+
+    sections.merge(other)
+    assert sections._content[SectionName("one")] is None
+    assert sections == {
+        SectionName("one"): [["1"], ["3"]],
+        SectionName("two"): [["2"], ["4"]],
+        SectionName("three"): [["5"]],
+    }
+
+
+def test_lazy_agent_sections_content_digest():
+    sections = agent.LazyAgentSections()
+    sections.add_chunk(SectionName("one"), _chunk(b"a b\n"))
+    sections.add_chunk(SectionName("two"), _chunk(b"a b\n", separator=";"))
+    sections.add_chunk(SectionName("three"), _chunk(b"a b\n"))
+
+    digest = sections.content_digest(SectionName("one"))
+    assert digest == sections.content_digest(SectionName("three"))
+    assert digest != sections.content_digest(SectionName("two"))
+    assert sections._content[SectionName("one")] is None
+
+    assert sections[SectionName("one")] == [["a", "b"]]
+    assert sections.content_digest(SectionName("one")) != digest
+    sections.add_chunk(SectionName("three"), _chunk(b"c\n"))
+    assert sections.content_digest(SectionName("three")) != digest
@@ -9,6 +9,7 @@ import pytest  # type: ignore[import]
 
 from testlib.base import Scenario
 
+import cmk.utils.paths
 import cmk.utils.piggyback
 from cmk.utils.type_defs import ParsedSectionName, SectionName, SourceType
 
@@ -129,6 +130,32 @@ def test_get_parsed_section(monkeypatch, node_section_content, expected_result):
            "Section content: Expected '%s' but got '%s'" % (expected_result, content)
 
 
+def test_get_parsed_section_cached(monkeypatch, tmp_path):
+    _set_up(monkeypatch, "node1", None, {})
+    monkeypatch.setattr(config, "cached_parsed_sections", ["one"])
+    monkeypatch.setattr(cmk.utils.paths, "parsed_sections_cache_dir", tmp_path)
+    host_key = HostKey("node1", "127.0.0.1", SourceType.HOST)
+    parse_calls = []
+    section = SECTION_ONE._replace(
+        parse_function=lambda x: parse_calls.append(x) or {"node": x[0][0]})
+    monkeypatch.setattr(config, "get_registered_section_plugin", {section.name: section}.get)
+
+    def get_parsed_section(node_section_content):
+        multi_host_sections = MultiHostSections()
+        multi_host_sections[host_key] = AgentHostSections(sections=node_section_content)
+        content = multi_host_sections.get_parsed_section(host_key, ParsedSectionName("parsed"))
+        multi_host_sections.store_parsed_sections()
+        return content
+
+    assert get_parsed_section({SectionName("one"): NODE_1}) == {"node": "node1"}
+    assert (tmp_path / "node1").exists()
+    assert get_parsed_section({SectionName("one"): NODE_1}) == {"node": "node1"}
+    assert len(parse_calls) == 1
+
+    assert get_parsed_section({SectionName("one"): NODE_2}) == {"node": "node2"}
+    assert len(parse_calls) == 2
+
+
 @pytest.mark.parametrize("required_sections,expected_result", [
     (["nonexistent"], {}),
     (["parsed"], {
@@ -8,6 +8,10 @@
 
 # No stub file
 import pytest  # type: ignore[import]
+
+from cmk.utils.exceptions import MKGeneralException
+import cmk.utils.paths
+
 import cmk.base.core
 import cmk.base.config
 import cmk.base.checking
@@ -215,3 +219,129 @@ def _check_timeperiod(timeperiod, active_timeperiods):
 ])
 def test_aggregate_result(subresults, aggregated_results):
     assert cmk.base.checking._aggregate_results(subresults) == aggregated_results
+
+
+class _CommandPipe:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.buffer = b""
+        self.writes = []
+
+    def write(self, data):
+        if self.fail_after is not None and len(self.writes) >= self.fail_after:
+            raise BrokenPipeError("Broken pipe")
+        self.buffer += data
+
+    def flush(self):
+        self.writes.append(self.buffer)
+        self.buffer = b""
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(name="buffered_submission")
+def fixture_buffered_submission(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.base.config, "check_submission_buffered", True)
+    monkeypatch.setattr(cmk.base.config, "check_submission_flush_results", 1000)
+    monkeypatch.setattr(cmk.base.config, "check_submission_max_write_size", 4096)
+    monkeypatch.setattr(cmk.base.config, "monitoring_core", "nagios")
+    monkeypatch.setattr(cmk.utils.paths, "check_result_path", str(tmp_path))
+    monkeypatch.setattr(cmk.base.checking, "_pending_check_results", [])
+    monkeypatch.setattr(cmk.base.checking, "_checkresult_file_fd", None)
+    monkeypatch.setattr(cmk.base.checking, "_checkresult_file_path", None)
+    yield tmp_path
+    cmk.base.checking._close_checkresult_file()
+
+
+def _submit_results(num):
+    for n in range(num):
+        cmk.base.checking._do_submit_to_core("host", "Service %d" % n, 0, "OK - line1\nline2", None)
+
+
+def test_command_pipe_chunks():
+    results = [("host", "Service %d" % n, 0, "x" * (n % 100), 0.0) for n in range(500)]
+    chunks = list(cmk.base.checking._command_pipe_chunks(results, 1000))
+
+    assert len(chunks) > 1
+    assert sum(num for num, _chunk in chunks) == len(results)
+    assert all(len(chunk) <= 1000 for _num, chunk in chunks)
+    assert all(chunk.endswith(b"\n") for _num, chunk in chunks)
+    assert b"".join(chunk for _num, chunk in chunks) == b"".join(
+        cmk.base.checking._command_pipe_line(*result) for result in results)
+
+
+def test_command_pipe_chunks_oversized_line():
+    results = [("host", "Service %d" % n, 0, "x" * 200, 0.0) for n in range(3)]
+    chunks = list(cmk.base.checking._command_pipe_chunks(results, 100))
+    assert [num for num, _chunk in chunks] == [1, 1, 1]
+
+
+def test_submit_buffered_via_command_pipe(monkeypatch, buffered_submission):
+    monkeypatch.setattr(cmk.base.config, "check_submission", "pipe")
+    pipe = _CommandPipe()
+    monkeypatch.setattr(cmk.base.checking, "_nagios_command_pipe", pipe)
+
+    _submit_results(100)
+    assert pipe.writes == []
+
+    cmk.base.checking._flush_check_results()
+    assert cmk.base.checking._pending_check_results == []
+    assert 1 < len(pipe.writes) < 5
+    assert all(len(write) <= 4096 for write in pipe.writes)
+    lines = b"".join(pipe.writes).splitlines()
+    assert len(lines) == 100
+    assert lines[0].endswith(b"PROCESS_SERVICE_CHECK_RESULT;host;Service 0;0;OK - line1\\nline2")
+
+
+def test_submit_buffered_flush_threshold(monkeypatch, buffered_submission):
+    monkeypatch.setattr(cmk.base.config, "check_submission", "pipe")
+    monkeypatch.setattr(cmk.base.config, "check_submission_flush_results", 10)
+    pipe = _CommandPipe()
+    monkeypatch.setattr(cmk.base.checking, "_nagios_command_pipe", pipe)
+
+    _submit_results(25)
+    assert len(b"".join(pipe.writes).splitlines()) == 20
+    assert len(cmk.base.checking._pending_check_results) == 5
+
+
+def test_submit_buffered_via_check_result_file(monkeypatch, buffered_submission):
+    monkeypatch.setattr(cmk.base.config, "check_submission", "file")
+
+    _submit_results(100)
+    assert list(buffered_submission.iterdir()) == []
+
+    cmk.base.checking._flush_check_results()
+    cmk.base.checking._close_checkresult_file()
+    result_files = [p for p in buffered_submission.iterdir() if p.suffix != ".ok"]
+    assert len(result_files) == 1
+    assert result_files[0].read_text().count("host_name=host\n") == 100
+
+
+def test_submit_buffered_pipe_error_fallback(monkeypatch, buffered_submission):
+    monkeypatch.setattr(cmk.base.config, "check_submission", "pipe")
+    pipe = _CommandPipe(fail_after=1)
+    monkeypatch.setattr(cmk.base.checking, "_nagios_command_pipe", pipe)
+
+    _submit_results(100)
+    cmk.base.checking._flush_check_results()
+    cmk.base.checking._close_checkresult_file()
+
+    assert cmk.base.checking._nagios_command_pipe is None
+    num_written = len(pipe.writes[0].splitlines())
+    result_files = [p for p in buffered_submission.iterdir() if p.suffix != ".ok"]
+    assert len(result_files) == 1
+    content = result_files[0].read_text()
+    assert content.count("host_name=host\n") == 100 - num_written
+    assert "service_description=Service %d\n" % num_written in content
+
+
+def test_submit_buffered_pipe_error_cmc(monkeypatch, buffered_submission):
+    monkeypatch.setattr(cmk.base.config, "check_submission", "pipe")
+    monkeypatch.setattr(cmk.base.config, "monitoring_core", "cmc")
+    monkeypatch.setattr(cmk.base.checking, "_nagios_command_pipe", _CommandPipe(fail_after=0))
+
+    _submit_results(10)
+    with pytest.raises(MKGeneralException, match="Broken pipe"):
+        cmk.base.checking._flush_check_results()
+    assert list(buffered_submission.iterdir()) == []
@@ -107,3 +107,21 @@ def test_cpu_tracking_add_times(monkeypatch):
     assert times["TOTAL"][4] == 7.0
     assert times["busy"][4] == 2.0
     assert times["agent"][4] == 5.0
+
+
+def test_cpu_tracking_counters(monkeypatch):
+    cpu_tracking.count("hits")
+    assert cpu_tracking.get_counters() == {}
+
+    monkeypatch.setattr("time.time", lambda: 0.0)
+    cpu_tracking.start("busy")
+    cpu_tracking.count("hits")
+    cpu_tracking.count("hits")
+    cpu_tracking.count("misses")
+    cpu_tracking.end()
+
+    assert cpu_tracking.get_counters() == {"hits": 2, "misses": 1}
+
+    cpu_tracking.start("busy")
+    assert cpu_tracking.get_counters() == {}
+    cpu_tracking.end()
@@ -68,3 +68,46 @@ def test_get_average(ini_zero, backlog_min, timeseries):
             initialize_zero=ini_zero,
         )
         assert avg == expected_average, "at [%r]: got %r expected %r" % (idx, avg, expected_average)
+
+
+def test_counters_file_migrates_legacy_format(tmp_path):
+    path = tmp_path / "host"
+    path.write_text(u"{('check', 'item', 'counter'): (1.0, 42)}\n")
+
+    counters_file = item_state.CountersFile(str(path))
+    item_states = counters_file.parse(path.read_bytes())
+    assert item_states == {("check", "item", "counter"): (1.0, 42)}
+
+    item_states[("check", "item", "other")] = (2.0, 23)
+    counters_file.write(item_states, [], {("check", "item", "other"): (2.0, 23)})
+    assert path.read_bytes().startswith(item_state.CountersFile.magic)
+    assert item_state.CountersFile(str(path)).parse(path.read_bytes()) == item_states
+
+
+def test_counters_file_appends_changes(tmp_path):
+    path = tmp_path / "host"
+    counters_file = item_state.CountersFile(str(path))
+    item_states = {("check", "item%d" % i, "counter"): (1.0, i) for i in range(100)}
+    counters_file.write(item_states, [], item_states)
+    snapshot_size = path.stat().st_size
+
+    removed = [("check", "item0", "counter")]
+    updated = {("check", "item1", "counter"): (2.0, 1), ("check", "new", "counter"): (2.0, 1)}
+    del item_states[removed[0]]
+    item_states.update(updated)
+    counters_file.write(item_states, removed, updated)
+    assert path.stat().st_size > snapshot_size
+
+    assert item_state.CountersFile(str(path)).parse(path.read_bytes()) == item_states
+
+
+def test_counters_file_drops_truncated_record(tmp_path):
+    path = tmp_path / "host"
+    counters_file = item_state.CountersFile(str(path))
+    item_states = {("check", "item", "counter"): (1.0, 42)}
+    counters_file.write(item_states, [], item_states)
+
+    with path.open("ab") as f:
+        f.write(b"\x20\x00\x00\x00garbage")
+
+    assert item_state.CountersFile(str(path)).parse(path.read_bytes()) == item_states
@@ -6,6 +6,7 @@
 
 import io
 import os
+import time
 
 import pytest  # type: ignore[import]
 
@@ -75,3 +76,201 @@ def test_raw_context_from_env_pipe_decoding(monkeypatch, environ, expected):
 def test_raw_context_from_stdin(monkeypatch, context, expected):
     monkeypatch.setattr('sys.stdin', io.StringIO(context))
     assert notify.raw_context_from_stdin() == expected
+
+
+@pytest.mark.parametrize("rule,context", [
+    ({
+        "disabled": True
+    }, {
+        "WHAT": "HOST"
+    }),
+    ({
+        "match_service_event": ["?c"]
+    }, {
+        "WHAT": "HOST"
+    }),
+    ({
+        "match_host_event": ["?d"]
+    }, {
+        "WHAT": "SERVICE"
+    }),
+    ({
+        "match_servicegroups": ["web"]
+    }, {
+        "WHAT": "HOST"
+    }),
+    ({
+        "match_servicegroups_regex": ("match_id", ["web.*"])
+    }, {
+        "WHAT": "HOST"
+    }),
+    ({
+        "match_ec": False
+    }, {
+        "WHAT": "SERVICE",
+        "EC_ID": "1"
+    }),
+    ({
+        "match_ec": {}
+    }, {
+        "WHAT": "SERVICE"
+    }),
+])
+def test_rule_mismatch_of_kind(rule, context):
+    why_not = notify._rule_mismatch_of_kind(rule, context["WHAT"], "EC_ID" in context)
+    assert why_not is not None
+    for matcher in [
+            notify.rbn_match_rule_disabled,
+            notify.events.event_match_servicegroups_fixed,
+            notify.events.event_match_servicegroups_regex,
+            notify.rbn_match_host_event,
+            notify.rbn_match_service_event,
+            notify.rbn_match_event_console,
+    ]:
+        if matcher(rule, context) == why_not:
+            break
+    else:
+        raise AssertionError("No matcher reports %r" % why_not)
+
+
+@pytest.mark.parametrize("rule", [
+    {},
+    {
+        "match_host_event": ["?d"],
+        "match_service_event": ["?c"]
+    },
+    {
+        "match_servicegroups": []
+    },
+    {
+        "match_ec": {}
+    },
+])
+def test_rule_mismatch_of_kind_may_match(rule):
+    assert notify._rule_mismatch_of_kind(rule, "SERVICE", True) is None
+
+
+def test_compile_notification_rules(monkeypatch):
+    rules = [
+        {
+            "description": "all"
+        },
+        {
+            "description": "hosts",
+            "match_host_event": ["?d"]
+        },
+        {
+            "description": "no ec",
+            "match_ec": False
+        },
+    ]
+    monkeypatch.setattr(notify.config, "notification_rules", rules)
+    monkeypatch.setattr(notify.config, "contacts", {})
+
+    compiled_rules = notify.compile_notification_rules()
+    assert compiled_rules.rules == rules
+    assert sorted(compiled_rules.mismatches[("HOST", False)]) == []
+    assert sorted(compiled_rules.mismatches[("HOST", True)]) == [2]
+    assert sorted(compiled_rules.mismatches[("SERVICE", False)]) == [1]
+    assert sorted(compiled_rules.mismatches[("SERVICE", True)]) == [1, 2]
+
+
+class _LivestatusConnection:
+    queries = 0
+
+    def query(self, query):
+        _LivestatusConnection.queries += 1
+        assert query == "GET contactgroups\nColumns: name members\n"
+        return [["admins", ["alice", "bob"]], ["web", ["bob", "carol"]]]
+
+
+def test_rbn_groups_contacts_cached(monkeypatch):
+    monkeypatch.setattr(notify.livestatus, "LocalConnection", _LivestatusConnection)
+    monkeypatch.setattr(notify, "_contactgroup_members_cache", None)
+    monkeypatch.setattr(notify.config, "notification_contactgroups_cache_ttl", 60)
+    monkeypatch.setattr(_LivestatusConnection, "queries", 0)
+
+    assert notify.rbn_groups_contacts([]) == set()
+    assert notify.rbn_groups_contacts(["admins", "web"]) == {"alice", "bob", "carol"}
+    assert notify.rbn_groups_contacts(["web", "unknown"]) == {"bob", "carol"}
+    assert _LivestatusConnection.queries == 1
+
+    monkeypatch.setattr(notify.config, "notification_contactgroups_cache_ttl", 0)
+    assert notify.rbn_groups_contacts(["admins"]) == {"alice", "bob"}
+    assert _LivestatusConnection.queries == 2
+
+
+def test_notification_dispatcher(monkeypatch):
+    calls = []
+
+    def call_notification_script(plugin_name, plugin_context):
+        calls.append((plugin_name, plugin_context["CONTACTNAME"]))
+        return 0 if plugin_name == "mail" else 2
+
+    monkeypatch.setattr(notify, "call_notification_script", call_notification_script)
+
+    dispatcher = notify.NotificationDispatcher(num_workers=2, queue_size=1)
+    for number in range(5):
+        dispatcher.submit("mail", {"CONTACTNAME": "user%d" % number})
+    dispatcher.submit("sms", {"CONTACTNAME": "user0"})
+    dispatcher.shutdown()
+
+    assert sorted(calls) == [("mail", "user%d" % n) for n in range(5)] + [("sms", "user0")]
+    statistics = dispatcher.statistics()
+    assert statistics["mail"]["submitted"] == 5
+    assert statistics["mail"]["executed"] == 5
+    assert statistics["mail"]["failed"] == 0
+    assert statistics["sms"]["executed"] == 1
+    assert statistics["sms"]["failed"] == 1
+
+
+def test_notification_dispatcher_keeps_order_of_objects(monkeypatch):
+    calls = []
+
+    def call_notification_script(plugin_name, plugin_context):
+        # Make the workers finish in a different order than the notifications were submitted
+        time.sleep(0.001 * (hash(plugin_context["HOSTNAME"]) % 5))
+        calls.append((plugin_context["HOSTNAME"], plugin_context.get("SERVICEDESC"),
+                      plugin_context["NOTIFICATIONTYPE"]))
+        return 0
+
+    monkeypatch.setattr(notify, "call_notification_script", call_notification_script)
+
+    dispatcher = notify.NotificationDispatcher(num_workers=4, queue_size=100)
+    for notification_type in ["PROBLEM", "ACKNOWLEDGEMENT", "RECOVERY"]:
+        for number in range(10):
+            dispatcher.submit("ticket", {
+                "WHAT": "HOST",
+                "HOSTNAME": "host%d" % number,
+                "NOTIFICATIONTYPE": notification_type,
+            })
+            dispatcher.submit(
+                "ticket", {
+                    "WHAT": "SERVICE",
+                    "HOSTNAME": "host%d" % number,
+                    "SERVICEDESC": "CPU load",
+                    "NOTIFICATIONTYPE": notification_type,
+                })
+    dispatcher.shutdown()
+
+    assert len(calls) == 60
+    for number in range(10):
+        for service in [None, "CPU load"]:
+            assert [
+                notification_type for host_name, service_description, notification_type in calls
+                if host_name == "host%d" % number and service_description == service
+            ] == ["PROBLEM", "ACKNOWLEDGEMENT", "RECOVERY"]
+
+
+def test_call_notification_script_in_thread_timeout(monkeypatch, tmp_path):
+    script = tmp_path / "sleep"
+    script.write_text("#!/bin/sh\necho started\nexec sleep 10\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(notify.config, "notification_plugin_timeout", 0.1)
+
+    log = []
+    assert notify._call_notification_script_in_thread(str(script), {}, log.append) == 1
+    assert log == [
+        "Output: started",
+        "Notification plugin did not finish within 0 seconds. Terminating.",
+    ]
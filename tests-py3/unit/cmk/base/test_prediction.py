@@ -4,11 +4,19 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
 import math
+import os
 import time
 from pprint import pprint
+import numpy as np  # type: ignore[import]
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+import cmk.utils.prediction
+from cmk.utils.prediction import TimeSeries
+
+import cmk.base.config as config
 from cmk.base import prediction
 from testlib import on_time
 
@@ -120,3 +128,136 @@ def test_time_slices(utcdate, timezone, horizon, period_info, timegroup, result)
     ])
 def test_data_stats(slices, result):
     assert prediction.data_stats(slices) == result
+
+
+def test_data_stats_of_arrays():
+    slices = [[1, 5, 3, 6, 8, None], [2, 2, 2, 4, 3, 5], [3, 3, None, None, 2, 2]]
+    assert prediction.data_stats([np.array(s, dtype=float) for s in slices]) == \
+        prediction.data_stats(slices)
+
+
+def _fake_rrd_data(fetches):
+    def get_rrd_data(hostname,
+                     service_description,
+                     varname,
+                     cf,
+                     fromtime,
+                     untiltime,
+                     max_entries=400):
+        fetches.append((fromtime, untiltime, max_entries))
+        step = max((untiltime - fromtime) // max_entries, 60)
+        return TimeSeries([float(t) for t in range(fromtime + step, untiltime + step, step)],
+                          (fromtime, untiltime, step))
+
+    return get_rrd_data
+
+
+def test_rrd_fetch_cache_hours_of_day(monkeypatch):
+    fetches = []
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data", _fake_rrd_data(fetches))
+    monkeypatch.setattr(cmk.utils.prediction, "timezone_at", lambda timestamp: 0)
+    column = prediction.RRDFetchCache().rrd_datacolumn("heute", "CPU load", "load15", "MAX")
+
+    day = 86400 * 1000
+    for hour in range(24):
+        from_time = day + hour * 3600
+        time_series = column(from_time, from_time + 3600)
+        assert time_series.twindow == (from_time, from_time + 3600, 60)
+        assert time_series.values == [float(from_time + 60 * (i + 1)) for i in range(60)]
+
+    assert fetches == [(day, day + 86400, 400 * 24)]
+
+
+def test_rrd_fetch_cache_days(monkeypatch):
+    fetches = []
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data", _fake_rrd_data(fetches))
+    column = prediction.RRDFetchCache().rrd_datacolumn("heute", "CPU load", "load15", "MAX")
+
+    assert column(86400, 2 * 86400) == column(86400, 2 * 86400)
+    assert fetches == [(86400, 2 * 86400, 400)]
+
+
+def test_get_levels_precompute(monkeypatch, tmp_path):
+    fetches = []
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data", _fake_rrd_data(fetches))
+    monkeypatch.setattr(config, "prediction_precompute", True)
+    params = {"period": "minute", "horizon": 2, "levels_upper": ("absolute", (10, 20))}
+
+    assert prediction.get_levels("heute", "CPU load", "load15", params, "MAX") == \
+        (None, (None, None, None, None))
+    assert not fetches
+
+    prediction.precompute_predictions()
+    # One fetch per day of the horizon (and the current day)
+    assert len(fetches) == 3
+
+    ref_value, levels = prediction.get_levels("heute", "CPU load", "load15", params, "MAX")
+    assert ref_value is not None
+    assert levels[:2] == (ref_value + 10, ref_value + 20)
+    assert len(fetches) == 3
+
+
+def test_precompute_predictions_lookahead(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data", _fake_rrd_data([]))
+    monkeypatch.setattr(config, "prediction_precompute", True)
+    monkeypatch.setattr(prediction, "_last_requests", {})
+    params = {"period": "wday", "horizon": 14, "levels_upper": ("absolute", (10, 20))}
+    prediction.get_levels("heute", "CPU load", "load15", params, "MAX")
+
+    prediction.precompute_predictions(lookahead=86400)
+    now = time.time()
+
+    # The prediction of tomorrow is computed from the data available today
+    info_files = list(tmp_path.glob("prediction/heute/CPU_load/load15/*.info"))
+    assert len(info_files) == 2
+    for info_file in info_files:
+        info = json.loads(info_file.read_text())
+        assert info["time"] <= now
+        assert info["range"][1] <= now + info["slice"]
+
+
+def test_precompute_predictions_removes_outdated_requests(monkeypatch, tmp_path):
+    fetches = []
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data", _fake_rrd_data(fetches))
+    monkeypatch.setattr(config, "prediction_precompute", True)
+    monkeypatch.setattr(prediction, "_last_requests", {})
+    params = {"period": "minute", "horizon": 2, "levels_upper": ("absolute", (10, 20))}
+
+    prediction.get_levels("heute", "CPU load", "load15", params, "MAX")
+    request_file = tmp_path.joinpath("prediction/heute/CPU_load/load15/precompute.request")
+    assert request_file.exists()
+
+    # The service has not requested the prediction for more than a day
+    outdated = time.time() - 2 * 86400
+    os.utime(str(request_file), (outdated, outdated))
+    prediction.precompute_predictions()
+    assert not request_file.exists()
+    assert not fetches
+
+    # The request is written again as soon as the service uses the prediction
+    monkeypatch.setattr(prediction, "_last_requests", {})
+    prediction.get_levels("heute", "CPU load", "load15", params, "MAX")
+    assert request_file.exists()
+
+
+def test_request_prediction_refreshes_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(prediction, "_last_requests", {})
+    params = {"period": "minute", "horizon": 2, "levels_upper": ("absolute", (10, 20))}
+    request_file = tmp_path.joinpath("precompute.request")
+
+    prediction.request_prediction(str(tmp_path), "heute", "CPU load", "load15", params, "MAX")
+    outdated = time.time() - 2 * 3600
+    os.utime(str(request_file), (outdated, outdated))
+
+    # Refreshed at most once per hour
+    prediction.request_prediction(str(tmp_path), "heute", "CPU load", "load15", params, "MAX")
+    assert request_file.stat().st_mtime == outdated
+
+    monkeypatch.setattr(prediction, "_last_requests", {
+        str(request_file): (request_file.read_text(), outdated),
+    })
+    prediction.request_prediction(str(tmp_path), "heute", "CPU load", "load15", params, "MAX")
+    assert request_file.stat().st_mtime > outdated
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+import pickle
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.history
+import cmk.ec.main
+import cmk.ec.export as ec
+
+RULE_PACKS = [{
+    "id": "pack",
+    "disabled": False,
+    "rules": [
+        {
+            "id": "drop_debug",
+            "match": "debug",
+            "drop": True,
+        },
+        {
+            "id": "disk_full",
+            "match": "disk (.*) full",
+            "state": 2,
+            "sl": {
+                "value": 0,
+                "precedence": "message"
+            },
+        },
+    ],
+}]
+
+
+@pytest.fixture(name="config", scope="function")
+def fixture_config():
+    config = ec.default_config()
+    config["rule_packs"] = RULE_PACKS
+    config["event_processing_workers"] = 2
+    return config
+
+
+@pytest.fixture(name="event_server", scope="function")
+def fixture_event_server(config, tmp_path):
+    settings = ec.settings('1.2.3i45', tmp_path, tmp_path / "etc" / "check_mk", ['mkeventd'])
+    logger = logging.getLogger("cmk.mkeventd")
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    history = cmk.ec.history.History(settings, config, logger,
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger)
+    event_server = cmk.ec.main.EventServer(logger, settings, config,
+                                           cmk.ec.main.default_slave_status_master(), perfcounters,
+                                           cmk.ec.main.ECLock(logger), history, event_status,
+                                           cmk.ec.main.StatusTableEvents.columns, False)
+    event_server.compile_rules([], RULE_PACKS)
+    return event_server
+
+
+def _lines(texts):
+    return b"".join(b"<78>Dec 12 10:00:00 myhost app: %s\n" % text.encode() for text in texts)
+
+
+def test_match_raw_lines(event_server):
+    matched_events = event_server.match_raw_lines(
+        _lines(["disk /var full", "debug output", "nothing"]))
+    assert [event["text"] for event, _rule_match in matched_events] == [
+        "disk /var full",
+        "debug output",
+        "nothing",
+    ]
+
+    full, debug, nothing = [rule_match for _event, rule_match in matched_events]
+    assert full.rule_id == "disk_full"
+    assert full.match_groups["match_groups_message"] == ("/var",)
+    assert full.hits == [("pack", "disk_full")]
+    assert debug.drop
+    assert debug.hits == [("pack", "drop_debug")]
+    assert nothing.rule_id is None
+    assert not nothing.hits
+
+
+def test_rule_match_picklable(event_server):
+    matched_events = event_server.match_raw_lines(_lines(["disk /var full"]))
+    event, rule_match = pickle.loads(pickle.dumps(matched_events))[0]
+    assert event["text"] == "disk /var full"
+    assert rule_match.rule_id == "disk_full"
+
+
+def test_pipeline_keeps_order(event_server):
+    event_server._update_pipeline()
+    assert event_server._pipeline.active
+
+    texts = ["disk /vol%d full" % nr for nr in range(100)]
+    for chunk in range(0, len(texts), 10):
+        event_server.process_raw_lines(_lines(texts[chunk:chunk + 10]))
+    event_server._pipeline.stop()
+
+    assert [event["text"] for event in event_server._event_status.events()] == texts
+    assert event_server._perfcounters._counters["messages"] == len(texts)
+    assert event_server._perfcounters._counters["rule_hits"] == len(texts)
+
+
+def test_pipeline_restarted_on_rule_changes(event_server):
+    event_server._update_pipeline()
+    assert event_server._pipeline.is_up_to_date(event_server._rules, 2)
+
+    event_server.compile_rules([], RULE_PACKS)
+    assert not event_server._pipeline.is_up_to_date(event_server._rules, 2)
+
+    event_server._update_pipeline()
+    assert event_server._pipeline.is_up_to_date(event_server._rules, 2)
+    event_server._pipeline.stop()
+
+
+def test_pipeline_removes_spool_file_after_apply(event_server):
+    event_server._update_pipeline()
+
+    spool_dir = event_server.settings.paths.spool_dir.value
+    spool_dir.mkdir(parents=True)
+    spool_file = spool_dir / "spool1"
+    spool_file.write_bytes(_lines(["disk /var full"]))
+
+    event_server._process_spool_file(spool_file)
+    assert spool_file.exists()
+    assert spool_file in event_server._pending_spool_files
+
+    event_server._pipeline.stop()
+    assert not spool_file.exists()
+    assert not event_server._pending_spool_files
+    assert [event["text"] for event in event_server._event_status.events()] == ["disk /var full"]
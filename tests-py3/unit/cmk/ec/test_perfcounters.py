@@ -21,6 +21,13 @@ def test_perfcounters_count():
     assert not [(k, v) for k, v in c._counters.items() if k != "messages" and v > 0]
 
 
+def test_perfcounters_count_value():
+    c = Perfcounters(logger)
+    c.count("prefilter_skips", 5)
+    c.count("prefilter_skips")
+    assert c._counters["prefilter_skips"] == 6
+
+
 def test_perfcounters_count_time():
     c = Perfcounters(logger)
     assert "processing" not in c._times
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+import re
+
+import pytest  # type: ignore[import]
+
+from cmk.ec.main import EventServer, RuleMatcher
+from cmk.ec.prefilter import RulePrefilter, regex_literals
+
+
+def _compile_rule(rule):
+    compiled = {"id": "rule", "pack": "pack"}
+    for key, value in rule.items():
+        if isinstance(value, str):
+            value = EventServer._compile_matching_value(key, value)
+        compiled[key] = value
+    return compiled
+
+
+def _event(text="", host="", application=""):
+    return {
+        "text": text,
+        "host": host,
+        "application": application,
+        "ipaddress": "",
+        "facility": 1,
+        "priority": 2,
+    }
+
+
+@pytest.mark.parametrize("pattern,literals", [
+    ("disk full$", ["disk full"]),
+    ("^Error: (.*) failed", ["error: ", " failed"]),
+    ("Link (up|down) on eth[0-9]+", ["link ", " on eth"]),
+    ("(Timeout)+ on port", ["timeout", " on port"]),
+    ("a(bcd)? connected", [" connected"]),
+    ("ab.d", []),
+    ("foo|bar", []),
+    ("Ünicode café", ["nicode caf"]),
+])
+def test_regex_literals(pattern, literals):
+    assert sorted(regex_literals(re.compile(pattern, re.IGNORECASE))) == sorted(literals)
+
+
+def test_candidates():
+    prefilter = RulePrefilter([
+        _compile_rule({"match": "disk (.*) full$"}),
+        _compile_rule({"match": "Link down"}),
+        _compile_rule({"match_host": "web01"}),
+        _compile_rule({
+            "match_host": "db.*",
+            "match_application": "^mysqld"
+        }),
+        _compile_rule({"match": "link down on eth.*"}),
+        _compile_rule({
+            "match": "Disk",
+            "match_ok": "Recovered"
+        }),
+        _compile_rule({"match": "x|y"}),
+    ])
+    assert prefilter.num_unconditional == 2
+
+    assert prefilter.candidates(_event(text="DISK /var FULL")) == [0, 5, 6]
+    assert prefilter.candidates(_event(text="link down on eth0")) == [1, 4, 5, 6]
+    assert prefilter.candidates(_event(text="Link down", host="WEB01")) == [1, 2, 5, 6]
+    assert prefilter.candidates(_event(host="db01", application="mysqld")) == [3, 5, 6]
+    assert prefilter.candidates(_event(host="db01", application="sshd")) == [5, 6]
+
+
+def test_candidates_non_ascii_values():
+    prefilter = RulePrefilter([
+        _compile_rule({"match": "disk full$"}),
+        _compile_rule({"match": "Link down"}),
+    ])
+    # The case insensitive regex also matches the long s, the lower case text does not
+    assert re.search("disk full$", "DIſK FULL", re.IGNORECASE)
+    assert prefilter.candidates(_event(text="DIſK FULL")) == [0]
+    assert prefilter.candidates(_event(text="ÄLink down")) == [0, 1]
+
+
+def test_candidates_contain_all_matching_rules():
+    rules = [
+        _compile_rule(rule) for rule in [
+            {
+                "match": "disk (.*) full$"
+            },
+            {
+                "match": "Link down"
+            },
+            {
+                "match": "link down on eth.*",
+                "match_host": "web.*"
+            },
+            {
+                "match_host": "web01"
+            },
+            {
+                "match_host": "db.*",
+                "match_application": "^mysqld"
+            },
+            {
+                "match": "(Timeout)+ on port [0-9]+",
+                "match_application": "sshd"
+            },
+            {
+                "match": "Disk",
+                "match_ok": "Recovered"
+            },
+            {
+                "match": "Error",
+                "invert_matching": True
+            },
+        ]
+    ]
+    events = [
+        _event(text="DISK /var FULL", host="web01"),
+        _event(text="link down on eth0", host="WEB02"),
+        _event(text="Timeout on port 22", application="sshd"),
+        _event(text="timeouttimeout on port 22", application="SSHD"),
+        _event(text="Recovered", host="db01", application="mysqld"),
+        _event(text="DIſK FULL", host="web01"),
+        _event(text="Error", host="web03", application="app"),
+    ]
+    matcher = RuleMatcher(logging.getLogger("cmk.mkeventd"), {"debug_rules": False})
+    prefilter = RulePrefilter(rules)
+    for event in events:
+        candidates = prefilter.candidates(event)
+        for position, rule in enumerate(rules):
+            if matcher.event_rule_matches_non_inverted(rule, event):
+                assert position in candidates, (rule, event)
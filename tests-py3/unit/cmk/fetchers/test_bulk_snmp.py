@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import bisect
+import socket
+import threading
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+
+from cmk.snmplib.type_defs import SNMPHostConfig, SNMPTree
+
+import cmk.fetchers.factory as factory
+import cmk.fetchers.snmp_backend.bulk as bulk
+import cmk.fetchers.snmp_backend.stored_walk as stored_walk
+from cmk.fetchers.snmp import SNMPDataFetcher
+from cmk.fetchers.snmp_backend import BulkSNMPBackend, StoredWalkSNMPBackend
+from cmk.fetchers.snmp_backend._utils import strip_snmp_value
+
+WALK = u"""\
+.1.3.6.1.2.1.1.1.0 Linux walkhost
+.1.3.6.1.2.1.1.5.0 walkhost
+.1.3.6.1.2.1.2.2.1.1.1 1
+.1.3.6.1.2.1.2.2.1.1.2 2
+.1.3.6.1.2.1.2.2.1.1.10 10
+.1.3.6.1.2.1.2.2.1.2.1 "lo"
+.1.3.6.1.2.1.2.2.1.2.2 "eth0"
+.1.3.6.1.2.1.2.2.1.2.10 "eth1"
+.1.3.6.1.2.1.2.2.1.6.2 "B2 E0 7D 2C 4D 15 "
+.1.3.6.1.2.1.2.2.1.10.1 1000
+.1.3.6.1.2.1.2.2.1.10.2 2000
+.1.3.6.1.2.1.2.2.1.10.10 10000
+.1.3.6.1.4.1.2021.4.5.0 8000000
+"""
+
+
+def _oid_key(oid):
+    return tuple(int(p) for p in oid.strip(".").split("."))
+
+
+class StoredWalkResponder:
+    """SNMP v1/v2c agent answering requests from a stored walk, like snmpsim does"""
+    def __init__(self, walk, drop=0, max_repetitions=None):
+        self._rows = sorted(((_oid_key(line.split(" ", 1)[0]), line.split(
+            " ", 1)[0], strip_snmp_value(line.split(" ", 1)[1])) for line in walk.splitlines()),
+                            key=lambda row: row[0])
+        self._keys = [row[0] for row in self._rows]
+        self._drop = drop
+        self._max_repetitions = max_repetitions
+        self.requests = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._socket.close()
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self._socket.recvfrom(65535)
+            except OSError:
+                return
+            request = bulk.decode_message(data)
+            self.requests.append(request)
+            if self._drop:
+                self._drop -= 1
+                continue
+            self._socket.sendto(bulk.encode_message(self._respond(request)), address)
+
+    @staticmethod
+    def _encode_value(value):
+        if value.isdigit() and b"%d" % int(value) == value:
+            return bulk.TAG_INTEGER, bulk._encode_integer(int(value))[2:]
+        return bulk.TAG_OCTET_STRING, value
+
+    def _next(self, oid):
+        index = bisect.bisect_right(self._keys, _oid_key(oid))
+        if index == len(self._rows):
+            return oid, bulk.TAG_END_OF_MIB_VIEW, b""
+        _key, next_oid, value = self._rows[index]
+        return (next_oid,) + self._encode_value(value)
+
+    def _respond(self, request):
+        def response(varbinds, error_status=0):
+            return request._replace(pdu_type=bulk.PDU_RESPONSE,
+                                    error_status=error_status,
+                                    error_index=0,
+                                    varbinds=varbinds)
+
+        if request.pdu_type == bulk.PDU_GET:
+            varbinds = []
+            for oid, _tag, _value in request.varbinds:
+                index = bisect.bisect_left(self._keys, _oid_key(oid))
+                if index < len(self._rows) and self._keys[index] == _oid_key(oid):
+                    varbinds.append((oid,) + self._encode_value(self._rows[index][2]))
+                else:
+                    varbinds.append((oid, bulk.TAG_NO_SUCH_INSTANCE, b""))
+            return response(varbinds)
+
+        if request.pdu_type == bulk.PDU_GET_NEXT:
+            varbinds = [self._next(oid) for oid, _tag, _value in request.varbinds]
+            if request.version == 0 and any(v[1] == bulk.TAG_END_OF_MIB_VIEW for v in varbinds):
+                return response(request.varbinds, bulk.ERROR_NO_SUCH_NAME)
+            return response(varbinds)
+
+        assert request.pdu_type == bulk.PDU_GET_BULK
+        if self._max_repetitions is not None and request.error_index > self._max_repetitions:
+            return response([], bulk.ERROR_TOO_BIG)
+        varbinds = []
+        for oid, _tag, _value in request.varbinds:
+            for _repetition in range(request.error_index):
+                varbind = self._next(oid)
+                varbinds.append(varbind)
+                if varbind[1] == bulk.TAG_END_OF_MIB_VIEW:
+                    break
+                oid = varbind[0]
+        return response(varbinds)
+
+
+def _snmp_config(port, is_bulkwalk_host=True, bulk_walk_size_of=3, timing=None):
+    return SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname="walkhost",
+        ipaddress="127.0.0.1",
+        credentials="public",
+        port=port,
+        is_bulkwalk_host=is_bulkwalk_host,
+        is_snmpv2or3_without_bulkwalk_host=False,
+        bulk_walk_size_of=bulk_walk_size_of,
+        timing=timing or {
+            "timeout": 1,
+            "retries": 1
+        },
+        oid_range_limits=[],
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        is_inline_snmp_host=False,
+        record_stats=False,
+        bulk_backend_settings={"max_outstanding": 4},
+    )
+
+
+@pytest.fixture
+def responder():
+    responder = StoredWalkResponder(WALK)
+    yield responder
+    responder.close()
+
+
+@pytest.fixture
+def stored_walk_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+    monkeypatch.setattr(stored_walk, "_walk_cache", {})
+    (tmp_path / "walkhost").write_text(WALK)
+    return StoredWalkSNMPBackend(_snmp_config(161)._replace(is_usewalk_host=True))
+
+
+@pytest.mark.parametrize("message", [
+    bulk.Message(1, b"public", bulk.PDU_GET_BULK, 2**31 - 1, 0, 10,
+                 [(".1.3.6.1.4.1.2021.4.5.0", bulk.TAG_NULL, b"")]),
+    bulk.Message(0, b"c" * 200, bulk.PDU_RESPONSE, 1, 0, 0, [
+        (".1.3.6.1.2.1.%d.4294967295" % n, bulk.TAG_OCTET_STRING, b"x" * n) for n in range(100)
+    ]),
+    bulk.Message(1, b"", bulk.PDU_GET, 0, 0, 0, []),
+])
+def test_encode_decode_message(message):
+    assert bulk.decode_message(bulk.encode_message(message)) == message
+
+
+def test_decode_truncated_message():
+    data = bulk.encode_message(
+        bulk.Message(1, b"public", bulk.PDU_GET, 1, 0, 0, [(".1.3.6", bulk.TAG_NULL, b"")]))
+    with pytest.raises(ValueError):
+        bulk.decode_message(data[:-1])
+
+
+@pytest.mark.parametrize("tag, value, expected", [
+    (bulk.TAG_INTEGER, b"\xff", b"-1"),
+    (bulk.TAG_INTEGER, b"\x00\x80", b"128"),
+    (bulk.TAG_COUNTER32, b"\x00\xff\xff\xff\xff", b"4294967295"),
+    (bulk.TAG_COUNTER64, b"\x01\x00\x00\x00\x00\x00\x00\x00\x00", b"18446744073709551616"),
+    (bulk.TAG_TIMETICKS, b"\x64", b"100"),
+    (bulk.TAG_IP_ADDRESS, b"\x0a\x00\x00\x01", b"10.0.0.1"),
+    (bulk.TAG_OID, b"\x2b\x06\x01", b".1.3.6.1"),
+    (bulk.TAG_OCTET_STRING, b"\xb2\xe0", b"\xb2\xe0"),
+    (bulk.TAG_NULL, b"", b""),
+])
+def test_decode_value(tag, value, expected):
+    assert bulk.decode_value(tag, value) == expected
+
+
+def test_factory(responder):
+    config = _snmp_config(responder.port)
+    assert isinstance(factory.backend(config), BulkSNMPBackend)
+    assert not isinstance(factory.backend(config._replace(bulk_backend_settings=None)),
+                          BulkSNMPBackend)
+    assert not isinstance(factory.backend(config._replace(credentials=("noAuthNoPriv", "user"))),
+                          BulkSNMPBackend)
+
+
+@pytest.mark.parametrize("is_bulkwalk_host", [True, False])
+@pytest.mark.parametrize("oid", [
+    ".1.3.6.1.2.1.2.2.1.2",
+    ".1.3.6.1.2.1.2.2.1.6",
+    ".1.3.6.1.2.1.2.2.1.10",
+    ".1.3.6.1.2.1.2.2.1.100",
+    ".1.3.6.1.4.1.2021.4.5",
+    ".1.3.6.1.2.1.2",
+])
+def test_walk_like_stored_walk(responder, stored_walk_backend, is_bulkwalk_host, oid):
+    backend = BulkSNMPBackend(_snmp_config(responder.port, is_bulkwalk_host=is_bulkwalk_host))
+    assert backend.walk(oid) == stored_walk_backend.walk(oid)
+
+
+def test_walk_many(responder, stored_walk_backend):
+    oids = [".1.3.6.1.2.1.2.2.1.%d" % n for n in (1, 2, 6, 10)] + [".1.3.6.1.4.1.2021"]
+    backend = BulkSNMPBackend(_snmp_config(responder.port, bulk_walk_size_of=2))
+
+    assert backend.walk_many(oids) == {oid: stored_walk_backend.walk(oid) for oid in oids}
+    assert {r.pdu_type for r in responder.requests} == {bulk.PDU_GET_BULK}
+    assert {r.error_index for r in responder.requests} == {2}
+
+
+def test_prefetch(responder):
+    backend = BulkSNMPBackend(_snmp_config(responder.port))
+    backend.prefetch([".1.3.6.1.2.1.2.2.1.2", ".1.3.6.1.2.1.2.2.1.10"])
+    num_requests = len(responder.requests)
+
+    assert backend.walk(".1.3.6.1.2.1.2.2.1.10") == [
+        (".1.3.6.1.2.1.2.2.1.10.1", b"1000"),
+        (".1.3.6.1.2.1.2.2.1.10.2", b"2000"),
+        (".1.3.6.1.2.1.2.2.1.10.10", b"10000"),
+    ]
+    assert backend.walk(".1.3.6.1.2.1.2.2.1.10") == backend.walk(".1.3.6.1.2.1.2.2.1.10")
+    assert len(responder.requests) == num_requests
+
+    backend.walk(".1.3.6.1.2.1.2.2.1.1")
+    assert len(responder.requests) > num_requests
+
+
+def test_fetcher_prefetches_all_sections(responder, monkeypatch):
+    fetcher = SNMPDataFetcher(
+        {
+            "if_names": [SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=["1", "2"])],
+            "if_octets": [SNMPTree(base=".1.3.6.1.2.1.2.2.1", oids=["1", "10"])],
+        },
+        use_snmpwalk_cache=False,
+        snmp_config=_snmp_config(responder.port),
+    )
+    walk_many_calls = []
+    monkeypatch.setattr(BulkSNMPBackend,
+                        "walk_many",
+                        lambda self, oids, walk_many=BulkSNMPBackend.walk_many: walk_many_calls.
+                        append(list(oids)) or walk_many(self, walk_many_calls[-1]))
+
+    assert fetcher.data() == {
+        "if_names": [[["1", "lo"], ["2", "eth0"], ["10", "eth1"]]],
+        "if_octets": [[["1", "1000"], ["2", "2000"], ["10", "10000"]]],
+    }
+    assert walk_many_calls == [[
+        ".1.3.6.1.2.1.2.2.1.1",
+        ".1.3.6.1.2.1.2.2.1.2",
+        ".1.3.6.1.2.1.2.2.1.1",
+        ".1.3.6.1.2.1.2.2.1.10",
+    ]]
+
+
+def test_walk_too_big():
+    responder = StoredWalkResponder(WALK, max_repetitions=2)
+    try:
+        backend = BulkSNMPBackend(_snmp_config(responder.port, bulk_walk_size_of=10))
+        assert len(backend.walk(".1.3.6.1.2.1.2.2.1.2")) == 3
+        assert [r.error_index for r in responder.requests[:3]] == [10, 5, 2]
+    finally:
+        responder.close()
+
+
+def test_walk_retries_lost_requests():
+    responder = StoredWalkResponder(WALK, drop=1)
+    try:
+        backend = BulkSNMPBackend(
+            _snmp_config(responder.port, timing={
+                "timeout": 0.1,
+                "retries": 1
+            }))
+        assert len(backend.walk(".1.3.6.1.2.1.2.2.1.2")) == 3
+        assert responder.requests[0] == responder.requests[1]
+    finally:
+        responder.close()
+
+
+def test_walk_timeout():
+    responder = StoredWalkResponder(WALK, drop=10)
+    try:
+        backend = BulkSNMPBackend(
+            _snmp_config(responder.port, timing={
+                "timeout": 0.05,
+                "retries": 2
+            }))
+        with pytest.raises(MKSNMPError):
+            backend.walk(".1.3.6.1.2.1.2.2.1.2")
+        assert len(responder.requests) == 3
+    finally:
+        responder.close()
+
+
+@pytest.mark.parametrize("oid, expected", [
+    (".1.3.6.1.2.1.1.1.0", b"Linux walkhost"),
+    (".1.3.6.1.2.1.1.2.0", None),
+    (".1.3.6.1.2.1.1.*", b"Linux walkhost"),
+    (".1.3.6.1.2.1.3.*", None),
+])
+def test_get(responder, oid, expected):
+    assert BulkSNMPBackend(_snmp_config(responder.port)).get(oid) == expected
@@ -34,6 +34,7 @@ def test_snmp_port_spec(port, expected):
         is_usewalk_host=False,
         is_inline_snmp_host=False,
         record_stats=False,
+        bulk_backend_settings=None,
     )
     assert ClassicSNMPBackend(snmp_config)._snmp_port_spec() == expected
 
@@ -59,6 +60,7 @@ def test_snmp_proto_spec(monkeypatch, is_ipv6, expected):
         is_usewalk_host=False,
         is_inline_snmp_host=False,
         record_stats=False,
+        bulk_backend_settings=None,
     )
     assert ClassicSNMPBackend(snmp_config)._snmp_proto_spec() == expected
 
@@ -90,6 +92,7 @@ SNMPSettings = collections.namedtuple("SNMPSettings", [
             is_usewalk_host=False,
             is_inline_snmp_host=False,
             record_stats=False,
+            bulk_backend_settings=None,
         ),
         context_name=None,
     ), [
@@ -116,6 +119,7 @@ SNMPSettings = collections.namedtuple("SNMPSettings", [
             is_usewalk_host=False,
             is_inline_snmp_host=False,
             record_stats=False,
+            bulk_backend_settings=None,
         ),
         context_name="blabla",
     ), [
@@ -142,6 +146,7 @@ SNMPSettings = collections.namedtuple("SNMPSettings", [
             is_usewalk_host=False,
             is_inline_snmp_host=False,
             record_stats=False,
+            bulk_backend_settings=None,
         ),
         context_name="blabla",
     ), [
@@ -168,6 +173,7 @@ SNMPSettings = collections.namedtuple("SNMPSettings", [
             is_usewalk_host=False,
             is_inline_snmp_host=False,
             record_stats=False,
+            bulk_backend_settings=None,
         ),
         context_name=None,
     ), [
@@ -194,6 +200,7 @@ SNMPSettings = collections.namedtuple("SNMPSettings", [
             is_usewalk_host=False,
             is_inline_snmp_host=False,
             record_stats=False,
+            bulk_backend_settings=None,
         ),
         context_name=None,
     ), [
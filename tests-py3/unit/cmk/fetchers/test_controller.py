@@ -6,8 +6,13 @@
 
 from pathlib import Path
 
+import json
+import socket
+
 import pytest  # type: ignore[import]
 
+import cmk.fetchers.controller as controller
+from cmk.fetchers import MKFetcherError
 from cmk.fetchers.controller import (Header, make_failure_answer, make_success_answer,
                                      build_json_file_path)
 from cmk.utils.paths import core_fetcher_config_dir
@@ -27,6 +32,37 @@ def test_build_json_file_path():
         serial="_serial_", host="buzz") == Path(core_fetcher_config_dir) / "_serial_" / "buzz.mk"
 
 
+def test_run_batch(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(controller, "core_fetcher_config_dir", str(tmp_path / "config"))
+    monkeypatch.setattr(controller, "tcp_cache_dir", str(tmp_path / "cache"))
+    (tmp_path / "config" / "serial").mkdir(parents=True)
+    for host in ("up", "down"):
+        (tmp_path / "config" / "serial" / ("%s.mk" % host)).write_text(
+            json.dumps({
+                "family": socket.AF_INET,
+                "address": [host, 6556],
+                "timeout": 1.0,
+                "encryption_settings": {
+                    "use_regular": "disable"
+                },
+            }))
+
+    def fetch_concurrently(fetchers, timeout, max_concurrent):
+        assert sorted(fetchers) == ["down", "up"]
+        return {"up": b"<<<check_mk>>>\n", "down": MKFetcherError("Timeout")}
+
+    monkeypatch.setattr(controller, "fetch_concurrently", fetch_concurrently)
+
+    assert controller.run_batch("serial", ["up", "down", "unknown"], 10) == 1
+    assert (tmp_path / "cache" / "up").read_bytes() == b"<<<check_mk>>>\n"
+    assert not (tmp_path / "cache" / "down").exists()
+
+    output = capsys.readouterr().out
+    assert make_success_answer("up") in output
+    assert make_failure_answer("down: Timeout", "fetch") in output
+    assert "unknown: " in output
+
+
 class TestHeader:
     @pytest.mark.parametrize("state", [Header.State.SUCCESS, "SUCCESS"])
     def test_success_header(self, state):
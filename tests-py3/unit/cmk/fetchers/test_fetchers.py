@@ -6,6 +6,7 @@
 
 import json
 import socket
+import threading
 from collections import namedtuple
 
 import pytest  # type: ignore[import]
@@ -110,6 +111,7 @@ class TestSNMP:
                     is_usewalk_host=False,
                     is_inline_snmp_host=False,
                     record_stats=False,
+                    bulk_backend_settings=None,
                 )._asdict(),
             }))
         assert isinstance(fetcher, SNMPDataFetcher)
@@ -150,3 +152,50 @@ class TestTCPDataFetcher:
 
         with pytest.raises(MKFetcherError):
             fetcher._decrypt(output)
+
+    @pytest.fixture
+    def agent_port(self):
+        """A TCP port answering each connection with plaintext agent output"""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+
+        def serve():
+            while True:
+                try:
+                    connection, _address = server.accept()
+                except OSError:
+                    return
+                with connection:
+                    connection.sendall(b"<<<check_mk>>>\nVersion: 1.7.0\n")
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        yield server.getsockname()[1]
+        server.close()
+
+    def test_fetch_concurrently(self, agent_port):
+        closed_port_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed_port_socket.bind(("127.0.0.1", 0))
+        closed_port = closed_port_socket.getsockname()[1]
+        closed_port_socket.close()
+
+        settings = {"use_regular": "disable"}
+        fetchers = {
+            "host%d" % n: TCPDataFetcher(socket.AF_INET, ("127.0.0.1", agent_port), 1.0, settings)
+            for n in range(5)
+        }
+        fetchers["down"] = TCPDataFetcher(socket.AF_INET, ("127.0.0.1", closed_port), 1.0, settings)
+
+        results = fetch_concurrently(fetchers, timeout=5.0, max_concurrent=2)
+
+        assert list(results) == list(fetchers)
+        assert isinstance(results.pop("down"), MKFetcherError)
+        assert set(results.values()) == {b"<<<check_mk>>>\nVersion: 1.7.0\n"}
+
+    def test_fetch_concurrently_enforced_encryption(self, agent_port):
+        fetchers = {
+            "host": TCPDataFetcher(socket.AF_INET, ("127.0.0.1", agent_port), 1.0,
+                                   {"use_regular": "enforce"})
+        }
+        assert isinstance(fetch_concurrently(fetchers, timeout=5.0)["host"], MKFetcherError)
@@ -6,7 +6,12 @@
 
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+
+from cmk.snmplib.type_defs import SNMPHostConfig
+
 import cmk.fetchers.snmp_backend._utils as utils
+import cmk.fetchers.snmp_backend.stored_walk as stored_walk
 from cmk.fetchers.snmp_backend import StoredWalkSNMPBackend
 
 
@@ -32,3 +37,58 @@ class TestStoredWalkSNMPBackend:
     ])
     def test_compare_oids(self, a, b, result):
         assert StoredWalkSNMPBackend._compare_oids(a, b) == result
+
+    @pytest.fixture
+    def backend(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+        monkeypatch.setattr(stored_walk, "_walk_cache", {})
+        (tmp_path / "walkhost").write_text(u"""\
+.1.3.6.1.2.1.1.1.0 Linux walkhost
+.1.3.6.1.2.1.2.2.1.10.2 2000
+.1.3.6.1.2.1.2.2.1.10.10 10000
+.1.3.6.1.2.1.2.2.1.10.1 1000
+.1.3.6.1.2.1.2.2.1.100.1 "B2 E0 7D 2C 4D 15 "
+""")
+        return StoredWalkSNMPBackend(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="walkhost",
+                ipaddress="127.0.0.1",
+                credentials="public",
+                port=161,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=10,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=True,
+                is_inline_snmp_host=False,
+                record_stats=False,
+                bulk_backend_settings=None,
+            ))
+
+    @pytest.mark.parametrize("oid, expected", [
+        (".1.3.6.1.2.1.2.2.1.10", [
+            (".1.3.6.1.2.1.2.2.1.10.1", b"1000"),
+            (".1.3.6.1.2.1.2.2.1.10.2", b"2000"),
+            (".1.3.6.1.2.1.2.2.1.10.10", b"10000"),
+        ]),
+        ("1.3.6.1.2.1.2.2.1.100", [(".1.3.6.1.2.1.2.2.1.100.1", b"\xb2\xe0},M\x15")]),
+        (".1.3.6.1.2.1.2.2.1.10.*", [(".1.3.6.1.2.1.2.2.1.10.1", b"1000")]),
+        (".1.3.6.1.2.1.2.2.1.1", []),
+        (".1.3.6.1.2.1.3", []),
+    ])
+    def test_walk(self, backend, oid, expected):
+        assert backend.walk(oid) == expected
+
+    def test_walk_persists_index(self, backend, tmp_path):
+        backend.walk(".1.3.6.1.2.1.1.1.0")
+        index_path = tmp_path / ".walkhost.index"
+        assert index_path.exists()
+
+        stored_walk._walk_cache.clear()
+        index_mtime = index_path.stat().st_mtime_ns
+        assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux walkhost"
+        assert index_path.stat().st_mtime_ns == index_mtime
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import functools
+import operator
+import random
+
+import pytest  # type: ignore[import]
+
+from cmk.gui.exceptions import MKGeneralException
+from cmk.gui.plugins.metrics import stats
+import cmk.gui.plugins.metrics.timeseries as ts
+
+
+def _random_values(rnd, num_points):
+    return [
+        None if rnd.random() < 0.2 else rnd.choice([0, rnd.uniform(-100, 100)])
+        for _point in range(num_points)
+    ]
+
+
+def _point_wise(operator_id, tsp):
+    """The result of the operator for a single point in time"""
+    clean = [x for x in tsp if x is not None]
+    if not clean:
+        return None
+    if operator_id in ["*", "-", "/"] and None in tsp:
+        return None
+    if operator_id == "+":
+        return sum(clean)
+    if operator_id == "*":
+        return functools.reduce(operator.mul, clean, 1)
+    if operator_id == "-":
+        return clean[0] - clean[1]
+    if operator_id == "/":
+        return None if clean[1] == 0 else clean[0] / clean[1]
+    if operator_id == "MAX":
+        return max(clean)
+    if operator_id == "MIN":
+        return min(clean)
+    if operator_id == "AVERAGE":
+        return sum(clean) / len(clean)
+    if operator_id == "MERGE":
+        return clean[0]
+    raise NotImplementedError(operator_id)
+
+
+@pytest.mark.parametrize("operator_id, num_operands", [
+    ("+", 1),
+    ("+", 3),
+    ("*", 2),
+    ("*", 3),
+    ("-", 2),
+    ("/", 2),
+    ("MAX", 3),
+    ("MIN", 3),
+    ("AVERAGE", 1),
+    ("AVERAGE", 3),
+    ("MERGE", 3),
+])
+def test_time_series_math_like_point_wise_operators(operator_id, num_operands):
+    rnd = random.Random(operator_id)
+    operands = [_random_values(rnd, 200) for _operand in range(num_operands)]
+    expected = [_point_wise(operator_id, tsp) for tsp in zip(*operands)]
+    assert ts.time_series_math(operator_id, operands) == pytest.approx(expected)
+
+
+def test_time_series_math_undefined_operator():
+    with pytest.raises(MKGeneralException, match="Undefined operator"):
+        ts.time_series_math("**", [[1.0], [2.0]])
+
+
+@pytest.mark.parametrize("operator_id", ["+", "MAX", "AVERAGE"])
+def test_time_series_math_without_operands(operator_id):
+    assert ts.time_series_math(operator_id, []) == []
+
+
+@pytest.mark.parametrize("num_points", [0, 1, 2, 7, 100])
+@pytest.mark.parametrize("q", [0, 1, 25, 50, 90, 99, 100])
+def test_time_series_operator_perc_like_stats(num_points, q):
+    values = _random_values(random.Random(num_points), num_points)
+    clean_values = [v for v in values if v is not None]
+    expected = stats.percentile(clean_values, q) if clean_values else None
+    assert ts.time_series_operator_perc(values, q) == [expected] * num_points
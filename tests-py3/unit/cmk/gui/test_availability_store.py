@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.gui.availability_store as availability_store
+
+#   state, host_down, in_downtime, in_host_downtime, in_notification_period,
+#   in_service_period, is_flapping
+_OK = (0, 0, 0, 0, 1, 1, 0)
+_CRIT = (2, 0, 0, 0, 1, 1, 0)
+
+
+@pytest.fixture(name="days")
+def fixture_days():
+    first_day = availability_store.day_start(time.mktime((2020, 6, 1, 12, 0, 0, 0, 0, -1)))
+    second_day = availability_store.day_end(first_day)
+    return first_day, second_day, availability_store.day_end(second_day)
+
+
+def test_days_between(days):
+    first_day, second_day, third_day = days
+    assert availability_store.days_between(first_day, third_day) == [first_day, second_day]
+    assert availability_store.days_between(first_day + 1, third_day) == [second_day]
+    assert availability_store.days_between(first_day, third_day - 1) == [first_day]
+    assert availability_store.days_between(first_day, second_day - 1) == []
+
+
+def test_aggregate_durations():
+    rows = [
+        ["heute", "CPU load", 100] + list(_OK),
+        ["heute", "CPU load", 50] + list(_CRIT),
+        ["heute", "CPU load", 20] + list(_OK),
+        ["heute", "", 170, 0, 0, 0, 0, 1, 1, 0],
+    ]
+    assert availability_store.aggregate_durations(rows) == {
+        ("heute", "CPU load", _OK): 120,
+        ("heute", "CPU load", _CRIT): 50,
+        ("heute", "", (0, 0, 0, 0, 1, 1, 0)): 170,
+    }
+
+
+def test_store_spans(tmp_path, days):
+    first_day, second_day, third_day = days
+    store = availability_store.AvailabilityStore(tmp_path / "store.sqlite")
+    assert store.days("heute") == set()
+    assert store.spans(["heute"], "service", first_day, third_day) == []
+
+    store.add_day(
+        "heute", first_day, {
+            ("heute", "CPU load", _OK): 80000,
+            ("heute", "CPU load", _CRIT): 6400,
+            ("heute", "", _OK): 86400,
+        })
+    store.add_day("heute", second_day, {
+        ("heute", "CPU load", _OK): 86400,
+        ("heute", "", _OK): 86400,
+    })
+    store.add_day("other", second_day, {("other", "", _OK): 86400})
+    assert store.days("heute") == {first_day, second_day}
+
+    spans = sorted(store.spans(["heute"], "service", first_day, third_day),
+                   key=lambda span: span["state"])
+    assert [(span["service_description"], span["state"], span["duration"], span["from"],
+             span["until"]) for span in spans] == [
+                 ("CPU load", 0, 166400, first_day, third_day),
+                 ("CPU load", 2, 6400, first_day, third_day),
+             ]
+    assert all(span[column] == value
+               for span in spans
+               for column, value in zip(availability_store.KEY_COLUMNS[1:], _OK[1:]))
+
+    host_spans = store.spans(["heute", "other"], "host", second_day, third_day)
+    assert sorted((span["site"], span["duration"]) for span in host_spans) == [
+        ("heute", 86400),
+        ("other", 86400),
+    ]
+
+    # Materializing a day again replaces its durations
+    store.add_day("heute", first_day, {("heute", "", _CRIT): 86400})
+    assert [(span["state"], span["duration"])
+            for span in store.spans(["heute"], "host", first_day, second_day)] == [(2, 86400)]
+
+    store.remove_days_before("heute", second_day)
+    assert store.days("heute") == {second_day}
+    assert store.spans(["heute"], "host", first_day, second_day) == []
+
+
+def test_materialized_days(tmp_path, days):
+    first_day, second_day, third_day = days
+    store = availability_store.AvailabilityStore(tmp_path / "store.sqlite")
+    store.add_day("heute", first_day, {})
+    store.add_day("heute", second_day, {})
+
+    # The last day of the time range is never taken from the store
+    assert store.materialized_days(["heute"], first_day, third_day) == (first_day, second_day)
+    assert store.materialized_days(["heute"], first_day - 3600,
+                                   third_day + 3600) == (first_day, third_day)
+    assert store.materialized_days(["heute"], first_day + 1, third_day) is None
+    assert store.materialized_days(["heute", "other"], first_day, third_day) is None
+    assert store.materialized_days(["heute"], first_day - 86400, third_day) is None
+
+
+def _history(days):
+    first_day, second_day, third_day = days
+    changes = [
+        (first_day - 7200, first_day + 3600, 0),
+        (first_day + 3600, second_day + 600, 2),
+        (second_day + 600, third_day + 5000, 1),
+        (third_day + 5000, third_day + 86400, 0),
+    ]
+    return [
+        dict(
+            zip(["site", "host_name", "service_description", "from", "until"] +
+                availability_store.KEY_COLUMNS,
+                ("heute", "heute", "CPU load", span_from, span_until, state) + _OK[1:]))
+        for span_from, span_until, state in changes
+    ]
+
+
+def _clip_history(history, time_range):
+    spans = []
+    for span in history:
+        span_from = max(span["from"], time_range[0])
+        span_until = min(span["until"], time_range[1])
+        if span_from < span_until:
+            spans.append(dict(span, duration=span_until - span_from))
+            spans[-1].update({"from": span_from, "until": span_until})
+    return spans
+
+
+@pytest.fixture(name="availability")
+def fixture_availability(monkeypatch, tmp_path, days):
+    import cmk.gui.availability as availability  # pylint: disable=import-outside-toplevel
+    history = _history(days)
+
+    def query_availability_spans(what, context, filterheaders, only_sites, av_object,
+                                 include_output, include_long_output, avoptions, time_range):
+        return _clip_history(history, time_range), None
+
+    monkeypatch.setattr(availability, "_query_availability_spans", query_availability_spans)
+    monkeypatch.setattr(availability, "load_annotations", lambda: {})
+    monkeypatch.setattr(availability.config, "availability_store_days", 400, raising=False)
+    monkeypatch.setattr(availability_store.cmk.utils.paths, "var_dir", str(tmp_path))
+
+    store = availability_store.AvailabilityStore()
+    for day in days[:2]:
+        rows = [[span["host_name"], span["service_description"], span["duration"]] +
+                [span[column]
+                 for column in availability_store.KEY_COLUMNS]
+                for span in _clip_history(history, (day, availability_store.day_end(day)))]
+        store.add_day("heute", day, availability_store.aggregate_durations(rows))
+    return availability
+
+
+def _compute_states(availability, time_range):
+    avoptions = availability.get_default_avoptions()
+    avoptions["range"] = time_range, ""
+    av_rawdata, _has_reached_logrow_limit = availability.get_availability_rawdata(
+        "service", {}, "", ["heute"], None, False, False, avoptions)
+    return [(entry["service"], entry["states"])
+            for entry in availability.compute_availability("service", av_rawdata, avoptions)]
+
+
+def _compute_states_with_and_without_store(availability, time_range):
+    with_store = _compute_states(availability, time_range)
+    availability.config.availability_store_days = None
+    assert with_store == _compute_states(availability, time_range)
+    return with_store
+
+
+def test_availability_with_store(availability, days):
+    first_day, _second_day, third_day = days
+    assert _compute_states_with_and_without_store(availability,
+                                                  (first_day - 3600, third_day + 7200)) == [
+                                                      ("CPU load", {
+                                                          "ok": 3600 + 3600 + 2200,
+                                                          "crit": 86400 - 3600 + 600,
+                                                          "warn": 86400 - 600 + 5000,
+                                                      }),
+                                                  ]
+
+
+def test_availability_with_store_and_annotations(availability, monkeypatch, days):
+    first_day, second_day, third_day = days
+    annotations = {
+        ("heute", "heute", "CPU load"): [{
+            "from": second_day - 3600,
+            "until": second_day + 3600,
+            "service_state": 1,
+        }],
+    }
+    monkeypatch.setattr(availability, "load_annotations", lambda: annotations)
+    states = _compute_states_with_and_without_store(availability,
+                                                    (first_day - 3600, third_day + 7200))
+    assert states[0][1]["crit"] == 86400 - 3600 + 600 - 3600 - 600
@@ -42,3 +42,148 @@ def test_get_aggregation_group_trees(monkeypatch, host_aggregations, expected):
     monkeypatch.setattr(bi.config, "aggregations", [])
     monkeypatch.setattr(bi.config, "host_aggregations", host_aggregations)
     assert bi.get_aggregation_group_trees() == expected
+
+
+@pytest.fixture(name="bi_services")
+def fixture_bi_services(monkeypatch):
+    services = {
+        ("site", "web01"): ([], ["CPU load", "HTTP api", "HTTP www"], [], [], "Web server"),
+        ("site", "web02"): ([], ["CPU load", "HTTP www"], [], [], "Web server"),
+        ("site", "db01"): ([], ["CPU load", "MySQL"], [], [], "Database"),
+    }
+    services_by_hostname = {}
+    for (site, hostname), entry in services.items():
+        services_by_hostname.setdefault(hostname, []).append((site, entry))
+    monkeypatch.setattr(bi, "g_services", services)
+    monkeypatch.setattr(bi, "g_services_by_hostname", services_by_hostname)
+    monkeypatch.setattr(bi, "g_compile_dependencies", {})
+    return services
+
+
+def test_matching_hosts(bi_services):
+    assert sorted(host_spec for host_spec, _entry in bi.matching_hosts("web.*", False)) == [
+        ("site", "web01"),
+        ("site", "web02"),
+    ]
+    assert [host_spec for host_spec, _entry in bi.matching_hosts((None, "Data.*"), False)] == [
+        ("site", "db01"),
+    ]
+
+
+def test_matching_services(bi_services):
+    assert bi.matching_services("HTTP (.*)") == {"HTTP api": ("api",), "HTTP www": ("www",)}
+    assert bi.matching_services("Disk") == {}
+
+
+def test_find_matching_services_tracks_host_patterns(bi_services):
+    bi.reset_compile_dependencies()
+    assert bi.find_matching_services(bi.AGGR_MULTI, None, ("web(.*)", "HTTP (.*)")) == [
+        (("web01", "Web server"), ("01", "api")),
+        (("web01", "Web server"), ("01", "www")),
+        (("web02", "Web server"), ("02", "www")),
+    ]
+    assert bi.g_compile_dependencies["patterns"] == {("web(.*)", False)}
+
+
+def test_get_changed_hosts(bi_services):
+    old_fingerprints = bi.host_fingerprints(bi_services)
+    new_services = dict(bi_services)
+    del new_services[("site", "web02")]
+    new_services[("site", "db01")] = ([], ["CPU load"], [], [], "Database")
+    new_services[("site", "db02")] = ([], ["MySQL"], [], [], "Backup")
+
+    assert bi.get_changed_hosts(old_fingerprints, bi.host_fingerprints(new_services)) == {
+        ("site", "web02"): {"Web server"},
+        ("site", "db01"): {"Database"},
+        ("site", "db02"): {"Backup"},
+    }
+
+
+def test_get_affected_jobs(monkeypatch, bi_services):
+    monkeypatch.setattr(bi.config, "host_aggregations", [])
+    monkeypatch.setattr(bi.config, "aggregations", [
+        ({}, "Web", ("web.*", "HTTP.*")),
+        ({}, "DB", "db", "rule_db"),
+    ])
+    monkeypatch.setattr(bi.config, "aggregation_rules", {"rule_db": ("DB", [], "worst", [])})
+    web_job = (bi.AGGR_MULTI, 0, ("Web",))
+    db_job = (bi.AGGR_MULTI, 1, ("DB",))
+    compiled_trees = bi.BICacheManager.empty_compiled_tree()
+    compiled_trees["compiled_multi_aggr"] = {web_job: {}, db_job: {}}
+    compiled_trees["dependencies"] = {
+        web_job: {
+            "aggregation": bi.aggregation_fingerprint(web_job),
+            "rules": {},
+            "hosts": set(),
+            "patterns": {("web.*", False)},
+        },
+        db_job: {
+            "aggregation": bi.aggregation_fingerprint(db_job),
+            "rules": {
+                "rule_db": bi.rule_fingerprint("rule_db")
+            },
+            "hosts": {("site", "db01")},
+            "patterns": set(),
+        },
+    }
+
+    assert bi.get_affected_jobs(compiled_trees, {}) == set()
+    assert bi.get_affected_jobs(compiled_trees, {("site", "web03"): {"New"}}) == {web_job}
+    assert bi.get_affected_jobs(compiled_trees, {("site", "db01"): {"Database"}}) == {db_job}
+
+    monkeypatch.setitem(bi.config.aggregation_rules, "rule_db", ("DB", [], "best", []))
+    assert bi.get_affected_jobs(compiled_trees, {}) == {db_job}
+
+
+def test_cache_manager_invalidate(monkeypatch, tmp_path):
+    monkeypatch.setattr(bi, "get_cache_dir", lambda: str(tmp_path))
+    host_job = (bi.AGGR_HOST, 0, ("Hosts",))
+    multi_job = (bi.AGGR_MULTI, 1, ("All",))
+    aggregations = {
+        "h1": {
+            "reqhosts": [("site", "host1")]
+        },
+        "h2": {
+            "reqhosts": [("site", "host2")]
+        },
+        "m": {
+            "reqhosts": [("site", "host1"), ("site", "host2")]
+        },
+    }
+    compiled_trees = bi.BICacheManager.empty_compiled_tree()
+    compiled_trees.update({
+        "compiled_host_aggr": {
+            host_job: {
+                "compiled_hosts": {("site", "host1"), ("site", "host2")}
+            }
+        },
+        "compiled_multi_aggr": {
+            multi_job: {
+                "compiled": True
+            }
+        },
+        "job_refs": {
+            host_job: ["h1", "h2"],
+            multi_job: ["m"]
+        },
+        "aggr_ref": aggregations,
+        "forest_ref": {
+            "Hosts": ["h1", "h2"],
+            "All": ["m"]
+        },
+        "aggregations_by_hostname_ref": {
+            "host1": [(("site", "host1"), "h1"), (("site", "host1"), "m")],
+            "host2": [(("site", "host2"), "h2"), (("site", "host2"), "m")],
+        },
+    })
+
+    cache_manager = bi.BICacheManager()
+    cache_manager._reinstantiate_references(compiled_trees)
+    cache_manager.invalidate({multi_job}, {("site", "host1")})
+
+    trees = cache_manager.get_compiled_trees()
+    assert trees["compiled_host_aggr"] == {host_job: {"compiled_hosts": {("site", "host2")}}}
+    assert trees["compiled_multi_aggr"] == {}
+    assert trees["job_refs"] == {host_job: ["h2"]}
+    assert trees["forest"] == {"Hosts": [aggregations["h2"]], "All": []}
+    assert trees["aggregations_by_hostname"] == {"host2": [(("site", "host2"), aggregations["h2"])]}
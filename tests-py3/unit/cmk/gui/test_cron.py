@@ -11,6 +11,7 @@ import cmk.gui.cron as cron
 def test_registered_jobs():
 
     expected = [
+        'cmk.gui.availability_store.update_availability_store',
         'cmk.gui.inventory.run',
         'cmk.gui.plugins.cron.gui_background_job.housekeeping',
         'cmk.gui.userdb.execute_userdb_job',
@@ -7,6 +7,7 @@
 # pylint: disable=redefined-outer-name
 
 import json
+import os
 
 import pytest  # type: ignore[import]
 
@@ -922,6 +923,65 @@ def test_html_set_theme(my_theme, register_builtin_html):
     assert html.get_theme() == "my_theme"
 
 
+@pytest.fixture()
+def multisite_config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "default_config_dir", str(tmp_path))
+    (tmp_path / "multisite.d").mkdir()
+    (tmp_path / "multisite.mk").write_text(u"quicksearch_dropdown_limit = 42\n")
+    return tmp_path
+
+
+def test_load_config_cached(mocker, multisite_config_dir):
+    custom_mk = multisite_config_dir / "multisite.d" / "custom.mk"
+    custom_mk.write_text(u"table_row_limit = 23\ncustom_setting = {'key': [1]}\n")
+    load_config_files = mocker.spy(config, "_load_config_files")
+
+    config.load_config()
+    assert load_config_files.call_count == 1
+    assert config.quicksearch_dropdown_limit == 42
+    assert config.custom_setting == {"key": [1]}
+
+    # Changes made while handling a request do not reach the next request
+    config.table_row_limit = 100
+    config.custom_setting["key"].append(2)
+    config.sites.clear()
+
+    config.load_config()
+    assert load_config_files.call_count == 1
+    assert config.table_row_limit == 23
+    assert config.custom_setting == {"key": [1]}
+    assert config.sites == config.default_single_site_configuration()
+
+
+@pytest.mark.parametrize("change", ["added", "removed", "modified"])
+def test_load_config_reloads_changed_files(mocker, multisite_config_dir, change):
+    config.load_config()
+    load_config_files = mocker.spy(config, "_load_config_files")
+
+    if change == "added":
+        (multisite_config_dir / "multisite.d" / "new.mk").write_text(u"debug = True\n")
+    elif change == "removed":
+        (multisite_config_dir / "multisite.mk").unlink()
+    else:
+        os.utime(str(multisite_config_dir / "multisite.mk"), (0, 0))
+
+    config.load_config()
+    assert load_config_files.call_count == 1
+
+
+def test_load_config_reloads_changed_plugins(mocker, multisite_config_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "local_web_dir", tmp_path / "local")
+    config.load_config()
+    load_config_files = mocker.spy(config, "_load_config_files")
+
+    plugins_dir = tmp_path / "local" / "plugins" / "config"
+    plugins_dir.mkdir(parents=True)
+    (plugins_dir / "my_plugin.py").write_text(u"my_plugin_setting = 1\n")
+    config.load_config()
+    assert load_config_files.call_count == 1
+    assert config.my_plugin_setting == 1
+
+
 @pytest.mark.usefixtures("load_config")
 def test_default_tags():
     groups = {
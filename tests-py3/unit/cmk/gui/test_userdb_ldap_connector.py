@@ -514,3 +514,138 @@ def test_get_group_memberships_nested(mocked_ldap):
 
     for needed_group_dn, needed_group in needed_groups:
         assert memberships[needed_group_dn] == needed_group
+
+
+def test_get_group_memberships_nested_loop(mocked_ldap):
+    memberships = mocked_ldap.get_group_memberships(["loop1", "loop2", "loop3"], nested=True)
+
+    assert len(memberships) == 3
+    for group in memberships.values():
+        assert group["members"] == [
+            u"cn=admin,ou=users,dc=check-mk,dc=org",
+            u"cn=härry,ou=users,dc=check-mk,dc=org",
+        ]
+
+
+def test_get_group_memberships_nested_queries(mocked_ldap):
+    mocked_ldap.get_group_memberships(["top-level", "level1", "level2"], nested=True)
+    # One query for the DNs of all groups, one for the memberships of all objects
+    assert mocked_ldap._num_queries == 2
+
+    memberships = mocked_ldap.get_group_memberships(["cn=level2,ou=groups,dc=check-mk,dc=org"],
+                                                    filt_attr="distinguishedname",
+                                                    nested=True)
+    assert memberships[u"cn=level2,ou=groups,dc=check-mk,dc=org"]["cn"] == u"level2"
+    # The group is cached, the CN is already known
+    assert mocked_ldap._num_queries == 2
+
+    mocked_ldap.get_group_memberships(["cn=loop1,ou=groups,dc=check-mk,dc=org"],
+                                      filt_attr="distinguishedname",
+                                      nested=True)
+    # Only the CN of the group is fetched, the memberships are reused
+    assert mocked_ldap._num_queries == 3
+
+
+def test_get_group_memberships_nested_single_user(mocked_ldap):
+    groups = ["empty", "top-level", "level1", "level2", "selfref", "loop1", "loop2", "loop3"]
+    user_dn = u"cn=härry,ou=users,dc=check-mk,dc=org"
+    memberships = mocked_ldap.get_group_memberships(groups, nested=True)
+
+    # When syncing a single user, only the memberships of this user are looked up
+    mocked_ldap._flush_caches()
+    mocked_ldap._sync_user_dn = user_dn
+    user_memberships = mocked_ldap.get_group_memberships(groups, nested=True)
+
+    assert sorted(user_memberships) == sorted(memberships)
+    for group_dn, group in memberships.items():
+        assert user_memberships[group_dn] == {
+            "cn": group["cn"],
+            "members": [member for member in group["members"] if member == user_dn],
+        }
+    assert user_memberships[u"cn=loop1,ou=groups,dc=check-mk,dc=org"]["members"] == [user_dn]
+
+
+@pytest.mark.parametrize("members,user_cmp_val,result", [
+    ([], "b", False),
+    (["a", "b", "c"], "b", True),
+    (["a", "b", "c"], "c", True),
+    (["a", "c"], "b", False),
+    (["a", "c"], "d", False),
+])
+def test_is_group_member(members, user_cmp_val, result):
+    assert ldap._is_group_member({"members": members}, user_cmp_val) == result
+
+
+def _sync_state(**kwargs):
+    sync_state = {
+        "server": "cn=ntds settings,cn=dc1",
+        "changed_filter": "(usnchanged>=43)",
+        "last_full_sync": 1000.0,
+        "contact_groups": ["all"],
+        "default_roles": ["user"],
+    }
+    sync_state.update(kwargs)
+    return sync_state
+
+
+@pytest.mark.parametrize("last_state,sync_state,result", [
+    (None, _sync_state(), None),
+    (_sync_state(), _sync_state(changed_filter="(usnchanged>=50)",
+                                last_full_sync=2000.0), "(usnchanged>=43)"),
+    (_sync_state(), _sync_state(last_full_sync=1000.0 + 86400), None),
+    (_sync_state(server="cn=ntds settings,cn=dc2"), _sync_state(last_full_sync=2000.0), None),
+    (_sync_state(contact_groups=[]), _sync_state(last_full_sync=2000.0), None),
+    (_sync_state(default_roles=["admin"]), _sync_state(last_full_sync=2000.0), None),
+])
+def test_incremental_sync_filter(mocked_ldap, monkeypatch, last_state, sync_state, result):
+    mocked_ldap._config["incremental_sync"] = 86400
+    monkeypatch.setattr(mocked_ldap, "_group_change_searches", lambda changed_filter: [])
+    mocked_ldap.clear_all_ldap_caches()
+    if last_state is not None:
+        mocked_ldap._save_sync_state(last_state)
+
+    assert mocked_ldap._incremental_sync_filter(sync_state) == result
+    if result is not None:
+        # The time of the full sync is kept for the next sync
+        assert sync_state["last_full_sync"] == 1000.0
+
+
+def test_incremental_sync_filter_changed_groups(mocked_ldap, monkeypatch):
+    mocked_ldap._config["incremental_sync"] = 86400
+    mocked_ldap._save_sync_state(_sync_state())
+
+    monkeypatch.setattr(
+        mocked_ldap, "_group_change_searches", lambda changed_filter: [
+            ["ou=groups,dc=check-mk,dc=org", "(cn=level1)", "sub"],
+        ])
+    assert mocked_ldap._incremental_sync_filter(_sync_state(last_full_sync=2000.0)) is None
+
+    monkeypatch.setattr(
+        mocked_ldap, "_group_change_searches", lambda changed_filter: [
+            ["ou=groups,dc=check-mk,dc=org", "(cn=not-existing)", "sub"],
+        ])
+    assert mocked_ldap._incremental_sync_filter(
+        _sync_state(last_full_sync=2000.0)) == "(usnchanged>=43)"
+
+
+@pytest.mark.parametrize("nested,result", [
+    (False, "(cn=out-of-scope)"),
+    (True, None),
+])
+def test_incremental_sync_filter_changed_nested_groups(mocked_ldap, nested, result):
+    mocked_ldap._config["incremental_sync"] = 86400
+    mocked_ldap._config["active_plugins"]["groups_to_roles"] = {"nested": nested}
+    # A group outside of the group base DN, which may be a nested group of the configured ones
+    mocked_ldap._save_sync_state(_sync_state(changed_filter="(cn=out-of-scope)"))
+
+    assert mocked_ldap._incremental_sync_filter(_sync_state(last_full_sync=2000.0)) == result
+
+
+def test_incremental_sync_filter_user_filter_memberof(mocked_ldap, monkeypatch):
+    mocked_ldap._config["incremental_sync"] = 86400
+    mocked_ldap._config["user_filter"] = (
+        "(&(objectclass=user)(memberOf=cn=admins,ou=groups,dc=check-mk,dc=org))")
+    monkeypatch.setattr(mocked_ldap, "_group_change_searches", lambda changed_filter: [])
+    mocked_ldap._save_sync_state(_sync_state())
+
+    assert mocked_ldap._incremental_sync_filter(_sync_state(last_full_sync=2000.0)) is None
@@ -7,12 +7,15 @@
 import tarfile
 import io
 import logging
+import os
+import time
 from pathlib import Path
 
 import pytest  # type: ignore[import]
 
 import cmk.utils.paths
 import cmk.utils.version as cmk_version
+from cmk.utils.exceptions import MKGeneralException
 import cmk.gui.watolib.activate_changes as activate_changes
 from cmk.gui.watolib.activate_changes import ConfigSyncFileInfo
 from cmk.gui.watolib.config_sync import ReplicationPath
@@ -574,6 +577,101 @@ def test_automation_receive_config_sync(monkeypatch, tmp_path):
     assert file_to_dir.joinpath("aaa").exists()
 
 
+def test_automation_receive_config_sync_symlinked_dir(monkeypatch, tmp_path):
+    remote_path = tmp_path.joinpath("remote")
+    monkeypatch.setattr(cmk.utils.paths, "omd_root", remote_path)
+    monkeypatch.setattr(cmk.gui.watolib.activate_changes, "_execute_post_config_sync_actions",
+                        lambda site_id: None)
+
+    # The conf.d of the remote site is a symlink to a directory outside of the site
+    conf_dir = tmp_path.joinpath("conf.d")
+    conf_dir.mkdir(parents=True)
+    with conf_dir.joinpath("keep.mk").open("w", encoding="utf-8") as f:
+        f.write(u"keep")
+    remote_path.joinpath("etc/check_mk").mkdir(parents=True)
+    remote_path.joinpath("etc/check_mk/conf.d").symlink_to(conf_dir)
+
+    central_path = tmp_path.joinpath("central")
+    central_path.joinpath("etc/check_mk/conf.d/new").mkdir(parents=True)
+    with central_path.joinpath("etc/check_mk/conf.d/new.mk").open("w", encoding="utf-8") as f:
+        f.write(u"new")
+    with central_path.joinpath("etc/check_mk/conf.d/new/sub.mk").open("w", encoding="utf-8") as f:
+        f.write(u"sub")
+    central_path.joinpath("etc/check_mk/conf.d/new").chmod(0o750)
+
+    automation = activate_changes.AutomationReceiveConfigSync()
+    automation.execute(
+        activate_changes.ReceiveConfigSyncRequest(
+            site_id="remote",
+            sync_archive=activate_changes._get_sync_archive([
+                "etc/check_mk/conf.d/new.mk",
+                "etc/check_mk/conf.d/new",
+            ], central_path),
+            to_delete=[],
+            config_generation=0,
+        ))
+
+    assert remote_path.joinpath("etc/check_mk/conf.d").is_symlink()
+    assert sorted(p.name for p in conf_dir.iterdir()) == ["keep.mk", "new", "new.mk"]
+    assert conf_dir.joinpath("new/sub.mk").exists()
+    # New directories get the permissions from the archive
+    assert conf_dir.joinpath("new").stat().st_mode & 0o777 == 0o750
+
+
+def test_automation_receive_config_sync_broken_archive(monkeypatch, tmp_path):
+    remote_path = tmp_path.joinpath("remote")
+    monkeypatch.setattr(cmk.utils.paths, "omd_root", remote_path)
+    monkeypatch.setattr(cmk.gui.watolib.activate_changes, "_execute_post_config_sync_actions",
+                        lambda site_id: None)
+
+    to_delete_path = remote_path.joinpath("to_delete")
+    to_delete_path.parent.mkdir(parents=True, exist_ok=True)
+    with to_delete_path.open("w", encoding="utf-8") as f:
+        f.write(u"äää")
+
+    automation = activate_changes.AutomationReceiveConfigSync()
+    with pytest.raises(MKGeneralException):
+        automation.execute(
+            activate_changes.ReceiveConfigSyncRequest(
+                site_id="remote",
+                sync_archive=_get_test_sync_archive(tmp_path.joinpath("central"))[:700],
+                to_delete=["to_delete"],
+                config_generation=0,
+            ))
+
+    # Nothing has been changed
+    assert to_delete_path.exists()
+    assert not remote_path.joinpath("etc/abc").exists()
+    assert not list(Path(cmk.utils.paths.var_dir, "wato").glob("config_sync_*"))
+
+
+def test_config_sync_manifest(monkeypatch, tmp_path):
+    file_path = tmp_path.joinpath("file")
+    with file_path.open("w", encoding="utf-8") as f:
+        f.write(u"Däng")
+    mtime = time.time() - 10
+    os.utime(str(file_path), (mtime, mtime))
+    manifest_path = tmp_path.joinpath("manifests/site.json")
+    expected_hash = "780518619e3c5dfc931121362c7f14fa8d06457995c762bd818072ed42e6e69e"
+
+    manifest = activate_changes.ConfigSyncManifest(manifest_path)
+    assert activate_changes._get_config_sync_file_info(file_path,
+                                                       manifest).file_hash == expected_hash
+    manifest.save()
+
+    # The hash of the unchanged file is taken from the manifest
+    monkeypatch.setattr(activate_changes, "_create_config_sync_file_hash", lambda path: "rehashed")
+    manifest = activate_changes.ConfigSyncManifest(manifest_path)
+    assert activate_changes._get_config_sync_file_info(file_path,
+                                                       manifest).file_hash == expected_hash
+
+    # A modified file is hashed again
+    with file_path.open("w", encoding="utf-8") as f:
+        f.write(u"Dong")
+    os.utime(str(file_path), (mtime, mtime))
+    assert activate_changes._get_config_sync_file_info(file_path, manifest).file_hash == "rehashed"
+
+
 def test_get_current_config_generation():
     assert activate_changes._get_current_config_generation() == 0
     activate_changes.update_config_generation()
@@ -1236,6 +1236,7 @@ def test_grouped_rulespecs():
             'snmp_check_interval',
             'bulkwalk_hosts',
             'snmp_bulk_size',
+            'snmp_bulk_backend',
             'snmp_without_sys_descr',
             'snmpv2c_hosts',
             'snmpv3_contexts',
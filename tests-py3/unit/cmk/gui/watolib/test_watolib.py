@@ -82,6 +82,7 @@ def test_registered_configvars():
         'apache_process_tuning',
         'archive_orphans',
         'auth_by_http_header',
+        'availability_store_days',
         'builtin_icon_visibility',
         'bulk_discovery_default_settings',
         'check_mk_perfdata_with_times',
@@ -101,6 +102,7 @@ def test_registered_configvars():
         'enable_sounds',
         'escape_plugin_output',
         'event_limit',
+        'event_processing_workers',
         'eventsocket_queue_len',
         'failed_notification_horizon',
         'hard_query_limit',
@@ -128,13 +130,17 @@ def test_registered_configvars():
         'multisite_draw_ruleicon',
         'notification_backlog',
         'notification_bulk_interval',
+        'notification_contactgroups_cache_ttl',
         'notification_fallback_email',
         'notification_logging',
+        'notification_plugin_queue_size',
         'notification_plugin_timeout',
+        'notification_plugin_workers',
         'page_heading',
         'pagetitle_date_format',
         'password_policy',
         'piggyback_max_cachefile_age',
+        'prediction_precompute',
         'profile',
         'quicksearch_dropdown_limit',
         'quicksearch_search_order',
@@ -31,6 +31,7 @@ SNMPConfig = SNMPHostConfig(
     is_usewalk_host=False,
     is_inline_snmp_host=False,
     record_stats=False,
+    bulk_backend_settings=None,
 )
 
 
@@ -9,7 +9,9 @@ import pytest  # type: ignore[import]
 from testlib.base import Scenario
 from cmk.base.check_utils import Service
 from cmk.base.discovered_labels import DiscoveredServiceLabels, ServiceLabel
-from cmk.utils.rulesets.ruleset_matcher import RulesetMatchObject
+from cmk.utils.regex import regex
+from cmk.utils.rulesets.ruleset_matcher import (HostConditionIndex, RulesetMatchObject,
+                                                ServiceDescriptionMatcher)
 
 
 def test_ruleset_match_object_no_conditions():
@@ -506,3 +508,121 @@ def test_ruleset_matcher_get_service_ruleset_values_labels(monkeypatch, hostname
             hostname, service_description),
                                            ruleset=service_label_ruleset,
                                            is_binary=False)) == expected_result
+
+
+@pytest.fixture()
+def host_condition_index():
+    labels = {
+        "host1": {
+            "os": "linux"
+        },
+        "host2": {
+            "os": "windows"
+        },
+        "host3": {},
+    }
+    labels_requested = []
+
+    def labels_of_host(hostname):
+        labels_requested.append(hostname)
+        return labels[hostname]
+
+    index = HostConditionIndex(
+        ["host3", "host1", "host2"],
+        {
+            "host1": {"lan", "prod", "/wato/a/"},
+            "host2": {"wan", "prod", "/wato/a/b/"},
+            "host3": {"lan", "test", "/wato/"},
+        },
+        {
+            "host1": "/wato/a/",
+            "host2": "/wato/a/b/",
+            "host3": "/wato/",
+        },
+        labels_of_host,
+    )
+    return index, labels_requested
+
+
+def test_host_condition_index_bits(host_condition_index):
+    index, _labels_requested = host_condition_index
+    assert index.hosts_of_bits(index.all_hosts_bits) == {"host1", "host2", "host3"}
+    assert index.hosts_of_bits(0) == set()
+    assert index.hosts_of_bits(index.bits_of_hosts(["host2", "unknown"])) == {"host2"}
+
+
+@pytest.mark.parametrize("folder_path,expected_result", [
+    ("/", {"host1", "host2", "host3"}),
+    ("/wato/a/", {"host1", "host2"}),
+    ("/wato/a/b/", {"host2"}),
+    ("/wato/c/", set()),
+])
+def test_host_condition_index_folder_bits(host_condition_index, folder_path, expected_result):
+    index, _labels_requested = host_condition_index
+    assert index.hosts_of_bits(index.folder_bits(folder_path)) == expected_result
+
+
+@pytest.mark.parametrize("tag_spec,expected_result", [
+    ("lan", {"host1", "host3"}),
+    ("unknown", set()),
+    ({
+        "$ne": "lan"
+    }, {"host2"}),
+    ({
+        "$or": ["wan", "test"]
+    }, {"host2", "host3"}),
+    ({
+        "$nor": ["wan", "test"]
+    }, {"host1"}),
+])
+def test_host_condition_index_tag_spec_bits(host_condition_index, tag_spec, expected_result):
+    index, _labels_requested = host_condition_index
+    assert index.hosts_of_bits(index.tag_spec_bits(tag_spec)) == expected_result
+
+
+def test_host_condition_index_label_conditions_bits(host_condition_index):
+    index, labels_requested = host_condition_index
+    prod_bits = index.tag_spec_bits("prod")
+
+    assert index.hosts_of_bits(index.label_conditions_bits({"os": "linux"}, prod_bits)) == {"host1"}
+    assert index.hosts_of_bits(index.label_conditions_bits({"os": {
+        "$ne": "linux"
+    }}, prod_bits)) == {"host2"}
+    # Only the labels of the candidates are computed, each host only once
+    assert sorted(labels_requested) == ["host1", "host2"]
+
+    assert index.hosts_of_bits(
+        index.label_conditions_bits({"os": {
+            "$ne": "linux"
+        }}, index.all_hosts_bits)) == {"host2", "host3"}
+    assert sorted(labels_requested) == ["host1", "host2", "host3"]
+
+
+@pytest.mark.parametrize(
+    "patterns",
+    [
+        ["", "CPU", "(?:CPU load)|(?:Memory)", "Interface [0-9]+$", "CPU"],
+        # Inline flags can not be combined into one pattern
+        ["(?i)cpu", "Memory"],
+        # Group references refer to other groups within the combined pattern
+        ["(x)", r"(a)\1", "(?P<c>C)(?P=c)", "(M)?(?(1)emory|CPU)", "CPU"],
+    ])
+@pytest.mark.parametrize("service_description", [
+    "CPU load",
+    "CPU utilization",
+    "Memory",
+    "Interface 12",
+    "Interface 12 x",
+    "cpu",
+    "aa",
+    "CCPU",
+])
+def test_service_description_matcher(patterns, service_description):
+    matcher = ServiceDescriptionMatcher([regex(p) for p in patterns])
+    expected_result = {
+        index for index, pattern in enumerate(patterns)
+        if regex(pattern).match(service_description) is not None
+    }
+    assert matcher.matching_rules(service_description) == expected_result
+    # Cached result
+    assert matcher.matching_rules(service_description) == expected_result
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2020 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import random
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.prediction as prediction
+from cmk.utils.array_timeseries import (
+    ArrayTimeSeries,
+    array_operators,
+    percentile,
+    to_array,
+    to_values,
+)
+
+
+def _random_values(rnd, num_points, missing=0.2):
+    return [
+        None if rnd.random() < missing else rnd.choice([0, rnd.uniform(-100, 100)])
+        for _point in range(num_points)
+    ]
+
+
+def test_array_conversion():
+    values = [1.0, None, 3.5, None]
+    array = to_array(values)
+    assert array.dtype == float
+    assert to_values(array) == values
+
+
+def test_array_time_series_list_interface():
+    ts = ArrayTimeSeries([100, 130, 10, 1, None, 3])
+    assert ts.twindow == (100, 130, 10)
+    assert len(ts) == 3
+    assert ts[0] == 1.0
+    assert ts[1] is None
+    assert ts.values == [1.0, None, 3.0]
+    assert ts.time_data_pairs() == prediction.TimeSeries([100, 130, 10, 1, None,
+                                                          3]).time_data_pairs()
+    assert ts.to_time_series() == prediction.TimeSeries([100, 130, 10, 1, None, 3])
+    assert ArrayTimeSeries.from_time_series(ts.to_time_series()) == ts
+
+
+def test_array_time_series_arithmetic():
+    a = ArrayTimeSeries([1, None, 3, 4], (0, 40, 10))
+    b = ArrayTimeSeries([2, 2, None, 0], (0, 40, 10))
+    assert (a + b).values == [3.0, 2.0, 3.0, 4.0]
+    assert (a - b).values == [-1.0, None, None, 4.0]
+    assert (a * b).values == [2.0, None, None, 0.0]
+    assert (a / b).values == [0.5, None, None, None]
+    assert (a * 2).values == [2.0, None, 6.0, 8.0]
+    assert (12 / a).values == [12.0, None, 4.0, 3.0]
+
+
+@pytest.mark.parametrize("rrddata, twindow, shift", [
+    ([10, 20, 10, 20], (10, 20, 5), 0),
+    ([10, 20, 10, 20], (20, 30, 5), 10),
+    ([0, 120, 40, 25, 65, 105], (300, 400, 10), 300),
+    ([0, 120, 40, 25, None, 105], (300, 400, 10), 300),
+    ([0, 120, 40, 25, 65, 105], (330, 410, 10), 300),
+])
+def test_bfill_upsample_like_time_series(rrddata, twindow, shift):
+    assert ArrayTimeSeries(rrddata).bfill_upsample(twindow, shift).values == \
+        prediction.TimeSeries(rrddata).bfill_upsample(twindow, shift)
+
+
+def test_bfill_upsample_beyond_data():
+    assert ArrayTimeSeries([0, 20, 10, 1, 2]).bfill_upsample((0, 40, 5), 0).values == \
+        [1.0, 1.0, 2.0, 2.0, None, None, None, None]
+
+
+@pytest.mark.parametrize("rrddata, twindow, cf", [
+    ([10, 25, 5, 15, 20, 25], (10, 30, 10), "average"),
+    ([10, 25, 5, 15, 20, 25], (10, 30, 10), "max"),
+    ([10, 45, 5, 15, 20, 25, 30, 35, 40, 45], (10, 40, 10), "max"),
+    ([10, 45, 5, 15, 20, 25, 30, 35, 40, 45], (10, 60, 10), "max"),
+    ([10, 45, 5, 15, None, 25, None, None, None, 45], (10, 60, 10), "max"),
+    ([10, 45, 5, 15, 20, 25, 30, 35, 40, 45], (0, 60, 10), "max"),
+    ([10, 45, 5, 15, 20, 25, 30, 35, 40, 45], (10, 40, 10), "average"),
+    ([10, 45, 5, 15, 20, 25, 30, None, 40, 45], (10, 40, 10), "average"),
+    ([10, 45, 5, 15, 20, 25, 30, None, 40, 45], (10, 40, 10), "min"),
+    ([0, 6000, 60] + _random_values(random.Random(0), 100), (0, 6000, 300), "max"),
+    ([0, 6000, 60] + _random_values(random.Random(1), 100), (0, 6000, 300), "min"),
+    ([0, 6000, 60] + _random_values(random.Random(2), 100, 0.8), (0, 6000, 300), "average"),
+])
+def test_downsample_like_time_series(rrddata, twindow, cf):
+    expected = prediction.TimeSeries(rrddata).downsample(twindow, cf)
+    result = ArrayTimeSeries(rrddata).downsample(twindow, cf).values
+    assert result == pytest.approx(expected)
+
+
+def test_downsample_invalid_cf():
+    with pytest.raises(ValueError):
+        ArrayTimeSeries([10, 25, 5, 15, 20, 25]).downsample((10, 30, 10), "last")
+
+
+@pytest.mark.parametrize("operator_id, result", [
+    ("+", [5.0, 2.0, 3.0, None]),
+    ("*", [4.0, None, None, None]),
+    ("MAX", [4.0, 2.0, 3.0, None]),
+    ("MIN", [1.0, 2.0, 3.0, None]),
+    ("AVERAGE", [2.5, 2.0, 3.0, None]),
+    ("MERGE", [1.0, 2.0, 3.0, None]),
+])
+def test_array_operators(operator_id, result):
+    operands = [[1, None, 3, None], [4, 2, None, None]]
+    _title, op_func = array_operators()[operator_id]
+    assert to_values(op_func([to_array(operand) for operand in operands])) == result
+
+
+@pytest.mark.parametrize("values, q, result", [
+    ([], 50, None),
+    ([None, None], 50, None),
+    ([3, None, 1, 2], 50, 2.0),
+    ([4, 1, 3, 2], 50, 2.5),
+    ([4, 1, 3, 2], 0, 1.0),
+    ([4, 1, 3, 2], 100, 4.0),
+    ([4, 1, 3, 2], 90, 4.0),
+])
+def test_percentile(values, q, result):
+    assert percentile(to_array(values), q) == result
@@ -23,6 +23,10 @@ def test_config():
     for f1 in piggyback_dir.glob("*/*"):
         f1.unlink()
 
+    catalog_path = piggyback_dir / ".catalog.sqlite"
+    if catalog_path.exists():
+        catalog_path.unlink()
+
     source_file = piggyback_dir / "test-host" / "source1"
     with source_file.open(mode="wb") as f2:
         f2.write(b"<<<check_mk>>>\nlala\n")
@@ -432,3 +436,92 @@ def test_get_piggyback_matching_time_settings(time_settings, expected_time_setti
         piggyback._get_matching_time_settings(
             ["source-host"], "piggybacked-host",
             time_settings).keys()) == sorted(expected_time_setting_keys)
+
+
+def test_store_piggyback_raw_data_catalog(monkeypatch):
+    time_settings: piggyback.PiggybackTimeSettings = [(None, "max_cache_age",
+                                                       piggyback_max_cachefile_age)]
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+
+    catalog = piggyback._read_catalog()
+    assert catalog is not None
+    assert list(catalog.files["catalog-host"]) == ["source3"]
+    assert sorted(catalog.source_status) == ["source1", "source3"]
+
+    def listdir(_piggybacked_host_folder):
+        raise AssertionError("piggyback directory is scanned")
+
+    with monkeypatch.context() as m:
+        m.setattr(piggyback, "_get_piggybacked_host_sources", listdir)
+        assert sorted(piggyback.get_source_and_piggyback_hosts(time_settings)) == [
+            ("source1", "test-host"),
+            ("source3", "catalog-host"),
+        ]
+
+    raw_data_infos = piggyback.get_piggyback_raw_data("catalog-host", time_settings)
+    assert len(raw_data_infos) == 1
+    assert raw_data_infos[0].source_hostname == "source3"
+    assert raw_data_infos[0].file_path.endswith('/catalog-host/source3')
+    assert raw_data_infos[0].successfully_processed is True
+    assert raw_data_infos[0].raw_data == b'<<<check_mk>>>\nlulu\n'
+    assert piggyback.get_source_hostnames("catalog-host") == ["source3"]
+
+
+def test_get_piggyback_raw_data_catalog_outdated():
+    time_settings: piggyback.PiggybackTimeSettings = [(None, "max_cache_age",
+                                                       piggyback_max_cachefile_age)]
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+
+    # Files added or removed without updating the catalog are found
+    with (cmk.utils.paths.piggyback_dir / "catalog-host" / "source4").open("wb") as f:
+        f.write(b"<<<check_mk>>>\nlala\n")
+    assert sorted(piggyback.get_source_hostnames("catalog-host")) == ["source3", "source4"]
+    assert sorted(piggyback.get_source_hostnames()) == ["source1", "source3", "source4"]
+
+    # Status files changed without updating the catalog are respected
+    os.remove(str(cmk.utils.paths.piggyback_source_dir / "source3"))
+    assert list(piggyback.get_source_and_piggyback_hosts(time_settings)) == [("source1",
+                                                                              "test-host")]
+    for raw_data_info in piggyback.get_piggyback_raw_data("catalog-host", time_settings):
+        assert raw_data_info.successfully_processed is False
+        assert raw_data_info.reason.startswith("Source '%s' not sending piggyback data" %
+                                               raw_data_info.source_hostname)
+
+
+def test_remove_source_status_file_catalog():
+    time_settings: piggyback.PiggybackTimeSettings = [(None, "max_cache_age",
+                                                       piggyback_max_cachefile_age)]
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+
+    assert piggyback.remove_source_status_file("source3") is True
+    catalog = piggyback._read_catalog()
+    assert catalog is not None
+    assert "source3" not in catalog.source_status
+    assert piggyback.has_piggyback_raw_data("catalog-host", time_settings) is False
+
+
+def test_cleanup_piggyback_files_catalog():
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+
+    piggyback.cleanup_piggyback_files([(None, 'max_cache_age', -1)])
+    assert not (cmk.utils.paths.piggyback_dir / "catalog-host").exists()
+    assert not (cmk.utils.paths.piggyback_source_dir / "source3").exists()
+    assert piggyback._read_catalog() == piggyback._PiggybackCatalog({}, {}, {})
+
+
+def test_store_piggyback_raw_data_broken_catalog():
+    time_settings: piggyback.PiggybackTimeSettings = [(None, "max_cache_age",
+                                                       piggyback_max_cachefile_age)]
+    catalog_path = piggyback._get_catalog_path()
+    catalog_path.parent.mkdir(parents=True, exist_ok=True)
+    with catalog_path.open("wb") as f:
+        f.write(b"no database")
+
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+    assert not catalog_path.exists()
+    assert piggyback.has_piggyback_raw_data("catalog-host", time_settings) is True
+
+    # The catalog is created again with the next update
+    piggyback.store_piggyback_raw_data("source3", {"catalog-host": [b"<<<check_mk>>>", b"lulu"]})
+    assert catalog_path.exists()
+    assert piggyback.has_piggyback_raw_data("catalog-host", time_settings) is True
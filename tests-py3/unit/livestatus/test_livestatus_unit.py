@@ -7,8 +7,11 @@
 # pylint: disable=redefined-outer-name
 
 import errno
+import json
 import socket
 import ssl
+import threading
+import time
 from contextlib import closing
 
 import pytest  # type: ignore[import]
@@ -195,3 +198,188 @@ def test_create_socket_no_cert(tmp_path):
     with pytest.raises(livestatus.MKLivestatusConfigError,
                        match="(unknown error|no certificate or crl found)"):
         live._create_socket(socket.AF_INET)
+
+
+def _response(body, code="200"):
+    return ("%s %11d\n" % (code, len(body))).encode("ascii") + body
+
+
+def _json_response(rows):
+    return _response(("[" + ",\n".join(json.dumps(r) for r in rows) + "]\n").encode("utf-8"))
+
+
+@pytest.mark.parametrize("rows", [
+    [],
+    [["host", 1, 2.5]],
+    [["häst", ["a", "b"], {
+        "k": "v"
+    }], ["x,]", None, []]],
+])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1000])
+def test_iter_json_rows(rows, chunk_size):
+    data = _json_response(rows)[16:]
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    assert list(livestatus._iter_json_rows(chunks)) == rows
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"[[1]",
+    b"[[1], [2",
+    b"[[1]] x",
+    b"{}",
+])
+def test_iter_json_rows_malformed(data):
+    with pytest.raises(livestatus.MKLivestatusSocketError, match="Malformed output"):
+        list(livestatus._iter_json_rows([data]))
+
+
+@pytest.fixture()
+def socket_pair():
+    client, server = socket.socketpair()
+    with closing(client), closing(server):
+        yield client, server
+
+
+def _connected_site(client):
+    live = livestatus.SingleSiteConnection("unix:/tmp/xyz")
+    live.socket = client
+    return live
+
+
+def test_single_site_query_rows(socket_pair):
+    client, server = socket_pair
+    live = _connected_site(client)
+    server.sendall(_json_response([["a", 1], ["b", 2]]))
+
+    live.set_prepend_site(True)
+    assert list(live.query_rows("GET hosts\nColumns: name state\n")) == [
+        [b"", "a", 1],
+        [b"", "b", 2],
+    ]
+    assert b"OutputFormat: json\n" in server.recv(4096)
+    assert live.socket is client
+
+
+def test_single_site_iter_table_assoc(socket_pair):
+    client, server = socket_pair
+    live = _connected_site(client)
+    server.sendall(_json_response([["name", "state"], ["a", 1], ["b", 2]]))
+
+    assert list(live.iter_table_assoc("GET hosts\nColumns: name state\n")) == [
+        {
+            "name": "a",
+            "state": 1
+        },
+        {
+            "name": "b",
+            "state": 2
+        },
+    ]
+
+
+def test_single_site_query_rows_not_found(socket_pair):
+    client, server = socket_pair
+    live = _connected_site(client)
+    server.sendall(_response(b"no table x\n", code="404"))
+
+    with pytest.raises(livestatus.MKLivestatusTableNotFoundError, match="no table x"):
+        list(live.iter_table("GET x\n"))
+    assert live.socket is client
+
+
+def test_single_site_query_rows_aborted(socket_pair):
+    client, server = socket_pair
+    live = _connected_site(client)
+    server.sendall(_json_response([["a"], ["b"]]))
+
+    rows = live.iter_table("GET hosts\nColumns: name\n")
+    assert next(rows) == ["a"]
+    rows.close()
+    # The remaining response has not been read, the connection must not be reused
+    assert live.socket is None
+
+
+class _FakeLivestatusSite(threading.Thread):
+    """Answers the first query on a unix socket with the given response after a delay"""
+    def __init__(self, path, response, delay=0.0):
+        super(_FakeLivestatusSite, self).__init__()
+        self.daemon = True
+        self.query = b""
+        self._response = response
+        self._delay = delay
+        self._sock = socket.socket(socket.AF_UNIX)
+        self._sock.bind("%s" % path)
+        self._sock.listen(1)
+        self.start()
+
+    def run(self):
+        conn, _addr = self._sock.accept()
+        with closing(conn), closing(self._sock):
+            while not self.query.endswith(b"\n\n"):
+                self.query += conn.recv(4096)
+            time.sleep(self._delay)
+            if self._response is not None:
+                conn.sendall(self._response)
+            else:
+                conn.recv(1)  # Never answer, wait for the client to disconnect
+
+
+@pytest.fixture()
+def fake_sites(tmp_path):
+    def _create(**responses):
+        sites = {}
+        for site_id, (response, delay) in responses.items():
+            path = tmp_path / site_id
+            _FakeLivestatusSite(path, response, delay)
+            sites[site_id] = {"socket": "unix:%s" % path}
+        return livestatus.MultiSiteConnection(sites)
+
+    return _create
+
+
+def test_multi_site_query_parallel(fake_sites):
+    live = fake_sites(
+        slow=(_response(b"[['s', 1]]\n"), 0.2),
+        fast=(_response(b"[['f', 2]]\n"), 0.0),
+    )
+    live.set_prepend_site(True)
+
+    assert sorted(live.query("GET hosts\nColumns: name state\n")) == [
+        ["fast", "f", 2],
+        ["slow", "s", 1],
+    ]
+    assert live.dead_sites() == {}
+    assert sorted(live.alive_sites()) == ["fast", "slow"]
+    latencies = live.site_latencies()
+    assert latencies["fast"] < latencies["slow"]
+
+
+def test_multi_site_query_parallel_deadline(fake_sites):
+    live = fake_sites(
+        hanging=(None, 0.0),
+        fast=(_response(b"[['f', 2]]\n"), 0.0),
+    )
+    live.set_query_timeout(0.2)
+
+    assert live.query("GET hosts\nColumns: name state\n") == [["f", 2]]
+    assert live.alive_sites() == ["fast"]
+    assert "No response within" in str(live.dead_sites()["hanging"]["exception"])
+    assert list(live.site_latencies()) == ["fast"]
+
+
+def test_multi_site_query_rows_in_order_of_arrival(fake_sites):
+    live = fake_sites(
+        slow=(_json_response([["s", 1]]), 0.2),
+        fast=(_json_response([["f", 2], ["g", 3]]), 0.0),
+        missing=(_response(b"no table x\n", code="404"), 0.0),
+    )
+    live.set_prepend_site(True)
+
+    assert list(live.query_rows("GET hosts\nColumns: name state\n")) == [
+        ["fast", "f", 2],
+        ["fast", "g", 3],
+        ["slow", "s", 1],
+    ]
+    assert live.dead_sites() == {}
+    assert sorted(live.alive_sites()) == ["fast", "missing", "slow"]